@@ -0,0 +1,548 @@
+"""
+Article records and functions to write articles as plaintext and
+metadata files identical to those written by the XSLTs, or to hold
+them in memory as compact records of their plaintext and metadata
+fields (see ArticleRecord).
+
+The XSLTs compute word counts and OCR quality statistics using XPath
+number semantics, so the functions here that emulate them (number
+parsing, number to string conversion and format-number) are used
+where output must match that of the XSLTs byte for byte.
+"""
+
+import math
+import os
+import os.path
+import re
+import threading
+from functools import lru_cache
+
+from lxml import etree
+
+from alto2txt import xml, xslts
+
+XSL_NS = "http://www.w3.org/1999/XSL/Transform"
+""" XSL namespace """
+COMMON_XSLT = "extract_text_common.xslt"
+""" XSLT defining parameters common to all XSLTs """
+
+METADATA_DECLARATION = b'<?xml version="1.0"?>\n'
+""" XML declaration of metadata files, as written by the XSLTs. """
+TEXT_SUFFIX = ".txt"
+""" Suffix of plaintext article files. """
+METADATA_SUFFIX = "_metadata.xml"
+""" Suffix of article metadata files. """
+ARTICLE_FIELDS = (
+    "input_sub_path",
+    "input_filename",
+    "xml_flavour",
+    "publication_id",
+    "publication_title",
+    "location",
+    "issue_id",
+    "issue_date",
+    "item_id",
+    "item_title",
+    "item_type",
+    "word_count",
+    "ocr_quality_mean",
+    "ocr_quality_sd",
+    "ocr_quality",
+    "plain_text_file",
+)
+"""
+Metadata fields of article records (see metadata_fields). ocr_quality
+is the UKP ocr_quality or BLN ocr_quality_summary.
+"""
+STUB_SEPARATORS = ("_", "-", ".")
+"""
+Characters that can follow an output file stub in the names of the
+article files written for it e.g. 0002647_18240217_art0001.txt (METS),
+NCBP_18500102-0001-001.txt (UKP), EXGZ_18500102_0007.txt (BLN).
+"""
+
+RE_XPATH_NUMBER = re.compile(
+    r"^[ \t\r\n]*(-?)([0-9]*)(?:\.([0-9]*))?([eE][-+]?[0-9]+)?[ \t\r\n]*$"
+)
+""" Regular expression for strings XPath can convert to numbers. """
+XPATH_MAX_FRAC = 20
+""" Maximum number of fraction digits used when converting to number. """
+XPATH_DBL_DIG = 15
+""" Significant digits used when converting number to string. """
+
+FORMAT_NUMBER_XSLT = """<?xml version="1.0" encoding="UTF-8"?>
+<xsl:stylesheet version="1.0" xmlns:xsl="http://www.w3.org/1999/XSL/Transform">
+  <xsl:param name="number" />
+  <xsl:param name="pattern" />
+  <xsl:output method="text" />
+  <xsl:template match="/">
+    <xsl:value-of select="format-number($number, $pattern)" />
+  </xsl:template>
+</xsl:stylesheet>
+"""
+""" XSLT to call format-number. """
+_thread_xslts = threading.local()
+""" XSLTs compiled for each thread. """
+
+
+class Article:
+    """
+    Plaintext and minimal metadata of an article.
+
+    :param item_id: Article ID
+    :type item_id: str
+    :param stub: Output file stub e.g. 0002647_18240217_art0001
+    :type stub: str
+    :param text: Plaintext
+    :type text: str
+    :param metadata: Metadata lwm element
+    :type metadata: lxml.etree._Element
+    """
+
+    __slots__ = ("item_id", "stub", "text", "metadata")
+
+    def __init__(self, item_id, stub, text, metadata):
+        self.item_id = item_id
+        self.stub = stub
+        self.text = text
+        self.metadata = metadata
+
+    def __repr__(self):
+        return "Article({!r}, {!r})".format(self.item_id, self.stub)
+
+
+class ArticleRecord:
+    """
+    Plaintext and metadata fields of an article, held in memory.
+
+    :param stub: Output file stub e.g. 0002647_18240217_art0001
+    :type stub: str
+    :param text: Plaintext
+    :type text: str
+    :param fields: Metadata field to value, for ARTICLE_FIELDS (see
+    metadata_fields), missing fields being None
+    :type fields: dict
+    """
+
+    __slots__ = ("stub", "text") + ARTICLE_FIELDS
+
+    def __init__(self, stub, text, **fields):
+        self.stub = stub
+        self.text = text
+        for field in ARTICLE_FIELDS:
+            setattr(self, field, fields.get(field))
+
+    def __repr__(self):
+        return "ArticleRecord({!r}, {!r})".format(self.item_id, self.stub)
+
+    def __eq__(self, other):
+        if not isinstance(other, ArticleRecord):
+            return NotImplemented
+        return all(
+            getattr(self, field) == getattr(other, field) for field in self.__slots__
+        )
+
+    def to_dict(self):
+        """
+        Gets the record as a dict.
+
+        :return: stub, text and metadata fields to values
+        :rtype: dict
+        """
+        return {field: getattr(self, field) for field in self.__slots__}
+
+
+def to_int(value):
+    """
+    Converts metadata value to int.
+
+    :param value: Value
+    :type value: str
+    :return: int, or None if value is not an integer
+    :rtype: int
+    """
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def to_float(value):
+    """
+    Converts metadata value to float.
+
+    :param value: Value
+    :type value: str
+    :return: float, or None if value is not a number
+    :rtype: float
+    """
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def metadata_fields(lwm):
+    """
+    Gets metadata fields from article metadata.
+
+    :param lwm: lwm element
+    :type lwm: lxml.etree._Element
+    :return: field, one of ARTICLE_FIELDS, to value
+    :rtype: dict
+    """
+    publication = lwm.find("publication")
+    if publication is None:
+        publication = etree.Element("publication")
+    issue = publication.find("issue")
+    if issue is None:
+        issue = etree.Element("issue")
+    item = issue.find("item")
+    if item is None:
+        item = etree.Element("item")
+    ocr_quality = item.findtext("ocr_quality")
+    if ocr_quality is None:
+        ocr_quality = item.findtext("ocr_quality_summary")
+    return {
+        "input_sub_path": lwm.findtext("process/input_sub_path"),
+        "input_filename": lwm.findtext("process/input_filename"),
+        "xml_flavour": lwm.findtext("process/xml_flavour"),
+        "publication_id": publication.get("id"),
+        "publication_title": publication.findtext("title"),
+        "location": publication.findtext("location"),
+        "issue_id": issue.get("id"),
+        "issue_date": issue.findtext("date"),
+        "item_id": item.get("id"),
+        "item_title": item.findtext("title"),
+        "item_type": item.findtext("item_type"),
+        "word_count": to_int(item.findtext("word_count")),
+        "ocr_quality_mean": to_float(item.findtext("ocr_quality_mean")),
+        "ocr_quality_sd": to_float(item.findtext("ocr_quality_sd")),
+        "ocr_quality": to_float(ocr_quality),
+        "plain_text_file": item.findtext("plain_text_file"),
+    }
+
+
+def article_record(stub, text, lwm):
+    """
+    Gets an article record from article plaintext and metadata.
+
+    :param stub: Output file stub e.g. 0002647_18240217_art0001
+    :type stub: str
+    :param text: Plaintext
+    :type text: str
+    :param lwm: Metadata lwm element
+    :type lwm: lxml.etree._Element
+    :return: record
+    :rtype: ArticleRecord
+    """
+    return ArticleRecord(stub, text, **metadata_fields(lwm))
+
+
+def write_article(article, output_dir):
+    """
+    Writes article plaintext to output_dir/<stub>.txt and metadata to
+    output_dir/<stub>_metadata.xml.
+
+    :param article: Article
+    :type article: alto2txt.articles.Article
+    :param output_dir: Output directory
+    :type output_dir: str
+    """
+    output_path = os.path.join(output_dir, article.stub)
+    with open(output_path + TEXT_SUFFIX, "wb") as f:
+        f.write(article.text.encode("utf-8"))
+    with open(output_path + METADATA_SUFFIX, "wb") as f:
+        f.write(metadata_to_bytes(article.metadata))
+
+
+def is_article_file(name, stub, suffix):
+    """
+    Checks if a file name is that of an article file written for an
+    output file stub.
+
+    :param name: File name
+    :type name: str
+    :param stub: Output file stub e.g. 0002647_18240217
+    :type stub: str
+    :param suffix: TEXT_SUFFIX or METADATA_SUFFIX
+    :type suffix: str
+    :return: True if so
+    :rtype: bool
+    """
+    return (
+        name.endswith(suffix)
+        and name.startswith(stub)
+        and name[len(stub) : len(stub) + 1] in STUB_SEPARATORS
+    )
+
+
+def remove_articles(output_dir):
+    """
+    Removes article plaintext and metadata files from output_dir.
+
+    :param output_dir: Output directory
+    :type output_dir: str
+    :return: number of files removed
+    :rtype: int
+    """
+    num_removed = 0
+    with os.scandir(output_dir) as entries:
+        for entry in entries:
+            if entry.is_file() and (
+                entry.name.endswith(TEXT_SUFFIX) or entry.name.endswith(METADATA_SUFFIX)
+            ):
+                os.remove(entry.path)
+                num_removed += 1
+    return num_removed
+
+
+def metadata_to_bytes(metadata):
+    """
+    Serializes metadata as written by the XSLTs.
+
+    :param metadata: Metadata lwm element
+    :type metadata: lxml.etree._Element
+    :return: Serialized metadata
+    :rtype: bytes
+    """
+    return METADATA_DECLARATION + etree.tostring(
+        metadata, encoding="UTF-8", pretty_print=True
+    )
+
+
+def sub_element(parent, tag, text="", **attributes):
+    """
+    Creates sub-element. As in the XSLTs, elements with empty text have
+    no text node, so are serialized as <tag/>.
+
+    :param parent: Parent element
+    :type parent: lxml.etree._Element
+    :param tag: Tag
+    :type tag: str
+    :param text: Text
+    :type text: str
+    :param attributes: Attributes
+    :type attributes: dict(str: str)
+    :return: Element
+    :rtype: lxml.etree._Element
+    """
+    element = etree.SubElement(parent, tag, attributes)
+    if text:
+        element.text = text
+    return element
+
+
+@lru_cache(maxsize=None)
+def get_lwm_tool():
+    """
+    Gets name, version and source of this tool from the parameters
+    in extract_text_common.xslt, which the XSLTs write into metadata.
+
+    :return: (name, version, source)
+    :rtype: tuple(str, str, str)
+    """
+    common = etree.parse(xml.get_path(xslts, COMMON_XSLT))
+    params = {
+        param.get("name"): param.text or ""
+        for param in common.getroot().iterchildren(etree.QName(XSL_NS, "param").text)
+    }
+    return params["name"], params["version"], params["source"]
+
+
+def lwm_process(lwm, xml_flavour, software=None, input_sub_path="", input_filename=""):
+    """
+    Creates lwm/process metadata element, common to all XSLTs.
+
+    :param lwm: lwm element
+    :type lwm: lxml.etree._Element
+    :param xml_flavour: XML flavour e.g. alto
+    :type xml_flavour: str
+    :param software: Software, or None if not recorded
+    :type software: str
+    :param input_sub_path: Input sub-path e.g. 0002647/1824/0217
+    :type input_sub_path: str
+    :param input_filename: Input filename
+    :type input_filename: str
+    :return: process element
+    :rtype: lxml.etree._Element
+    """
+    name, version, source = get_lwm_tool()
+    process = sub_element(lwm, "process")
+    lwm_tool = sub_element(process, "lwm_tool")
+    sub_element(lwm_tool, "name", name)
+    sub_element(lwm_tool, "version", version)
+    sub_element(lwm_tool, "source", source)
+    sub_element(process, "source_type", "newspaper")
+    sub_element(process, "xml_flavour", xml_flavour)
+    if software is not None:
+        sub_element(process, "software", software)
+    sub_element(process, "input_sub_path", input_sub_path)
+    sub_element(process, "input_filename", input_filename)
+    return process
+
+
+def xpath_number(value):
+    """
+    Converts string to number as XPath number() does, returning NaN
+    if the string is not a number.
+
+    Digits are accumulated as by libxml2, rather than converted with
+    float(), so the result is identical to that within the XSLTs.
+
+    :param value: String
+    :type value: str
+    :return: Number
+    :rtype: float
+    """
+    match = RE_XPATH_NUMBER.match(value)
+    if match is None:
+        return math.nan
+    sign, integer, fraction, exponent = match.groups()
+    if not integer and not fraction:
+        return math.nan
+    number = 0.0
+    for digit in integer:
+        number = number * 10 + int(digit)
+    if fraction:
+        fraction_digits = fraction[
+            : len(fraction) - len(fraction.lstrip("0")) + XPATH_MAX_FRAC
+        ]
+        fraction_value = 0.0
+        for digit in fraction_digits:
+            fraction_value = fraction_value * 10 + int(digit)
+        number += fraction_value / math.pow(10.0, len(fraction_digits))
+    if exponent:
+        number *= math.pow(10.0, int(exponent[1:]))
+    return -number if sign else number
+
+
+def xpath_string(number):
+    """
+    Converts number to string as XPath string() does.
+
+    :param number: Number
+    :type number: float
+    :return: String
+    :rtype: str
+    """
+    if math.isnan(number):
+        return "NaN"
+    if math.isinf(number):
+        return "Infinity" if number > 0 else "-Infinity"
+    if number == 0:
+        return "0"
+    if -(2**31) < number < 2**31 - 1 and number == int(number):
+        return "%d" % number
+    absolute = abs(number)
+    if absolute > 1e9 or absolute < 1e-5:
+        mantissa, exponent = ("%.*e" % (XPATH_DBL_DIG - 1, number)).split("e")
+        return mantissa.rstrip("0").rstrip(".") + "e" + exponent
+    integer_place = int(math.log10(absolute))
+    if integer_place > 0:
+        fraction_place = XPATH_DBL_DIG - integer_place - 1
+    else:
+        fraction_place = XPATH_DBL_DIG - integer_place
+    string = "%0.*f" % (fraction_place, number)
+    if "." in string:
+        string = string.rstrip("0").rstrip(".")
+    return string
+
+
+def xpath_literal(number):
+    """
+    Gets XPath expression that evaluates to exactly number.
+
+    :param number: Number
+    :type number: float
+    :return: XPath expression
+    :rtype: str
+    """
+    if math.isnan(number):
+        return "number('NaN')"
+    if math.isinf(number):
+        return "1 div 0" if number > 0 else "-1 div 0"
+    numerator, denominator = number.as_integer_ratio()
+    expression = str(numerator)
+    # Divide by powers of two that XPath can represent exactly.
+    while denominator > 1:
+        step = min(denominator, 2**52)
+        expression += " div {}".format(step)
+        denominator //= step
+    return expression
+
+
+def get_format_number_xslt():
+    """
+    Gets XSLT to call format-number, compiled once per thread, as
+    XSLTs are not shared between threads.
+
+    :return: XSLT
+    :rtype: lxml.etree.XSLT
+    """
+    xslt = getattr(_thread_xslts, "format_number", None)
+    if xslt is None:
+        xslt = etree.XSLT(etree.XML(FORMAT_NUMBER_XSLT.encode("utf-8")))
+        _thread_xslts.format_number = xslt
+    return xslt
+
+
+def format_number(number, pattern):
+    """
+    Formats number as XSLT format-number does. format-number is
+    called via a minimal XSLT as its rounding of the last digit is
+    specific to libxslt.
+
+    :param number: Number
+    :type number: float
+    :param pattern: Pattern e.g. 0.0000
+    :type pattern: str
+    :return: Formatted number
+    :rtype: str
+    """
+    result = get_format_number_xslt()(
+        etree.ElementTree(etree.Element("number")),
+        number=xpath_literal(number),
+        pattern=etree.XSLT.strparam(pattern),
+    )
+    return str(result)
+
+
+def word_confidence_stats(word_confidences):
+    """
+    Computes word count and mean and standard deviation of word
+    confidences, as the METS XSLTs do.
+
+    :param word_confidences: Word confidences (String/@WC values)
+    :type word_confidences: list(str)
+    :return: (word_count, mean, standard_deviation), where mean and
+    standard_deviation are NaN if there are no words
+    :rtype: tuple(int, float, float)
+    """
+    word_count = len(word_confidences)
+    # Word confidences take few distinct values so convert each once.
+    numbers = {}
+    values = []
+    for word_confidence in word_confidences:
+        value = numbers.get(word_confidence)
+        if value is None:
+            value = numbers[word_confidence] = xpath_number(word_confidence)
+        values.append(value)
+    total = 0.0
+    for value in values:
+        total += value
+    mean = total / word_count if word_count else math.nan
+    # The XSLTs compute squares via string values so do the same.
+    squares = {}
+    total_squares = 0.0
+    for value in values:
+        square = squares.get(value)
+        if square is None:
+            square = squares[value] = xpath_number(
+                xpath_string(math.pow(value - mean, 2))
+            )
+        total_squares += square
+    standard_deviation = (
+        math.sqrt(total_squares / word_count) if word_count else math.nan
+    )
+    return word_count, mean, standard_deviation
@@ -0,0 +1,672 @@
+#!/usr/bin/env python
+"""
+Benchmarks conversion of a synthetic corpus (see alto2txt.synthetic).
+
+Times xml_to_text.issue_to_text and xml_to_text.publication_to_text
+for each flavour of XML, and xml_to_text_entry.xml_publications_to_text
+for each process type, with each engine. Each case runs in a new
+process, so its peak resident set size (RSS) is its own.
+
+Results, with throughput in files, MB and articles per second, are
+printed and appended to a JSON Lines file, with the git commit, so they
+can be compared across commits.
+
+Usage:
+
+    usage: benchmark.py [-h] [-w [WORK_DIR]] [-r [RESULTS_FILE]]
+                        [-c] [--flavours FLAVOUR [FLAVOUR ...]]
+                        [--publications [PUBLICATIONS]]
+                        [--years [YEARS]] [--issues [ISSUES]]
+                        [--pages [PAGES]] [--articles [ARTICLES]]
+                        [--words [WORDS]] [--seed [SEED]]
+                        [--engines ENGINE [ENGINE ...]]
+                        [--process-types PROCESS_TYPE [PROCESS_TYPE ...]]
+                        [-n [NUM_CORES]] [--repeat [REPEAT]]
+
+    Benchmarks conversion of a synthetic corpus
+
+    optional arguments:
+      -h, --help            show this help message and exit
+      -w [WORK_DIR], --work-dir [WORK_DIR]
+                            Directory for corpus and output. Default: a
+                            temporary directory, removed afterwards
+      -r [RESULTS_FILE], --results-file [RESULTS_FILE]
+                            Results file. Default:
+                            alto2txt_benchmarks.jsonl
+      -c, --compare         Compare with the last results in the results
+                            file for the same corpus
+      --flavours FLAVOUR [FLAVOUR ...]
+                            Flavours. Default: mets18 mets13 bln ukp
+      --publications [PUBLICATIONS]
+                            Publications per flavour. Default: 1
+      --years [YEARS]       Years per publication. Default: 1
+      --issues [ISSUES]     Issues per year. Default: 4
+      --pages [PAGES]       Pages per issue. Default: 4
+      --articles [ARTICLES]
+                            Articles per page. Default: 8
+      --words [WORDS]       Mean words per article. Default: 200
+      --seed [SEED]         Random number generator seed. Default: 0
+      --engines ENGINE [ENGINE ...]
+                            Engines. Default: xslt native
+      --process-types PROCESS_TYPE [PROCESS_TYPE ...]
+                            Process types. Default: single serial multi
+                            threads, and spark if pyspark is installed
+      -n [NUM_CORES], --num-cores [NUM_CORES]
+                            Number of cores (Spark only). Default 1
+      --repeat [REPEAT]     Times to run each case, keeping the fastest.
+                            Default: 1
+"""
+
+import datetime
+import importlib.util
+import json
+import logging
+import multiprocessing
+import os
+import os.path
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from argparse import ArgumentParser
+
+from lxml import etree
+
+from alto2txt import articles, synthetic, xml, xml_to_text, xml_to_text_entry
+
+RESULTS_FILE = "alto2txt_benchmarks.jsonl"
+""" Default results file name. """
+CASE_ISSUE = "issue_to_text"
+""" Case timing xml_to_text.issue_to_text on one issue of a flavour. """
+CASE_PUBLICATION = "publication_to_text"
+"""
+Case timing xml_to_text.publication_to_text on one publication of a
+flavour.
+"""
+CORPUS_PARAMETERS = [
+    "flavours",
+    "publications",
+    "years",
+    "issues",
+    "pages",
+    "articles_per_page",
+    "words",
+    "seed",
+]
+""" Parameters of synthetic.generate_corpus defining a corpus. """
+
+
+def get_process_types():
+    """
+    Gets process types to benchmark by default: all of
+    xml_to_text_entry.PROCESS_TYPES, except Spark if pyspark is not
+    installed.
+
+    :return: process types
+    :rtype: list(str)
+    """
+    return [
+        process_type
+        for process_type in xml_to_text_entry.PROCESS_TYPES
+        if process_type != xml_to_text_entry.PROCESS_SPARK
+        or importlib.util.find_spec("pyspark") is not None
+    ]
+
+
+def get_commit():
+    """
+    Gets the git commit of the alto2txt source, if in a git repository.
+
+    :return: commit hash, or None
+    :rtype: str
+    """
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True,
+            check=True,
+            text=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def get_peak_rss():
+    """
+    Gets peak RSS of this process and of the largest of its waited-for
+    child processes.
+
+    :return: peak RSS of this process and of children in bytes, or
+    (None, None) if this is not supported by the platform
+    :rtype: tuple(int, int)
+    """
+    try:
+        import resource
+    except ImportError:
+        return None, None
+    # ru_maxrss is in kilobytes, except on macOS where it is in bytes.
+    scale = 1 if sys.platform == "darwin" else 1024
+    return (
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale,
+        resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * scale,
+    )
+
+
+def get_cases(flavours, engines, process_types):
+    """
+    Gets cases to benchmark.
+
+    :param flavours: Flavours, from synthetic.FLAVOURS
+    :type flavours: list(str)
+    :param engines: Engines, from xml_to_text.ENGINES
+    :type engines: list(str)
+    :param process_types: Process types, from
+    xml_to_text_entry.PROCESS_TYPES
+    :type process_types: list(str)
+    :return: (case name, case, flavour, engine) tuples, where case is
+    CASE_ISSUE, CASE_PUBLICATION or a process type and flavour is None
+    for process types, which convert the whole corpus, except single,
+    which converts the first publication
+    :rtype: list(tuple(str, str, str, str))
+    """
+    cases = []
+    for engine in engines:
+        for case in [CASE_ISSUE, CASE_PUBLICATION]:
+            for flavour in flavours:
+                name = "{}[{},{}]".format(case, flavour, engine)
+                cases.append((name, case, flavour, engine))
+        for process_type in process_types:
+            name = "{}[{}]".format(process_type, engine)
+            cases.append((name, process_type, None, engine))
+    return cases
+
+
+def run_case(corpus_dir, out_dir, case, flavour, engine, num_cores=1):
+    """
+    Runs a case.
+
+    :param corpus_dir: Synthetic corpus directory
+    :type corpus_dir: str
+    :param out_dir: Output directory
+    :type out_dir: str
+    :param case: CASE_ISSUE, CASE_PUBLICATION or a process type
+    :type case: str
+    :param flavour: Flavour, for CASE_ISSUE and CASE_PUBLICATION
+    :type flavour: str
+    :param engine: Engine, from xml_to_text.ENGINES
+    :type engine: str
+    :param num_cores: Number of cores (Spark only)
+    :type num_cores: int
+    :return: summary (see alto2txt.stats), elapsed time in seconds
+    :rtype: tuple(dict(str: int or float), float)
+    """
+    log_file = out_dir + ".log"
+    if case in (CASE_ISSUE, CASE_PUBLICATION):
+        publication = synthetic.publication_id(flavour, 0)
+        publication_dir = os.path.join(corpus_dir, publication)
+        # XSLTs are loaded once per run, so are not timed.
+        xslts = xml.load_xslts()
+        start = time.perf_counter()
+        if case == CASE_ISSUE:
+            year, issue, issue_dir = next(
+                xml_to_text.publication_issues(publication_dir)
+            )
+            summary = xml_to_text.issue_to_text(
+                publication, year, issue, issue_dir, out_dir, xslts, engine
+            )
+        else:
+            summary = xml_to_text.publication_to_text(
+                publication_dir, out_dir, xslts, engine=engine
+            )
+        return summary, time.perf_counter() - start
+    xml_in_dir = corpus_dir
+    if case == xml_to_text_entry.PROCESS_SINGLE:
+        xml_in_dir = os.path.join(corpus_dir, sorted(os.listdir(corpus_dir))[0])
+    start = time.perf_counter()
+    report = xml_to_text_entry.xml_publications_to_text(
+        xml_in_dir, out_dir, case, log_file, num_cores, engine=engine
+    )
+    return report["total"], time.perf_counter() - start
+
+
+def measure_case(
+    connection, corpus_dir, out_dir, case, flavour, engine, num_cores, start_method
+):
+    """
+    Runs a case and sends its summary, elapsed time and peak RSS, or
+    the exception raised, to a connection. Run in a new process by
+    measure.
+
+    :param connection: Connection to send (result, error) to
+    :type connection: multiprocessing.connection.Connection
+    :param corpus_dir: Synthetic corpus directory
+    :type corpus_dir: str
+    :param out_dir: Output directory
+    :type out_dir: str
+    :param case: CASE_ISSUE, CASE_PUBLICATION or a process type
+    :type case: str
+    :param flavour: Flavour, for CASE_ISSUE and CASE_PUBLICATION
+    :type flavour: str
+    :param engine: Engine, from xml_to_text.ENGINES
+    :type engine: str
+    :param num_cores: Number of cores (Spark only)
+    :type num_cores: int
+    :param start_method: multiprocessing start method for process pools
+    :type start_method: str
+    """
+    # A spawned process inherits the spawn start method, so restore
+    # the method the multi process type would otherwise use.
+    multiprocessing.set_start_method(start_method, force=True)
+    # Log to file only, so console logging does not add to times, and
+    # log warnings only, as when converting corpora.
+    logging.basicConfig(
+        level=logging.WARNING, handlers=[logging.FileHandler(out_dir + ".log")]
+    )
+    try:
+        summary, elapsed = run_case(
+            corpus_dir, out_dir, case, flavour, engine, num_cores
+        )
+        peak_rss, peak_rss_children = get_peak_rss()
+        result = {
+            "summary": summary,
+            "elapsed": elapsed,
+            "peak_rss": peak_rss,
+            "peak_rss_children": peak_rss_children,
+        }
+        connection.send((result, None))
+    except Exception as e:
+        connection.send((None, "{}: {}".format(type(e).__name__, str(e))))
+    finally:
+        connection.close()
+
+
+def measure(corpus_dir, out_dir, case, flavour, engine, num_cores=1):
+    """
+    Runs a case in a new process (see measure_case).
+
+    :param corpus_dir: Synthetic corpus directory
+    :type corpus_dir: str
+    :param out_dir: Output directory, which must not exist
+    :type out_dir: str
+    :param case: CASE_ISSUE, CASE_PUBLICATION or a process type
+    :type case: str
+    :param flavour: Flavour, for CASE_ISSUE and CASE_PUBLICATION
+    :type flavour: str
+    :param engine: Engine, from xml_to_text.ENGINES
+    :type engine: str
+    :param num_cores: Number of cores (Spark only)
+    :type num_cores: int
+    :return: result with summary, elapsed and peak_rss, and error
+    :rtype: tuple(dict, str)
+    """
+    # Spawn, rather than fork, so the process does not inherit the
+    # memory of this one.
+    os.makedirs(os.path.dirname(out_dir), exist_ok=True)
+    context = multiprocessing.get_context("spawn")
+    receiver, sender = context.Pipe(duplex=False)
+    process = context.Process(
+        target=measure_case,
+        args=(
+            sender,
+            corpus_dir,
+            out_dir,
+            case,
+            flavour,
+            engine,
+            num_cores,
+            multiprocessing.get_start_method(),
+        ),
+    )
+    process.start()
+    sender.close()
+    try:
+        result, error = receiver.recv()
+    except EOFError:
+        result, error = None, None
+    process.join()
+    if result is None and error is None:
+        error = "Process exited with code {}".format(process.exitcode)
+    return result, error
+
+
+def get_metrics(result):
+    """
+    Gets metrics of a case from its result.
+
+    :param result: Result from measure
+    :type result: dict
+    :return: metric to value
+    :rtype: dict
+    """
+    summary = result["summary"]
+    seconds = max(result["elapsed"], 1e-9)
+    metrics = {
+        "elapsed": result["elapsed"],
+        "files_per_second": summary["num_files"] / seconds,
+        "mb_per_second": summary["bytes_read"] / 1e6 / seconds,
+        "articles_per_second": summary["num_articles"] / seconds,
+        "peak_rss_mb": None,
+        "num_files": summary["num_files"],
+        "bytes_read": summary["bytes_read"],
+        "num_articles": summary["num_articles"],
+    }
+    peak_rss = [rss for rss in [result["peak_rss"], result["peak_rss_children"]] if rss]
+    if peak_rss:
+        metrics["peak_rss_mb"] = max(peak_rss) / 1e6
+    for key in ["time_classify", "time_parse", "time_transform", "time_write"]:
+        metrics[key] = summary.get(key, 0.0)
+    return metrics
+
+
+def run_benchmarks(
+    work_dir,
+    corpus,
+    engines=xml_to_text.ENGINES,
+    process_types=None,
+    num_cores=1,
+    repeat=1,
+):
+    """
+    Generates a synthetic corpus and benchmarks each case on it.
+
+    :param work_dir: Directory for corpus and output
+    :type work_dir: str
+    :param corpus: Parameters of synthetic.generate_corpus, see
+    CORPUS_PARAMETERS
+    :type corpus: dict
+    :param engines: Engines, from xml_to_text.ENGINES
+    :type engines: list(str)
+    :param process_types: Process types, default get_process_types()
+    :type process_types: list(str)
+    :param num_cores: Number of cores (Spark only)
+    :type num_cores: int
+    :param repeat: Times to run each case, keeping the fastest
+    :type repeat: int
+    :return: record with environment, corpus and case name to metrics,
+    or to error if a case failed
+    :rtype: dict
+    """
+    if process_types is None:
+        process_types = get_process_types()
+    corpus_dir = os.path.join(work_dir, "corpus")
+    corpus_counts = synthetic.generate_corpus(corpus_dir, **corpus)
+    results = {}
+    for name, case, flavour, engine in get_cases(
+        corpus["flavours"], engines, process_types
+    ):
+        best = None
+        error = None
+        peak_rss_mb = None
+        for run in range(repeat):
+            out_dir = os.path.join(work_dir, "output", "{}.{}".format(name, run))
+            result, error = measure(
+                corpus_dir, out_dir, case, flavour, engine, num_cores
+            )
+            if error is not None:
+                break
+            metrics = get_metrics(result)
+            if metrics["peak_rss_mb"] is not None:
+                peak_rss_mb = max(peak_rss_mb or 0, metrics["peak_rss_mb"])
+            if best is None or metrics["elapsed"] < best["elapsed"]:
+                best = metrics
+        if error is not None:
+            results[name] = {"error": error}
+        else:
+            best["peak_rss_mb"] = peak_rss_mb
+            results[name] = best
+        print(format_result(name, results[name]), flush=True)
+    return {
+        "commit": get_commit(),
+        "version": articles.get_lwm_tool()[1],
+        "date": datetime.datetime.now().astimezone().isoformat(),
+        "python": platform.python_version(),
+        "lxml": ".".join(str(part) for part in etree.LXML_VERSION),
+        "platform": platform.platform(),
+        "cpus": multiprocessing.cpu_count(),
+        "repeat": repeat,
+        "corpus": dict(corpus, **corpus_counts),
+        "results": results,
+    }
+
+
+def format_result(name, metrics):
+    """
+    Formats metrics of a case as a line of a table.
+
+    :param name: Case name
+    :type name: str
+    :param metrics: Metrics, from get_metrics, or error
+    :type metrics: dict
+    :return: line
+    :rtype: str
+    """
+    if "error" in metrics:
+        return "{:<36} {}".format(name, metrics["error"])
+    return (
+        "{:<36} {:>9.3f}s {:>9.1f} files/s {:>8.2f} MB/s {:>9.1f} articles/s {}".format(
+            name,
+            metrics["elapsed"],
+            metrics["files_per_second"],
+            metrics["mb_per_second"],
+            metrics["articles_per_second"],
+            (
+                "{:>8.1f} MB RSS".format(metrics["peak_rss_mb"])
+                if metrics["peak_rss_mb"] is not None
+                else ""
+            ),
+        )
+    )
+
+
+def load_results(results_file):
+    """
+    Loads benchmark records.
+
+    :param results_file: Results file
+    :type results_file: str
+    :return: records, oldest first
+    :rtype: list(dict)
+    """
+    records = []
+    if not os.path.exists(results_file):
+        return records
+    with open(results_file, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                records.append(json.loads(line))
+    return records
+
+
+def save_results(record, results_file):
+    """
+    Appends a benchmark record to a results file.
+
+    :param record: Record, from run_benchmarks
+    :type record: dict
+    :param results_file: Results file
+    :type results_file: str
+    """
+    with open(results_file, "a", encoding="utf-8") as f:
+        f.write(json.dumps(record, sort_keys=True) + "\n")
+
+
+def same_corpus(record, other):
+    """
+    Checks if two benchmark records are for the same corpus.
+
+    :param record: Record
+    :type record: dict
+    :param other: Record
+    :type other: dict
+    :return: True if so
+    :rtype: bool
+    """
+    return all(
+        record["corpus"].get(key) == other["corpus"].get(key)
+        for key in CORPUS_PARAMETERS
+    )
+
+
+def compare_results(previous, record):
+    """
+    Compares the elapsed time of each case of a record with that of a
+    previous record.
+
+    :param previous: Previous record
+    :type previous: dict
+    :param record: Record
+    :type record: dict
+    :return: (case name, previous elapsed, elapsed, change as a
+    fraction of previous elapsed) tuples, for cases in both records
+    :rtype: list(tuple(str, float, float, float))
+    """
+    comparison = []
+    for name, metrics in record["results"].items():
+        previous_metrics = previous["results"].get(name, {})
+        if "elapsed" not in metrics or "elapsed" not in previous_metrics:
+            continue
+        previous_elapsed = previous_metrics["elapsed"]
+        change = (metrics["elapsed"] - previous_elapsed) / max(previous_elapsed, 1e-9)
+        comparison.append((name, previous_elapsed, metrics["elapsed"], change))
+    return comparison
+
+
+def main():
+    """
+    Benchmarks conversion of a synthetic corpus.
+
+    Parses command-line arguments and calls run_benchmarks.
+    """
+    parser = ArgumentParser(description="Benchmarks conversion of a synthetic corpus")
+    parser.add_argument(
+        "-w",
+        "--work-dir",
+        type=str,
+        nargs="?",
+        default=None,
+        help="Directory for corpus and output. Default: a temporary directory, "
+        "removed afterwards",
+    )
+    parser.add_argument(
+        "-r",
+        "--results-file",
+        type=str,
+        nargs="?",
+        default=RESULTS_FILE,
+        help="Results file. Default: " + RESULTS_FILE,
+    )
+    parser.add_argument(
+        "-c",
+        "--compare",
+        action="store_true",
+        help="Compare with the last results in the results file for the same corpus",
+    )
+    parser.add_argument(
+        "--flavours",
+        type=str,
+        nargs="+",
+        default=synthetic.FLAVOURS,
+        metavar="FLAVOUR",
+        help="Flavours. Default: " + " ".join(synthetic.FLAVOURS),
+    )
+    for argument, default, description in [
+        ("publications", 1, "Publications per flavour"),
+        ("years", 1, "Years per publication"),
+        ("issues", 4, "Issues per year"),
+        ("pages", 4, "Pages per issue"),
+        ("articles", 8, "Articles per page"),
+        ("words", 200, "Mean words per article"),
+        ("seed", 0, "Random number generator seed"),
+    ]:
+        parser.add_argument(
+            "--" + argument,
+            type=int,
+            nargs="?",
+            default=default,
+            help="{}. Default: {}".format(description, default),
+        )
+    parser.add_argument(
+        "--engines",
+        type=str,
+        nargs="+",
+        default=xml_to_text.ENGINES,
+        metavar="ENGINE",
+        help="Engines. Default: " + " ".join(xml_to_text.ENGINES),
+    )
+    parser.add_argument(
+        "--process-types",
+        type=str,
+        nargs="+",
+        default=None,
+        metavar="PROCESS_TYPE",
+        help="Process types. Default: single serial multi threads, and spark if pyspark "
+        "is installed",
+    )
+    parser.add_argument(
+        "-n",
+        "--num-cores",
+        type=int,
+        nargs="?",
+        default=1,
+        help="Number of cores (Spark only). Default 1",
+    )
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        nargs="?",
+        default=1,
+        help="Times to run each case, keeping the fastest. Default: 1",
+    )
+    args = parser.parse_args()
+    corpus = {
+        "flavours": args.flavours,
+        "publications": args.publications,
+        "years": args.years,
+        "issues": args.issues,
+        "pages": args.pages,
+        "articles_per_page": args.articles,
+        "words": args.words,
+        "seed": args.seed,
+    }
+    work_dir = args.work_dir
+    if work_dir is None:
+        work_dir = tempfile.mkdtemp(prefix="alto2txt_benchmark_")
+    try:
+        record = run_benchmarks(
+            work_dir,
+            corpus,
+            args.engines,
+            args.process_types,
+            args.num_cores,
+            args.repeat,
+        )
+    finally:
+        if args.work_dir is None:
+            shutil.rmtree(work_dir, ignore_errors=True)
+    if args.compare:
+        previous = [
+            other
+            for other in load_results(args.results_file)
+            if same_corpus(record, other)
+        ]
+        if previous:
+            print("Compared with {}:".format(previous[-1]["commit"]))
+            for name, previous_elapsed, elapsed, change in compare_results(
+                previous[-1], record
+            ):
+                print(
+                    "{:<36} {:>9.3f}s -> {:>9.3f}s {:>+7.1%}".format(
+                        name, previous_elapsed, elapsed, change
+                    )
+                )
+        else:
+            print("No previous results for this corpus")
+    save_results(record, args.results_file)
+
+
+if __name__ == "__main__":
+    main()
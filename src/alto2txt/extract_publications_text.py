@@ -2,9 +2,10 @@
 """
 Converts XML (in METS 1.8/ALTO 1.4, METS 1.3/ALTO 1.4, BLN or UKP
 format) publications to plaintext articles and generates minimal
-metadata. Downsampling can be used to convert only every Nth issue of
-each newspaper. One text file is output per article, each complemented
-by one XML metadata file.
+metadata. Sampling can be used to convert only 1 in N issues of
+each newspaper, or a sample of a given number or size of issues. One
+text file is output per article, each complemented by one XML
+metadata file.
 
 Quality assurance is also performed to check for:
 
@@ -20,6 +21,21 @@ Usage:
                                         [-l [LOG_FILE]]
                                         [-d [DOWNSAMPLE]]
                                         [-n [NUM_CORES]]
+                                        [-e [ENGINE]] [-r] [-i]
+                                        [-f [OUTPUT_FORMAT]] [-m]
+                                        [--search-index] [--profile]
+                                        [-w [WRITER_THREADS]]
+                                        [--fsync [FSYNC]] [--count-words]
+                                        [--inventory [INVENTORY_FILE]]
+                                        [--sample-size [SAMPLE_SIZE]]
+                                        [--sample-bytes [SAMPLE_BYTES]]
+                                        [--stratify [STRATIFY]]
+                                        [--sample-seed [SAMPLE_SEED]]
+                                        [--issues [ISSUES_FILE]]
+                                        [--shard [SHARD]]
+                                        [--verbosity [LOG_DETAIL]]
+                                        [--file-log-rate [LOG_RATE]]
+                                        [--queue-lease [LEASE_SECONDS]]
                                         xml_in_dir txt_out_dir
 
     Converts XML publications to plaintext articles
@@ -31,7 +47,8 @@ Usage:
     optional arguments:
       -h, --help            show this help message and exit
       -p [PROCESS_TYPE], --process-type [PROCESS_TYPE]
-                            Process type. One of: single,serial,multi,spark
+                            Process type. One of:
+                            single,serial,multi,threads,spark,queue
                             Default: multi
       -l [LOG_FILE], --log-file [LOG_FILE]
                             Log file. Default out.log
@@ -39,6 +56,50 @@ Usage:
                             Downsample. Default 1
       -n [NUM_CORES], --num-cores [NUM_CORES]
                             Number of cores (Spark only). Default 1")
+      -e [ENGINE], --engine [ENGINE]
+                            Engine. One of: xslt,native. Default: xslt
+      -r, --resume          Resume, skipping issues already converted
+      -i, --incremental     Convert only issues whose content changed
+      -f [OUTPUT_FORMAT], --output-format [OUTPUT_FORMAT]
+                            Output format. One of: files,zip,tar,jsonl.
+                            Default: files
+      -m, --metadata-index  Write Parquet metadata index (requires
+                            pyarrow)
+      --search-index        Write SQLite full-text search index
+      --profile             Profile Python functions and XSLT templates
+      -w [WRITER_THREADS], --writer-threads [WRITER_THREADS]
+                            Number of writer threads, per process, writing
+                            articles asynchronously. Default 0
+      --fsync [FSYNC]       fsync policy. One of: none,issue,article.
+                            Default: none
+      --count-words         Count words of articles written by the XSLTs
+                            to files, reading them once written
+      --inventory [INVENTORY_FILE]
+                            Reuse inventory of xml_in_dir. Default:
+                            txt_out_dir/alto2txt_inventory.jsonl
+      --sample-size [SAMPLE_SIZE]
+                            Number of issues to sample
+      --sample-bytes [SAMPLE_BYTES]
+                            Size of input files of issues to sample, e.g.
+                            500M
+      --stratify [STRATIFY]
+                            Sample within strata. One of:
+                            publication,year,none. Default: publication
+      --sample-seed [SAMPLE_SEED]
+                            Sampling seed. Default 0
+      --issues [ISSUES_FILE]
+                            Convert only the issues listed in ISSUES_FILE,
+                            or stdin if "-"
+      --shard [SHARD]       Convert only shard INDEX/COUNT of the issues,
+                            e.g. 0/10
+      --verbosity [LOG_DETAIL]
+                            Log detail. One of: file,issue. Default: file
+      --file-log-rate [LOG_RATE]
+                            Maximum number of per-file messages logged per
+                            second, per process
+      --queue-lease [LEASE_SECONDS]
+                            Duration, in seconds, of a lease on an issue
+                            (queue only). Default 600
 
 xml_in_dir is expected to hold XML for multiple publications, in the
 following structure:
@@ -63,15 +124,176 @@ structure:
 
 txt_out_dir is created with an analogous structure to xml_in_dir.
 
+Converted issues are recorded, with the sizes and modification times
+of their input files, in txt_out_dir/alto2txt_manifest.jsonl. If
+"-r|--resume" is provided then issues recorded as converted, whose
+input files are unchanged and none of whose files failed to convert,
+are skipped, so an interrupted run can be resumed.
+
+If "-i|--incremental" is provided then the content of each issue's
+files, and of the ALTO files referenced by its METS files, is hashed
+and recorded in the manifest. Only issues whose content changed since
+they were recorded are converted, and the articles previously output
+for these issues are removed first, so no stale articles remain.
+
 PROCESS_TYPE can be one of:
 
 * single: Process single publication.
 * serial: Process publications serially.
 * multi: Process publications using multiprocessing (default).
+* threads: Process publications using a pool of threads, one per CPU,
+  in a single process, each compiling its own XSLTs. This uses less
+  memory than multi.
 * spark: Process publications using Spark.
+* queue: Process publications as one of any number of processes,
+  for example batch jobs on several nodes with a shared filesystem,
+  claiming issues from a work queue,
+  txt_out_dir/alto2txt_queue.sqlite. Run the same command in each
+  process.
 
 DOWNSAMPLE must be a positive integer, default 1.
 
+Issues are sampled deterministically, by a hash of their path,
+publication/year/issue, and SAMPLE_SEED, so the same issues are
+sampled whatever the process type and however the filesystem orders
+them, and different seeds give different samples. Issues are sampled
+within each stratum, given by STRATIFY, in hash order:
+
+* "-d|--downsample" takes 1 in DOWNSAMPLE issues of each stratum,
+  rounded down.
+* "--sample-size" takes SAMPLE_SIZE issues in total, allocated to
+  strata in proportion to their numbers of issues.
+* "--sample-bytes" takes issues whose input files total up to
+  SAMPLE_BYTES, with an optional K, M, G or T suffix, allocated to
+  strata in proportion to their sizes.
+
+STRATIFY can be one of:
+
+* publication: Sample each publication (default).
+* year: Sample each year of each publication.
+* none: Sample all issues together.
+
+ENGINE can be one of:
+
+* xslt: Convert XML using the XSLTs (default).
+* native: Convert METS 1.8 and METS 1.3 XML using lxml only, without
+  XSLT, which gives the same output but is faster. UKP and BLN XML is
+  streamed, so memory use does not grow with file size.
+
+OUTPUT_FORMAT can be one of:
+
+* files: Output a plaintext file and a metadata file per article
+  (default).
+* zip: Output a zip file per issue, txt_out_dir/publication/year/
+  issue.zip, holding the plaintext and metadata files of its articles.
+* tar: Output a tar file per issue, as for zip.
+* jsonl: Output a JSON Lines file per issue, with one record per
+  article holding its stub, plaintext and metadata.
+
+If "-m|--metadata-index" is provided then a Parquet table,
+txt_out_dir/alto2txt_index.parquet, is also written with one row per
+article converted, holding its publication, issue and item metadata,
+word count, OCR quality and plaintext file. This requires pyarrow.
+
+If "--search-index" is provided then an SQLite database,
+txt_out_dir/alto2txt_search.sqlite, is also written with an articles
+table of the metadata of each article converted and an FTS5 table,
+articles_text, of their titles and plaintext, for example:
+
+    sqlite3 txt_out_dir/alto2txt_search.sqlite \
+        "SELECT plain_text_file FROM articles_text
+         JOIN articles ON articles.id = articles_text.rowid
+         WHERE articles_text MATCH 'railway'"
+
+Articles are indexed as they are written, so the output is not read
+again. Issues converted again replace their previous rows.
+
+If "--profile" is provided then conversion is profiled with cProfile
+and libxslt's XSLT profiling. Tables of the Python functions with the
+most cumulative time and of the time spent in each template of each
+XSLT, aggregated across workers, are written to
+txt_out_dir/alto2txt_profile.txt, and cProfile statistics to
+txt_out_dir/alto2txt_profile.prof.
+
+If "-w|--writer-threads" is provided, with WRITER_THREADS greater than
+0, then articles are written by that many threads, in each process,
+while issues continue to be converted, so conversion is not held up
+by slow storage. The output held in memory waiting to be written is
+bounded; if writing falls behind then conversion waits. Issues are
+recorded in the manifest only once their articles are written.
+
+Unless "-p|--process-type single" is provided, xml_in_dir is first
+scanned, by concurrent threads, into an inventory of its issues,
+recording each issue's files, their sizes and modification times and
+the flavour of its XML files, which is written to
+txt_out_dir/alto2txt_inventory.jsonl. Issues are then listed, and
+downsampled, from the inventory, and ALTO files are skipped without
+being read again. If "--inventory" is provided then the inventory in
+INVENTORY_FILE, or txt_out_dir/alto2txt_inventory.jsonl if no file is
+given, is reused, if it is an inventory of xml_in_dir, rather than
+scanning xml_in_dir again. Scan again, by omitting "--inventory", if
+issues have been added or removed.
+
+If "--issues" is provided then only the issues listed in ISSUES_FILE,
+or read from stdin if ISSUES_FILE is "-", are converted, for example
+to convert again issues that failed, and xml_in_dir is not scanned.
+ISSUES_FILE lists one issue directory per line, either relative to
+xml_in_dir, e.g. 0002647/1824/0217, or including xml_in_dir, e.g.
+xml_in_dir/0002647/1824/0217. Blank lines, and lines starting with
+#, are ignored. The listed issues are scanned, unless "--inventory"
+is also provided, in which case they are taken from the inventory,
+and no inventory is written.
+
+If "--shard" is provided, as INDEX/COUNT, then issues, listed or in
+the inventory, are sorted by path and split into COUNT shards, of
+which only shard INDEX, counting from 0, is converted. Each shard has
+every COUNT-th issue, so each task of a job array can convert one
+shard. Shards are taken before issues are sampled, and listed issues
+are sharded before they are scanned. To avoid every task scanning
+xml_in_dir, provide "--issues" or "--inventory" with a shared
+inventory.
+
+FSYNC can be one of:
+
+* none: Leave files to be written to disk by the operating system
+  (default).
+* issue: Sync each issue's files, and their directory, to disk once
+  the issue is written.
+* article: Sync each article's files to disk as they are written, and
+  each issue's zip, tar or JSON Lines file once it is written.
+
+LOG_DETAIL can be one of:
+
+* file: Log a message for each file converted (default).
+* issue: Log a summary for each issue, and only warnings and errors
+  for individual files.
+
+If "--file-log-rate" is provided then at most LOG_RATE messages about
+individual files, other than warnings and errors, are logged per
+second by each process, and the number of messages dropped is noted
+in the next message logged. With "-p|--process-type multi", worker
+processes send log records to the main process, which alone writes
+to the console and LOG_FILE.
+
+With "-p|--process-type queue", the first process to start lists the
+issues to convert into the queue, using its own sampling options, and
+every process then claims issues one at a time. A claim is a lease
+which each process renews while it runs. If "--queue-lease" is
+provided then leases last LEASE_SECONDS, default 600, and issues
+claimed by a process that stops are claimed by another process once
+their leases expire. Each process writes the run report for every
+issue in the queue once no issues remain, and the last to finish
+merges any metadata index, search index and profile. Remove the queue
+file to run again.
+
+Once the run completes, a JSON run report,
+txt_out_dir/alto2txt_report.json, is written with the parameters,
+elapsed time, throughput and, for each publication and in total, the
+issues converted and skipped, bytes read, articles, words and bytes
+written and the time spent classifying, parsing, transforming and
+writing. Words of articles the XSLTs write as files are counted only
+if "--count-words" is provided, as the files must be read again.
+
 The following XSLT files need to be in an extract_text.xslts module:
 
 * extract_text_mets18.xslt: METS 1.8 XSL file.
@@ -80,9 +302,18 @@ The following XSLT files need to be in an extract_text.xslts module:
 * extract_text_ukp.xslt: UKP XSL file.
 """
 
+import os.path
 from argparse import ArgumentParser
 
-from alto2txt import xml_to_text_entry
+from alto2txt import (
+    inventory,
+    logging_utils,
+    sampling,
+    sinks,
+    work_queue,
+    xml_to_text,
+    xml_to_text_entry,
+)
 
 
 def main():
@@ -132,6 +363,164 @@ def main():
         default=1,
         help="Number of cores (Spark only). Default 1",
     )
+    parser.add_argument(
+        "-e",
+        "--engine",
+        type=str,
+        nargs="?",
+        default=xml_to_text.ENGINE_XSLT,
+        help="Engine. One of: "
+        + ",".join(xml_to_text.ENGINES)
+        + ". Default: "
+        + xml_to_text.ENGINE_XSLT,
+    )
+    parser.add_argument(
+        "-r",
+        "--resume",
+        action="store_true",
+        help="Resume, skipping issues already converted",
+    )
+    parser.add_argument(
+        "-i",
+        "--incremental",
+        action="store_true",
+        help="Convert only issues whose content changed",
+    )
+    parser.add_argument(
+        "-f",
+        "--output-format",
+        type=str,
+        nargs="?",
+        default=sinks.OUTPUT_FILES,
+        help="Output format. One of: "
+        + ",".join(sinks.OUTPUT_FORMATS)
+        + ". Default: "
+        + sinks.OUTPUT_FILES,
+    )
+    parser.add_argument(
+        "-m",
+        "--metadata-index",
+        action="store_true",
+        help="Write Parquet metadata index (requires pyarrow)",
+    )
+    parser.add_argument(
+        "--search-index",
+        action="store_true",
+        help="Write SQLite full-text search index",
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="Profile Python functions and XSLT templates",
+    )
+    parser.add_argument(
+        "-w",
+        "--writer-threads",
+        type=int,
+        nargs="?",
+        default=0,
+        help="Number of writer threads, per process, writing articles "
+        "asynchronously. Default 0",
+    )
+    parser.add_argument(
+        "--fsync",
+        type=str,
+        nargs="?",
+        default=sinks.FSYNC_NONE,
+        help="fsync policy. One of: "
+        + ",".join(sinks.FSYNC_POLICIES)
+        + ". Default: "
+        + sinks.FSYNC_NONE,
+    )
+    parser.add_argument(
+        "--count-words",
+        action="store_true",
+        help="Count words of articles written by the XSLTs to files, "
+        "reading them once written",
+    )
+    parser.add_argument(
+        "--inventory",
+        type=str,
+        nargs="?",
+        const="",
+        default=None,
+        help="Reuse inventory of xml_in_dir. Default: txt_out_dir/"
+        + inventory.INVENTORY_FILE,
+    )
+    parser.add_argument(
+        "--sample-size",
+        type=int,
+        nargs="?",
+        default=None,
+        help="Number of issues to sample",
+    )
+    parser.add_argument(
+        "--sample-bytes",
+        type=sampling.parse_bytes,
+        nargs="?",
+        default=None,
+        help="Size of input files of issues to sample, e.g. 500M",
+    )
+    parser.add_argument(
+        "--stratify",
+        type=str,
+        nargs="?",
+        default=sampling.STRATIFY_PUBLICATION,
+        help="Sample within strata. One of: "
+        + ",".join(sampling.STRATIFICATIONS)
+        + ". Default: "
+        + sampling.STRATIFY_PUBLICATION,
+    )
+    parser.add_argument(
+        "--sample-seed",
+        type=int,
+        nargs="?",
+        default=0,
+        help="Sampling seed. Default 0",
+    )
+    parser.add_argument(
+        "--issues",
+        dest="issues_file",
+        type=str,
+        nargs="?",
+        default=None,
+        help='Convert only the issues listed in ISSUES_FILE, or stdin if "-"',
+    )
+    parser.add_argument(
+        "--shard",
+        type=inventory.parse_shard,
+        nargs="?",
+        default=(0, 1),
+        help="Convert only shard INDEX/COUNT of the issues, e.g. 0/10",
+    )
+    parser.add_argument(
+        "--verbosity",
+        dest="log_detail",
+        type=str,
+        nargs="?",
+        default=logging_utils.LOG_DETAIL_FILE,
+        help="Log detail. One of: "
+        + ",".join(logging_utils.LOG_DETAILS)
+        + ". Default: "
+        + logging_utils.LOG_DETAIL_FILE,
+    )
+    parser.add_argument(
+        "--file-log-rate",
+        dest="log_rate",
+        type=float,
+        nargs="?",
+        default=None,
+        help="Maximum number of per-file messages logged per second, per process",
+    )
+    parser.add_argument(
+        "--queue-lease",
+        dest="lease_seconds",
+        type=float,
+        nargs="?",
+        default=work_queue.QUEUE_LEASE_SECONDS,
+        help="Duration, in seconds, of a lease on an issue (queue only). Default "
+        + str(work_queue.QUEUE_LEASE_SECONDS),
+    )
     args = parser.parse_args()
     xml_in_dir = args.xml_in_dir
     txt_out_dir = args.txt_out_dir
@@ -139,8 +528,56 @@ def main():
     log_file = args.log_file
     num_cores = args.num_cores
     downsample = args.downsample
+    engine = args.engine
+    resume = args.resume
+    incremental = args.incremental
+    output_format = args.output_format
+    index = args.metadata_index
+    search = args.search_index
+    profile = args.profile
+    writer_threads = args.writer_threads
+    fsync = args.fsync
+    count_words = args.count_words
+    inventory_file = args.inventory
+    if inventory_file == "":
+        inventory_file = os.path.join(txt_out_dir, inventory.INVENTORY_FILE)
+    sample_size = args.sample_size
+    sample_bytes = args.sample_bytes
+    stratify = args.stratify
+    sample_seed = args.sample_seed
+    issues_file = args.issues_file
+    shard_index, shard_count = args.shard
+    log_detail = args.log_detail
+    log_rate = args.log_rate
+    lease_seconds = args.lease_seconds
     xml_to_text_entry.xml_publications_to_text(
-        xml_in_dir, txt_out_dir, process_type, log_file, num_cores, downsample
+        xml_in_dir,
+        txt_out_dir,
+        process_type,
+        log_file,
+        num_cores,
+        downsample,
+        engine,
+        resume,
+        incremental,
+        output_format,
+        index,
+        search,
+        profile,
+        writer_threads,
+        fsync,
+        count_words,
+        inventory_file,
+        sample_size,
+        sample_bytes,
+        stratify,
+        sample_seed,
+        issues_file,
+        shard_index,
+        shard_count,
+        log_detail,
+        log_rate,
+        lease_seconds,
     )
 
 
@@ -0,0 +1,623 @@
+"""
+Input files, which may be in directories or in zip or tar archives,
+and may be compressed.
+
+Publications are often delivered as one archive per publication or
+per publication year. Such an archive can take the place of the
+directory it holds. For example, a year archive,
+publications_dir/0002647/1824.zip, with members 0217/..._mets.xml etc.
+(or 1824/0217/..._mets.xml) is read as if it were the directory
+publications_dir/0002647/1824.
+
+Paths of directories and files within archives are "virtual" paths
+which go through the archive file, e.g.
+publications_dir/0002647/1824.zip/0217/0002647_18240217_mets.xml. The
+functions of this module accept both filesystem and virtual paths, so
+virtual paths can be used wherever issue directories and input files
+are, and archive members are read in place, without being unpacked.
+
+Files can be compressed with gzip (.gz) or zstd (.zst), e.g.
+0002647_18240217_mets.xml.gz, and are decompressed as they are read.
+Where a file is referenced by name, e.g. ALTO files referenced by METS
+files, and does not exist, a compressed file of that name, e.g.
+0002647_18240217_0001.xml.gz, is read instead (see find_file).
+
+ALTO files referenced by METS files, within archives or compressed,
+are loaded by the XSLTs, via document(), using ArchiveResolver.
+"""
+
+import calendar
+import collections
+import gzip
+import logging
+import os
+import os.path
+import posixpath
+import tarfile
+import threading
+import zipfile
+
+from lxml import etree
+
+logger = logging.getLogger(__name__)
+""" Module-level logger. """
+
+ZIP_SUFFIXES = [".zip"]
+""" Zip archive file name suffixes. """
+TAR_SUFFIXES = [".tar", ".tar.gz", ".tgz"]
+"""
+Tar archive file name suffixes. Members of compressed tar archives
+are read by decompressing from the start of the archive, so are much
+slower to read out of order than those of uncompressed tar archives.
+"""
+ARCHIVE_SUFFIXES = ZIP_SUFFIXES + TAR_SUFFIXES
+""" Archive file name suffixes. """
+GZIP_SUFFIX = ".gz"
+""" gzip compressed file name suffix. """
+ZSTD_SUFFIX = ".zst"
+""" zstd compressed file name suffix. Requires zstandard. """
+COMPRESSION_SUFFIXES = [GZIP_SUFFIX, ZSTD_SUFFIX]
+""" Compressed file name suffixes. """
+ARCHIVE_CACHE_SIZE = 8
+""" Number of archives kept open by each thread. """
+
+_local = threading.local()
+"""
+Archives opened by each thread, in an OrderedDict, most recently used
+last, and the process ID for which they were opened. Archives are not
+shared between threads, as tarfile.TarFile members cannot be read
+concurrently, and an archive evicted by one thread would otherwise be
+closed while another thread is reading it.
+"""
+
+
+def get_archive_suffix(name):
+    """
+    Gets archive suffix of a file name.
+
+    :param name: File name
+    :type name: str
+    :return: suffix, one of ARCHIVE_SUFFIXES, or None if name does not
+    have an archive suffix
+    :rtype: str
+    """
+    lower_name = name.lower()
+    for suffix in sorted(ARCHIVE_SUFFIXES, key=len, reverse=True):
+        if lower_name.endswith(suffix) and len(name) > len(suffix):
+            return suffix
+    return None
+
+
+def get_name(name):
+    """
+    Gets name of a directory or archive, without any archive suffix,
+    e.g. 1824 for 1824 or 1824.zip.
+
+    :param name: Directory or archive name
+    :type name: str
+    :return: name
+    :rtype: str
+    """
+    suffix = get_archive_suffix(name)
+    if suffix is None:
+        return name
+    return name[: -len(suffix)]
+
+
+def get_compression_suffix(name):
+    """
+    Gets compression suffix of a file name.
+
+    :param name: File name
+    :type name: str
+    :return: suffix, one of COMPRESSION_SUFFIXES, or None if name does
+    not have a compression suffix
+    :rtype: str
+    """
+    lower_name = name.lower()
+    for suffix in COMPRESSION_SUFFIXES:
+        if lower_name.endswith(suffix):
+            return suffix
+    return None
+
+
+def strip_compression_suffix(name):
+    """
+    Gets file name without any compression suffix, e.g. a.xml for
+    a.xml or a.xml.gz.
+
+    :param name: File name
+    :type name: str
+    :return: name
+    :rtype: str
+    """
+    suffix = get_compression_suffix(name)
+    if suffix is None:
+        return name
+    return name[: -len(suffix)]
+
+
+def is_archive(path):
+    """
+    Checks if a path is an archive file.
+
+    :param path: Path
+    :type path: str
+    :return: True if path is a file with an archive suffix
+    :rtype: bool
+    """
+    return get_archive_suffix(os.path.basename(path)) is not None and (
+        os.path.isfile(path)
+    )
+
+
+def split_path(path):
+    """
+    Splits a virtual path into the archive it goes through and the
+    path of a member within the archive.
+
+    :param path: Path
+    :type path: str
+    :return: (archive file, member path, or "" for the archive
+    itself), or (None, path) if path does not go through an archive
+    :rtype: tuple(str, str)
+    """
+    path = os.path.normpath(path)
+    parts = path.split(os.sep)
+    # Only check the filesystem if a part has an archive suffix.
+    if not any(get_archive_suffix(part) for part in parts):
+        return None, path
+    for index in range(1, len(parts) + 1):
+        if get_archive_suffix(parts[index - 1]) is None:
+            continue
+        archive_path = os.sep.join(parts[:index]) or os.sep
+        if os.path.isfile(archive_path):
+            return archive_path, "/".join(parts[index:])
+    return None, path
+
+
+class Archive:
+    """
+    Zip or tar archive, indexed by member path.
+
+    If all members are within a single directory named after the
+    archive, e.g. 1824/ in 1824.zip, then member paths are relative to
+    that directory.
+
+    :param archive_path: Archive file
+    :type archive_path: str
+    """
+
+    def __init__(self, archive_path):
+        self.archive_path = archive_path
+        stat = os.stat(archive_path)
+        self.stat = (stat.st_size, stat.st_mtime_ns)
+        self.files = {}
+        """ Member path to (size, modification time in nanoseconds, info). """
+        self.dirs = {"": set()}
+        """ Directory path to names of its files and directories. """
+        if get_archive_suffix(archive_path) in ZIP_SUFFIXES:
+            self.archive = zipfile.ZipFile(archive_path)
+            members = [
+                (info.filename, info.is_dir(), info.file_size, info.date_time, info)
+                for info in self.archive.infolist()
+            ]
+        else:
+            self.archive = tarfile.open(archive_path)
+            members = [
+                (info.name, info.isdir(), info.size, info.mtime, info)
+                for info in self.archive.getmembers()
+                if info.isdir() or info.isfile()
+            ]
+        paths = [posixpath.normpath(name) for name, _, _, _, _ in members]
+        root = get_name(os.path.basename(archive_path))
+        prefix = ""
+        if paths and all(path == root or path.startswith(root + "/") for path in paths):
+            prefix = root + "/"
+        for path, (_, is_dir, size, mtime, info) in zip(paths, members):
+            if path == root and prefix:
+                continue
+            path = path[len(prefix) :]
+            if is_dir:
+                self.add_dir(path)
+                continue
+            if isinstance(mtime, tuple):
+                # Zip date_time, which has no time zone.
+                mtime = zipfile_mtime(mtime)
+            self.files[path] = (size, int(mtime * 1e9), info)
+            parent, name = posixpath.split(path)
+            self.add_dir(parent)
+            self.dirs[parent].add(name)
+
+    def add_dir(self, path):
+        """
+        Adds a directory, and its parent directories.
+
+        :param path: Directory path
+        :type path: str
+        """
+        name = None
+        while True:
+            is_new = path not in self.dirs
+            names = self.dirs.setdefault(path, set())
+            if name is not None:
+                names.add(name)
+            if not (is_new and path):
+                return
+            path, name = posixpath.split(path)
+
+    def open(self, path):
+        """
+        Opens a member for reading.
+
+        :param path: Member path
+        :type path: str
+        :return: binary file
+        :rtype: io.BufferedIOBase
+        :raises FileNotFoundError: if there is no such member
+        """
+        if path not in self.files:
+            raise FileNotFoundError(
+                "No such file in {}: {}".format(self.archive_path, path)
+            )
+        info = self.files[path][2]
+        if isinstance(self.archive, zipfile.ZipFile):
+            return self.archive.open(info)
+        return self.archive.extractfile(info)
+
+    def close(self):
+        """
+        Closes the archive.
+        """
+        self.archive.close()
+
+
+def zipfile_mtime(date_time):
+    """
+    Converts zip member date_time to a timestamp.
+
+    :param date_time: (year, month, day, hours, minutes, seconds)
+    :type date_time: tuple(int)
+    :return: seconds since the epoch, treating date_time as UTC
+    :rtype: int
+    """
+    return calendar.timegm(tuple(date_time) + (0, 0, 0))
+
+
+def get_archive(archive_path):
+    """
+    Gets an archive, opening it if it is not already open in this
+    thread or has changed since it was opened.
+
+    :param archive_path: Archive file
+    :type archive_path: str
+    :return: archive
+    :rtype: Archive
+    """
+    if getattr(_local, "pid", None) != os.getpid():
+        # Archives opened by a parent process are not shared.
+        _local.archives = collections.OrderedDict()
+        _local.pid = os.getpid()
+    archives = _local.archives
+    archive = archives.pop(archive_path, None)
+    if archive is not None:
+        stat = os.stat(archive_path)
+        if archive.stat != (stat.st_size, stat.st_mtime_ns):
+            archive.close()
+            archive = None
+    if archive is None:
+        logger.debug("Opening archive: %s", archive_path)
+        archive = Archive(archive_path)
+    archives[archive_path] = archive
+    while len(archives) > ARCHIVE_CACHE_SIZE:
+        _, evicted = archives.popitem(last=False)
+        evicted.close()
+    return archive
+
+
+def isdir(path):
+    """
+    Checks if a path is a directory, an archive or a directory within
+    an archive.
+
+    :param path: Path
+    :type path: str
+    :return: True if path is a directory
+    :rtype: bool
+    """
+    archive_path, member = split_path(path)
+    if archive_path is None:
+        return os.path.isdir(path)
+    return member in get_archive(archive_path).dirs
+
+
+def isfile(path):
+    """
+    Checks if a path is a file, other than an archive, or a file
+    within an archive.
+
+    :param path: Path
+    :type path: str
+    :return: True if path is a file
+    :rtype: bool
+    """
+    archive_path, member = split_path(path)
+    if archive_path is None:
+        return os.path.isfile(path)
+    return member in get_archive(archive_path).files
+
+
+def listdir(path):
+    """
+    Lists the names of the files and directories in a directory, an
+    archive or a directory within an archive.
+
+    :param path: Path
+    :type path: str
+    :return: names
+    :rtype: list(str)
+    :raises FileNotFoundError: if path is not a directory
+    """
+    archive_path, member = split_path(path)
+    if archive_path is None:
+        return os.listdir(path)
+    archive = get_archive(archive_path)
+    if member not in archive.dirs:
+        raise FileNotFoundError("No such directory: {}".format(path))
+    return sorted(archive.dirs[member])
+
+
+def stat(path):
+    """
+    Gets size, modification time and inode of a file. Files within
+    archives have inode 0.
+
+    :param path: Path
+    :type path: str
+    :return: [size, modification time in nanoseconds, inode]
+    :rtype: list(int)
+    :raises FileNotFoundError: if path is not a file
+    """
+    archive_path, member = split_path(path)
+    if archive_path is None:
+        file_stat = os.stat(path)
+        return [file_stat.st_size, file_stat.st_mtime_ns, file_stat.st_ino]
+    archive = get_archive(archive_path)
+    if member not in archive.files:
+        raise FileNotFoundError("No such file: {}".format(path))
+    size, mtime, _ = archive.files[member]
+    return [size, mtime, 0]
+
+
+def getsize(path):
+    """
+    Gets size of a file.
+
+    :param path: Path
+    :type path: str
+    :return: size, in bytes
+    :rtype: int
+    :raises FileNotFoundError: if path is not a file
+    """
+    return stat(path)[0]
+
+
+def list_files(path):
+    """
+    Gets sizes, modification times and inodes of the files in a
+    directory, an archive or a directory within an archive.
+
+    :param path: Path
+    :type path: str
+    :return: file name to [size, modification time in nanoseconds,
+    inode]
+    :rtype: dict(str: list(int))
+    """
+    archive_path, member = split_path(path)
+    files = {}
+    if archive_path is None:
+        with os.scandir(path) as entries:
+            for entry in entries:
+                if entry.is_file():
+                    file_stat = entry.stat()
+                    files[entry.name] = [
+                        file_stat.st_size,
+                        file_stat.st_mtime_ns,
+                        file_stat.st_ino,
+                    ]
+        return files
+    archive = get_archive(archive_path)
+    for name in archive.dirs.get(member, []):
+        file_info = archive.files.get(posixpath.join(member, name))
+        if file_info is not None:
+            files[name] = [file_info[0], file_info[1], 0]
+    return files
+
+
+def find_file(path):
+    """
+    Finds a file, or a compressed file of the same name if the file
+    does not exist.
+
+    :param path: Path
+    :type path: str
+    :return: path, or path with a compression suffix
+    :rtype: str
+    """
+    if get_compression_suffix(path) is None and not isfile(path):
+        for suffix in COMPRESSION_SUFFIXES:
+            if isfile(path + suffix):
+                return path + suffix
+    return path
+
+
+class _GzipFile(gzip.GzipFile):
+    """
+    gzip file which also closes the file it reads from.
+    """
+
+    def close(self):
+        """
+        Closes the gzip file and the file it reads from.
+        """
+        fileobj = self.fileobj
+        try:
+            super().close()
+        finally:
+            if fileobj is not None:
+                fileobj.close()
+
+
+def decompress(f, suffix):
+    """
+    Wraps a binary file to decompress its content as it is read.
+
+    :param f: Binary file, closed when the returned file is closed
+    :type f: io.BufferedIOBase
+    :param suffix: Compression suffix, one of COMPRESSION_SUFFIXES
+    :type suffix: str
+    :return: binary file
+    :rtype: io.BufferedIOBase
+    :raises ImportError: if suffix is ZSTD_SUFFIX and zstandard is not
+    installed
+    """
+    if suffix == GZIP_SUFFIX:
+        return _GzipFile(fileobj=f)
+    try:
+        import zstandard
+    except ImportError:
+        f.close()
+        raise ImportError(
+            "zstandard is required to read {} files: "
+            "pip install alto2txt[zstd]".format(ZSTD_SUFFIX)
+        )
+    return zstandard.ZstdDecompressor().stream_reader(f)
+
+
+def open_file(path):
+    """
+    Opens a file, or a file within an archive, for reading,
+    decompressing it if it is compressed. If the file does not exist
+    then a compressed file of the same name is opened (see find_file).
+
+    :param path: Path
+    :type path: str
+    :return: binary file
+    :rtype: io.BufferedIOBase
+    :raises FileNotFoundError: if path is not a file
+    :raises ImportError: if the file is zstd compressed and zstandard
+    is not installed
+    """
+    path = find_file(path)
+    archive_path, member = split_path(path)
+    if archive_path is None:
+        f = open(path, "rb")
+    else:
+        f = get_archive(archive_path).open(member)
+    suffix = get_compression_suffix(path)
+    if suffix is None:
+        return f
+    return decompress(f, suffix)
+
+
+def read_file(path):
+    """
+    Reads a file, or a file within an archive, decompressing it if it
+    is compressed (see open_file).
+
+    :param path: Path
+    :type path: str
+    :return: content
+    :rtype: bytes
+    :raises FileNotFoundError: if path is not a file
+    """
+    with open_file(path) as f:
+        return f.read()
+
+
+def parse(path, parser=None):
+    """
+    Parses an XML file, or an XML file within an archive, decompressing
+    it if it is compressed (see open_file).
+
+    Files, and gzip compressed files, other than those within
+    archives, are read by lxml directly.
+
+    :param path: Path
+    :type path: str
+    :param parser: Parser
+    :type parser: lxml.etree.XMLParser
+    :return: Document tree
+    :rtype: lxml.etree._ElementTree
+    :raises FileNotFoundError: if path is not a file
+    :raises lxml.etree.XMLSyntaxError: if the XML is malformed
+    """
+    path = find_file(path)
+    archive_path, _ = split_path(path)
+    if archive_path is None and get_compression_suffix(path) in [None, GZIP_SUFFIX]:
+        return etree.parse(path, parser)
+    with open_file(path) as f:
+        return etree.parse(f, parser)
+
+
+def iterparse(path, **kwargs):
+    """
+    Parses an XML file, or an XML file within an archive,
+    incrementally, yielding (event, element) tuples as
+    lxml.etree.iterparse does. The file is decompressed if it is
+    compressed (see open_file).
+
+    Files, other than those within archives or compressed, are read by
+    lxml directly.
+
+    :param path: Path
+    :type path: str
+    :param kwargs: lxml.etree.iterparse arguments e.g. events
+    :type kwargs: dict
+    :return: (event, element) tuples
+    :rtype: generator(tuple(str, lxml.etree._Element))
+    :raises FileNotFoundError: if path is not a file
+    :raises lxml.etree.XMLSyntaxError: if the XML is malformed
+    """
+    path = find_file(path)
+    archive_path, _ = split_path(path)
+    if archive_path is None and get_compression_suffix(path) is None:
+        yield from etree.iterparse(path, **kwargs)
+        return
+    with open_file(path) as f:
+        yield from etree.iterparse(f, **kwargs)
+
+
+class ArchiveResolver(etree.Resolver):
+    """
+    lxml resolver loading documents within archives, or compressed, so
+    XSLTs, parsed with a parser with this resolver, can load such ALTO
+    files via document(). If a document does not exist then a
+    compressed document of the same name is loaded (see find_file).
+    Other documents are loaded as usual.
+    """
+
+    def resolve(self, url, public_id, context):
+        """
+        Resolves a URL.
+
+        :param url: URL
+        :type url: str
+        :param public_id: Public ID
+        :type public_id: str
+        :param context: Resolver context
+        :type context: object
+        :return: document, or None to load URL as usual
+        :rtype: object
+        """
+        if url.startswith("file://"):
+            url = url[len("file://") :]
+        path = find_file(url)
+        archive_path, _ = split_path(path)
+        suffix = get_compression_suffix(path)
+        if archive_path is None and suffix is None:
+            return None
+        if archive_path is None and suffix == GZIP_SUFFIX:
+            # libxml2 reads gzip compressed files directly.
+            return self.resolve_filename(path, context)
+        return self.resolve_string(read_file(path), context, base_url=url)
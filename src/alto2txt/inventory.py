@@ -0,0 +1,506 @@
+"""
+Inventory of the issues of XML publications, recording, for each
+issue, its input files, their sizes and modification times and the
+flavour of its XML files, so the input directory is walked once and
+can then be read from the inventory.
+
+Issue directories are scanned concurrently by threads, as scanning is
+dominated by filesystem latency, for example on network or parallel
+filesystems.
+
+The inventory is a JSON Lines file, by default in the output
+directory. Its first record holds the input directory scanned and
+each following record is an issue, in the order in which issues were
+listed. Issues are sampled from the inventory (see alto2txt.sampling).
+Issue paths are relative to the input directory.
+
+Rather than the whole input directory, an explicit list of issues can
+be read from a file or stdin (see read_issue_paths), in which case
+only those issues are scanned, or taken from an inventory being
+reused. Issues can also be split into shards, by their position in
+the sorted issue paths (see shard_records), so each task of an array
+job converts one shard.
+
+An inventory is not checked against the input directory when it is
+reused, so it must be scanned again if issues are added or removed.
+Changes to the files of an issue are still detected when resuming or
+converting incrementally, as the sizes and modification times of
+converted issues' files are recorded in the manifest (see
+alto2txt.manifest) as given by the inventory.
+"""
+
+import json
+import logging
+import os
+import os.path
+import sys
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from alto2txt import inputs, xml
+
+logger = logging.getLogger(__name__)
+""" Module-level logger. """
+
+INVENTORY_FILE = "alto2txt_inventory.jsonl"
+""" Inventory file name, in output directory. """
+INVENTORY_PUBLICATIONS_DIR = "publications_dir"
+""" Inventory header key for input directory, as an absolute path. """
+INVENTORY_PUBLICATION = "publication"
+""" Inventory record key for publication e.g. 0002647. """
+INVENTORY_YEAR = "year"
+""" Inventory record key for year e.g. 1824. """
+INVENTORY_ISSUE = "issue"
+""" Inventory record key for issue e.g. 0217. """
+INVENTORY_PATH = "path"
+"""
+Inventory record key for issue directory, relative to the input
+directory e.g. 0002647/1824/0217 or 0002647/1824.zip/0217.
+"""
+INVENTORY_FILES = "files"
+"""
+Inventory record key for issue file sizes and modification times, as
+recorded in the manifest (see alto2txt.manifest.issue_files).
+"""
+INVENTORY_FLAVOURS = "flavours"
+"""
+Inventory record key for the flavour of each XML file (see
+alto2txt.xml.get_xml_flavour), or None if it could not be read.
+Members of archives are not classified when scanning, so have no
+flavour.
+"""
+INVENTORY_THREADS = 16
+""" Number of threads scanning issue directories. """
+ISSUES_STDIN = "-"
+""" Issues file name for reading issues from stdin. """
+
+
+def issue_dirs(publication_dir):
+    """
+    Lists issues of an XML publication, yielding a (year, issue,
+    issue_dir) tuple for each issue, in the order they are listed.
+
+    publication_dir is expected to have the structure described in
+    alto2txt.xml_to_text.publication_to_text. Year directories can be
+    zip or tar archives, in which case the year is the archive name
+    without its suffix and issue_dir is a path within the archive (see
+    alto2txt.inputs).
+
+    :param publication_dir: Input directory with XML publications
+    :type publication_dir: str
+    :return: (year, issue, issue_dir) tuples
+    :rtype: generator(tuple(str, str, str))
+    """
+    for year_name in inputs.listdir(publication_dir):
+        year_dir = os.path.join(publication_dir, year_name)
+        if not inputs.isdir(year_dir):
+            logger.warning("Unexpected file: %s", year_name)
+            continue
+        year = inputs.get_name(year_name)
+        for issue in inputs.listdir(year_dir):
+            issue_dir = os.path.join(year_dir, issue)
+            if not inputs.isdir(issue_dir):
+                logger.warning("Unexpected file: %s", os.path.join(year, issue))
+                continue
+            yield year, issue, issue_dir
+
+
+def publication_issue_dirs(publication, publication_dir):
+    """
+    Lists issues of an XML publication (see issue_dirs).
+
+    :param publication: Publication e.g. 0002647
+    :type publication: str
+    :param publication_dir: Input directory with XML publications
+    :type publication_dir: str
+    :return: (publication, year, issue, issue_dir) tuples
+    :rtype: list(tuple(str, str, str, str))
+    """
+    return [
+        (publication, year, issue, issue_dir)
+        for year, issue, issue_dir in issue_dirs(publication_dir)
+    ]
+
+
+def scan_issue(issue_dir):
+    """
+    Scans an issue directory, getting the sizes and modification times
+    of its files and the flavours of its XML files.
+
+    :param issue_dir: Issue directory e.g. .../0000151/1835/0121
+    :type issue_dir: str
+    :return: file name to [size, modification time in nanoseconds],
+    and XML file name to flavour
+    :rtype: tuple(dict(str: list(int)), dict(str: str))
+    """
+    files = {name: stat[:2] for name, stat in inputs.list_files(issue_dir).items()}
+    flavours = {}
+    # Archive members are not read concurrently.
+    if inputs.split_path(issue_dir)[0] is not None:
+        return files, flavours
+    for name in files:
+        input_filename = inputs.strip_compression_suffix(name)
+        if os.path.splitext(input_filename)[1].lower() != ".xml":
+            continue
+        try:
+            metadata = xml.sniff_xml_metadata(os.path.join(issue_dir, name))
+            flavours[name] = xml.get_xml_flavour(metadata)
+        except Exception:
+            # Reported when the issue is converted.
+            flavours[name] = None
+    return files, flavours
+
+
+def scan(publications_dir, num_threads=INVENTORY_THREADS):
+    """
+    Scans XML publications, listing their issues and scanning each
+    issue directory (see scan_issue) using a pool of threads.
+
+    :param publications_dir: Input directory with XML publications
+    :type publications_dir: str
+    :param num_threads: Number of threads
+    :type num_threads: int
+    :return: issue records
+    :rtype: list(dict)
+    """
+    publications = []
+    publication_dirs = []
+    for publication_name in os.listdir(publications_dir):
+        publication_dir = os.path.join(publications_dir, publication_name)
+        if not inputs.isdir(publication_dir):
+            logger.warning("Unexpected file: %s", publication_dir)
+            continue
+        publications.append(inputs.get_name(publication_name))
+        publication_dirs.append(publication_dir)
+    with ThreadPoolExecutor(num_threads) as executor:
+        issues = [
+            issue
+            for publication_issues in executor.map(
+                publication_issue_dirs, publications, publication_dirs
+            )
+            for issue in publication_issues
+        ]
+        records = issue_records(publications_dir, issues, executor)
+    logger.info("Inventory %s: %d issues", publications_dir, len(records))
+    return records
+
+
+def issue_records(publications_dir, issues, executor):
+    """
+    Scans issue directories (see scan_issue) using a pool of threads,
+    creating an inventory record for each.
+
+    :param publications_dir: Input directory with XML publications
+    :type publications_dir: str
+    :param issues: (publication, year, issue, issue_dir) tuples
+    :type issues: list(tuple(str, str, str, str))
+    :param executor: Pool of threads
+    :type executor: concurrent.futures.ThreadPoolExecutor
+    :return: issue records
+    :rtype: list(dict)
+    """
+    scans = executor.map(scan_issue, [issue[3] for issue in issues])
+    return [
+        {
+            INVENTORY_PUBLICATION: publication,
+            INVENTORY_YEAR: year,
+            INVENTORY_ISSUE: issue,
+            INVENTORY_PATH: os.path.relpath(issue_dir, publications_dir),
+            INVENTORY_FILES: files,
+            INVENTORY_FLAVOURS: flavours,
+        }
+        for (publication, year, issue, issue_dir), (files, flavours) in zip(
+            issues, scans
+        )
+    ]
+
+
+def read_issue_paths(issues_file, publications_dir):
+    """
+    Reads issue directories, one per line, from a file or stdin.
+    Blank lines and lines starting with # are ignored, as are
+    duplicates.
+
+    Issue directories can be relative to publications_dir e.g.
+    0002647/1824/0217, or paths of directories in publications_dir,
+    relative to the current directory or absolute, e.g.
+    xml_in/0002647/1824/0217, as logged for issues that failed.
+
+    :param issues_file: Issues file, or ISSUES_STDIN to read stdin
+    :type issues_file: str
+    :param publications_dir: Input directory with XML publications
+    :type publications_dir: str
+    :return: issue paths, relative to publications_dir
+    :rtype: list(str)
+    """
+    if issues_file == ISSUES_STDIN:
+        lines = sys.stdin.read().splitlines()
+    else:
+        with open(issues_file, "r", encoding="utf-8") as f:
+            lines = f.read().splitlines()
+    prefix = os.path.normpath(publications_dir) + os.sep
+    paths = []
+    for line in lines:
+        line = line.strip()
+        if (not line) or line.startswith("#"):
+            continue
+        path = os.path.normpath(line)
+        if os.path.isabs(path):
+            path = os.path.relpath(path, os.path.abspath(publications_dir))
+        elif path.startswith(prefix) and prefix != "." + os.sep:
+            path = path[len(prefix) :]
+        if path.startswith(os.pardir) or len(path.split(os.sep)) != 3:
+            logger.warning("Not an issue of %s: %s", publications_dir, line)
+            continue
+        paths.append(path)
+    return list(dict.fromkeys(paths))
+
+
+def parse_shard(value):
+    """
+    Parses a shard as its index, from 0, and the number of shards e.g.
+    3/2000.
+
+    :param value: Shard
+    :type value: str
+    :return: shard index and number of shards
+    :rtype: tuple(int, int)
+    :raises ValueError: if value is not a shard
+    """
+    index, _, count = value.partition("/")
+    try:
+        shard = int(index), int(count)
+    except ValueError:
+        raise ValueError("Invalid shard: {}".format(value))
+    return shard
+
+
+def take_shard(items, shard_index=0, shard_count=1, key=None):
+    """
+    Takes a shard of items: every shard_count-th item, from
+    shard_index, once sorted. Each item is in exactly one of
+    shard_count shards, and shards differ in size by at most one.
+
+    :param items: Items
+    :type items: list
+    :param shard_index: Shard index, from 0
+    :type shard_index: int
+    :param shard_count: Number of shards
+    :type shard_count: int
+    :param key: Sort key, or None to sort items themselves
+    :type key: callable
+    :return: items in shard
+    :rtype: list
+    """
+    if shard_count == 1:
+        return items
+    shard = sorted(items, key=key)[shard_index::shard_count]
+    logger.info(
+        "Shard %d of %d: %d of %d issues",
+        shard_index,
+        shard_count,
+        len(shard),
+        len(items),
+    )
+    return shard
+
+
+def list_issue_records(
+    publications_dir, paths, records=None, num_threads=INVENTORY_THREADS
+):
+    """
+    Gets inventory records for listed issues, taking them from records,
+    if provided, and otherwise scanning their directories. Issues whose
+    directories do not exist are logged and skipped.
+
+    :param publications_dir: Input directory with XML publications
+    :type publications_dir: str
+    :param paths: Issue paths, relative to publications_dir, from
+    read_issue_paths
+    :type paths: list(str)
+    :param records: Inventory records of publications_dir
+    :type records: list(dict)
+    :param num_threads: Number of threads scanning issue directories
+    :type num_threads: int
+    :return: issue records, in the order of paths
+    :rtype: list(dict)
+    """
+    inventory_records = {record[INVENTORY_PATH]: record for record in records or []}
+    issues = []
+    for path in paths:
+        if path in inventory_records:
+            continue
+        publication_name, year_name, issue = path.split(os.sep)
+        issues.append(
+            (
+                inputs.get_name(publication_name),
+                inputs.get_name(year_name),
+                issue,
+                os.path.join(publications_dir, path),
+            )
+        )
+    with ThreadPoolExecutor(num_threads) as executor:
+        exists = list(executor.map(inputs.isdir, [issue[3] for issue in issues]))
+        for issue, issue_exists in zip(issues, exists):
+            if not issue_exists:
+                logger.warning("Issue not found: %s", issue[3])
+        scanned = issue_records(
+            publications_dir,
+            [issue for issue, issue_exists in zip(issues, exists) if issue_exists],
+            executor,
+        )
+    inventory_records.update((record[INVENTORY_PATH], record) for record in scanned)
+    records = [inventory_records[path] for path in paths if path in inventory_records]
+    logger.info("Listed issues: %d (scanned: %d)", len(records), len(scanned))
+    return records
+
+
+def write_inventory(inventory_file, publications_dir, records):
+    """
+    Writes an inventory. The inventory is written to a temporary file
+    which then replaces inventory_file, so a partially written
+    inventory is never read. The temporary file is unique, so
+    concurrent runs, for example the tasks of an array job, do not
+    write to the same file.
+
+    :param inventory_file: Inventory file
+    :type inventory_file: str
+    :param publications_dir: Input directory with XML publications
+    :type publications_dir: str
+    :param records: Issue records, from scan
+    :type records: list(dict)
+    """
+    inventory_dir = os.path.dirname(inventory_file)
+    if inventory_dir:
+        os.makedirs(inventory_dir, exist_ok=True)
+    partial_file = "{}.partial-{}".format(inventory_file, uuid.uuid4().hex)
+    with open(partial_file, "w", encoding="utf-8") as f:
+        header = {INVENTORY_PUBLICATIONS_DIR: os.path.abspath(publications_dir)}
+        f.write(json.dumps(header) + "\n")
+        for record in records:
+            f.write(json.dumps(record, sort_keys=True) + "\n")
+    os.replace(partial_file, inventory_file)
+
+
+def load_inventory(inventory_file, publications_dir):
+    """
+    Loads an inventory of publications_dir.
+
+    :param inventory_file: Inventory file
+    :type inventory_file: str
+    :param publications_dir: Input directory with XML publications
+    :type publications_dir: str
+    :return: issue records, or None if inventory_file does not exist
+    or is an inventory of another directory
+    :rtype: list(dict)
+    """
+    if not os.path.exists(inventory_file):
+        return None
+    with open(inventory_file, "r", encoding="utf-8") as f:
+        header = json.loads(f.readline() or "{}")
+        if header.get(INVENTORY_PUBLICATIONS_DIR) != os.path.abspath(publications_dir):
+            logger.warning(
+                "Inventory %s is not of %s", inventory_file, publications_dir
+            )
+            return None
+        records = [json.loads(line) for line in f]
+    logger.info("Inventory %s: %d issues", inventory_file, len(records))
+    return records
+
+
+def get_inventory(
+    publications_dir,
+    txt_out_dir,
+    inventory_file=None,
+    num_threads=INVENTORY_THREADS,
+    issues_file=None,
+    shard_index=0,
+    shard_count=1,
+):
+    """
+    Gets an inventory of XML publications.
+
+    If issues_file is provided then only the issues it lists (see
+    read_issue_paths) are inventoried. They are taken from
+    inventory_file, if provided, and otherwise scanned, and no
+    inventory is written.
+
+    Otherwise, if inventory_file is provided, and is an inventory of
+    publications_dir, then it is loaded. Otherwise publications_dir
+    is scanned and the inventory written to inventory_file or, if not
+    provided, to INVENTORY_FILE in txt_out_dir.
+
+    If shard_count is greater than 1 then only the issues in shard
+    shard_index are inventoried (see take_shard). Issues listed in
+    issues_file are sharded before they are scanned.
+
+    :param publications_dir: Input directory with XML publications
+    :type publications_dir: str
+    :param txt_out_dir: Output directory for plaintext articles
+    :type txt_out_dir: str
+    :param inventory_file: Inventory file to reuse
+    :type inventory_file: str
+    :param num_threads: Number of threads scanning issue directories
+    :type num_threads: int
+    :param issues_file: File listing issues, or ISSUES_STDIN to read
+    them from stdin, or None for all issues
+    :type issues_file: str
+    :param shard_index: Shard index, from 0
+    :type shard_index: int
+    :param shard_count: Number of shards
+    :type shard_count: int
+    :return: issue records
+    :rtype: list(dict)
+    """
+    if issues_file is not None:
+        paths = take_shard(
+            read_issue_paths(issues_file, publications_dir), shard_index, shard_count
+        )
+        records = None
+        if inventory_file is not None:
+            records = load_inventory(inventory_file, publications_dir)
+        return list_issue_records(publications_dir, paths, records, num_threads)
+    records = None
+    if inventory_file is not None:
+        records = load_inventory(inventory_file, publications_dir)
+    else:
+        inventory_file = os.path.join(txt_out_dir, INVENTORY_FILE)
+    if records is None:
+        records = scan(publications_dir, num_threads)
+        write_inventory(inventory_file, publications_dir, records)
+    return take_shard(
+        records,
+        shard_index,
+        shard_count,
+        key=lambda record: record[INVENTORY_PATH],
+    )
+
+
+def group_issues(publications_dir, records):
+    """
+    Groups issues from an inventory by publication.
+
+    :param publications_dir: Input directory with XML publications
+    :type publications_dir: str
+    :param records: Issue records
+    :type records: iterable(dict)
+    :return: publication to (publication_dir, (year, issue, issue_dir,
+    record) tuples), in the order of records
+    :rtype: dict(str: tuple(str, list(tuple(str, str, str, dict))))
+    """
+    publications = {}
+    for record in records:
+        path = record[INVENTORY_PATH]
+        publication_dir = os.path.join(publications_dir, path.split(os.sep)[0])
+        _, issues = publications.setdefault(
+            record[INVENTORY_PUBLICATION], (publication_dir, [])
+        )
+        issues.append(
+            (
+                record[INVENTORY_YEAR],
+                record[INVENTORY_ISSUE],
+                os.path.join(publications_dir, path),
+                record,
+            )
+        )
+    return publications
@@ -1,23 +1,162 @@
 """
 Logging utilities.
+
+Messages about individual files, such as each file converted, are
+logged to FILES_LOGGER, so they can be reduced independently of
+messages about issues and publications (see configure_file_messages):
+LOG_DETAIL_ISSUE drops per-file messages below WARNING before any
+record is created, leaving a summary per issue, and a rate limit
+keeps at most a number of per-file messages per second per process
+(see RateLimitFilter).
+
+In a multiprocessing pool, rather than each worker process appending
+to the log file, workers send records through a queue (see
+configure_queue_logging) to a single listener thread in the parent
+process which writes them (see start_log_listener).
 """
 
 import logging
+import logging.handlers
+import multiprocessing
+import os.path
+import time
+
+LOG_FORMAT = "%(asctime)s:%(name)s:%(process)d:%(levelname)s:%(message)s"
+""" Log record format. """
+FILES_LOGGER = "alto2txt.files"
+""" Name of logger for per-file messages. """
+LOG_DETAIL_FILE = "file"
+""" Log detail logging a message for each file. """
+LOG_DETAIL_ISSUE = "issue"
+"""
+Log detail logging a summary for each issue, and only warnings and
+errors for files.
+"""
+LOG_DETAILS = [LOG_DETAIL_FILE, LOG_DETAIL_ISSUE]
+""" Log details. """
 
 
 def configure_logging(log_file):
     """
     Configure console and file logging.
 
+    If a handler for log_file is already attached to the root logger,
+    for example in a forked worker process, then another one is not
+    added, so records are not logged twice.
+
     :param log_file: log file
     :type log_file: str
     """
 
-    format = "%(asctime)s:%(name)s:%(process)d:%(levelname)s:%(message)s"
-    formatter = logging.Formatter(format)
+    formatter = logging.Formatter(LOG_FORMAT)
 
-    logging.basicConfig(level=logging.INFO, format=format)
+    logging.basicConfig(level=logging.INFO, format=LOG_FORMAT)
+    root_logger = logging.getLogger()
+    for handler in root_logger.handlers:
+        if isinstance(handler, logging.FileHandler) and (
+            handler.baseFilename == os.path.abspath(log_file)
+        ):
+            return
     file_logger = logging.FileHandler(log_file)
     file_logger.setLevel(logging.INFO)
     file_logger.setFormatter(formatter)
-    logging.getLogger().addHandler(file_logger)
+    root_logger.addHandler(file_logger)
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Filter passing at most rate records, below WARNING, per second,
+    with bursts of up to rate records. Warnings and errors are always
+    passed. The number of records dropped is appended to the next
+    record passed.
+
+    :param rate: Maximum number of records per second
+    :type rate: float
+    """
+
+    def __init__(self, rate):
+        super().__init__()
+        self.rate = rate
+        self.allowance = rate
+        self.last = time.monotonic()
+        self.num_dropped = 0
+        """ Number of records dropped since the last record passed. """
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+        now = time.monotonic()
+        self.allowance = min(self.rate, self.allowance + (now - self.last) * self.rate)
+        self.last = now
+        if self.allowance < 1:
+            self.num_dropped += 1
+            return False
+        self.allowance -= 1
+        if self.num_dropped:
+            record.msg = "{} ({} messages dropped)".format(record.msg, self.num_dropped)
+            self.num_dropped = 0
+        return True
+
+
+def configure_file_messages(log_detail=LOG_DETAIL_FILE, log_rate=None):
+    """
+    Configure the per-file messages of this process, logged to
+    FILES_LOGGER.
+
+    :param log_detail: Log detail, one of LOG_DETAILS
+    :type log_detail: str
+    :param log_rate: Maximum number of per-file messages, below
+    WARNING, per second, or None for no limit
+    :type log_rate: float
+    """
+    files_logger = logging.getLogger(FILES_LOGGER)
+    if log_detail == LOG_DETAIL_ISSUE:
+        files_logger.setLevel(logging.WARNING)
+    else:
+        files_logger.setLevel(logging.NOTSET)
+    for log_filter in list(files_logger.filters):
+        if isinstance(log_filter, RateLimitFilter):
+            files_logger.removeFilter(log_filter)
+    if log_rate is not None:
+        files_logger.addFilter(RateLimitFilter(log_rate))
+
+
+def start_log_listener(log_file):
+    """
+    Configure console and file logging (see configure_logging) and
+    start a listener thread logging records sent through a queue, by
+    worker processes, to the console and log file.
+
+    The queue must be passed to worker processes when they are created,
+    for example as an initializer argument of a multiprocessing pool,
+    and the listener stopped once they have exited.
+
+    :param log_file: log file
+    :type log_file: str
+    :return: queue and listener
+    :rtype: tuple(multiprocessing.Queue, logging.handlers.QueueListener)
+    """
+    configure_logging(log_file)
+    log_queue = multiprocessing.Queue()
+    listener = logging.handlers.QueueListener(
+        log_queue, *logging.getLogger().handlers, respect_handler_level=True
+    )
+    listener.start()
+    return log_queue, listener
+
+
+def configure_queue_logging(log_queue):
+    """
+    Configure logging of a worker process to send records through a
+    queue to the listener of start_log_listener. Handlers inherited from
+    the parent process, for example by forking, are removed, so the
+    worker does not write to the console or log file itself.
+
+    :param log_queue: queue, from start_log_listener
+    :type log_queue: multiprocessing.Queue
+    """
+    root_logger = logging.getLogger()
+    for handler in list(root_logger.handlers):
+        root_logger.removeHandler(handler)
+    root_logger.addHandler(logging.handlers.QueueHandler(log_queue))
+    root_logger.setLevel(logging.INFO)
@@ -0,0 +1,342 @@
+"""
+Manifest of converted issues, recording, for each issue, the sizes and
+modification times of its input files, its summary and the version of
+this tool, so an interrupted run can be resumed without converting
+issues again.
+
+The manifest is an append-only JSON Lines file in the output
+directory. Each record is appended with a single write, so processes
+converting issues concurrently can share the manifest. If an issue is
+converted more than once, its last record is used.
+
+In incremental mode, each record also holds a fingerprint of the
+issue: a content hash of each of its input files, including the ALTO
+files referenced by its METS files. Issues are converted again only if
+their fingerprint changes. A file is hashed again only if its size,
+modification time or inode changed since it was last recorded.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import os.path
+
+from alto2txt import articles, inputs, mets_to_text, xml
+
+logger = logging.getLogger(__name__)
+""" Module-level logger. """
+
+MANIFEST_FILE = "alto2txt_manifest.jsonl"
+""" Manifest file name, in output directory. """
+MANIFEST_ISSUE = "issue"
+""" Manifest record key for issue, its input sub-path. """
+MANIFEST_FILES = "files"
+""" Manifest record key for input file sizes and modification times. """
+MANIFEST_SUMMARY = "summary"
+""" Manifest record key for issue summary. """
+MANIFEST_VERSION = "version"
+""" Manifest record key for tool version. """
+MANIFEST_FINGERPRINT = "fingerprint"
+""" Manifest record key for input file fingerprint (incremental only). """
+HASH_BLOCK_SIZE = 1024 * 1024
+""" Size, in bytes, of blocks read when hashing files. """
+
+
+def issue_files(issue_dir):
+    """
+    Gets sizes and modification times of files in an issue directory.
+
+    :param issue_dir: Issue directory e.g. .../0000151/1835/0121, which
+    may be within an archive (see alto2txt.inputs)
+    :type issue_dir: str
+    :return: file name to [size, modification time in nanoseconds]
+    :rtype: dict(str: list(int))
+    """
+    return {name: stat[:2] for name, stat in inputs.list_files(issue_dir).items()}
+
+
+def file_digest(file_path):
+    """
+    Gets content hash of a file.
+
+    :param file_path: File, which may be within an archive (see
+    alto2txt.inputs)
+    :type file_path: str
+    :return: BLAKE2b hash, in hexadecimal
+    :rtype: str
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    with inputs.open_file(file_path) as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def mets_filelocs(mets_file):
+    """
+    Gets locations of ALTO files referenced by a METS 1.8 or METS 1.3
+    file, via mets:FLocat/@xlink:href.
+
+    :param mets_file: XML file
+    :type mets_file: str
+    :return: ALTO file locations, relative to directory of mets_file,
+    or [] if mets_file is not METS 1.8 or METS 1.3 or cannot be parsed.
+    Locations of ALTO files read from compressed files of the same
+    name have the compression suffix (see alto2txt.inputs.find_file).
+    :rtype: list(str)
+    """
+    try:
+        flavour = xml.get_xml_flavour(xml.sniff_xml_metadata(mets_file))
+        if flavour == xml.FLAVOUR_METS_18:
+            filelocs = mets_to_text.mets18_filelocs(xml.get_xml(mets_file).getroot())
+        elif flavour == xml.FLAVOUR_METS_13:
+            filelocs = mets_to_text.mets13_filelocs(xml.get_xml(mets_file).getroot())
+        else:
+            return []
+    except Exception as e:
+        logger.warning("Problematic file %s: %s", mets_file, str(e))
+        return []
+    mets_dir = os.path.dirname(mets_file)
+    alto_filelocs = []
+    for fileloc in filelocs:
+        fileloc = os.path.normpath(fileloc)
+        alto_path = os.path.join(mets_dir, fileloc)
+        # Add the compression suffix, if any, of the file read.
+        alto_filelocs.append(fileloc + inputs.find_file(alto_path)[len(alto_path) :])
+    return alto_filelocs
+
+
+def issue_fingerprint(issue_dir, previous=None):
+    """
+    Gets fingerprint of an issue: the size, modification time, inode
+    and content hash of each file in the issue directory and of each
+    ALTO file referenced by METS files in the issue directory.
+
+    Hashes in previous are reused for files whose size, modification
+    time and inode are unchanged. Files within archives (see
+    alto2txt.inputs) have inode 0. If no file in the issue directory
+    has changed then the METS files are not parsed again and the
+    files in previous are used.
+
+    :param issue_dir: Issue directory e.g. .../0000151/1835/0121
+    :type issue_dir: str
+    :param previous: Previous fingerprint of the issue
+    :type previous: dict(str: list)
+    :return: file location, relative to issue_dir, to [size,
+    modification time in nanoseconds, inode, hash], or None if the
+    file does not exist
+    :rtype: dict(str: list)
+    """
+    previous = previous or {}
+    stats = inputs.list_files(issue_dir)
+    filelocs = set(stats)
+    if all(
+        (previous.get(fileloc) or [])[:3] == stat for fileloc, stat in stats.items()
+    ):
+        filelocs.update(previous)
+    else:
+        for fileloc in stats:
+            if os.path.splitext(fileloc)[1].lower() == ".xml":
+                filelocs.update(mets_filelocs(os.path.join(issue_dir, fileloc)))
+    fingerprint = {}
+    for fileloc in sorted(filelocs):
+        file_path = os.path.join(issue_dir, fileloc)
+        stat = stats.get(fileloc)
+        if stat is None:
+            try:
+                stat = inputs.stat(file_path)
+            except OSError:
+                fingerprint[fileloc] = None
+                continue
+        previous_stat = previous.get(fileloc) or []
+        if previous_stat[:3] == stat:
+            fingerprint[fileloc] = previous_stat
+        else:
+            fingerprint[fileloc] = stat + [file_digest(file_path)]
+    return fingerprint
+
+
+def fingerprint_hashes(fingerprint):
+    """
+    Gets content hashes from an issue fingerprint.
+
+    :param fingerprint: Issue fingerprint, from issue_fingerprint
+    :type fingerprint: dict(str: list)
+    :return: file location to hash, or None if the file does not exist
+    :rtype: dict(str: str)
+    """
+    return {
+        fileloc: None if state is None else state[3]
+        for fileloc, state in fingerprint.items()
+    }
+
+
+def get_version():
+    """
+    Gets version of this tool, as written into metadata.
+
+    :return: version
+    :rtype: str
+    """
+    return articles.get_lwm_tool()[1]
+
+
+class Manifest:
+    """
+    Manifest of converted issues in an output directory.
+
+    :param txt_out_dir: Output directory for plaintext articles
+    :type txt_out_dir: str
+    :param resume: If True, load records of issues already converted
+    so they can be skipped (see is_complete), otherwise only append
+    records
+    :type resume: bool
+    :param incremental: If True, fingerprint issues (see
+    get_fingerprint) and compare fingerprints, rather than file sizes
+    and modification times, to check if issues have changed
+    :type incremental: bool
+    """
+
+    def __init__(self, txt_out_dir, resume=False, incremental=False):
+        self.manifest_file = os.path.join(txt_out_dir, MANIFEST_FILE)
+        self.resume = resume
+        self.incremental = incremental
+        self.records = {}
+        if resume:
+            self.records = load_manifest(self.manifest_file)
+
+    def get_record(self, input_sub_path, record=None):
+        """
+        Gets the record of an issue.
+
+        :param input_sub_path: Input sub-path e.g. 0002647/1824/0217
+        :type input_sub_path: str
+        :param record: Record of the issue, e.g. loaded by another
+        manifest when listing issues, or None for that loaded by this
+        manifest, if any
+        :type record: dict
+        :return: record, or None if the issue is not recorded
+        :rtype: dict
+        """
+        if record is not None:
+            return record
+        return self.records.get(input_sub_path)
+
+    def get_fingerprint(self, input_sub_path, issue_dir, record=None):
+        """
+        Gets fingerprint of an issue, if in incremental mode, reusing
+        the hashes of files unchanged since the issue was recorded.
+
+        :param input_sub_path: Input sub-path e.g. 0002647/1824/0217
+        :type input_sub_path: str
+        :param issue_dir: Issue directory e.g. .../0000151/1835/0121
+        :type issue_dir: str
+        :param record: Record of the issue (see get_record)
+        :type record: dict
+        :return: fingerprint, from issue_fingerprint, or None if not
+        in incremental mode
+        :rtype: dict(str: list)
+        """
+        if not self.incremental:
+            return None
+        record = self.get_record(input_sub_path, record) or {}
+        return issue_fingerprint(issue_dir, record.get(MANIFEST_FINGERPRINT))
+
+    def is_complete(self, input_sub_path, files, fingerprint=None, record=None):
+        """
+        Checks if an issue has been converted, by this version of this
+        tool, without any files failing to convert, and its input files
+        are unchanged since.
+
+        :param input_sub_path: Input sub-path e.g. 0002647/1824/0217
+        :type input_sub_path: str
+        :param files: Issue files, from issue_files
+        :type files: dict(str: list(int))
+        :param fingerprint: Issue fingerprint, from get_fingerprint.
+        If provided, input files are unchanged if their content hashes
+        are unchanged, regardless of files.
+        :type fingerprint: dict(str: list)
+        :param record: Record of the issue (see get_record)
+        :type record: dict
+        :return: True if so
+        :rtype: bool
+        """
+        record = self.get_record(input_sub_path, record)
+        if record is None or record.get(MANIFEST_VERSION) != get_version():
+            return False
+        # Files that failed to convert, e.g. as output could not be
+        # written, are converted again.
+        if record.get(MANIFEST_SUMMARY, {}).get("converted_bad", 0) > 0:
+            return False
+        if fingerprint is not None:
+            previous = record.get(MANIFEST_FINGERPRINT)
+            return previous is not None and fingerprint_hashes(
+                previous
+            ) == fingerprint_hashes(fingerprint)
+        return record.get(MANIFEST_FILES) == files
+
+    def record(self, input_sub_path, files, summary, fingerprint=None):
+        """
+        Records that an issue has been converted.
+
+        :param input_sub_path: Input sub-path e.g. 0002647/1824/0217
+        :type input_sub_path: str
+        :param files: Issue files, from issue_files, taken before the
+        issue was converted
+        :type files: dict(str: list(int))
+        :param summary: Issue summary
+        :type summary: dict(str: int)
+        :param fingerprint: Issue fingerprint, from get_fingerprint,
+        taken before the issue was converted
+        :type fingerprint: dict(str: list)
+        """
+        record = {
+            MANIFEST_ISSUE: input_sub_path,
+            MANIFEST_FILES: files,
+            MANIFEST_SUMMARY: summary,
+            MANIFEST_VERSION: get_version(),
+        }
+        if fingerprint is not None:
+            record[MANIFEST_FINGERPRINT] = fingerprint
+        line = (json.dumps(record, sort_keys=True) + "\n").encode("utf-8")
+        os.makedirs(os.path.dirname(self.manifest_file), exist_ok=True)
+        # A single write to a file opened for appending is not
+        # interleaved with writes from other processes.
+        fd = os.open(self.manifest_file, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, line)
+        finally:
+            os.close(fd)
+        if self.resume:
+            self.records[input_sub_path] = record
+
+
+def load_manifest(manifest_file):
+    """
+    Loads manifest records. Records that cannot be parsed, such as one
+    partially written when a run was interrupted, are logged and
+    ignored.
+
+    :param manifest_file: Manifest file
+    :type manifest_file: str
+    :return: input sub-path to last record for that issue
+    :rtype: dict(str: dict)
+    """
+    records = {}
+    if not os.path.exists(manifest_file):
+        return records
+    with open(manifest_file, "r", encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            try:
+                record = json.loads(line)
+                records[record[MANIFEST_ISSUE]] = record
+            except (ValueError, KeyError, TypeError) as e:
+                logger.warning(
+                    "Invalid manifest record %s:%d: %s",
+                    manifest_file,
+                    line_number,
+                    str(e),
+                )
+    logger.info("Manifest %s: %d issues", manifest_file, len(records))
+    return records
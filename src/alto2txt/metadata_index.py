@@ -0,0 +1,260 @@
+"""
+Columnar metadata index of converted articles, written as a Parquet
+file, alto2txt_index.parquet, in the output directory, with one row per
+article.
+
+The index allows articles to be filtered and sampled (e.g. by date or
+OCR quality) by scanning a single table rather than parsing every
+article's metadata file.
+
+Each process converting issues writes rows in batches to its own part
+file in an alto2txt_index_parts directory in the output directory.
+Once all issues are converted, merge_index merges the part files into
+the index, keeping rows of any previous index for issues that were not
+converted again.
+
+Requires pyarrow.
+"""
+
+import logging
+import os
+import os.path
+import uuid
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+from lxml import etree
+
+from alto2txt import articles
+
+logger = logging.getLogger(__name__)
+""" Module-level logger. """
+
+INDEX_FILE = "alto2txt_index.parquet"
+""" Index file name, in output directory. """
+INDEX_PARTS_DIR = "alto2txt_index_parts"
+""" Index part files directory name, in output directory. """
+INDEX_BATCH_ROWS = 10000
+""" Number of rows buffered before they are written to a part file. """
+
+INDEX_SCHEMA = pa.schema(
+    [
+        ("input_sub_path", pa.string()),
+        ("input_filename", pa.string()),
+        ("xml_flavour", pa.string()),
+        ("publication_id", pa.string()),
+        ("publication_title", pa.string()),
+        ("location", pa.string()),
+        ("issue_id", pa.string()),
+        ("issue_date", pa.string()),
+        ("item_id", pa.string()),
+        ("item_title", pa.string()),
+        ("item_type", pa.string()),
+        ("word_count", pa.int64()),
+        ("ocr_quality_mean", pa.float64()),
+        ("ocr_quality_sd", pa.float64()),
+        ("ocr_quality", pa.float64()),
+        ("output", pa.string()),
+        ("plain_text_file", pa.string()),
+    ]
+)
+"""
+Index schema. ocr_quality is the UKP ocr_quality or BLN
+ocr_quality_summary. output is the output sub-path of the issue
+directory or container holding plain_text_file, e.g.
+0002647/1824/0217 or 0002647/1824/0217.zip.
+"""
+
+
+def metadata_row(lwm, output):
+    """
+    Gets index row from article metadata.
+
+    :param lwm: lwm element
+    :type lwm: lxml.etree._Element
+    :param output: Output sub-path of issue directory or container
+    :type output: str
+    :return: column name to value
+    :rtype: dict
+    """
+    row = articles.metadata_fields(lwm)
+    row["output"] = output
+    return row
+
+
+class IndexWriter:
+    """
+    Writer of index rows to a new part file.
+
+    :param txt_out_dir: Output directory for plaintext articles
+    :type txt_out_dir: str
+    :param batch_rows: Number of rows buffered before they are written
+    :type batch_rows: int
+    """
+
+    def __init__(self, txt_out_dir, batch_rows=INDEX_BATCH_ROWS):
+        self.part_file = os.path.join(
+            txt_out_dir, INDEX_PARTS_DIR, "part-{}.parquet".format(uuid.uuid4().hex)
+        )
+        self.batch_rows = batch_rows
+        self.rows = []
+        self.writer = None
+
+    def add(self, lwm, output, text=None):
+        """
+        Adds a row for an article.
+
+        :param lwm: Article metadata lwm element
+        :type lwm: lxml.etree._Element
+        :param output: Output sub-path of issue directory or container
+        :type output: str
+        :param text: Plaintext, which is not indexed (see
+        alto2txt.search_index)
+        :type text: str
+        """
+        self.rows.append(metadata_row(lwm, output))
+        if len(self.rows) >= self.batch_rows:
+            self.flush()
+
+    def add_files(self, output_dir, stub, output):
+        """
+        Adds rows for articles whose metadata files, in output_dir,
+        were written for stub, such as those written by an XSLT (see
+        alto2txt.articles.is_article_file).
+
+        :param output_dir: Directory with metadata files
+        :type output_dir: str
+        :param stub: Output file stub e.g. 0002647_18240217
+        :type stub: str
+        :param output: Output sub-path of issue directory or container
+        :type output: str
+        """
+        for name in sorted(os.listdir(output_dir)):
+            if articles.is_article_file(name, stub, articles.METADATA_SUFFIX):
+                lwm = etree.parse(os.path.join(output_dir, name)).getroot()
+                self.add(lwm, output)
+
+    def flush(self):
+        """
+        Writes buffered rows to the part file.
+        """
+        if not self.rows:
+            return
+        if self.writer is None:
+            os.makedirs(os.path.dirname(self.part_file), exist_ok=True)
+            self.writer = pq.ParquetWriter(self.part_file, INDEX_SCHEMA)
+        self.writer.write_table(pa.Table.from_pylist(self.rows, schema=INDEX_SCHEMA))
+        self.rows = []
+
+    def close(self):
+        """
+        Writes buffered rows and closes the part file.
+        """
+        self.flush()
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+
+
+def read_part_sub_paths(part_file):
+    """
+    Reads the input sub-paths of the issues in an index part file.
+
+    :param part_file: Index part file
+    :type part_file: str
+    :return: input sub-paths, or None if the part file cannot be read,
+    for example if it was left partially written by a crash
+    :rtype: set(str)
+    """
+    try:
+        table = pq.read_table(part_file, columns=["input_sub_path"])
+    except (pa.ArrowException, OSError) as e:
+        logger.warning("Skipping unreadable index part %s: %s", part_file, str(e))
+        return None
+    return set(table.column("input_sub_path").to_pylist())
+
+
+def filter_sub_paths(table, sub_paths):
+    """
+    Filters out rows of a table whose input sub-path is in sub_paths.
+
+    :param table: Index rows
+    :type table: pyarrow.Table
+    :param sub_paths: Input sub-paths
+    :type sub_paths: set(str)
+    :return: rows
+    :rtype: pyarrow.Table
+    """
+    if not sub_paths:
+        return table
+    value_set = pa.array(list(sub_paths), pa.string())
+    return table.filter(pc.invert(pc.is_in(table.column("input_sub_path"), value_set)))
+
+
+def merge_index(txt_out_dir):
+    """
+    Merges index part files into the index, then removes them.
+
+    Rows in any previous index are kept, unless their input sub-path
+    is in a part file, as the issue has been converted again. If an
+    issue is in more than one part file, for example if it was
+    converted again after an interrupted run, only its rows in the
+    newest part file, by modification time, are kept. Part files that
+    cannot be read are logged, skipped and left in place.
+
+    :param txt_out_dir: Output directory for plaintext articles
+    :type txt_out_dir: str
+    :return: number of rows in index
+    :rtype: int
+    """
+    parts_dir = os.path.join(txt_out_dir, INDEX_PARTS_DIR)
+    part_files = []
+    if os.path.isdir(parts_dir):
+        part_files = [
+            os.path.join(parts_dir, name)
+            for name in os.listdir(parts_dir)
+            if name.endswith(".parquet")
+        ]
+    # Newest first.
+    part_files.sort(key=lambda part_file: os.stat(part_file).st_mtime_ns, reverse=True)
+    parts = []
+    for part_file in part_files:
+        part_sub_paths = read_part_sub_paths(part_file)
+        if part_sub_paths is not None:
+            parts.append((part_file, part_sub_paths))
+    if not parts:
+        return 0
+    index_file = os.path.join(txt_out_dir, INDEX_FILE)
+    sub_paths = set().union(*(part_sub_paths for _, part_sub_paths in parts))
+    partial_file = index_file + ".partial"
+    num_rows = 0
+    merged = []
+    with pq.ParquetWriter(partial_file, INDEX_SCHEMA) as writer:
+        if os.path.exists(index_file):
+            for batch in pq.ParquetFile(index_file).iter_batches():
+                table = pa.Table.from_batches([batch]).cast(INDEX_SCHEMA)
+                table = filter_sub_paths(table, sub_paths)
+                writer.write_table(table)
+                num_rows += table.num_rows
+        newer_sub_paths = set()
+        for part_file, part_sub_paths in parts:
+            try:
+                table = pq.read_table(part_file).cast(INDEX_SCHEMA)
+            except (pa.ArrowException, OSError) as e:
+                logger.warning(
+                    "Skipping unreadable index part %s: %s", part_file, str(e)
+                )
+                continue
+            table = filter_sub_paths(table, newer_sub_paths)
+            writer.write_table(table)
+            num_rows += table.num_rows
+            newer_sub_paths.update(part_sub_paths)
+            merged.append(part_file)
+    os.replace(partial_file, index_file)
+    for part_file in merged:
+        os.remove(part_file)
+    if not os.listdir(parts_dir):
+        os.rmdir(parts_dir)
+    logger.info("Index %s: %d articles", index_file, num_rows)
+    return num_rows
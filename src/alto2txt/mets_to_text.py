@@ -0,0 +1,644 @@
+"""
+Functions to convert METS/ALTO issues to plaintext articles and
+generate minimal metadata without XSLT.
+
+The output is identical to that of extract_text_mets18.xslt and
+extract_text_mets13.xslt, but rather than copying every ALTO page, and
+then every article's blocks, into new trees, each ALTO page is parsed
+once per issue into an index of blocks by ID (see AltoPages), which is
+shared by all articles of the issue, the METS structure is indexed
+once per issue and article text and word confidences are collected in
+a single walk over each article's blocks.
+
+The text of an article is taken from String, HYP and SP elements
+within TextLine elements within TextBlock elements, as the ALTO schema
+requires.
+"""
+
+import logging
+
+from lxml import etree
+
+from alto2txt import articles, inputs, xml
+
+logger = logging.getLogger(__name__)
+""" Module-level logger. """
+
+MODS_NS = "http://www.loc.gov/mods/v3"
+""" MODS namespace """
+XLINK_18_NS = "http://www.w3.org/1999/xlink"
+""" XLink namespace used by METS 1.8 """
+XLINK_13_NS = "http://www.w3.org/TR/xlink"
+""" XLink namespace used by METS 1.3 """
+NS_18 = {"mets": xml.METS_NS, "mods": MODS_NS, "xlink": XLINK_18_NS}
+""" Namespaces used in METS 1.8 XPath queries. """
+NS_13 = {"mets": xml.METS_NS, "mods": MODS_NS, "xlink": XLINK_13_NS}
+""" Namespaces used in METS 1.3 XPath queries. """
+
+METS_DIV = etree.QName(xml.METS_NS, "div").text
+""" METS div element """
+METS_DMD_SEC = etree.QName(xml.METS_NS, "dmdSec").text
+""" METS dmdSec element """
+METS_FPTR = etree.QName(xml.METS_NS, "fptr").text
+""" METS fptr element """
+METS_AREA = etree.QName(xml.METS_NS, "area").text
+""" METS area element """
+METS_SM_ARC_LINK = etree.QName(xml.METS_NS, "smArcLink").text
+""" METS smArcLink element """
+XLINK_18_HREF = etree.QName(XLINK_18_NS, "href").text
+""" METS 1.8 xlink:href attribute """
+XLINK_18_LABEL = etree.QName(XLINK_18_NS, "label").text
+""" METS 1.8 xlink:label attribute """
+XLINK_18_TO = etree.QName(XLINK_18_NS, "to").text
+""" METS 1.8 xlink:to attribute """
+
+ALTO_LAYOUT = "Layout"
+""" ALTO Layout element """
+ALTO_BLOCKS = ("ComposedBlock", "TextBlock")
+""" ALTO elements referenced from METS """
+ALTO_TEXT_BLOCK = "TextBlock"
+""" ALTO TextBlock element """
+ALTO_TEXT_LINE = "TextLine"
+""" ALTO TextLine element """
+ALTO_STRING = "String"
+""" ALTO String element """
+ALTO_HYP = "HYP"
+""" ALTO HYP element """
+ALTO_SP = "SP"
+""" ALTO SP element """
+
+SOFTWARE = etree.XPath(
+    "string(mets:metsHdr/mets:agent[@OTHERTYPE='SOFTWARE']/mets:name)", namespaces=NS_18
+)
+""" XPath for software name, relative to mets element. """
+STRING_VALUE = etree.XPath("string()")
+""" XPath for string-value of a node. """
+
+MODS_PUBLICATION_ID = etree.XPath(
+    ".//mods:mods/mods:relatedItem/mods:identifier", namespaces=NS_18
+)
+""" XPath for publication ID, relative to dmdSec element. """
+MODS_SOURCE = etree.XPath(".//mods:note", namespaces=NS_18)
+""" XPath for source, relative to dmdSec element. """
+MODS_TITLE = etree.XPath(".//mods:title", namespaces=NS_18)
+""" XPath for title, relative to dmdSec element. """
+MODS_LOCATION = etree.XPath(".//mods:placeTerm", namespaces=NS_18)
+""" XPath for location, relative to dmdSec element. """
+MODS_DATE = etree.XPath(".//mods:dateIssued", namespaces=NS_18)
+""" XPath for date issued, relative to dmdSec element. """
+
+METS_18_FILES = etree.XPath(
+    "mets:fileSec//mets:fileGrp[@USE='Fulltext']/mets:file", namespaces=NS_18
+)
+""" XPath for ALTO files, relative to mets element. """
+METS_18_FILE_HREF = etree.XPath("string(mets:FLocat/@xlink:href)", namespaces=NS_18)
+""" XPath for ALTO file location, relative to file element. """
+METS_18_LOCATORS = etree.XPath(
+    "mets:structLink/mets:smLinkGrp/mets:smLocatorLink", namespaces=NS_18
+)
+""" XPath for structLink locators, relative to mets element. """
+METS_18_PHYSICAL_DIVS = etree.XPath(
+    "mets:structMap[@TYPE='PHYSICAL']//mets:div", namespaces=NS_18
+)
+""" XPath for physical structMap divs, relative to mets element. """
+METS_18_ISSUES = etree.XPath(
+    "mets:structMap[@TYPE='LOGICAL']/mets:div", namespaces=NS_18
+)
+""" XPath for issue divs, relative to mets element. """
+METS_18_ISSUE_NUMBER = etree.XPath(
+    ".//mods:mods/mods:part//mods:number", namespaces=NS_18
+)
+""" XPath for issue number, relative to dmdSec element. """
+
+METS_13_FILES = etree.XPath(
+    "mets:fileSec/mets:fileGrp[@USE='Text']/mets:file", namespaces=NS_13
+)
+""" XPath for ALTO files, relative to mets element. """
+METS_13_FILE_HREF = etree.XPath("string(mets:FLocat/@xlink:href)", namespaces=NS_13)
+""" XPath for ALTO file location, relative to file element. """
+METS_13_FILE_PREFIX = "file://./"
+""" Prefix of ALTO file locations, stripped off. """
+METS_13_ISSUES = etree.XPath(
+    "mets:structMap[@TYPE='LOGICAL']/mets:div[@TYPE='Newspaper']"
+    "/mets:div[@TYPE='VOLUME']/mets:div[@TYPE='ISSUE']",
+    namespaces=NS_13,
+)
+""" XPath for issue divs, relative to mets element. """
+METS_13_ITEMS = etree.XPath(
+    "mets:div[@TYPE='CONTENT']/mets:div[@TYPE='ARTICLE']", namespaces=NS_13
+)
+""" XPath for item divs, relative to issue div. """
+METS_13_AREAS = etree.XPath(
+    "mets:div/mets:div/mets:div/mets:div/mets:fptr/mets:area", namespaces=NS_13
+)
+""" XPath for page areas, relative to item div. """
+METS_13_ISSUE_NUMBER = etree.XPath(
+    ".//mods:mods/mods:titleInfo//mods:partNumber", namespaces=NS_13
+)
+""" XPath for issue number, relative to dmdSec element. """
+
+
+class AltoPages:
+    """
+    ALTO pages of an issue, each parsed once, and an index of their
+    ComposedBlock and TextBlock elements by ID.
+
+    As with the XSLT key over all pages, an ID maps to the blocks
+    with that ID across all pages, in page order then document order.
+    Pages that cannot be loaded are logged, recorded in missing and
+    treated as empty.
+
+    :param input_path: Issue directory
+    :type input_path: str
+    :param filelocs: ALTO file locations, relative to input_path
+    :type filelocs: list(str)
+    """
+
+    def __init__(self, input_path, filelocs):
+        self.roots = []
+        self.blocks = {}
+        self.missing = []
+        trees = {}
+        for fileloc in filelocs:
+            page_path = "{}/{}".format(input_path, fileloc)
+            if page_path not in trees:
+                trees[page_path] = load_alto_page(page_path)
+            root = trees[page_path]
+            if root is None:
+                self.missing.append(page_path)
+            self.roots.append(root)
+            if root is None or root.tag != xml.ALTO_ROOT:
+                continue
+            for layout in root.iterchildren(ALTO_LAYOUT):
+                for block in layout.iter(*ALTO_BLOCKS):
+                    block_id = block.get("ID")
+                    if block_id is not None:
+                        self.blocks.setdefault(block_id, []).append(block)
+
+    def check_missing(self):
+        """
+        Checks that all pages were loaded. Called once all articles
+        have been converted as, like the XSLTs, articles are still
+        converted when pages are missing but the conversion as a
+        whole fails.
+
+        :raise OSError: if any page could not be loaded
+        """
+        if self.missing:
+            raise OSError("Cannot resolve URI {}".format(" ".join(self.missing)))
+
+    def get_alto_namespace(self):
+        """
+        Gets noNamespaceSchemaLocation of the first page.
+
+        :return: schema location, or "" if none
+        :rtype: str
+        """
+        if not self.roots:
+            return ""
+        root = self.roots[0]
+        if root is None or root.tag != xml.ALTO_ROOT:
+            return ""
+        return root.get(xml.NO_NS_SCHEMA_LOCATION.text, "")
+
+
+def load_alto_page(page_path):
+    """
+    Loads ALTO page, logging a warning if it cannot be loaded.
+
+    :param page_path: ALTO file, which may be within an archive (see
+    alto2txt.inputs)
+    :type page_path: str
+    :return: Root element, or None if the page cannot be loaded
+    :rtype: lxml.etree._Element
+    """
+    try:
+        return inputs.parse(page_path).getroot()
+    except (OSError, etree.XMLSyntaxError) as e:
+        logger.warning("Problematic ALTO page %s: %s", page_path, str(e))
+        return None
+
+
+def blocks_to_text(blocks):
+    """
+    Gets plaintext and word confidences of ALTO blocks, walking each
+    block once.
+
+    Each TextLine gives a line of text, TextBlocks are separated by
+    blank lines. If there are no words then the text is a single
+    newline.
+
+    :param blocks: ComposedBlock and TextBlock elements
+    :type blocks: list(lxml.etree._Element)
+    :return: (text, word_confidences)
+    :rtype: tuple(str, list(str))
+    """
+    text_blocks = []
+    word_confidences = []
+    has_words = False
+    for block in blocks:
+        for text_block in block.iter(ALTO_TEXT_BLOCK):
+            lines = []
+            for text_line in text_block.iterchildren(ALTO_TEXT_LINE):
+                children = list(text_line.iterchildren(ALTO_STRING, ALTO_HYP, ALTO_SP))
+                last = len(children) - 1
+                words = []
+                for position, child in enumerate(children):
+                    if child.tag == ALTO_SP:
+                        # A space is only output between words.
+                        if position != last:
+                            words.append(" ")
+                        continue
+                    has_words = True
+                    words.append(child.get("CONTENT", ""))
+                    if child.tag == ALTO_STRING:
+                        word_confidence = child.get("WC")
+                        if word_confidence is not None:
+                            word_confidences.append(word_confidence)
+                words.append("\n")
+                lines.append("".join(words))
+            text_blocks.append("".join(lines))
+    if not has_words:
+        return "\n", word_confidences
+    return "\n".join(text_blocks), word_confidences
+
+
+def index_elements(elements, attribute):
+    """
+    Indexes elements by an attribute, as an XSLT key does. Elements
+    without the attribute are not indexed.
+
+    :param elements: Elements
+    :type elements: list(lxml.etree._Element)
+    :param attribute: Attribute name
+    :type attribute: str
+    :return: index of attribute value to elements, in document order
+    :rtype: dict(str: list(lxml.etree._Element))
+    """
+    index = {}
+    for element in elements:
+        value = element.get(attribute)
+        if value is not None:
+            index.setdefault(value, []).append(element)
+    return index
+
+
+def first_string(elements, xpath):
+    """
+    Gets the string-value of the first node matching an XPath across
+    elements, as XPath string() of a node-set does.
+
+    :param elements: Elements in document order
+    :type elements: list(lxml.etree._Element)
+    :param xpath: XPath relative to each element
+    :type xpath: lxml.etree.XPath
+    :return: string-value, or "" if there is no match
+    :rtype: str
+    """
+    for element in elements:
+        nodes = xpath(element)
+        if nodes:
+            return str(STRING_VALUE(nodes[0]))
+    return ""
+
+
+def ocr_quality_elements(item, word_confidences):
+    """
+    Creates word_count, ocr_quality_mean and ocr_quality_sd elements.
+
+    :param item: item element
+    :type item: lxml.etree._Element
+    :param word_confidences: Word confidences (String/@WC values)
+    :type word_confidences: list(str)
+    """
+    word_count, mean, standard_deviation = articles.word_confidence_stats(
+        word_confidences
+    )
+    articles.sub_element(item, "word_count", str(word_count))
+    articles.sub_element(item, "ocr_quality_mean", format_quality(mean))
+    articles.sub_element(item, "ocr_quality_sd", format_quality(standard_deviation))
+
+
+def format_quality(quality):
+    """
+    Formats OCR quality statistic to 4 decimal places.
+
+    :param quality: statistic
+    :type quality: float
+    :return: formatted statistic, or "" if statistic is NaN
+    :rtype: str
+    """
+    if quality != quality:
+        return ""
+    return articles.format_number(quality, "0.0000")
+
+
+class Mets18Index:
+    """
+    Index of METS 1.8 structLink locators and physical structMap divs,
+    built once per issue.
+
+    :param mets: mets element
+    :type mets: lxml.etree._Element
+    """
+
+    def __init__(self, mets):
+        locators = METS_18_LOCATORS(mets)
+        self.locators_by_href = index_elements(locators, XLINK_18_HREF)
+        self.locators_by_label = index_elements(locators, XLINK_18_LABEL)
+        self.physical_divs = METS_18_PHYSICAL_DIVS(mets)
+        self.physical_divs_by_id = index_elements(self.physical_divs, "ID")
+        self.physical_div_positions = {
+            div: position for position, div in enumerate(self.physical_divs)
+        }
+
+    def get_page_areas(self, item_id):
+        """
+        Gets IDs of page areas of an item, following structLink arcs
+        from the item to physical structMap pagearea divs.
+
+        :param item_id: Item ID
+        :type item_id: str
+        :return: page area IDs, in order
+        :rtype: list(str)
+        """
+        groups = []
+        for locator in self.locators_by_href.get("#" + item_id, []):
+            group = locator.getparent()
+            if group not in groups:
+                groups.append(group)
+        page_areas = []
+        for group in groups:
+            for arc in group.iterchildren(METS_SM_ARC_LINK):
+                arc_to = arc.get(XLINK_18_TO)
+                if arc_to is None:
+                    continue
+                page_area = ""
+                for locator in self.locators_by_label.get(arc_to, []):
+                    href = locator.get(XLINK_18_HREF)
+                    if href is not None:
+                        page_area = href
+                        break
+                positions = set()
+                for div in self.physical_divs_by_id.get(page_area[1:], []):
+                    if div.get("TYPE") == "pagearea":
+                        positions.add(self.physical_div_positions[div])
+                    for child in div.iterchildren(METS_DIV):
+                        if child.get("TYPE") == "pagearea":
+                            positions.add(self.physical_div_positions[child])
+                for position in sorted(positions):
+                    div = self.physical_divs[position]
+                    if has_idref_area(div) and div.get("ID") is not None:
+                        page_areas.append(div.get("ID"))
+        return page_areas
+
+
+def get_dmd_secs(dmd_secs, dmd_id):
+    """
+    Gets dmdSec elements with an ID.
+
+    :param dmd_secs: dmdSec elements indexed by ID
+    :type dmd_secs: dict(str: list(lxml.etree._Element))
+    :param dmd_id: ID, or None
+    :type dmd_id: str
+    :return: dmdSec elements
+    :rtype: list(lxml.etree._Element)
+    """
+    if dmd_id is None:
+        return []
+    return dmd_secs.get(dmd_id, [])
+
+
+def mets_lwm(mets, pages, input_sub_path, input_filename):
+    """
+    Creates lwm metadata element and its process element, common to
+    all items of a METS file.
+
+    :param mets: mets element
+    :type mets: lxml.etree._Element
+    :param pages: ALTO pages
+    :type pages: AltoPages
+    :param input_sub_path: Input sub-path e.g. 0002647/1824/0217
+    :type input_sub_path: str
+    :param input_filename: METS filename
+    :type input_filename: str
+    :return: lwm element
+    :rtype: lxml.etree._Element
+    """
+    lwm = etree.Element("lwm")
+    process = articles.lwm_process(
+        lwm, "alto", str(SOFTWARE(mets)), input_sub_path, input_filename
+    )
+    articles.sub_element(
+        process, "mets_namespace", mets.get(xml.SCHEMA_LOCATION.text, "")
+    )
+    articles.sub_element(process, "alto_namespace", pages.get_alto_namespace())
+    return lwm
+
+
+def item_to_article(lwm, issue, item, title, blocks, output_document_stub):
+    """
+    Converts blocks of an item to a plaintext article, adding item
+    metadata to issue.
+
+    :param lwm: lwm element, of which issue is a descendant
+    :type lwm: lxml.etree._Element
+    :param issue: issue element
+    :type issue: lxml.etree._Element
+    :param item: METS item div
+    :type item: lxml.etree._Element
+    :param title: Item title
+    :type title: str
+    :param blocks: ALTO blocks of the item
+    :type blocks: list(lxml.etree._Element)
+    :param output_document_stub: Output file stub e.g. 0002647_18240217
+    :type output_document_stub: str
+    :return: article
+    :rtype: alto2txt.articles.Article
+    """
+    item_id = item.get("ID", "")
+    text, word_confidences = blocks_to_text(blocks)
+    stub = "{}_{}".format(output_document_stub, item_id)
+    item_element = articles.sub_element(issue, "item", id=item_id)
+    articles.sub_element(item_element, "plain_text_file", stub + articles.TEXT_SUFFIX)
+    articles.sub_element(item_element, "title", title)
+    articles.sub_element(item_element, "item_type", item.get("TYPE", ""))
+    ocr_quality_elements(item_element, word_confidences)
+    return articles.Article(item_id, stub, text, lwm)
+
+
+def has_idref_area(div):
+    """
+    Checks if div has a fptr/area child with BETYPE IDREF.
+
+    :param div: METS div element
+    :type div: lxml.etree._Element
+    :return: True if so
+    :rtype: bool
+    """
+    for fptr in div.iterchildren(METS_FPTR):
+        for area in fptr.iterchildren(METS_AREA):
+            if area.get("BETYPE") == "IDREF":
+                return True
+    return False
+
+
+def mets18_to_articles(
+    document_tree, input_path, input_sub_path, input_filename, output_document_stub
+):
+    """
+    Converts a METS 1.8/ALTO 1.4 issue to plaintext articles and
+    generates minimal metadata, as extract_text_mets18.xslt does.
+
+    :param document_tree: METS document tree
+    :type document_tree: lxml.etree._ElementTree
+    :param input_path: Issue directory, absolute path
+    :type input_path: str
+    :param input_sub_path: Input sub-path e.g. 0002647/1824/0217
+    :type input_sub_path: str
+    :param input_filename: METS filename
+    :type input_filename: str
+    :param output_document_stub: Output file stub e.g. 0002647_18240217
+    :type output_document_stub: str
+    :return: articles
+    :rtype: generator(alto2txt.articles.Article)
+    :raise OSError: after all articles are yielded, if any ALTO page
+    could not be loaded
+    """
+    mets = document_tree.getroot()
+    pages = AltoPages(input_path, mets18_filelocs(mets))
+    index = Mets18Index(mets)
+    dmd_secs = index_elements(mets.iterchildren(METS_DMD_SEC), "ID")
+    for issue_div in METS_18_ISSUES(mets):
+        issue_dmd_secs = get_dmd_secs(dmd_secs, issue_div.get("DMDID"))
+        date = first_string(issue_dmd_secs, MODS_DATE)
+        issue_id = first_string(issue_dmd_secs, METS_18_ISSUE_NUMBER)
+        if not any(
+            str(STRING_VALUE(number))
+            for dmd_sec in issue_dmd_secs
+            for number in METS_18_ISSUE_NUMBER(dmd_sec)
+        ):
+            # If missing then use date as issue ID.
+            issue_id = date
+        for item in issue_div.iterchildren(METS_DIV):
+            blocks = []
+            for page_area in index.get_page_areas(item.get("ID", "")):
+                blocks.extend(pages.blocks.get(page_area, []))
+            lwm = mets_lwm(mets, pages, input_sub_path, input_filename)
+            publication = articles.sub_element(
+                lwm,
+                "publication",
+                id=first_string(issue_dmd_secs, MODS_PUBLICATION_ID),
+            )
+            articles.sub_element(
+                publication, "source", first_string(issue_dmd_secs, MODS_SOURCE)
+            )
+            articles.sub_element(
+                publication, "title", first_string(issue_dmd_secs, MODS_TITLE)
+            )
+            articles.sub_element(
+                publication, "location", first_string(issue_dmd_secs, MODS_LOCATION)
+            )
+            issue = articles.sub_element(publication, "issue", id=issue_id)
+            articles.sub_element(issue, "date", date)
+            title = first_string(get_dmd_secs(dmd_secs, item.get("DMDID")), MODS_TITLE)
+            yield item_to_article(lwm, issue, item, title, blocks, output_document_stub)
+    pages.check_missing()
+
+
+def mets18_filelocs(mets):
+    """
+    Gets ALTO file locations from METS 1.8.
+
+    :param mets: mets element
+    :type mets: lxml.etree._Element
+    :return: ALTO file locations
+    :rtype: list(str)
+    """
+    return [str(METS_18_FILE_HREF(file)) for file in METS_18_FILES(mets)]
+
+
+def mets13_filelocs(mets):
+    """
+    Gets ALTO file locations from METS 1.3, stripping off any
+    file://./ prefix.
+
+    :param mets: mets element
+    :type mets: lxml.etree._Element
+    :return: ALTO file locations
+    :rtype: list(str)
+    """
+    filelocs = []
+    for file in METS_13_FILES(mets):
+        fileloc = str(METS_13_FILE_HREF(file))
+        if METS_13_FILE_PREFIX in fileloc:
+            fileloc = fileloc.split(METS_13_FILE_PREFIX, 1)[1]
+        filelocs.append(fileloc)
+    return filelocs
+
+
+def mets13_date(date):
+    """
+    Converts METS 1.3 date dd.mm.yyyy to yyyy-mm-dd.
+
+    :param date: Date
+    :type date: str
+    :return: Date
+    :rtype: str
+    """
+    return "{}-{}-{}".format(date[6:10], date[3:5], date[0:2])
+
+
+def mets13_to_articles(
+    document_tree, input_path, input_sub_path, input_filename, output_document_stub
+):
+    """
+    Converts a METS 1.3/ALTO 1.4 issue to plaintext articles and
+    generates minimal metadata, as extract_text_mets13.xslt does.
+
+    :param document_tree: METS document tree
+    :type document_tree: lxml.etree._ElementTree
+    :param input_path: Issue directory, absolute path
+    :type input_path: str
+    :param input_sub_path: Input sub-path e.g. 0002647/1824/0217
+    :type input_sub_path: str
+    :param input_filename: METS filename
+    :type input_filename: str
+    :param output_document_stub: Output file stub e.g. 0002647_18240217
+    :type output_document_stub: str
+    :return: articles
+    :rtype: generator(alto2txt.articles.Article)
+    :raise OSError: after all articles are yielded, if any ALTO page
+    could not be loaded
+    """
+    mets = document_tree.getroot()
+    pages = AltoPages(input_path, mets13_filelocs(mets))
+    dmd_secs = index_elements(mets.iterchildren(METS_DMD_SEC), "ID")
+    for issue_div in METS_13_ISSUES(mets):
+        issue_dmd_secs = get_dmd_secs(dmd_secs, issue_div.get("DMDID"))
+        for item in METS_13_ITEMS(issue_div):
+            blocks = []
+            for area in METS_13_AREAS(item):
+                page_area = area.get("BEGIN")
+                if page_area is not None:
+                    blocks.extend(pages.blocks.get(page_area, []))
+            lwm = mets_lwm(mets, pages, input_sub_path, input_filename)
+            publication = articles.sub_element(
+                lwm,
+                "publication",
+                id=first_string(issue_dmd_secs, MODS_PUBLICATION_ID),
+            )
+            articles.sub_element(
+                publication, "title", first_string(issue_dmd_secs, MODS_TITLE)
+            )
+            issue = articles.sub_element(
+                publication,
+                "issue",
+                id=first_string(issue_dmd_secs, METS_13_ISSUE_NUMBER),
+            )
+            articles.sub_element(
+                issue, "date", mets13_date(first_string(issue_dmd_secs, MODS_DATE))
+            )
+            title = first_string(get_dmd_secs(dmd_secs, item.get("DMDID")), MODS_TITLE)
+            yield item_to_article(lwm, issue, item, title, blocks, output_document_stub)
+    pages.check_missing()
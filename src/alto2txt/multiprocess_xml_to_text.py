@@ -8,55 +8,387 @@ import logging
 import multiprocessing
 import os
 import os.path
+from functools import partial
 from multiprocessing import Pool
 
-from alto2txt import xml, xml_to_text
-from alto2txt.logging_utils import configure_logging
+from alto2txt import (
+    inventory,
+    logging_utils,
+    manifest,
+    output_writer,
+    profiling,
+    sampling,
+    sinks,
+    stats,
+    worker,
+    xml_to_text,
+)
 
 logger = logging.getLogger(__name__)
 """ Module-level logger. """
 
+BATCHES_PER_PROCESS = 4
+"""
+Number of issue batches to create per process. More batches give
+better load balancing at the cost of more task dispatches.
+"""
+
+
+def issues_to_text(
+    issues,
+    txt_out_dir,
+    engine=xml_to_text.ENGINE_XSLT,
+    incremental=False,
+    output_format=sinks.OUTPUT_FILES,
+    index=False,
+    search=False,
+    profile=False,
+    writer_threads=0,
+    fsync=sinks.FSYNC_NONE,
+    count_words=False,
+    xslts=None,
+):
+    """
+    Converts a batch of issues to plaintext articles and generates
+    minimal metadata, calling xml_to_text.issue_to_text for each
+    issue.
+
+    Unless xslts are provided, must run in a process initialised by
+    alto2txt.worker.init_worker.
+
+    :param issues: (publication, year, issue, issue_dir,
+    issue_inventory, issue_record) tuples, from list_issues
+    :type issues: list(tuple(str, str, str, str, dict, dict))
+    :param txt_out_dir: Output directory for plaintext articles
+    :type txt_out_dir: str
+    :param engine: Engine, one of xml_to_text.ENGINES
+    :type engine: str
+    :param incremental: Fingerprint issues and remove their previous
+    output before converting them
+    :type incremental: bool
+    :param output_format: Output format, one of
+    alto2txt.sinks.OUTPUT_FORMATS
+    :type output_format: str
+    :param index: Write metadata index rows for the batch to a part
+    file (see alto2txt.metadata_index)
+    :type index: bool
+    :param search: Write search index rows for the batch to a part
+    file (see alto2txt.search_index)
+    :type search: bool
+    :param profile: Profile conversion of the batch, writing part files
+    (see alto2txt.profiling)
+    :type profile: bool
+    :param writer_threads: Number of writer threads writing the
+    articles of the batch (see alto2txt.output_writer)
+    :type writer_threads: int
+    :param fsync: fsync policy, one of alto2txt.sinks.FSYNC_POLICIES
+    :type fsync: str
+    :param count_words: Count words of articles written by the XSLTs
+    (see alto2txt.xml_to_text.issue_to_text)
+    :type count_words: bool
+    :param xslts: XSLTs to convert XML to plaintext, or None for those
+    of the worker process (see alto2txt.worker.get_xslts)
+    :type xslts: dict(str: lxml.etree.XSLT)
+    :return: publication to summary of its issues in the batch (see
+    alto2txt.stats)
+    :rtype: dict(str: dict(str: int or float))
+    """
+    # Issues already converted are filtered out before dispatch, or
+    # listed with their records if incremental, so only record issues
+    # in the manifest.
+    issue_manifest = manifest.Manifest(txt_out_dir, incremental=incremental)
+    issue_index = None
+    if index:
+        from alto2txt import metadata_index
+
+        issue_index = metadata_index.IndexWriter(txt_out_dir)
+    if search:
+        from alto2txt import search_index
+
+        issue_index = search_index.add_search_index(issue_index, txt_out_dir)
+    profiler = None
+    if profile:
+        profiler = profiling.Profiler(txt_out_dir)
+        profiler.enable()
+    writer = output_writer.open_writer(writer_threads, fsync)
+    if xslts is None:
+        xslts = worker.get_xslts()
+    summaries = {}
+    try:
+        for (
+            publication,
+            year,
+            issue,
+            issue_dir,
+            issue_inventory,
+            issue_record,
+        ) in issues:
+            publication_txt_out_dir = os.path.join(txt_out_dir, publication)
+            try:
+                summary = xml_to_text.issue_to_text(
+                    publication,
+                    year,
+                    issue,
+                    issue_dir,
+                    publication_txt_out_dir,
+                    xslts,
+                    engine,
+                    issue_manifest,
+                    output_format,
+                    issue_index,
+                    profiler,
+                    writer,
+                    issue_inventory,
+                    issue_record=issue_record,
+                    count_words=count_words,
+                )
+                stats.add_summaries(summaries, {publication: summary})
+            except Exception as e:
+                logger.error("%s failed to convert: %s", issue_dir, str(e))
+    finally:
+        if writer is not None:
+            writer.close()
+        if issue_index is not None:
+            issue_index.close()
+        if profiler is not None:
+            profiler.close()
+    return summaries
+
+
+def issue_cost(issue_files):
+    """
+    Estimates the cost of converting an issue as the total size, in
+    bytes, of the files in its directory.
+
+    :param issue_files: Issue files, from manifest.issue_files
+    :type issue_files: dict(str: list(int))
+    :return: cost
+    :rtype: int
+    """
+    return sum(size for size, _ in issue_files.values())
+
+
+def batch_issues(issues, num_batches):
+    """
+    Groups issues into batches for dispatch to a process pool.
+
+    Issues are sorted by decreasing cost and added to a batch until
+    the batch cost reaches total cost / num_batches. Issues costlier
+    than this are batched alone and dispatched first, and cheap
+    issues are grouped into the last batches, so that no process is
+    left converting a large issue while the others are idle.
+
+    :param issues: (cost, issue) tuples
+    :type issues: list(tuple(int, object))
+    :param num_batches: Target number of batches
+    :type num_batches: int
+    :return: batches
+    :rtype: list(list(object))
+    """
+    issues = sorted(issues, key=lambda cost_issue: cost_issue[0], reverse=True)
+    batch_target = sum(cost for cost, _ in issues) / max(num_batches, 1)
+    batches = []
+    batch = []
+    batch_cost = 0
+    for cost, issue in issues:
+        batch.append(issue)
+        batch_cost += cost
+        if batch_cost >= batch_target:
+            batches.append(batch)
+            batch = []
+            batch_cost = 0
+    if batch:
+        batches.append(batch)
+    return batches
+
 
-def publication_to_text(
-    publications_dir, publication, txt_out_dir, log_file, downsample=1
+def list_issues(
+    publications_dir,
+    txt_out_dir,
+    downsample=1,
+    resume=False,
+    incremental=False,
+    inventory_file=None,
+    sample_size=None,
+    sample_bytes=None,
+    stratify=sampling.STRATIFY_PUBLICATION,
+    sample_seed=0,
+    issues_file=None,
+    shard_index=0,
+    shard_count=1,
 ):
     """
-    Converts issues of an XML publication to plaintext articles and
-    generates minimal metadata.
+    Lists the issues of XML publications to convert, with their costs
+    (see issue_cost), from an inventory (see
+    alto2txt.inventory.get_inventory), sampled if downsample is
+    greater than 1 or sample_size or sample_bytes are provided (see
+    alto2txt.sampling).
 
-    Loads XSLTs, checks publications_dir/publication exists then calls
-    xml_to_text.publication_to_text.
+    Issues recorded as converted in the manifest in txt_out_dir are
+    not listed but are counted as skipped_issues in the summaries of
+    their publications (see publications_to_text). If incremental,
+    issues are listed with their manifest records instead, and are
+    fingerprinted, and skipped if unchanged, when converted (see
+    alto2txt.xml_to_text.issue_to_text), so their files are hashed by
+    the workers rather than here.
 
-    :param publications_dir: Input directory with XML publications
+    :param publications dir: Input directory with XML publications
     :type publications_dir: str
-    :param publication: Local publication directory in publications_dir
-    :type publication: str
     :param txt_out_dir: Output directory for plaintext articles
     :type txt_out_dir: str
-    :param log_file: log file
-    :type log_file: str
-    :param downsample: Downsample, converting every Nth issue only
+    :param downsample: Downsample, converting 1 in N issues only (see
+    alto2txt.sampling)
     :type downsample: int
+    :param resume: Resume, skipping issues already converted
+    :type resume: bool
+    :param incremental: Convert only issues whose content changed
+    :type incremental: bool
+    :param inventory_file: Inventory file to reuse
+    :type inventory_file: str
+    :param sample_size: Number of issues to convert, or None for all
+    :type sample_size: int
+    :param sample_bytes: Total size, in bytes, of the input files of the
+    issues to convert, or None for all
+    :type sample_bytes: int
+    :param stratify: Stratification, one of
+    alto2txt.sampling.STRATIFICATIONS
+    :type stratify: str
+    :param sample_seed: Sampling seed
+    :type sample_seed: int
+    :param issues_file: File listing issues to convert, or "-" to read
+    them from stdin, or None for all issues (see
+    alto2txt.inventory.read_issue_paths)
+    :type issues_file: str
+    :param shard_index: Shard of issues to convert, from 0 (see
+    alto2txt.inventory.take_shard)
+    :type shard_index: int
+    :param shard_count: Number of shards
+    :type shard_count: int
+    :return: (cost, (publication, year, issue, issue_dir,
+    issue_inventory, issue_record)) tuples, where issue_inventory is
+    the inventory record of the issue and issue_record its manifest
+    record, if incremental and the issue is recorded, otherwise None,
+    and publication to summary of skipped issues
+    :rtype: tuple(list(tuple(int, tuple(str, str, str, str, dict,
+    dict))), dict(str: dict(str: int or float)))
     """
-    # This function will run in a separate process so reconfigure
-    # logging.
-    configure_logging(log_file)
-    xslts = xml.load_xslts()
-    publication_dir = os.path.join(publications_dir, publication)
-    if not os.path.isdir(publication_dir):
-        logger.warning("Unexpected file: %s", publication_dir)
-    publication_txt_out_dir = os.path.join(txt_out_dir, publication)
-    xml_to_text.publication_to_text(
-        publication_dir, publication_txt_out_dir, xslts, downsample
+    records = inventory.get_inventory(
+        publications_dir,
+        txt_out_dir,
+        inventory_file,
+        issues_file=issues_file,
+        shard_index=shard_index,
+        shard_count=shard_count,
     )
+    issue_manifest = manifest.Manifest(txt_out_dir, resume or incremental, incremental)
+    summaries = {}
+    issues = []
+    num_complete = 0
+    for issue_inventory in sampling.sample_records(
+        records, downsample, sample_size, sample_bytes, stratify, sample_seed
+    ):
+        publication = issue_inventory[inventory.INVENTORY_PUBLICATION]
+        year = issue_inventory[inventory.INVENTORY_YEAR]
+        issue = issue_inventory[inventory.INVENTORY_ISSUE]
+        issue_dir = os.path.join(
+            publications_dir, issue_inventory[inventory.INVENTORY_PATH]
+        )
+        input_sub_path = os.path.join(publication, year, issue)
+        issue_files = issue_inventory[inventory.INVENTORY_FILES]
+        issue_record = None
+        if incremental:
+            issue_record = issue_manifest.get_record(input_sub_path)
+        elif issue_manifest.is_complete(input_sub_path, issue_files):
+            num_complete += 1
+            summaries.setdefault(publication, stats.new_summary())[
+                "skipped_issues"
+            ] += 1
+            continue
+        issues.append(
+            (
+                issue_cost(issue_files),
+                (
+                    publication,
+                    year,
+                    issue,
+                    issue_dir,
+                    issue_inventory,
+                    issue_record,
+                ),
+            )
+        )
+    if num_complete:
+        logger.info("Skipping converted issues: %d", num_complete)
+    if (not issues) and (not num_complete):
+        logger.warning("No issues found: %s", publications_dir)
+    return issues, summaries
 
 
-def publications_to_text(publications_dir, txt_out_dir, log_file, downsample=1):
+def publications_to_text(
+    publications_dir,
+    txt_out_dir,
+    log_file,
+    downsample=1,
+    engine=xml_to_text.ENGINE_XSLT,
+    resume=False,
+    incremental=False,
+    output_format=sinks.OUTPUT_FILES,
+    index=False,
+    search=False,
+    profile=False,
+    writer_threads=0,
+    fsync=sinks.FSYNC_NONE,
+    count_words=False,
+    inventory_file=None,
+    sample_size=None,
+    sample_bytes=None,
+    stratify=sampling.STRATIFY_PUBLICATION,
+    sample_seed=0,
+    issues_file=None,
+    shard_index=0,
+    shard_count=1,
+    log_detail=logging_utils.LOG_DETAIL_FILE,
+    log_rate=None,
+):
     """
     Converts XML publications to plaintext articles and generates
     minimal metadata.
 
-    Each publication is processed concurrently.
+    Issues are processed concurrently. All issues are listed up front,
+    from an inventory of publications_dir (see list_issues), then
+    grouped into batches of similar cost (see batch_issues) which
+    are handed out to a process pool as processes become free, so a
+    publication with many issues is spread across all processes.
+
+    Converted issues are recorded in a manifest in txt_out_dir (see
+    alto2txt.manifest). If resume is True then issues recorded as
+    converted, whose input files are unchanged, are not dispatched. If
+    incremental is True then issues recorded as converted, whose input
+    files and referenced ALTO files have unchanged content, are not
+    dispatched, and the previous output of other issues is removed
+    before they are converted again.
+
+    If index is True then each batch of issues writes metadata index
+    rows to a part file, and the part files are merged into a metadata
+    index in txt_out_dir once all batches are converted (see
+    alto2txt.metadata_index). Likewise, if search is True then a
+    full-text search index is written (see alto2txt.search_index).
+
+    If profile is True then each batch of issues is profiled, and
+    the profiles are merged into profile tables in txt_out_dir once
+    all batches are converted (see alto2txt.profiling).
+
+    If writer_threads is not 0 then, in each process, articles are
+    written by that many writer threads while issues are converted
+    (see alto2txt.output_writer). Files written are synced to disk as
+    specified by fsync (see alto2txt.sinks.FSYNC_POLICIES). Words of
+    articles written as files by the XSLTs are counted only if
+    count_words is True (see alto2txt.xml_to_text.issue_to_text).
+
+    Worker processes send log records through a queue to a listener
+    in this process, which alone writes to the console and log_file.
+    Per-file messages are logged as specified by log_detail and
+    log_rate (see alto2txt.logging_utils).
 
     publications_dir is expected to hold XML for multiple
     publications, in the following structure:
@@ -93,23 +425,126 @@ def publications_to_text(publications_dir, txt_out_dir, log_file, downsample=1):
     :type txt_out_dir: str
     :param log_file: log file
     :type log_file: str
-    :param downsample: Downsample, converting every Nth issue only
+    :param downsample: Downsample, converting 1 in N issues only (see
+    alto2txt.sampling)
     :type downsample: int
+    :param engine: Engine, one of xml_to_text.ENGINES
+    :type engine: str
+    :param resume: Resume, skipping issues already converted
+    :type resume: bool
+    :param incremental: Convert only issues whose content changed
+    :type incremental: bool
+    :param output_format: Output format, one of
+    alto2txt.sinks.OUTPUT_FORMATS
+    :type output_format: str
+    :param index: Write metadata index
+    :type index: bool
+    :param search: Write full-text search index
+    :type search: bool
+    :param profile: Profile conversion
+    :type profile: bool
+    :param writer_threads: Number of writer threads per process
+    :type writer_threads: int
+    :param fsync: fsync policy, one of alto2txt.sinks.FSYNC_POLICIES
+    :type fsync: str
+    :param count_words: Count words of articles written by the XSLTs
+    :type count_words: bool
+    :param inventory_file: Inventory file to reuse, see
+    alto2txt.inventory.get_inventory
+    :type inventory_file: str
+    :param sample_size: Number of issues to convert, or None for all
+    :type sample_size: int
+    :param sample_bytes: Total size, in bytes, of the input files of the
+    issues to convert, or None for all
+    :type sample_bytes: int
+    :param stratify: Stratification, one of
+    alto2txt.sampling.STRATIFICATIONS
+    :type stratify: str
+    :param sample_seed: Sampling seed
+    :type sample_seed: int
+    :param issues_file: File listing issues to convert, or "-" to read
+    them from stdin, or None for all issues (see
+    alto2txt.inventory.read_issue_paths)
+    :type issues_file: str
+    :param shard_index: Shard of issues to convert, from 0 (see
+    alto2txt.inventory.take_shard)
+    :type shard_index: int
+    :param shard_count: Number of shards
+    :type shard_count: int
+    :param log_detail: Log detail, one of
+    alto2txt.logging_utils.LOG_DETAILS
+    :type log_detail: str
+    :param log_rate: Maximum number of per-file messages per second,
+    per process, or None for no limit
+    :type log_rate: float
+    :return: publication to summary (see alto2txt.stats)
+    :rtype: dict(str: dict(str: int or float))
     """
     logger.info("Processing: %s", publications_dir)
-    publications = os.listdir(publications_dir)
-    pool_size = min(multiprocessing.cpu_count(), len(publications))
+    issues, summaries = list_issues(
+        publications_dir,
+        txt_out_dir,
+        downsample,
+        resume,
+        incremental,
+        inventory_file,
+        sample_size,
+        sample_bytes,
+        stratify,
+        sample_seed,
+        issues_file,
+        shard_index,
+        shard_count,
+    )
+    if not issues:
+        return summaries
+    batches = batch_issues(issues, multiprocessing.cpu_count() * BATCHES_PER_PROCESS)
+    pool_size = min(multiprocessing.cpu_count(), len(batches))
     logger.info(
-        "Publications: %d CPUs: %d Process pool size: %d",
-        len(publications),
+        "Issues: %d Batches: %d CPUs: %d Process pool size: %d",
+        len(issues),
+        len(batches),
         multiprocessing.cpu_count(),
         pool_size,
     )
-    pool = Pool(pool_size)
-    for publication in os.listdir(publications_dir):
-        pool.apply_async(
-            publication_to_text,
-            args=(publications_dir, publication, txt_out_dir, log_file, downsample),
-        )
-    pool.close()
-    pool.join()
+    log_queue, listener = logging_utils.start_log_listener(log_file)
+    try:
+        with Pool(
+            pool_size,
+            initializer=worker.init_worker,
+            initargs=(log_file, log_queue, log_detail, log_rate),
+        ) as pool:
+            for batch_summaries in pool.imap_unordered(
+                partial(
+                    issues_to_text,
+                    txt_out_dir=txt_out_dir,
+                    engine=engine,
+                    incremental=incremental,
+                    output_format=output_format,
+                    index=index,
+                    search=search,
+                    profile=profile,
+                    writer_threads=writer_threads,
+                    fsync=fsync,
+                    count_words=count_words,
+                ),
+                batches,
+            ):
+                stats.add_summaries(summaries, batch_summaries)
+            # Let workers exit, flushing their queued records, rather
+            # than be terminated.
+            pool.close()
+            pool.join()
+    finally:
+        listener.stop()
+    if index:
+        from alto2txt import metadata_index
+
+        metadata_index.merge_index(txt_out_dir)
+    if search:
+        from alto2txt import search_index
+
+        search_index.merge_search_index(txt_out_dir)
+    if profile:
+        profiling.merge_profiles(txt_out_dir)
+    return summaries
@@ -0,0 +1,297 @@
+"""
+Output writer, writing sinks asynchronously so that converting issues
+is not held up by writing articles, for example to a network
+filesystem.
+
+An OutputWriter has a pool of writer threads. Each sink it opens is
+wrapped in an AsyncSink, which gathers articles, in memory, into
+batches and queues them to the writer thread assigned to the sink,
+followed by closing (or aborting) the sink and any functions to be
+called once its articles are written, such as recording the issue in
+the manifest. Each sink is written by a single thread, so its articles
+are written in order, while the articles of different issues can be
+written concurrently.
+
+The size of the articles queued is capped (see WRITER_MAX_BYTES). When
+the cap is reached, conversion blocks until enough articles have been
+written, so memory use stays bounded however slow writing is.
+
+Articles converted by the XSLTs are written by the XSLTs to a
+temporary directory then read and queued (see
+alto2txt.sinks.files_output_dir).
+"""
+
+import logging
+import queue
+import threading
+
+from alto2txt import sinks
+
+logger = logging.getLogger(__name__)
+""" Module-level logger. """
+
+WRITER_MAX_BYTES = 64 * 1024 * 1024
+""" Maximum size, in bytes, of the articles queued for writing. """
+WRITER_BATCH_ARTICLES = 32
+""" Number of articles queued together for writing. """
+
+
+class AsyncSink(sinks.Sink):
+    """
+    Sink queueing articles for writing to another sink by a writer
+    thread of an OutputWriter.
+
+    Articles are counted, and indexed, as they are queued. time_write
+    is the time spent queueing articles, including any time blocked
+    until queued articles were written.
+
+    If writing fails then the sink being written is aborted, the error
+    is logged, and its remaining articles, and functions to be called
+    once its articles are written, are discarded.
+
+    :param sink: Sink to which to write articles
+    :type sink: alto2txt.sinks.Sink
+    :param writer: Output writer
+    :type writer: OutputWriter
+    """
+
+    def __init__(self, sink, writer):
+        # Articles converted by the XSLTs are written to a temporary
+        # directory then queued, so output_dir is None.
+        super().__init__(None, sink.path)
+        self.sink = sink
+        self.writer = writer
+        self.queue = writer.assign_queue()
+        self.batch = []
+        """ Articles not yet queued, as (stub, text, metadata) tuples. """
+        self.batch_bytes = 0
+        """ Size, in bytes, of articles not yet queued. """
+        self.error = None
+        """ Error raised when writing, if any. """
+
+    def write_entry(self, stub, text, metadata):
+        self.batch.append((stub, text, metadata))
+        self.batch_bytes += len(text) + len(metadata)
+        if len(self.batch) >= self.writer.batch_articles:
+            self.flush()
+
+    def flush(self):
+        """
+        Queues articles not yet queued.
+        """
+        if self.batch:
+            self.submit(self.write_batch, [self.batch], self.batch_bytes)
+            self.batch = []
+            self.batch_bytes = 0
+
+    def submit(self, function, args=None, size=0):
+        """
+        Queues a call to a function, to write the sink, for the writer
+        thread.
+
+        :param function: Function
+        :type function: callable
+        :param args: Arguments
+        :type args: list
+        :param size: Size, in bytes, of the data queued
+        :type size: int
+        """
+        self.writer.submit(self.queue, self.run, [function, args or []], size)
+
+    def run(self, function, args):
+        """
+        Calls a function, to write the sink, on the writer thread,
+        unless writing has already failed.
+
+        :param function: Function
+        :type function: callable
+        :param args: Arguments
+        :type args: list
+        """
+        if self.error is not None:
+            return
+        try:
+            function(*args)
+        except Exception as e:
+            self.error = e
+            logger.error("%s failed to write: %s", self.path, str(e))
+            try:
+                self.sink.abort()
+            except Exception as abort_error:
+                logger.error("%s failed to abort: %s", self.path, str(abort_error))
+
+    def write_batch(self, batch):
+        """
+        Writes a batch of articles to the sink, on the writer thread.
+
+        :param batch: (stub, text, metadata) tuples
+        :type batch: list(tuple(str, bytes, bytes))
+        """
+        for stub, text, metadata in batch:
+            self.sink.write_entry(stub, text, metadata)
+
+    def remove_articles(self):
+        # Called before any articles are written so remove them now.
+        return self.sink.remove_articles()
+
+    def on_written(self, function):
+        self.submit(function)
+
+    def close(self):
+        """
+        Queues the remaining articles then the closing of the sink.
+        """
+        self.flush()
+        self.submit(self.sink.close)
+
+    def abort(self):
+        """
+        Discards articles not yet queued and queues the aborting of the
+        sink.
+        """
+        self.batch = []
+        self.batch_bytes = 0
+        self.submit(self.sink.abort)
+
+
+class OutputWriter:
+    """
+    Output writer, setting the fsync policy of sinks and, if it has
+    writer threads, writing them asynchronously. Must be closed, to
+    wait for all articles to be written.
+
+    :param num_threads: Number of writer threads. If 0 then sinks are
+    written synchronously.
+    :type num_threads: int
+    :param fsync: fsync policy, one of alto2txt.sinks.FSYNC_POLICIES
+    :type fsync: str
+    :param max_bytes: Maximum size, in bytes, of the articles queued
+    :type max_bytes: int
+    :param batch_articles: Number of articles queued together
+    :type batch_articles: int
+    """
+
+    def __init__(
+        self,
+        num_threads=1,
+        fsync=sinks.FSYNC_NONE,
+        max_bytes=WRITER_MAX_BYTES,
+        batch_articles=WRITER_BATCH_ARTICLES,
+    ):
+        self.fsync = fsync
+        self.max_bytes = max_bytes
+        self.batch_articles = batch_articles
+        self.queued_bytes = 0
+        """ Size, in bytes, of the data queued. """
+        self.condition = threading.Condition()
+        self.queues = [queue.Queue() for _ in range(num_threads)]
+        self.next_queue = 0
+        self.threads = [
+            threading.Thread(
+                target=self.drain,
+                args=(task_queue,),
+                name="alto2txt-writer-{}".format(index),
+                daemon=True,
+            )
+            for index, task_queue in enumerate(self.queues)
+        ]
+        for thread in self.threads:
+            thread.start()
+
+    def open(self, sink):
+        """
+        Sets the fsync policy of a sink and, if there are writer
+        threads, wraps it to be written asynchronously.
+
+        :param sink: Sink
+        :type sink: alto2txt.sinks.Sink
+        :return: sink
+        :rtype: alto2txt.sinks.Sink
+        """
+        sink.fsync = self.fsync
+        if not self.queues:
+            return sink
+        return AsyncSink(sink, self)
+
+    def assign_queue(self):
+        """
+        Assigns the queue of a writer thread, in turn.
+
+        :return: queue
+        :rtype: queue.Queue
+        """
+        task_queue = self.queues[self.next_queue]
+        self.next_queue = (self.next_queue + 1) % len(self.queues)
+        return task_queue
+
+    def submit(self, task_queue, function, args, size):
+        """
+        Queues a call to a function for a writer thread, blocking while
+        the data queued would exceed max_bytes.
+
+        :param task_queue: Queue of writer thread
+        :type task_queue: queue.Queue
+        :param function: Function
+        :type function: callable
+        :param args: Arguments
+        :type args: list
+        :param size: Size, in bytes, of the data queued
+        :type size: int
+        """
+        with self.condition:
+            # Admit data larger than max_bytes once the queues are empty.
+            while self.queued_bytes > 0 and self.queued_bytes + size > self.max_bytes:
+                self.condition.wait()
+            self.queued_bytes += size
+        task_queue.put((function, args, size))
+
+    def drain(self, task_queue):
+        """
+        Calls functions queued for a writer thread, until None is
+        queued.
+
+        :param task_queue: Queue of writer thread
+        :type task_queue: queue.Queue
+        """
+        while True:
+            task = task_queue.get()
+            if task is None:
+                return
+            function, args, size = task
+            try:
+                function(*args)
+            except Exception as e:
+                logger.error("Writer failed: %s", str(e))
+            finally:
+                with self.condition:
+                    self.queued_bytes -= size
+                    self.condition.notify_all()
+
+    def close(self):
+        """
+        Waits for all queued articles to be written and stops the
+        writer threads.
+        """
+        for task_queue in self.queues:
+            task_queue.put(None)
+        for thread in self.threads:
+            thread.join()
+        self.threads = []
+        self.queues = []
+
+
+def open_writer(num_threads=0, fsync=sinks.FSYNC_NONE):
+    """
+    Opens an output writer, if one is needed.
+
+    :param num_threads: Number of writer threads
+    :type num_threads: int
+    :param fsync: fsync policy, one of alto2txt.sinks.FSYNC_POLICIES
+    :type fsync: str
+    :return: output writer, or None if num_threads is 0 and fsync is
+    alto2txt.sinks.FSYNC_NONE
+    :rtype: OutputWriter
+    """
+    if not num_threads and fsync == sinks.FSYNC_NONE:
+        return None
+    return OutputWriter(num_threads, fsync)
@@ -0,0 +1,206 @@
+"""
+Profiling of conversion, attributing time to Python functions, via
+cProfile, and to the templates of each XSLT, via libxslt profiling.
+
+Each process converting issues profiles its work with a Profiler and
+writes part files to an alto2txt_profile_parts directory in the output
+directory. Once all issues are converted, merge_profiles merges the
+part files into:
+
+* alto2txt_profile.prof: cProfile statistics, which can be loaded
+  with pstats or viewers such as snakeviz.
+* alto2txt_profile.txt: tables of the Python functions with the most
+  cumulative time and, for each XSLT, the time spent in each template.
+"""
+
+import cProfile
+import json
+import logging
+import os
+import os.path
+import pstats
+import uuid
+
+logger = logging.getLogger(__name__)
+""" Module-level logger. """
+
+PROFILE_FILE = "alto2txt_profile.txt"
+""" Profile tables file name, in output directory. """
+PROFILE_STATS_FILE = "alto2txt_profile.prof"
+""" cProfile statistics file name, in output directory. """
+PROFILE_PARTS_DIR = "alto2txt_profile_parts"
+""" Profile part files directory name, in output directory. """
+PROFILE_FUNCTIONS = 40
+""" Number of Python functions listed in profile tables. """
+XSLT_TICKS_PER_SECOND = 100000
+""" Units of libxslt template times (XSLT_TIMESTAMP_TICS_PER_SEC). """
+
+
+class Profiler:
+    """
+    Profiler of the work of a process, written to new part files.
+
+    :param txt_out_dir: Output directory for plaintext articles
+    :type txt_out_dir: str
+    """
+
+    def __init__(self, txt_out_dir):
+        self.part_stub = os.path.join(
+            txt_out_dir, PROFILE_PARTS_DIR, "part-{}".format(uuid.uuid4().hex)
+        )
+        self.profile = cProfile.Profile()
+        self.templates = {}
+        """ XSLT name to (match, name, mode) to [calls, ticks]. """
+        self.enabled = False
+
+    def enable(self):
+        """
+        Starts profiling Python functions.
+        """
+        self.profile.enable()
+        self.enabled = True
+
+    def disable(self):
+        """
+        Stops profiling Python functions.
+        """
+        if self.enabled:
+            self.profile.disable()
+            self.enabled = False
+
+    def add_xslt_profile(self, xslt_name, xslt_profile):
+        """
+        Adds template times from the profile of an XSLT run.
+
+        :param xslt_name: XSLT name e.g. extract_text_mets18.xslt
+        :type xslt_name: str
+        :param xslt_profile: Profile from the xslt_profile attribute of
+        the result of an XSLT called with profile_run=True
+        :type xslt_profile: lxml.etree._ElementTree
+        """
+        templates = self.templates.setdefault(xslt_name, {})
+        # libxslt builds the profile outside of lxml's tag name dictionary
+        # so tag lookups, e.g. iter("template"), do not find its elements.
+        for template in xslt_profile.getroot():
+            if template.tag != "template":
+                continue
+            key = (
+                template.get("match", ""),
+                template.get("name", ""),
+                template.get("mode", ""),
+            )
+            totals = templates.setdefault(key, [0, 0])
+            totals[0] += int(template.get("calls", 0))
+            totals[1] += int(template.get("time", 0))
+
+    def close(self):
+        """
+        Stops profiling and writes part files.
+        """
+        self.disable()
+        os.makedirs(os.path.dirname(self.part_stub), exist_ok=True)
+        self.profile.dump_stats(self.part_stub + ".prof")
+        with open(self.part_stub + ".json", "w", encoding="utf-8") as f:
+            json.dump(
+                [
+                    [xslt_name, match, name, mode, calls, ticks]
+                    for xslt_name, templates in self.templates.items()
+                    for (match, name, mode), (calls, ticks) in templates.items()
+                ],
+                f,
+            )
+
+
+def template_label(match, name, mode):
+    """
+    Gets label of an XSLT template.
+
+    :param match: match attribute
+    :type match: str
+    :param name: name attribute
+    :type name: str
+    :param mode: mode attribute
+    :type mode: str
+    :return: label e.g. match="TextLine"
+    :rtype: str
+    """
+    return " ".join(
+        '{}="{}"'.format(attribute, value)
+        for attribute, value in [("match", match), ("name", name), ("mode", mode)]
+        if value
+    )
+
+
+def write_template_table(f, xslt_name, templates):
+    """
+    Writes table of the time spent in each template of an XSLT, as
+    reported by libxslt, most time first.
+
+    :param f: File
+    :type f: io.TextIOBase
+    :param xslt_name: XSLT name
+    :type xslt_name: str
+    :param templates: (match, name, mode) to [calls, ticks]
+    :type templates: dict(tuple(str, str, str): list(int))
+    """
+    total = max(sum(ticks for _, ticks in templates.values()), 1)
+    f.write("\nXSLT templates: {}\n\n".format(xslt_name))
+    f.write(
+        "{:>10} {:>12} {:>12} {:>6}  {}\n".format(
+            "calls", "time (ms)", "avg (ms)", "%", "template"
+        )
+    )
+    rows = sorted(templates.items(), key=lambda item: item[1][1], reverse=True)
+    for (match, name, mode), (calls, ticks) in rows:
+        milliseconds = ticks * 1000 / XSLT_TICKS_PER_SECOND
+        f.write(
+            "{:>10} {:>12.2f} {:>12.4f} {:>6.1f}  {}\n".format(
+                calls,
+                milliseconds,
+                milliseconds / max(calls, 1),
+                100 * ticks / total,
+                template_label(match, name, mode),
+            )
+        )
+
+
+def merge_profiles(txt_out_dir):
+    """
+    Merges profile part files into profile statistics and tables, then
+    removes them.
+
+    :param txt_out_dir: Output directory for plaintext articles
+    :type txt_out_dir: str
+    :return: profile tables file, or None if there are no part files
+    :rtype: str
+    """
+    parts_dir = os.path.join(txt_out_dir, PROFILE_PARTS_DIR)
+    if not os.path.isdir(parts_dir):
+        return None
+    part_files = sorted(os.path.join(parts_dir, name) for name in os.listdir(parts_dir))
+    stats_files = [name for name in part_files if name.endswith(".prof")]
+    templates = {}
+    for part_file in part_files:
+        if not part_file.endswith(".json"):
+            continue
+        with open(part_file, encoding="utf-8") as f:
+            for xslt_name, match, name, mode, calls, ticks in json.load(f):
+                totals = templates.setdefault(xslt_name, {}).setdefault(
+                    (match, name, mode), [0, 0]
+                )
+                totals[0] += calls
+                totals[1] += ticks
+    profile_file = os.path.join(txt_out_dir, PROFILE_FILE)
+    with open(profile_file, "w", encoding="utf-8") as f:
+        if stats_files:
+            f.write("Python functions: {} processes\n".format(len(stats_files)))
+            stats = pstats.Stats(*stats_files, stream=f)
+            stats.dump_stats(os.path.join(txt_out_dir, PROFILE_STATS_FILE))
+            stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(PROFILE_FUNCTIONS)
+        for xslt_name in sorted(templates):
+            write_template_table(f, xslt_name, templates[xslt_name])
+    for part_file in part_files:
+        os.remove(part_file)
+    os.rmdir(parts_dir)
+    logger.info("Profile: %s", profile_file)
+    return profile_file
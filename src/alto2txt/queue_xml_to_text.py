@@ -0,0 +1,405 @@
+"""
+Functions to convert XML (in METS 1.8/ALTO 1.4, METS 1.3/ALTO 1.4, BLN
+or UKP format) publications to plaintext articles and generate minimal
+metadata using a work queue shared by any number of processes, on any
+number of nodes with a shared filesystem, without Spark.
+
+Each process, for example a batch job on each node of a cluster, runs
+publications_to_text with the same publications_dir and txt_out_dir,
+and claims issues from a work queue in txt_out_dir (see
+alto2txt.work_queue) until every issue is converted.
+"""
+
+import logging
+import os.path
+import time
+from functools import partial
+
+from alto2txt import (
+    manifest,
+    output_writer,
+    profiling,
+    sampling,
+    sinks,
+    work_queue,
+    xml,
+    xml_to_text,
+)
+from alto2txt.multiprocess_xml_to_text import list_issues
+
+logger = logging.getLogger(__name__)
+""" Module-level logger. """
+
+QUEUE_POLL_SECONDS = 5
+"""
+Time, in seconds, to wait before claiming issues again while other
+workers hold leases on all the issues not yet converted.
+"""
+QUEUE_COMPLETE_ISSUES = 100
+"""
+Number of issues converted after which their output is flushed and
+they are recorded as converted in the queue.
+"""
+
+
+class QueueWorker:
+    """
+    Worker converting issues claimed from a work queue.
+
+    An issue is recorded as converted in the queue only once its
+    output, index rows and profile are written, so the output writer,
+    index writers and profiler are closed every QUEUE_COMPLETE_ISSUES
+    issues and whenever no issue can be claimed, and opened again only
+    once another issue is claimed, so a worker waiting for other
+    workers writes no part files. Until then the issues remain leased
+    by this worker, so the queue is not finished until every worker
+    has written its part files.
+
+    :param queue: Work queue
+    :type queue: alto2txt.work_queue.WorkQueue
+    :param txt_out_dir: Output directory for plaintext articles
+    :type txt_out_dir: str
+    :param xslts: XSLTs to convert XML to plaintext
+    :type xslts: dict(str: lxml.etree.XSLT)
+    :param engine: Engine, one of xml_to_text.ENGINES
+    :type engine: str
+    :param incremental: Fingerprint issues and remove their previous
+    output before converting them
+    :type incremental: bool
+    :param output_format: Output format, one of
+    alto2txt.sinks.OUTPUT_FORMATS
+    :type output_format: str
+    :param index: Write metadata index rows to part files (see
+    alto2txt.metadata_index)
+    :type index: bool
+    :param search: Write search index rows to part files (see
+    alto2txt.search_index)
+    :type search: bool
+    :param profile: Profile conversion, writing part files (see
+    alto2txt.profiling)
+    :type profile: bool
+    :param writer_threads: Number of writer threads (see
+    alto2txt.output_writer)
+    :type writer_threads: int
+    :param fsync: fsync policy, one of alto2txt.sinks.FSYNC_POLICIES
+    :type fsync: str
+    :param count_words: Count words of articles written by the XSLTs
+    (see alto2txt.xml_to_text.issue_to_text)
+    :type count_words: bool
+    """
+
+    def __init__(
+        self,
+        queue,
+        txt_out_dir,
+        xslts,
+        engine=xml_to_text.ENGINE_XSLT,
+        incremental=False,
+        output_format=sinks.OUTPUT_FILES,
+        index=False,
+        search=False,
+        profile=False,
+        writer_threads=0,
+        fsync=sinks.FSYNC_NONE,
+        count_words=False,
+    ):
+        self.queue = queue
+        self.txt_out_dir = txt_out_dir
+        self.xslts = xslts
+        self.engine = engine
+        self.output_format = output_format
+        self.index = index
+        self.search = search
+        self.profile = profile
+        self.writer_threads = writer_threads
+        self.fsync = fsync
+        self.count_words = count_words
+        self.issue_manifest = manifest.Manifest(txt_out_dir, incremental=incremental)
+        self.issue_index = None
+        self.profiler = None
+        self.writer = None
+        self.is_open = False
+        """ True if the output writer, index writer and profiler are open. """
+        self.converted = []
+        """ (issue ID, summary) of issues not yet recorded as converted. """
+        self.num_issues = 0
+
+    def open(self):
+        """
+        Opens the output writer, index writer and profiler.
+        """
+        if self.index:
+            from alto2txt import metadata_index
+
+            self.issue_index = metadata_index.IndexWriter(self.txt_out_dir)
+        if self.search:
+            from alto2txt import search_index
+
+            self.issue_index = search_index.add_search_index(
+                self.issue_index, self.txt_out_dir
+            )
+        if self.profile:
+            self.profiler = profiling.Profiler(self.txt_out_dir)
+            self.profiler.enable()
+        self.writer = output_writer.open_writer(self.writer_threads, self.fsync)
+        self.is_open = True
+
+    def close(self):
+        """
+        Closes the output writer, index writer and profiler, then
+        records the issues converted in the queue.
+        """
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+        if self.issue_index is not None:
+            self.issue_index.close()
+            self.issue_index = None
+        if self.profiler is not None:
+            self.profiler.close()
+            self.profiler = None
+        self.is_open = False
+        if self.converted:
+            issue_ids, summaries = zip(*self.converted)
+            self.queue.complete(issue_ids, summaries)
+            self.converted = []
+
+    def convert(self, issue_id, issue):
+        """
+        Converts a claimed issue, calling xml_to_text.issue_to_text,
+        opening the output writer, index writer and profiler if not
+        open. If conversion fails then the issue is recorded as failed.
+
+        :param issue_id: Issue ID
+        :type issue_id: int
+        :param issue: (publication, year, issue, issue_dir,
+        issue_inventory, issue_record) tuple
+        :type issue: tuple(str, str, str, str, dict, dict)
+        """
+        publication, year, issue, issue_dir, issue_inventory, issue_record = issue
+        if not self.is_open:
+            self.open()
+        try:
+            summary = xml_to_text.issue_to_text(
+                publication,
+                year,
+                issue,
+                issue_dir,
+                os.path.join(self.txt_out_dir, publication),
+                self.xslts,
+                self.engine,
+                self.issue_manifest,
+                self.output_format,
+                self.issue_index,
+                self.profiler,
+                self.writer,
+                issue_inventory,
+                issue_record=issue_record,
+                count_words=self.count_words,
+            )
+        except Exception as e:
+            logger.error("%s failed to convert: %s", issue_dir, str(e))
+            self.queue.fail(issue_id, str(e))
+            return
+        self.converted.append((issue_id, summary))
+        self.num_issues += 1
+        if len(self.converted) >= QUEUE_COMPLETE_ISSUES:
+            self.close()
+
+    def run(self, poll_seconds=QUEUE_POLL_SECONDS):
+        """
+        Claims and converts issues until every issue in the queue is
+        converted or failed.
+
+        :param poll_seconds: Time, in seconds, to wait before claiming
+        issues again while other workers hold leases on all the issues
+        not yet converted
+        :type poll_seconds: float
+        :return: number of issues converted by this worker
+        :rtype: int
+        """
+        try:
+            while True:
+                claimed = self.queue.claim()
+                if claimed is not None:
+                    self.convert(*claimed)
+                    continue
+                self.close()
+                if self.queue.is_finished():
+                    break
+                time.sleep(poll_seconds)
+        finally:
+            self.close()
+        return self.num_issues
+
+
+def publications_to_text(
+    publications_dir,
+    txt_out_dir,
+    downsample=1,
+    engine=xml_to_text.ENGINE_XSLT,
+    resume=False,
+    incremental=False,
+    output_format=sinks.OUTPUT_FILES,
+    index=False,
+    search=False,
+    profile=False,
+    writer_threads=0,
+    fsync=sinks.FSYNC_NONE,
+    count_words=False,
+    inventory_file=None,
+    sample_size=None,
+    sample_bytes=None,
+    stratify=sampling.STRATIFY_PUBLICATION,
+    sample_seed=0,
+    issues_file=None,
+    shard_index=0,
+    shard_count=1,
+    lease_seconds=work_queue.QUEUE_LEASE_SECONDS,
+    poll_seconds=QUEUE_POLL_SECONDS,
+):
+    """
+    Converts XML publications to plaintext articles and generates
+    minimal metadata, as one of any number of workers sharing a work
+    queue in txt_out_dir/alto2txt_queue.sqlite.
+
+    The first worker to open the queue lists the issues, as for
+    multiprocess_xml_to_text.publications_to_text (see
+    multiprocess_xml_to_text.list_issues), so downsample, resume,
+    incremental, inventory_file, sample_size, sample_bytes, stratify
+    and sample_seed are those of that worker. Every worker then claims
+    and converts issues (see QueueWorker) until every issue is
+    converted or failed. Issues leased by a worker that stops are
+    claimed by another once their leases, of lease_seconds, expire.
+
+    If index, search or profile are True then each worker writes part
+    files, and the last worker to finish merges them (see
+    alto2txt.metadata_index, alto2txt.search_index and
+    alto2txt.profiling).
+
+    Once all issues are converted, the queue is finished, and further
+    runs with the same txt_out_dir convert nothing until the queue file
+    is removed.
+
+    publications_dir is expected to have the structure described in
+    multiprocess_xml_to_text.publications_to_text.
+
+    :param publications dir: Input directory with XML publications
+    :type publications_dir: str
+    :param txt_out_dir: Output directory for plaintext articles
+    :type txt_out_dir: str
+    :param downsample: Downsample, converting 1 in N issues only (see
+    alto2txt.sampling)
+    :type downsample: int
+    :param engine: Engine, one of xml_to_text.ENGINES
+    :type engine: str
+    :param resume: Resume, skipping issues already converted
+    :type resume: bool
+    :param incremental: Convert only issues whose content changed
+    :type incremental: bool
+    :param output_format: Output format, one of
+    alto2txt.sinks.OUTPUT_FORMATS
+    :type output_format: str
+    :param index: Write metadata index
+    :type index: bool
+    :param search: Write full-text search index
+    :type search: bool
+    :param profile: Profile conversion
+    :type profile: bool
+    :param writer_threads: Number of writer threads
+    :type writer_threads: int
+    :param fsync: fsync policy, one of alto2txt.sinks.FSYNC_POLICIES
+    :type fsync: str
+    :param count_words: Count words of articles written by the XSLTs
+    (see alto2txt.xml_to_text.issue_to_text)
+    :type count_words: bool
+    :param inventory_file: Inventory file to reuse, see
+    alto2txt.inventory.get_inventory
+    :type inventory_file: str
+    :param sample_size: Number of issues to convert, or None for all
+    :type sample_size: int
+    :param sample_bytes: Total size, in bytes, of the input files of the
+    issues to convert, or None for all
+    :type sample_bytes: int
+    :param stratify: Stratification, one of
+    alto2txt.sampling.STRATIFICATIONS
+    :type stratify: str
+    :param sample_seed: Sampling seed
+    :type sample_seed: int
+    :param issues_file: File listing issues to convert, or "-" to read
+    them from stdin, or None for all issues (see
+    alto2txt.inventory.read_issue_paths)
+    :type issues_file: str
+    :param shard_index: Shard of issues to convert, from 0 (see
+    alto2txt.inventory.take_shard)
+    :type shard_index: int
+    :param shard_count: Number of shards
+    :type shard_count: int
+    :param lease_seconds: Duration, in seconds, of a lease on an issue
+    :type lease_seconds: float
+    :param poll_seconds: Time, in seconds, to wait before claiming
+    issues again while other workers hold leases on all the issues
+    not yet converted
+    :type poll_seconds: float
+    :return: publication to summary of all issues in the queue,
+    whichever worker converted them (see alto2txt.stats)
+    :rtype: dict(str: dict(str: int or float))
+    """
+    logger.info("Processing: %s", publications_dir)
+    queue = work_queue.WorkQueue(
+        os.path.join(txt_out_dir, work_queue.QUEUE_FILE), lease_seconds
+    )
+    logger.info("Worker: %s", queue.worker_id)
+    try:
+        queue.start_renewing()
+        queue.populate(
+            partial(
+                list_issues,
+                publications_dir,
+                txt_out_dir,
+                downsample,
+                resume,
+                incremental,
+                inventory_file,
+                sample_size,
+                sample_bytes,
+                stratify,
+                sample_seed,
+                issues_file,
+                shard_index,
+                shard_count,
+            ),
+            poll_seconds,
+        )
+        worker = QueueWorker(
+            queue,
+            txt_out_dir,
+            xml.load_xslts(),
+            engine,
+            incremental,
+            output_format,
+            index,
+            search,
+            profile,
+            writer_threads,
+            fsync,
+            count_words,
+        )
+        num_issues = worker.run(poll_seconds)
+        logger.info("Issues converted by %s: %d", queue.worker_id, num_issues)
+        queue.stop()
+        if queue.finalise():
+            if index:
+                from alto2txt import metadata_index
+
+                metadata_index.merge_index(txt_out_dir)
+            if search:
+                from alto2txt import search_index
+
+                search_index.merge_search_index(txt_out_dir)
+            if profile:
+                profiling.merge_profiles(txt_out_dir)
+        logger.info("Queue: %s", str(queue.count_states()))
+        return queue.get_summaries()
+    finally:
+        queue.close()
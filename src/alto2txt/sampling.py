@@ -0,0 +1,234 @@
+"""
+Deterministic, stratified sampling of issues.
+
+Issues are selected by a hash of their input sub-path, e.g.
+0002647/1824/0217, and a seed, rather than by the order in which they
+are listed, so a sample is the same whichever process type is used
+and however the filesystem orders directories, and a different seed
+gives a different, but equally reproducible, sample.
+
+Issues are grouped into strata, by publication (the default), by
+publication and year, or not at all (see STRATIFICATIONS), and issues
+are taken from each stratum in hash order:
+
+* downsample N takes 1 in N issues of each stratum, rounded down.
+* sample_size takes a number of issues in total, allocated to strata
+  in proportion to their numbers of issues.
+* sample_bytes takes issues up to a total size, in bytes, of input
+  files, allocated to strata in proportion to their sizes. Within a
+  stratum, issues are taken until the next would exceed its budget.
+
+These can be combined, and are applied in that order. Issues are
+sampled from the inventory (see alto2txt.inventory), before any file
+is parsed, so the cost of a run is proportional to the sample.
+"""
+
+import hashlib
+import re
+
+from alto2txt import inventory
+
+STRATIFY_NONE = "none"
+""" Stratification sampling from all issues together. """
+STRATIFY_PUBLICATION = "publication"
+""" Stratification sampling from the issues of each publication. """
+STRATIFY_YEAR = "year"
+""" Stratification sampling from the issues of each publication year. """
+STRATIFICATIONS = [STRATIFY_PUBLICATION, STRATIFY_YEAR, STRATIFY_NONE]
+""" Stratifications. """
+BYTES_UNITS = {"": 1, "K": 1024, "M": 1024**2, "G": 1024**3, "T": 1024**4}
+""" Multipliers for suffixes of sizes in bytes (see parse_bytes). """
+
+
+def parse_bytes(value):
+    """
+    Parses a size in bytes, with an optional K, M, G or T (binary)
+    suffix e.g. 500M.
+
+    :param value: Size
+    :type value: str
+    :return: size, in bytes
+    :rtype: int
+    :raises ValueError: if value is not a size
+    """
+    match = re.fullmatch(r"\s*(\d+)\s*([KMGT]?)i?B?\s*", value, re.IGNORECASE)
+    if match is None:
+        raise ValueError("Invalid size: {}".format(value))
+    return int(match.group(1)) * BYTES_UNITS[match.group(2).upper()]
+
+
+def issue_hash(publication, year, issue, seed=0):
+    """
+    Gets the hash by which an issue is sampled.
+
+    :param publication: Publication e.g. 0002647
+    :type publication: str
+    :param year: Year e.g. 1824
+    :type year: str
+    :param issue: Issue e.g. 0217
+    :type issue: str
+    :param seed: Seed
+    :type seed: int
+    :return: hash
+    :rtype: int
+    """
+    digest = hashlib.blake2b(
+        "{}/{}/{}".format(publication, year, issue).encode("utf-8"),
+        digest_size=8,
+        key=str(seed).encode("utf-8"),
+    )
+    return int.from_bytes(digest.digest(), "big")
+
+
+def get_stratum(publication, year, stratify=STRATIFY_PUBLICATION):
+    """
+    Gets the stratum of an issue.
+
+    :param publication: Publication e.g. 0002647
+    :type publication: str
+    :param year: Year e.g. 1824
+    :type year: str
+    :param stratify: Stratification, one of STRATIFICATIONS
+    :type stratify: str
+    :return: stratum
+    :rtype: tuple(str)
+    """
+    if stratify == STRATIFY_YEAR:
+        return (publication, year)
+    if stratify == STRATIFY_PUBLICATION:
+        return (publication,)
+    return ()
+
+
+def allocate(totals, target):
+    """
+    Allocates a target to strata in proportion to their totals, by the
+    largest remainder method, so the allocations sum to target (or to
+    the sum of totals, if less).
+
+    :param totals: stratum to total
+    :type totals: dict(tuple(str): int)
+    :param target: Target
+    :type target: int
+    :return: stratum to allocation
+    :rtype: dict(tuple(str): int)
+    """
+    total = sum(totals.values())
+    if total <= target:
+        return dict(totals)
+    shares = {stratum: target * value / total for stratum, value in totals.items()}
+    allocations = {stratum: int(share) for stratum, share in shares.items()}
+    remainder = target - sum(allocations.values())
+    by_remainder = sorted(
+        shares, key=lambda stratum: (allocations[stratum] - shares[stratum], stratum)
+    )
+    for stratum in by_remainder[:remainder]:
+        allocations[stratum] += 1
+    return allocations
+
+
+def sample_issues(
+    issues,
+    downsample=1,
+    sample_size=None,
+    sample_bytes=None,
+    stratify=STRATIFY_PUBLICATION,
+    seed=0,
+):
+    """
+    Samples issues.
+
+    :param issues: (publication, year, issue, num_bytes, ...) tuples,
+    where num_bytes is the size of the issue's input files and any
+    further items are kept
+    :type issues: list(tuple)
+    :param downsample: Downsample, taking 1 in N issues of each stratum
+    :type downsample: int
+    :param sample_size: Number of issues to take, or None for all
+    :type sample_size: int
+    :param sample_bytes: Total size, in bytes, of the input files of the
+    issues to take, or None for all
+    :type sample_bytes: int
+    :param stratify: Stratification, one of STRATIFICATIONS
+    :type stratify: str
+    :param seed: Seed
+    :type seed: int
+    :return: issues taken, in the order of issues
+    :rtype: list(tuple)
+    """
+    strata = {}
+    for index, (publication, year, issue, num_bytes, *_) in enumerate(issues):
+        strata.setdefault(get_stratum(publication, year, stratify), []).append(
+            (issue_hash(publication, year, issue, seed), index, num_bytes)
+        )
+    for stratum in strata.values():
+        stratum.sort()
+    if downsample > 1:
+        strata = {
+            key: stratum[: len(stratum) // downsample]
+            for key, stratum in strata.items()
+        }
+    if sample_size is not None:
+        allocations = allocate(
+            {key: len(stratum) for key, stratum in strata.items()}, sample_size
+        )
+        strata = {key: stratum[: allocations[key]] for key, stratum in strata.items()}
+    if sample_bytes is not None:
+        allocations = allocate(
+            {key: sum(item[2] for item in stratum) for key, stratum in strata.items()},
+            sample_bytes,
+        )
+        for key, stratum in strata.items():
+            num_bytes = 0
+            for num_taken, item in enumerate(stratum):
+                num_bytes += item[2]
+                if num_bytes > allocations[key]:
+                    strata[key] = stratum[:num_taken]
+                    break
+    indices = sorted(item[1] for stratum in strata.values() for item in stratum)
+    return [issues[index] for index in indices]
+
+
+def sample_records(
+    records,
+    downsample=1,
+    sample_size=None,
+    sample_bytes=None,
+    stratify=STRATIFY_PUBLICATION,
+    seed=0,
+):
+    """
+    Samples issues from an inventory (see sample_issues).
+
+    :param records: Issue records (see alto2txt.inventory)
+    :type records: list(dict)
+    :param downsample: Downsample, taking 1 in N issues of each stratum
+    :type downsample: int
+    :param sample_size: Number of issues to take, or None for all
+    :type sample_size: int
+    :param sample_bytes: Total size, in bytes, of the input files of the
+    issues to take, or None for all
+    :type sample_bytes: int
+    :param stratify: Stratification, one of STRATIFICATIONS
+    :type stratify: str
+    :param seed: Seed
+    :type seed: int
+    :return: issue records taken, in the order of records
+    :rtype: list(dict)
+    """
+    issues = [
+        (
+            record[inventory.INVENTORY_PUBLICATION],
+            record[inventory.INVENTORY_YEAR],
+            record[inventory.INVENTORY_ISSUE],
+            sum(size for size, _ in record[inventory.INVENTORY_FILES].values()),
+            record,
+        )
+        for record in records
+    ]
+    return [
+        issue[4]
+        for issue in sample_issues(
+            issues, downsample, sample_size, sample_bytes, stratify, seed
+        )
+    ]
@@ -0,0 +1,312 @@
+"""
+Full-text search index of converted articles, written as a SQLite
+database, alto2txt_search.sqlite, in the output directory, as articles
+are converted, so the output does not need to be read again to index
+it.
+
+The database has an articles table, with one row per article holding
+its metadata fields (see alto2txt.articles.ARTICLE_FIELDS) and the
+output sub-path of its issue directory or container, indexed by
+publication, issue and item IDs, and an SQLite FTS5 table,
+articles_text, of article titles and plaintext, whose rowids are those
+of the articles table. For example:
+
+    SELECT articles.* FROM articles_text
+    JOIN articles ON articles.id = articles_text.rowid
+    WHERE articles_text MATCH 'railway'
+
+Each process converting issues writes rows to its own part file, a
+SQLite database in an alto2txt_search_parts directory in the output
+directory, in one transaction per issue. Once all issues are
+converted, merge_search_index merges the part files into the database,
+replacing the rows of any issues converted again.
+
+A search index writer is added to sinks in the same way as a metadata
+index writer (see alto2txt.sinks.open_sink), alongside one if both are
+written (see add_search_index).
+"""
+
+import logging
+import os
+import os.path
+import sqlite3
+import uuid
+
+from lxml import etree
+
+from alto2txt import articles
+
+logger = logging.getLogger(__name__)
+""" Module-level logger. """
+
+SEARCH_FILE = "alto2txt_search.sqlite"
+""" Search index file name, in output directory. """
+SEARCH_PARTS_DIR = "alto2txt_search_parts"
+""" Search index part files directory name, in output directory. """
+SEARCH_COLUMNS = articles.ARTICLE_FIELDS + ("output",)
+"""
+Metadata columns of the articles table. output is the output sub-path
+of the issue directory or container holding plain_text_file, e.g.
+0002647/1824/0217 or 0002647/1824/0217.zip.
+"""
+
+PART_SCHEMA = """
+CREATE TABLE IF NOT EXISTS articles (
+    {},
+    text TEXT
+);
+""".format(",\n    ".join(SEARCH_COLUMNS))
+""" Part file schema. """
+SEARCH_SCHEMA = """
+CREATE TABLE IF NOT EXISTS articles (
+    id INTEGER PRIMARY KEY,
+    {}
+);
+CREATE INDEX IF NOT EXISTS articles_item
+    ON articles (publication_id, issue_id, item_id);
+CREATE INDEX IF NOT EXISTS articles_input_sub_path ON articles (input_sub_path);
+CREATE VIRTUAL TABLE IF NOT EXISTS articles_text USING fts5(item_title, text);
+""".format(",\n    ".join(SEARCH_COLUMNS))
+""" Search index schema. """
+
+
+class SearchIndexWriter:
+    """
+    Writer of search index rows to a new part file. Rows are buffered
+    and written in one transaction for each issue output.
+
+    :param txt_out_dir: Output directory for plaintext articles
+    :type txt_out_dir: str
+    """
+
+    def __init__(self, txt_out_dir):
+        self.part_file = os.path.join(
+            txt_out_dir, SEARCH_PARTS_DIR, "part-{}.sqlite".format(uuid.uuid4().hex)
+        )
+        self.rows = []
+        self.output = None
+        """ Output of the rows buffered. """
+        self.connection = None
+
+    def add(self, lwm, output, text=None):
+        """
+        Adds a row for an article, writing the rows buffered if they
+        are of another issue output.
+
+        :param lwm: Article metadata lwm element
+        :type lwm: lxml.etree._Element
+        :param output: Output sub-path of issue directory or container
+        :type output: str
+        :param text: Plaintext
+        :type text: str
+        """
+        if output != self.output:
+            self.flush()
+            self.output = output
+        fields = articles.metadata_fields(lwm)
+        fields["output"] = output
+        self.rows.append(
+            tuple(fields[column] for column in SEARCH_COLUMNS) + (text or "",)
+        )
+
+    def add_files(self, output_dir, stub, output):
+        """
+        Adds rows for articles whose plaintext and metadata files, in
+        output_dir, were written for stub, such as those written by an
+        XSLT (see alto2txt.articles.is_article_file).
+
+        :param output_dir: Directory with plaintext and metadata files
+        :type output_dir: str
+        :param stub: Output file stub e.g. 0002647_18240217
+        :type stub: str
+        :param output: Output sub-path of issue directory or container
+        :type output: str
+        """
+        for name in sorted(os.listdir(output_dir)):
+            if articles.is_article_file(name, stub, articles.METADATA_SUFFIX):
+                path = os.path.join(output_dir, name)
+                lwm = etree.parse(path).getroot()
+                text_path = (
+                    path[: -len(articles.METADATA_SUFFIX)] + articles.TEXT_SUFFIX
+                )
+                text = ""
+                if os.path.exists(text_path):
+                    with open(text_path, "r", encoding="utf-8") as f:
+                        text = f.read()
+                self.add(lwm, output, text)
+
+    def flush(self):
+        """
+        Writes buffered rows to the part file, in one transaction.
+        """
+        if not self.rows:
+            return
+        if self.connection is None:
+            os.makedirs(os.path.dirname(self.part_file), exist_ok=True)
+            self.connection = sqlite3.connect(self.part_file)
+            self.connection.execute("PRAGMA synchronous = OFF")
+            self.connection.executescript(PART_SCHEMA)
+        with self.connection:
+            self.connection.executemany(
+                "INSERT INTO articles VALUES ({})".format(
+                    ", ".join("?" * (len(SEARCH_COLUMNS) + 1))
+                ),
+                self.rows,
+            )
+        self.rows = []
+
+    def close(self):
+        """
+        Writes buffered rows and closes the part file.
+        """
+        self.flush()
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+
+class IndexWriters:
+    """
+    Index writers, such as a metadata index writer and a search index
+    writer, to which each row is added.
+
+    :param writers: Index writers
+    :type writers: list
+    """
+
+    def __init__(self, writers):
+        self.writers = writers
+
+    def add(self, lwm, output, text=None):
+        for writer in self.writers:
+            writer.add(lwm, output, text)
+
+    def add_files(self, output_dir, stub, output):
+        for writer in self.writers:
+            writer.add_files(output_dir, stub, output)
+
+    def close(self):
+        for writer in self.writers:
+            writer.close()
+
+
+def add_search_index(issue_index, txt_out_dir):
+    """
+    Adds a search index writer, writing a new part file, to a metadata
+    index writer.
+
+    :param issue_index: Metadata index writer, or None
+    :type issue_index: alto2txt.metadata_index.IndexWriter
+    :param txt_out_dir: Output directory for plaintext articles
+    :type txt_out_dir: str
+    :return: index writer to pass to alto2txt.sinks.open_sink
+    :rtype: SearchIndexWriter or IndexWriters
+    """
+    writer = SearchIndexWriter(txt_out_dir)
+    if issue_index is None:
+        return writer
+    return IndexWriters([issue_index, writer])
+
+
+def merge_part(connection, part_file):
+    """
+    Merges a part file into the search index, in one transaction,
+    replacing the rows of the issues it holds.
+
+    :param connection: Search index connection, in autocommit mode
+    :type connection: sqlite3.Connection
+    :param part_file: Part file
+    :type part_file: str
+    :raises sqlite3.DatabaseError: if the part file cannot be read, in
+    which case the transaction is rolled back
+    """
+    columns = ", ".join(SEARCH_COLUMNS)
+    connection.execute("ATTACH DATABASE ? AS part", (part_file,))
+    try:
+        connection.execute("BEGIN")
+        connection.execute(
+            "DELETE FROM articles_text WHERE rowid IN "
+            "(SELECT id FROM articles WHERE input_sub_path IN "
+            "(SELECT input_sub_path FROM part.articles))"
+        )
+        connection.execute(
+            "DELETE FROM articles WHERE input_sub_path IN "
+            "(SELECT input_sub_path FROM part.articles)"
+        )
+        offset = connection.execute(
+            "SELECT COALESCE(MAX(id), 0) FROM articles"
+        ).fetchone()[0]
+        connection.execute(
+            "INSERT INTO articles (id, {0}) "
+            "SELECT rowid + ?, {0} FROM part.articles".format(columns),
+            (offset,),
+        )
+        connection.execute(
+            "INSERT INTO articles_text (rowid, item_title, text) "
+            "SELECT rowid + ?, item_title, text FROM part.articles",
+            (offset,),
+        )
+        connection.execute("COMMIT")
+    except BaseException:
+        if connection.in_transaction:
+            connection.execute("ROLLBACK")
+        raise
+    finally:
+        connection.execute("DETACH DATABASE part")
+
+
+def merge_search_index(txt_out_dir):
+    """
+    Merges search index part files into the search index, then
+    removes them.
+
+    Rows of any issue in a part file, by input sub-path, are first
+    removed from the search index, as the issue has been converted
+    again. Each part file is merged in one transaction, oldest first,
+    by modification time, so if an issue is in more than one part file
+    its rows in the newest are kept. Part files that cannot be read
+    are logged, skipped and left in place.
+
+    :param txt_out_dir: Output directory for plaintext articles
+    :type txt_out_dir: str
+    :return: number of rows in search index
+    :rtype: int
+    """
+    parts_dir = os.path.join(txt_out_dir, SEARCH_PARTS_DIR)
+    part_files = []
+    if os.path.isdir(parts_dir):
+        part_files = sorted(
+            (
+                os.path.join(parts_dir, name)
+                for name in os.listdir(parts_dir)
+                if name.endswith(".sqlite")
+            ),
+            key=lambda part_file: os.stat(part_file).st_mtime_ns,
+        )
+    if not part_files:
+        return 0
+    search_file = os.path.join(txt_out_dir, SEARCH_FILE)
+    connection = sqlite3.connect(search_file, isolation_level=None)
+    try:
+        connection.executescript(SEARCH_SCHEMA)
+        for part_file in part_files:
+            try:
+                merge_part(connection, part_file)
+            except sqlite3.DatabaseError as e:
+                logger.warning(
+                    "Skipping unreadable search index part %s: %s",
+                    part_file,
+                    str(e),
+                )
+                continue
+            os.remove(part_file)
+        num_rows = connection.execute("SELECT COUNT(*) FROM articles").fetchone()[0]
+        connection.execute(
+            "INSERT INTO articles_text (articles_text) VALUES ('optimize')"
+        )
+    finally:
+        connection.close()
+    if not os.listdir(parts_dir):
+        os.rmdir(parts_dir)
+    logger.info("Search index %s: %d articles", search_file, num_rows)
+    return num_rows
@@ -0,0 +1,617 @@
+"""
+Output sinks to which the plaintext and metadata of articles are
+written.
+
+By default each article is written as two files, a plaintext file and
+a metadata file, in an issue output directory. Alternatively, all the
+articles of an issue can be packed into a single container, next to
+where the issue output directory would be, so the number of files
+output is one per issue rather than two per article:
+
+* zip: zip file with the same plaintext and metadata files.
+* tar: tar file with the same plaintext and metadata files.
+* jsonl: JSON Lines file with one record per article holding the
+  article stub, plaintext and metadata.
+
+Containers are written to a temporary file which replaces the
+container once the issue has been converted, so a container is never
+left partially written.
+
+A sink can also add a row for each article it writes to a metadata
+index (see alto2txt.metadata_index) or a search index (see
+alto2txt.search_index). Sinks count the articles, words
+and bytes they write, and the time spent writing.
+
+An ArticleSink holds articles in memory, as records of their
+plaintext and metadata fields, rather than writing them, for callers
+consuming articles directly (see alto2txt.xml_to_text.iter_articles).
+
+Sinks can fsync what they write, per article or per issue (see
+FSYNC_POLICIES), and can be written asynchronously, by writer threads,
+via an alto2txt.output_writer.OutputWriter.
+"""
+
+import io
+import json
+import os
+import os.path
+import tarfile
+import tempfile
+import time
+import zipfile
+from contextlib import contextmanager
+
+from lxml import etree
+
+from alto2txt import articles
+
+OUTPUT_FILES = "files"
+""" Output format writing plaintext and metadata files per article. """
+OUTPUT_ZIP = "zip"
+""" Output format packing articles into a zip file per issue. """
+OUTPUT_TAR = "tar"
+""" Output format packing articles into a tar file per issue. """
+OUTPUT_JSONL = "jsonl"
+""" Output format packing articles into a JSON Lines file per issue. """
+OUTPUT_FORMATS = [OUTPUT_FILES, OUTPUT_ZIP, OUTPUT_TAR, OUTPUT_JSONL]
+""" Output formats. """
+
+JSONL_STUB = "stub"
+""" JSON Lines record key for article stub. """
+JSONL_TEXT = "text"
+""" JSON Lines record key for article plaintext. """
+JSONL_METADATA = "metadata"
+""" JSON Lines record key for article metadata XML. """
+
+PARTIAL_SUFFIX = ".partial"
+""" Suffix of containers being written. """
+
+FSYNC_NONE = "none"
+""" fsync policy leaving files to be written back by the OS. """
+FSYNC_ISSUE = "issue"
+"""
+fsync policy syncing files, and their directory, once an issue is
+closed.
+"""
+FSYNC_ARTICLE = "article"
+"""
+fsync policy syncing each file as it is written. Containers are synced
+once an issue is closed, as for FSYNC_ISSUE.
+"""
+FSYNC_POLICIES = [FSYNC_NONE, FSYNC_ISSUE, FSYNC_ARTICLE]
+""" fsync policies. """
+
+
+def fsync_path(path):
+    """
+    Flushes a file or directory to disk.
+
+    :param path: File or directory
+    :type path: str
+    """
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class Sink:
+    """
+    Sink for the articles of an issue. Sinks are context managers,
+    closed if the issue is converted and aborted otherwise.
+
+    :param output_dir: Directory into which articles can be written as
+    files directly, or None if articles are packed into a container
+    :type output_dir: str
+    :param path: Path of issue output directory or container
+    :type path: str
+    """
+
+    def __init__(self, output_dir, path):
+        self.output_dir = output_dir
+        self.path = path
+        self.index = None
+        """ Metadata index writer, if any (see open_sink). """
+        self.index_output = None
+        """ Issue output directory or container, for the index. """
+        self.num_articles = 0
+        """ Number of articles written. """
+        self.num_words = 0
+        """ Number of words, separated by whitespace, written. """
+        self.bytes_written = 0
+        """ Number of bytes of plaintext and metadata written. """
+        self.time_write = 0.0
+        """ Time, in seconds, spent writing. """
+        self.fsync = FSYNC_NONE
+        """ fsync policy, one of FSYNC_POLICIES (see open_sink). """
+        self.unsynced = []
+        """ Files written but not yet synced, for FSYNC_ISSUE. """
+        self.count_words = True
+        """
+        Count the words of articles written as files by XSLTs, which
+        requires reading them (see count_output_dir and open_sink).
+        """
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def write(self, stub, text, metadata):
+        """
+        Writes an article, counting it.
+
+        :param stub: Article stub e.g. 0002647_18240217_art0001
+        :type stub: str
+        :param text: Plaintext
+        :type text: bytes
+        :param metadata: Metadata XML
+        :type metadata: bytes
+        """
+        start = time.perf_counter()
+        self.write_entry(stub, text, metadata)
+        self.time_write += time.perf_counter() - start
+        self.count(text, len(metadata))
+
+    def write_entry(self, stub, text, metadata):
+        """
+        Writes an article. Implemented by subclasses.
+
+        :param stub: Article stub e.g. 0002647_18240217_art0001
+        :type stub: str
+        :param text: Plaintext
+        :type text: bytes
+        :param metadata: Metadata XML
+        :type metadata: bytes
+        """
+        raise NotImplementedError()
+
+    def count(self, text, metadata_size):
+        """
+        Counts an article written.
+
+        :param text: Plaintext
+        :type text: bytes
+        :param metadata_size: Size of metadata XML, in bytes
+        :type metadata_size: int
+        """
+        self.count_file(len(text), metadata_size, len(text.split()))
+
+    def count_file(self, text_size, metadata_size, num_words=0):
+        """
+        Counts an article written.
+
+        :param text_size: Size of plaintext, in bytes
+        :type text_size: int
+        :param metadata_size: Size of metadata XML, in bytes
+        :type metadata_size: int
+        :param num_words: Number of words of plaintext
+        :type num_words: int
+        """
+        self.num_articles += 1
+        self.num_words += num_words
+        self.bytes_written += text_size + metadata_size
+
+    def write_article(self, article):
+        """
+        Writes an article.
+
+        :param article: Article
+        :type article: alto2txt.articles.Article
+        """
+        self.write(
+            article.stub,
+            article.text.encode("utf-8"),
+            articles.metadata_to_bytes(article.metadata),
+        )
+        if self.index is not None:
+            self.index.add(article.metadata, self.index_output, article.text)
+
+    def remove_articles(self):
+        """
+        Removes articles previously written for the issue.
+
+        :return: number of files removed
+        :rtype: int
+        """
+        return 0
+
+    def sync(self, path):
+        """
+        Applies the fsync policy to a file written: syncing it now for
+        FSYNC_ARTICLE or once the issue is closed for FSYNC_ISSUE.
+
+        :param path: File
+        :type path: str
+        """
+        if self.fsync == FSYNC_ARTICLE:
+            fsync_path(path)
+        elif self.fsync == FSYNC_ISSUE:
+            self.unsynced.append(path)
+
+    def sync_unsynced(self):
+        """
+        Syncs files whose syncing was deferred until the issue is
+        closed, and their directory.
+        """
+        for path in self.unsynced:
+            fsync_path(path)
+        if self.unsynced:
+            fsync_path(os.path.dirname(self.unsynced[0]))
+        self.unsynced = []
+
+    def on_written(self, function):
+        """
+        Calls a function once all articles have been written and the
+        sink closed, which is now unless the sink is written
+        asynchronously.
+
+        :param function: Function, with no arguments
+        :type function: callable
+        """
+        function()
+
+    def close(self):
+        """
+        Completes the issue.
+        """
+
+    def abort(self):
+        """
+        Abandons the issue.
+        """
+
+
+class FilesSink(Sink):
+    """
+    Sink writing plaintext and metadata files per article into an issue
+    output directory.
+
+    :param issue_out_dir: Issue output directory
+    :type issue_out_dir: str
+    """
+
+    def __init__(self, issue_out_dir):
+        assert not os.path.exists(issue_out_dir) or not os.path.isfile(
+            issue_out_dir
+        ), "{} exists and is not a file".format(issue_out_dir)
+        if not os.path.exists(issue_out_dir):
+            os.makedirs(issue_out_dir)
+        assert os.path.exists(issue_out_dir), "Create {} failed".format(issue_out_dir)
+        super().__init__(issue_out_dir, issue_out_dir)
+
+    def write_entry(self, stub, text, metadata):
+        output_path = os.path.join(self.output_dir, stub)
+        for path, data in [
+            (output_path + articles.TEXT_SUFFIX, text),
+            (output_path + articles.METADATA_SUFFIX, metadata),
+        ]:
+            with open(path, "wb") as f:
+                f.write(data)
+            self.sync(path)
+
+    def remove_articles(self):
+        return articles.remove_articles(self.output_dir)
+
+    def close(self):
+        self.sync_unsynced()
+
+
+class ContainerSink(Sink):
+    """
+    Sink packing articles into a container file per issue. Subclasses
+    implement open_container, write_entry and close_container.
+
+    The container is replaced when closed, so articles previously
+    written for the issue need not be removed.
+
+    :param issue_out_dir: Issue output directory. The container is
+    issue_out_dir with suffix appended.
+    :type issue_out_dir: str
+    :param suffix: Container suffix e.g. .zip
+    :type suffix: str
+    """
+
+    def __init__(self, issue_out_dir, suffix):
+        super().__init__(None, issue_out_dir + suffix)
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self.partial_path = self.path + PARTIAL_SUFFIX
+        self.open_container(self.partial_path)
+
+    def open_container(self, path):
+        """
+        Opens container.
+
+        :param path: Container path
+        :type path: str
+        """
+        raise NotImplementedError()
+
+    def close_container(self):
+        """
+        Closes container.
+        """
+        raise NotImplementedError()
+
+    def close(self):
+        """
+        Completes the container and moves it into place.
+        """
+        self.close_container()
+        if self.fsync != FSYNC_NONE:
+            fsync_path(self.partial_path)
+        os.replace(self.partial_path, self.path)
+        if self.fsync != FSYNC_NONE:
+            fsync_path(os.path.dirname(self.path))
+
+    def abort(self):
+        """
+        Abandons the container, removing it.
+        """
+        self.close_container()
+        os.remove(self.partial_path)
+
+
+class ZipSink(ContainerSink):
+    """
+    Sink packing articles into a zip file per issue.
+
+    :param issue_out_dir: Issue output directory
+    :type issue_out_dir: str
+    """
+
+    def __init__(self, issue_out_dir):
+        super().__init__(issue_out_dir, ".zip")
+
+    def open_container(self, path):
+        self.container = zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED)
+
+    def write_entry(self, stub, text, metadata):
+        self.container.writestr(stub + articles.TEXT_SUFFIX, text)
+        self.container.writestr(stub + articles.METADATA_SUFFIX, metadata)
+
+    def close_container(self):
+        self.container.close()
+
+
+class TarSink(ContainerSink):
+    """
+    Sink packing articles into a tar file per issue.
+
+    :param issue_out_dir: Issue output directory
+    :type issue_out_dir: str
+    """
+
+    def __init__(self, issue_out_dir):
+        super().__init__(issue_out_dir, ".tar")
+
+    def open_container(self, path):
+        self.container = tarfile.open(path, "w")
+
+    def add_member(self, name, data):
+        member = tarfile.TarInfo(name)
+        member.size = len(data)
+        member.mtime = int(time.time())
+        member.mode = 0o644
+        self.container.addfile(member, io.BytesIO(data))
+
+    def write_entry(self, stub, text, metadata):
+        self.add_member(stub + articles.TEXT_SUFFIX, text)
+        self.add_member(stub + articles.METADATA_SUFFIX, metadata)
+
+    def close_container(self):
+        self.container.close()
+
+
+class JsonlSink(ContainerSink):
+    """
+    Sink packing articles into a JSON Lines file per issue, with one
+    record per article.
+
+    :param issue_out_dir: Issue output directory
+    :type issue_out_dir: str
+    """
+
+    def __init__(self, issue_out_dir):
+        super().__init__(issue_out_dir, ".jsonl")
+
+    def open_container(self, path):
+        self.container = open(path, "wb")
+
+    def write_entry(self, stub, text, metadata):
+        record = {
+            JSONL_STUB: stub,
+            JSONL_TEXT: text.decode("utf-8"),
+            JSONL_METADATA: metadata.decode("utf-8"),
+        }
+        self.container.write(json.dumps(record, ensure_ascii=False).encode("utf-8"))
+        self.container.write(b"\n")
+
+    def close_container(self):
+        self.container.close()
+
+
+class ArticleSink(Sink):
+    """
+    Sink holding articles in memory as records (see
+    alto2txt.articles.ArticleRecord). Articles converted natively are
+    recorded without serializing their metadata. Nothing is written, so
+    bytes_written stays 0.
+
+    :param path: Path identifying the issue e.g. its input directory
+    :type path: str
+    """
+
+    def __init__(self, path):
+        super().__init__(None, path)
+        self.records = []
+        """ Article records. """
+
+    def write_entry(self, stub, text, metadata):
+        lwm = etree.fromstring(metadata) if metadata else etree.Element("lwm")
+        self.records.append(articles.article_record(stub, text.decode("utf-8"), lwm))
+
+    def count(self, text, metadata_size):
+        self.num_articles += 1
+        self.num_words += len(text.split())
+
+    def write_article(self, article):
+        start = time.perf_counter()
+        self.records.append(
+            articles.article_record(article.stub, article.text, article.metadata)
+        )
+        self.time_write += time.perf_counter() - start
+        self.count(article.text, 0)
+
+
+SINKS = {
+    OUTPUT_FILES: FilesSink,
+    OUTPUT_ZIP: ZipSink,
+    OUTPUT_TAR: TarSink,
+    OUTPUT_JSONL: JsonlSink,
+}
+""" Sink for each output format. """
+
+
+def open_sink(
+    output_format,
+    issue_out_dir,
+    index=None,
+    index_output=None,
+    writer=None,
+    count_words=False,
+):
+    """
+    Opens a sink for the articles of an issue.
+
+    :param output_format: Output format, one of OUTPUT_FORMATS
+    :type output_format: str
+    :param issue_out_dir: Issue output directory
+    :type issue_out_dir: str
+    :param index: Metadata index writer to which to add a row for each
+    article written
+    :type index: alto2txt.metadata_index.IndexWriter
+    :param index_output: Issue output sub-path e.g. 0002647/1824/0217,
+    to record in the index with any container suffix appended
+    :type index_output: str
+    :param writer: Output writer setting the fsync policy and, if it
+    has writer threads, writing the sink asynchronously
+    :type writer: alto2txt.output_writer.OutputWriter
+    :param count_words: Count the words of articles written as files
+    by XSLTs, reading them once written (see count_output_dir).
+    Words of other articles are counted as they are written.
+    :type count_words: bool
+    :return: sink
+    :rtype: Sink
+    """
+    sink = SINKS[output_format](issue_out_dir)
+    sink.count_words = count_words
+    if writer is not None:
+        sink = writer.open(sink)
+    sink.index = index
+    if index_output is not None:
+        sink.index_output = index_output + sink.path[len(issue_out_dir) :]
+    return sink
+
+
+def write_output_dir(sink, output_dir):
+    """
+    Writes articles output as plaintext and metadata files into a
+    directory to a sink, in stub order.
+
+    :param sink: Sink
+    :type sink: Sink
+    :param output_dir: Directory with plaintext and metadata files
+    :type output_dir: str
+    """
+    stubs = sorted(
+        name[: -len(articles.TEXT_SUFFIX)]
+        for name in os.listdir(output_dir)
+        if name.endswith(articles.TEXT_SUFFIX)
+    )
+    for stub in stubs:
+        output_path = os.path.join(output_dir, stub)
+        with open(output_path + articles.TEXT_SUFFIX, "rb") as f:
+            text = f.read()
+        metadata = b""
+        if os.path.exists(output_path + articles.METADATA_SUFFIX):
+            with open(output_path + articles.METADATA_SUFFIX, "rb") as f:
+                metadata = f.read()
+        sink.write(stub, text, metadata)
+        if sink.index is not None and metadata:
+            sink.index.add(
+                etree.fromstring(metadata), sink.index_output, text.decode("utf-8")
+            )
+
+
+def count_output_dir(sink, stub):
+    """
+    Counts articles, whose plaintext files were written for stub, in a
+    sink's output directory, such as those written by an XSLT.
+
+    Sizes are taken from the directory entries. Plaintext files are
+    read, to count their words, only if the sink counts words (see
+    Sink.count_words).
+
+    :param sink: Sink
+    :type sink: Sink
+    :param stub: Output file stub e.g. 0002647_18240217
+    :type stub: str
+    """
+    with os.scandir(sink.output_dir) as entries:
+        for entry in entries:
+            if articles.is_article_file(entry.name, stub, articles.TEXT_SUFFIX):
+                num_words = 0
+                if sink.count_words:
+                    with open(entry.path, "rb") as f:
+                        num_words = len(f.read().split())
+                metadata_path = (
+                    entry.path[: -len(articles.TEXT_SUFFIX)] + articles.METADATA_SUFFIX
+                )
+                metadata_size = 0
+                sink.sync(entry.path)
+                if os.path.exists(metadata_path):
+                    metadata_size = os.path.getsize(metadata_path)
+                    sink.sync(metadata_path)
+                sink.count_file(entry.stat().st_size, metadata_size, num_words)
+
+
+@contextmanager
+def files_output_dir(sink, stub):
+    """
+    Context manager giving a directory into which articles for a sink
+    can be written as files, as the XSLTs do.
+
+    This is the sink's output directory or, if the sink packs articles
+    into a container, a temporary directory whose articles are written
+    to the sink, then removed, on exit.
+
+    Articles are written to the sink, counted and indexed, on exit even
+    if an exception is raised, as the XSLTs write the articles they can
+    before failing.
+
+    :param sink: Sink
+    :type sink: Sink
+    :param stub: Output file stub e.g. 0002647_18240217
+    :type stub: str
+    :return: directory
+    :rtype: str
+    """
+    if sink.output_dir is not None:
+        try:
+            yield sink.output_dir
+        finally:
+            count_output_dir(sink, stub)
+            if sink.index is not None:
+                sink.index.add_files(sink.output_dir, stub, sink.index_output)
+        return
+    with tempfile.TemporaryDirectory(prefix="alto2txt_") as output_dir:
+        try:
+            yield output_dir
+        finally:
+            write_output_dir(sink, output_dir)
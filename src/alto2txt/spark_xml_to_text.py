@@ -8,10 +8,22 @@ import logging
 import os
 import os.path
 
-from pyspark import SparkConf, SparkContext
+from pyspark import SparkConf
+from pyspark.sql import SparkSession
+from pyspark.sql.types import DoubleType, LongType, StringType, StructField, StructType
 
-from alto2txt import xml, xml_to_text
-from alto2txt.logging_utils import configure_logging
+from alto2txt import (
+    logging_utils,
+    manifest,
+    output_writer,
+    profiling,
+    sampling,
+    sinks,
+    stats,
+    worker,
+    xml_to_text,
+)
+from alto2txt.multiprocess_xml_to_text import batch_issues, list_issues
 
 LOG_FILE = "logging.config"
 """ Default log file name. """
@@ -19,50 +31,308 @@ LOG_FILE = "logging.config"
 logger = logging.getLogger(__name__)
 """ Module-level logger. """
 
+PARTITIONS_PER_CORE = 4
+"""
+Number of issue partitions to create per core. More partitions give
+better load balancing at the cost of more tasks.
+"""
+ISSUE_COLUMNS = ["publication", "year", "issue"]
+""" Columns identifying issues in issue summary DataFrames. """
+
+
+def get_issue_schema():
+    """
+    Gets the schema of issue summary DataFrames, with ISSUE_COLUMNS
+    then a column for each count and time of the summary of an issue
+    (see alto2txt.stats).
+
+    :return: schema
+    :rtype: pyspark.sql.types.StructType
+    """
+    return StructType(
+        [StructField(column, StringType(), False) for column in ISSUE_COLUMNS]
+        + [
+            StructField(key, LongType(), False)
+            for key in stats.SUMMARY_COUNTS + stats.STATS_COUNTS
+        ]
+        + [StructField(key, DoubleType(), False) for key in stats.STATS_TIMES]
+    )
 
-def publication_to_text(
-    publications_dir, publication, txt_out_dir, log_file, downsample=1
+
+def partition_to_text(
+    issues,
+    txt_out_dir,
+    log_file,
+    engine=xml_to_text.ENGINE_XSLT,
+    incremental=False,
+    output_format=sinks.OUTPUT_FILES,
+    index=False,
+    search=False,
+    profile=False,
+    writer_threads=0,
+    fsync=sinks.FSYNC_NONE,
+    count_words=False,
+    log_detail=logging_utils.LOG_DETAIL_FILE,
+    log_rate=None,
 ):
     """
-    Converts issues of an XML publication to plaintext articles and
-    generates minimal metadata.
+    Converts a partition of issues to plaintext articles and generates
+    minimal metadata, calling xml_to_text.issue_to_text for each
+    issue.
 
-    Loads XSLTs, checks publications_dir/publication exists then calls
-    xml_to_text.publication_to_text.
+    The worker is initialised once, at the start of the partition,
+    and keeps its XSLTs for later partitions, as Spark reuses Python
+    worker processes by default (spark.python.worker.reuse). The
+    manifest, index part files and profiler are likewise created once
+    per partition.
 
-    :param publications_dir: Input directory with XML publications
-    :type publications_dir: str
-    :param publication: Local publication directory in publications_dir
-    :type publication: str
+    :param issues: (publication, year, issue, issue_dir,
+    issue_inventory, issue_record) tuples, from
+    multiprocess_xml_to_text.list_issues
+    :type issues: iterable(tuple(str, str, str, str, dict, dict))
     :param txt_out_dir: Output directory for plaintext articles
     :type txt_out_dir: str
     :param log_file: log file
     :type log_file: str
-    :param downsample: Downsample, converting every Nth issue only
-    :type downsample: int
+    :param engine: Engine, one of xml_to_text.ENGINES
+    :type engine: str
+    :param incremental: Fingerprint issues and remove their previous
+    output before converting them
+    :type incremental: bool
+    :param output_format: Output format, one of
+    alto2txt.sinks.OUTPUT_FORMATS
+    :type output_format: str
+    :param index: Write metadata index rows for the partition to a
+    part file (see alto2txt.metadata_index)
+    :type index: bool
+    :param search: Write search index rows for the partition to a
+    part file (see alto2txt.search_index)
+    :type search: bool
+    :param profile: Profile conversion of the partition, writing part
+    files (see alto2txt.profiling)
+    :type profile: bool
+    :param writer_threads: Number of writer threads writing the
+    articles of the partition (see alto2txt.output_writer)
+    :type writer_threads: int
+    :param fsync: fsync policy, one of alto2txt.sinks.FSYNC_POLICIES
+    :type fsync: str
+    :param count_words: Count words of articles written by the XSLTs
+    (see alto2txt.xml_to_text.issue_to_text)
+    :type count_words: bool
+    :param log_detail: Log detail, one of
+    alto2txt.logging_utils.LOG_DETAILS
+    :type log_detail: str
+    :param log_rate: Maximum number of per-file messages per second,
+    per process, or None for no limit
+    :type log_rate: float
+    :return: issue summary rows, with the columns of get_issue_schema
+    :rtype: iterable(tuple)
+    """
+    worker.init_worker(log_file, None, log_detail, log_rate)
+    xslts = worker.get_xslts()
+    # Issues already converted are filtered out by the driver, or
+    # listed with their records if incremental, so only record issues
+    # in the manifest.
+    issue_manifest = manifest.Manifest(txt_out_dir, incremental=incremental)
+    issue_index = None
+    if index:
+        from alto2txt import metadata_index
+
+        issue_index = metadata_index.IndexWriter(txt_out_dir)
+    if search:
+        from alto2txt import search_index
+
+        issue_index = search_index.add_search_index(issue_index, txt_out_dir)
+    profiler = None
+    if profile:
+        profiler = profiling.Profiler(txt_out_dir)
+        profiler.enable()
+    writer = output_writer.open_writer(writer_threads, fsync)
+    try:
+        for (
+            publication,
+            year,
+            issue,
+            issue_dir,
+            issue_inventory,
+            issue_record,
+        ) in issues:
+            publication_txt_out_dir = os.path.join(txt_out_dir, publication)
+            try:
+                summary = xml_to_text.issue_to_text(
+                    publication,
+                    year,
+                    issue,
+                    issue_dir,
+                    publication_txt_out_dir,
+                    xslts,
+                    engine,
+                    issue_manifest,
+                    output_format,
+                    issue_index,
+                    profiler,
+                    writer,
+                    issue_inventory,
+                    issue_record=issue_record,
+                    count_words=count_words,
+                )
+            except Exception as e:
+                logger.error("%s failed to convert: %s", issue_dir, str(e))
+                continue
+            yield tuple(
+                [publication, year, issue]
+                + [int(summary[key]) for key in stats.SUMMARY_COUNTS]
+                + [int(summary[key]) for key in stats.STATS_COUNTS]
+                + [float(summary[key]) for key in stats.STATS_TIMES]
+            )
+    finally:
+        if writer is not None:
+            writer.close()
+        if issue_index is not None:
+            issue_index.close()
+        if profiler is not None:
+            profiler.close()
+
+
+def issues_to_dataframe(
+    spark,
+    issues,
+    txt_out_dir,
+    log_file,
+    num_partitions,
+    engine=xml_to_text.ENGINE_XSLT,
+    incremental=False,
+    output_format=sinks.OUTPUT_FILES,
+    index=False,
+    search=False,
+    profile=False,
+    writer_threads=0,
+    fsync=sinks.FSYNC_NONE,
+    count_words=False,
+    log_detail=logging_utils.LOG_DETAIL_FILE,
+    log_rate=None,
+):
+    """
+    Converts issues to plaintext articles and generates minimal
+    metadata via Spark, returning a DataFrame of issue summaries.
+
+    Issues are grouped into partitions of similar size, in bytes, by
+    multiprocess_xml_to_text.batch_issues, rather than of similar
+    numbers of issues, and each partition is converted by
+    partition_to_text.
+
+    The DataFrame is lazy, so issues are converted when an action,
+    such as collect, is run on it.
+
+    :param spark: Spark session
+    :type spark: pyspark.sql.SparkSession
+    :param issues: (cost, (publication, year, issue, issue_dir,
+    issue_inventory, issue_record)) tuples, from
+    multiprocess_xml_to_text.list_issues
+    :type issues: list(tuple(int, tuple(str, str, str, str, dict, dict)))
+    :param txt_out_dir: Output directory for plaintext articles
+    :type txt_out_dir: str
+    :param log_file: log file
+    :type log_file: str
+    :param num_partitions: Target number of partitions
+    :type num_partitions: int
+    :param engine: Engine, one of xml_to_text.ENGINES
+    :type engine: str
+    :param incremental: Fingerprint issues and remove their previous
+    output before converting them
+    :type incremental: bool
+    :param output_format: Output format, one of
+    alto2txt.sinks.OUTPUT_FORMATS
+    :type output_format: str
+    :param index: Write metadata index rows to part files
+    :type index: bool
+    :param search: Write search index rows to part files
+    :type search: bool
+    :param profile: Profile conversion, writing part files
+    :type profile: bool
+    :param writer_threads: Number of writer threads per partition
+    :type writer_threads: int
+    :param fsync: fsync policy, one of alto2txt.sinks.FSYNC_POLICIES
+    :type fsync: str
+    :param count_words: Count words of articles written by the XSLTs
+    (see alto2txt.xml_to_text.issue_to_text)
+    :type count_words: bool
+    :param log_detail: Log detail, one of
+    alto2txt.logging_utils.LOG_DETAILS
+    :type log_detail: str
+    :param log_rate: Maximum number of per-file messages per second,
+    per process, or None for no limit
+    :type log_rate: float
+    :return: issue summaries, with the columns of get_issue_schema
+    :rtype: pyspark.sql.DataFrame
     """
-    # This function will run on Spark worker node so reconfigure
-    # logging.
-    configure_logging(log_file)
-    xslts = xml.load_xslts()
-    publication_dir = os.path.join(publications_dir, publication)
-    if not os.path.isdir(publication_dir):
-        logger.warning("Unexpected file: %s", publication_dir)
-        return
-    publication_txt_out_dir = os.path.join(txt_out_dir, publication)
-    xml_to_text.publication_to_text(
-        publication_dir, publication_txt_out_dir, xslts, downsample
+    batches = batch_issues(issues, num_partitions)
+    logger.info("Issues: %d Partitions: %d", len(issues), len(batches))
+    # One batch per partition.
+    rdd_batches = spark.sparkContext.parallelize(batches, len(batches))
+    rdd_summaries = rdd_batches.mapPartitions(
+        lambda partition: partition_to_text(
+            [issue for batch in partition for issue in batch],
+            txt_out_dir,
+            log_file,
+            engine,
+            incremental,
+            output_format,
+            index,
+            search,
+            profile,
+            writer_threads,
+            fsync,
+            count_words,
+            log_detail,
+            log_rate,
+        )
     )
+    return spark.createDataFrame(rdd_summaries, get_issue_schema())
 
 
 def publications_to_text(
-    publications_dir, txt_out_dir, log_file, num_cores=1, downsample=1
+    publications_dir,
+    txt_out_dir,
+    log_file,
+    num_cores=1,
+    downsample=1,
+    engine=xml_to_text.ENGINE_XSLT,
+    resume=False,
+    incremental=False,
+    output_format=sinks.OUTPUT_FILES,
+    index=False,
+    search=False,
+    profile=False,
+    writer_threads=0,
+    fsync=sinks.FSYNC_NONE,
+    count_words=False,
+    inventory_file=None,
+    sample_size=None,
+    sample_bytes=None,
+    stratify=sampling.STRATIFY_PUBLICATION,
+    sample_seed=0,
+    issues_file=None,
+    shard_index=0,
+    shard_count=1,
+    log_detail=logging_utils.LOG_DETAIL_FILE,
+    log_rate=None,
 ):
     """
     Converts XML publications to plaintext articles and generates
     minimal metadata.
 
-    Each publication is processed concurrently via Spark.
+    Issues are processed concurrently via Spark. The driver lists all
+    issues up front, from an inventory of publications_dir (see
+    multiprocess_xml_to_text.list_issues), so a publication with many
+    issues is spread across all executors, and converts them with
+    issues_to_dataframe, in PARTITIONS_PER_CORE partitions of similar
+    size per core.
+
+    Converted issues are recorded in a manifest in txt_out_dir (see
+    alto2txt.manifest). If resume or incremental is True then issues
+    already converted are not converted again (see
+    multiprocess_xml_to_text.list_issues).
 
     publications_dir is expected to hold XML for multiple
     publications, in the following structure:
@@ -101,19 +371,121 @@ def publications_to_text(
     :type log_file: str
     :param num_cores: Number of cores
     :type num_cores: int
-    :param downsample: Downsample, converting every Nth issue only
+    :param downsample: Downsample, converting 1 in N issues only (see
+    alto2txt.sampling)
     :type downsample: int
+    :param engine: Engine, one of xml_to_text.ENGINES
+    :type engine: str
+    :param resume: Resume, skipping issues already converted
+    :type resume: bool
+    :param incremental: Convert only issues whose content changed
+    :type incremental: bool
+    :param output_format: Output format, one of
+    alto2txt.sinks.OUTPUT_FORMATS
+    :type output_format: str
+    :param index: Write metadata index, merging part files written by
+    workers once all issues are converted
+    :type index: bool
+    :param search: Write full-text search index, merging part files
+    written by workers once all issues are converted
+    :type search: bool
+    :param profile: Profile conversion, merging part files written by
+    workers once all issues are converted
+    :type profile: bool
+    :param writer_threads: Number of writer threads per partition
+    (see alto2txt.output_writer)
+    :type writer_threads: int
+    :param fsync: fsync policy, one of alto2txt.sinks.FSYNC_POLICIES
+    :type fsync: str
+    :param count_words: Count words of articles written by the XSLTs
+    (see alto2txt.xml_to_text.issue_to_text)
+    :type count_words: bool
+    :param inventory_file: Inventory file to reuse, see
+    alto2txt.inventory.get_inventory
+    :type inventory_file: str
+    :param sample_size: Number of issues to convert, or None for all
+    :type sample_size: int
+    :param sample_bytes: Total size, in bytes, of the input files of the
+    issues to convert, or None for all
+    :type sample_bytes: int
+    :param stratify: Stratification, one of
+    alto2txt.sampling.STRATIFICATIONS
+    :type stratify: str
+    :param sample_seed: Sampling seed
+    :type sample_seed: int
+    :param issues_file: File listing issues to convert, or "-" to read
+    them from stdin, or None for all issues (see
+    alto2txt.inventory.read_issue_paths)
+    :type issues_file: str
+    :param shard_index: Shard of issues to convert, from 0 (see
+    alto2txt.inventory.take_shard)
+    :type shard_index: int
+    :param shard_count: Number of shards
+    :type shard_count: int
+    :param log_detail: Log detail, one of
+    alto2txt.logging_utils.LOG_DETAILS
+    :type log_detail: str
+    :param log_rate: Maximum number of per-file messages per second,
+    per process, or None for no limit
+    :type log_rate: float
+    :return: publication to summary (see alto2txt.stats)
+    :rtype: dict(str: dict(str: int or float))
     """
     logger.info("Processing: %s", publications_dir)
-    publications = os.listdir(publications_dir)
+    issues, summaries = list_issues(
+        publications_dir,
+        txt_out_dir,
+        downsample,
+        resume,
+        incremental,
+        inventory_file,
+        sample_size,
+        sample_bytes,
+        stratify,
+        sample_seed,
+        issues_file,
+        shard_index,
+        shard_count,
+    )
+    if not issues:
+        return summaries
     conf = SparkConf()
     conf.setAppName(__name__)
     conf.set("spark.cores.max", num_cores)
-    context = SparkContext(conf=conf)
-    rdd_publications = context.parallelize(publications, num_cores)
-    rdd_publications = context.parallelize(publications)
-    rdd_publications.map(
-        lambda publication: publication_to_text(
-            publications_dir, publication, txt_out_dir, log_file, downsample
-        )
-    ).collect()
+    spark = SparkSession.builder.config(conf=conf).getOrCreate()
+    num_partitions = spark.sparkContext.defaultParallelism * PARTITIONS_PER_CORE
+    issue_summaries = issues_to_dataframe(
+        spark,
+        issues,
+        txt_out_dir,
+        log_file,
+        num_partitions,
+        engine,
+        incremental,
+        output_format,
+        index,
+        search,
+        profile,
+        writer_threads,
+        fsync,
+        count_words,
+        log_detail,
+        log_rate,
+    )
+    for row in issue_summaries.collect():
+        summary = row.asDict()
+        publication = summary.pop("publication")
+        del summary["year"]
+        del summary["issue"]
+        stats.add_summaries(summaries, {publication: summary})
+    if index:
+        from alto2txt import metadata_index
+
+        metadata_index.merge_index(txt_out_dir)
+    if search:
+        from alto2txt import search_index
+
+        search_index.merge_search_index(txt_out_dir)
+    if profile:
+        profiling.merge_profiles(txt_out_dir)
+    return summaries
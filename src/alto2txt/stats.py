@@ -0,0 +1,205 @@
+"""
+Run statistics: counts and timings for each issue, aggregated per
+publication and per run, and a machine-readable run report.
+
+Each issue's summary holds the counts that have always been logged
+(see SUMMARY_COUNTS) along with the bytes read, the articles, words
+and bytes written, and the time, in seconds, spent classifying,
+parsing, transforming and writing (see STATS_COUNTS and STATS_TIMES).
+Summaries are aggregated by adding their values.
+"""
+
+import datetime
+import json
+import logging
+import os
+import os.path
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+""" Module-level logger. """
+
+SUMMARY_COUNTS = [
+    "num_files",
+    "bad_xml",
+    "converted_ok",
+    "converted_bad",
+    "skipped_alto",
+    "skipped_bl_page",
+    "skipped_mets_unknown",
+    "skipped_root_unknown",
+    "non_xml",
+]
+""" Counts of files of an issue, as logged once the issue is converted. """
+STATS_COUNTS = [
+    "num_issues",
+    "skipped_issues",
+    "bytes_read",
+    "num_articles",
+    "num_words",
+    "bytes_written",
+]
+"""
+Counts of issues converted, issues skipped as already converted, bytes
+of input files, and articles, words and bytes output.
+"""
+STATS_TIMES = [
+    "time_classify",
+    "time_parse",
+    "time_transform",
+    "time_write",
+    "time_total",
+]
+"""
+Time, in seconds, spent classifying files, parsing files, transforming
+them (which includes writing for the XSLTs, which write their own
+output, and parsing for streamed files), writing articles, and in
+total.
+"""
+
+REPORT_FILE = "alto2txt_report.json"
+""" Run report file name, in output directory. """
+
+
+def new_summary():
+    """
+    Creates an issue summary with all counts and times zero.
+
+    :return: summary
+    :rtype: dict(str: int or float)
+    """
+    summary = {key: 0 for key in SUMMARY_COUNTS + STATS_COUNTS}
+    summary.update({key: 0.0 for key in STATS_TIMES})
+    return summary
+
+
+def add_summary(total, summary):
+    """
+    Adds the counts and times of a summary to a total.
+
+    :param total: Total summary, updated
+    :type total: dict(str: int or float)
+    :param summary: Summary
+    :type summary: dict(str: int or float)
+    :return: total
+    :rtype: dict(str: int or float)
+    """
+    for key, value in summary.items():
+        total[key] = total.get(key, 0) + value
+    return total
+
+
+def add_summaries(total, summaries):
+    """
+    Adds summaries, keyed by publication, to a total.
+
+    :param total: Total publication to summary, updated
+    :type total: dict(str: dict(str: int or float))
+    :param summaries: Publication to summary
+    :type summaries: dict(str: dict(str: int or float))
+    :return: total
+    :rtype: dict(str: dict(str: int or float))
+    """
+    for publication, summary in summaries.items():
+        add_summary(total.setdefault(publication, new_summary()), summary)
+    return total
+
+
+def get_counts(summary):
+    """
+    Gets the counts of a summary that are logged.
+
+    :param summary: Summary
+    :type summary: dict(str: int or float)
+    :return: SUMMARY_COUNTS to values
+    :rtype: dict(str: int)
+    """
+    return {key: summary[key] for key in SUMMARY_COUNTS}
+
+
+@contextmanager
+def timed(summary, key):
+    """
+    Context manager adding the time spent in it to a summary.
+
+    :param summary: Summary, updated
+    :type summary: dict(str: int or float)
+    :param key: Time key, one of STATS_TIMES
+    :type key: str
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        summary[key] += time.perf_counter() - start
+
+
+def get_throughput(summary, seconds):
+    """
+    Gets throughput of a run.
+
+    :param summary: Summary
+    :type summary: dict(str: int or float)
+    :param seconds: Elapsed time, in seconds
+    :type seconds: float
+    :return: issues, articles and bytes read per second
+    :rtype: dict(str: float)
+    """
+    seconds = max(seconds, 1e-9)
+    return {
+        "issues_per_second": summary.get("num_issues", 0) / seconds,
+        "articles_per_second": summary.get("num_articles", 0) / seconds,
+        "bytes_read_per_second": summary.get("bytes_read", 0) / seconds,
+    }
+
+
+def run_report(publications, parameters, start, seconds):
+    """
+    Creates a run report.
+
+    :param publications: Publication to summary
+    :type publications: dict(str: dict(str: int or float))
+    :param parameters: Run parameters e.g. process type, engine
+    :type parameters: dict
+    :param start: Run start time, seconds since the epoch
+    :type start: float
+    :param seconds: Elapsed time, in seconds
+    :type seconds: float
+    :return: report
+    :rtype: dict
+    """
+    # Imported here as articles loads the XSLTs module.
+    from alto2txt import articles
+
+    total = new_summary()
+    for summary in publications.values():
+        add_summary(total, summary)
+    return {
+        "version": articles.get_lwm_tool()[1],
+        "parameters": parameters,
+        "start": datetime.datetime.fromtimestamp(start).astimezone().isoformat(),
+        "elapsed": seconds,
+        "throughput": get_throughput(total, seconds),
+        "total": total,
+        "publications": publications,
+    }
+
+
+def write_report(report, txt_out_dir):
+    """
+    Writes a run report as JSON to txt_out_dir/alto2txt_report.json.
+
+    :param report: Report
+    :type report: dict
+    :param txt_out_dir: Output directory for plaintext articles
+    :type txt_out_dir: str
+    :return: report file
+    :rtype: str
+    """
+    os.makedirs(txt_out_dir, exist_ok=True)
+    report_file = os.path.join(txt_out_dir, REPORT_FILE)
+    with open(report_file, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+    logger.info("Report: %s", report_file)
+    return report_file
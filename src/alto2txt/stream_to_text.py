@@ -0,0 +1,480 @@
+"""
+Functions to convert UKP and BLN issues to plaintext articles and
+generate minimal metadata, streaming the XML rather than building a
+document tree.
+
+The output is identical to that of extract_text_ukp.xslt and
+extract_text_bln.xslt. Each file is parsed incrementally with
+lxml.etree.iterparse. An article is converted when its element is
+closed, then the element, and any elements preceding it, are cleared,
+so memory use is bounded by the size of an article (or UKP page)
+rather than the size of the file.
+
+As articles are yielded as they are read, a file that is not
+well-formed yields the articles preceding the error before the error
+is raised, whereas the XSLTs give no output for it. Such files are
+counted as converted_bad, rather than bad_xml, by
+alto2txt.xml_to_text.issue_to_text.
+"""
+
+import logging
+
+from lxml import etree
+
+from alto2txt import articles, inputs, xml
+
+logger = logging.getLogger(__name__)
+""" Module-level logger. """
+
+DC_NS = "http://purl.org/dc/elements/1.1/"
+""" Dublin Core namespace """
+STRING_VALUE = etree.XPath("string()")
+""" XPath for string-value of a node. """
+
+UKP_PERIODICAL = etree.QName(xml.UKP_NS, "Periodical").text
+""" UKP Periodical element """
+UKP_ISSUE = etree.QName(xml.UKP_NS, "issue").text
+""" UKP issue element """
+UKP_ISSUE_ID = etree.QName(xml.UKP_NS, "id").text
+""" UKP issue and article id element """
+UKP_ISSUE_NUMBER = etree.QName(xml.UKP_NS, "is").text
+""" UKP issue number element """
+UKP_ISSUE_DATE = etree.QName(xml.UKP_NS, "pf").text
+""" UKP issue date element """
+UKP_METADATA_INFO = etree.QName(xml.UKP_NS, "metadatainfo").text
+""" UKP metadatainfo element """
+UKP_NEWSPAPER_ID = etree.QName(xml.UKP_NS, "newspaperID").text
+""" UKP newspaperID element """
+UKP_PAGE = etree.QName(xml.UKP_NS, "page").text
+""" UKP page element """
+UKP_ARTICLE = etree.QName(xml.UKP_NS, "article").text
+""" UKP article element """
+UKP_ISSUE_FIELDS = [UKP_ISSUE_ID, UKP_ISSUE_NUMBER, UKP_ISSUE_DATE]
+""" UKP issue child elements giving issue metadata. """
+UKP_TEXT_SECTIONS = ["text.title", "text.preamble", "text.cr"]
+""" UKP article text sections, output in this order. """
+UKP_NS = {"ukp": xml.UKP_NS}
+""" Namespaces used in UKP XPath queries. """
+UKP_TITLE = etree.XPath("string(ukp:ti)", namespaces=UKP_NS)
+""" XPath for article title, relative to article element. """
+UKP_ITEM_TYPE = etree.XPath("string(ukp:ct)", namespaces=UKP_NS)
+""" XPath for article type, relative to article element. """
+UKP_OCR_QUALITY = etree.XPath("string(ukp:ocr)", namespaces=UKP_NS)
+""" XPath for article OCR quality, relative to article element. """
+UKP_ARTICLE_ID = etree.XPath("string(ukp:id)", namespaces=UKP_NS)
+""" XPath for article ID, relative to article element. """
+UKP_WORD_COUNT = etree.XPath("count(ukp:text//ukp:wd)", namespaces=UKP_NS)
+""" XPath for article word count, relative to article element. """
+UKP_SECTION_WORDS = {
+    section: etree.XPath(
+        "ukp:text/ukp:{}/ukp:p/ukp:wd".format(section), namespaces=UKP_NS
+    )
+    for section in UKP_TEXT_SECTIONS
+}
+""" XPaths for words of each text section, relative to article element. """
+
+BLN_ARTICLE = "BL_article"
+""" BLN BL_article element """
+BLN_ARTICLE_WORD = "articleWord"
+""" BLN articleWord element """
+BLN_WORD_PATH = ["articleText", "articleImage", "image_metadata", BLN_ARTICLE]
+""" Ancestors of articleWord elements giving article text, innermost first. """
+BLN_NS = {"dc": DC_NS}
+""" Namespaces used in BLN XPath queries. """
+BLN_SOFTWARE = etree.XPath(
+    "string(article_metadata/additional_metadata/conversionCredit)"
+)
+""" XPath for software, relative to BL_article element. """
+BLN_PUBLICATION_ID = etree.XPath("string(title_metadata/titleAbbreviation)")
+""" XPath for publication ID, relative to BL_article element. """
+BLN_TITLE = etree.XPath("string(title_metadata/title)")
+""" XPath for publication title, relative to BL_article element. """
+BLN_LOCATION = etree.XPath("string(title_metadata/placeOfPublication)")
+""" XPath for location, relative to BL_article element. """
+BLN_ISSUE_ID = etree.XPath("string(issue_metadata/issueNumber)")
+""" XPath for issue ID, relative to BL_article element. """
+BLN_DATE = etree.XPath("string(issue_metadata/normalisedDate)")
+""" XPath for date, relative to BL_article element. """
+BLN_ITEM_ID = etree.XPath("string(image_metadata/articleImage/articleSequence)")
+""" XPath for article ID, relative to BL_article element. """
+BLN_ITEM_TITLE = etree.XPath(
+    "string(article_metadata/dc_metadata/dc:Title)", namespaces=BLN_NS
+)
+""" XPath for article title, relative to BL_article element. """
+BLN_QUALITY = etree.XPath("string(issue_metadata/qualityRating)")
+""" XPath for OCR quality, relative to BL_article element. """
+
+
+class BLPageError(Exception):
+    """
+    Raised when a BLN file holds BL_page elements, which contain
+    layout not text, so the file is not converted.
+    """
+
+
+def clear_element(element):
+    """
+    Clears a processed element and removes preceding siblings, which
+    have already been processed, from its parent, so memory used by
+    iterparse stays bounded.
+
+    :param element: Element
+    :type element: lxml.etree._Element
+    """
+    element.clear(keep_tail=True)
+    parent = element.getparent()
+    if parent is not None:
+        while element.getprevious() is not None:
+            del parent[0]
+
+
+def words_to_text(words):
+    """
+    Joins words as the UKP and BLN XSLTs do, with a newline after every
+    10th word and a space after other words but the last.
+
+    :param words: Words
+    :type words: list(str)
+    :return: text
+    :rtype: str
+    """
+    chunks = []
+    last = len(words)
+    for position, word in enumerate(words, 1):
+        chunks.append(word)
+        if position != last:
+            chunks.append("\n" if position % 10 == 0 else " ")
+    return "".join(chunks)
+
+
+def is_child(element, parent_tag):
+    """
+    Checks if element's parent has a tag.
+
+    :param element: Element
+    :type element: lxml.etree._Element
+    :param parent_tag: Tag
+    :type parent_tag: str
+    :return: True if so
+    :rtype: bool
+    """
+    parent = element.getparent()
+    return parent is not None and parent.tag == parent_tag
+
+
+def is_ukp_issue(element):
+    """
+    Checks if element is a /ukp:UKP/ukp:Periodical/ukp:issue element.
+
+    :param element: Element, or None
+    :type element: lxml.etree._Element
+    :return: True if so
+    :rtype: bool
+    """
+    if element is None or element.tag != UKP_ISSUE:
+        return False
+    if not is_child(element, UKP_PERIODICAL):
+        return False
+    periodical = element.getparent()
+    return is_child(periodical, xml.UKP_ROOT.text) and (
+        periodical.getparent().getparent() is None
+    )
+
+
+class UkpIssue:
+    """
+    UKP issue metadata, collected as the issue is streamed, and
+    converted articles waiting for that metadata.
+
+    The XSLT uses the first id, is, pf and metadatainfo/newspaperID
+    children of the issue, which may follow the pages, so articles are
+    held back until all of these have been seen or the issue ends.
+    """
+
+    def __init__(self):
+        self.fields = {}
+        self.publication_id = None
+        self.pending = []
+
+    def is_complete(self):
+        """
+        Checks if all issue metadata has been seen.
+
+        :return: True if so
+        :rtype: bool
+        """
+        return self.publication_id is not None and len(self.fields) == len(
+            UKP_ISSUE_FIELDS
+        )
+
+    def add_child(self, element):
+        """
+        Records issue metadata from a closed child of the issue.
+
+        :param element: Child element
+        :type element: lxml.etree._Element
+        """
+        if element.tag in UKP_ISSUE_FIELDS:
+            self.fields.setdefault(element.tag, str(STRING_VALUE(element)))
+        elif element.tag == UKP_METADATA_INFO and self.publication_id is None:
+            newspaper_id = element.find(UKP_NEWSPAPER_ID)
+            if newspaper_id is not None:
+                self.publication_id = str(STRING_VALUE(newspaper_id))
+
+    def flush(self, input_sub_path, input_filename, output_document_stub):
+        """
+        Creates articles held back for issue metadata, using "" for any
+        metadata not seen.
+
+        :param input_sub_path: Input sub-path e.g. 0002647/1824/0217
+        :type input_sub_path: str
+        :param input_filename: Input filename
+        :type input_filename: str
+        :param output_document_stub: Output file stub
+        :type output_document_stub: str
+        :return: articles
+        :rtype: list(alto2txt.articles.Article)
+        """
+        pending = self.pending
+        self.pending = []
+        return [
+            ukp_article(
+                self, record, input_sub_path, input_filename, output_document_stub
+            )
+            for record in pending
+        ]
+
+
+def ukp_article_record(article):
+    """
+    Extracts text and metadata of a UKP article element.
+
+    :param article: ukp:article element
+    :type article: lxml.etree._Element
+    :return: (article_id, text, title, item_type, word_count,
+    ocr_quality) where article_id is untrimmed
+    :rtype: tuple(str, str, str, str, int, str)
+    """
+    text = "".join(
+        words_to_text([str(STRING_VALUE(word)) for word in words(article)]) + "\n"
+        for words in UKP_SECTION_WORDS.values()
+    )
+    return (
+        str(UKP_ARTICLE_ID(article)),
+        text,
+        str(UKP_TITLE(article)),
+        str(UKP_ITEM_TYPE(article)),
+        int(UKP_WORD_COUNT(article)),
+        str(UKP_OCR_QUALITY(article)),
+    )
+
+
+def ukp_article(issue, record, input_sub_path, input_filename, output_document_stub):
+    """
+    Creates UKP article, as extract_text_ukp.xslt does.
+
+    :param issue: Issue metadata
+    :type issue: UkpIssue
+    :param record: Article record from ukp_article_record
+    :type record: tuple(str, str, str, str, int, str)
+    :param input_sub_path: Input sub-path e.g. 0002647/1824/0217
+    :type input_sub_path: str
+    :param input_filename: Input filename
+    :type input_filename: str
+    :param output_document_stub: Output file stub
+    :type output_document_stub: str
+    :return: article
+    :rtype: alto2txt.articles.Article
+    """
+    article_id, text, title, item_type, word_count, ocr_quality = record
+    issue_id = issue.fields.get(UKP_ISSUE_ID, "")
+    issue_date = issue.fields.get(UKP_ISSUE_DATE, "")
+    # Trim issue ID, and separator, from article ID.
+    article_id = article_id[len(issue_id) + 1 :]
+    stub = "{}-{}".format(output_document_stub, article_id)
+    lwm = etree.Element("lwm")
+    articles.lwm_process(lwm, "ukp", None, input_sub_path, input_filename)
+    publication = articles.sub_element(
+        lwm, "publication", id=issue.publication_id or ""
+    )
+    issue_element = articles.sub_element(
+        publication, "issue", id=issue.fields.get(UKP_ISSUE_NUMBER, "")
+    )
+    # Convert YYYYMMDD to YYYY-MM-DD.
+    articles.sub_element(
+        issue_element,
+        "date",
+        "{}-{}-{}".format(issue_date[0:4], issue_date[4:6], issue_date[6:8]),
+    )
+    item = articles.sub_element(issue_element, "item", id=article_id)
+    articles.sub_element(item, "plain_text_file", stub + articles.TEXT_SUFFIX)
+    articles.sub_element(item, "title", title)
+    articles.sub_element(item, "item_type", item_type)
+    articles.sub_element(item, "word_count", str(word_count))
+    articles.sub_element(item, "ocr_quality", ocr_quality)
+    return articles.Article(article_id, stub, text, lwm)
+
+
+def ukp_to_articles(
+    xml_file_path, input_sub_path, input_filename, output_document_stub
+):
+    """
+    Converts a UKP issue file to plaintext articles and generates
+    minimal metadata, streaming the file.
+
+    :param xml_file_path: UKP file, which may be within an archive (see
+    alto2txt.inputs)
+    :type xml_file_path: str
+    :param input_sub_path: Input sub-path e.g. 0002647/1824/0217
+    :type input_sub_path: str
+    :param input_filename: Input filename
+    :type input_filename: str
+    :param output_document_stub: Output file stub
+    :type output_document_stub: str
+    :return: articles
+    :rtype: generator(alto2txt.articles.Article)
+    :raises lxml.etree.XMLSyntaxError: if the XML is malformed, in
+    which case articles preceding the error will have been yielded
+    """
+    issue = None
+    for event, element in inputs.iterparse(xml_file_path, events=("start", "end")):
+        if event == "start":
+            if is_ukp_issue(element):
+                issue = UkpIssue()
+            continue
+        if is_ukp_issue(element):
+            yield from issue.flush(input_sub_path, input_filename, output_document_stub)
+            issue = None
+            clear_element(element)
+        elif issue is not None and is_ukp_issue(element.getparent()):
+            issue.add_child(element)
+            clear_element(element)
+            if issue.is_complete():
+                yield from issue.flush(
+                    input_sub_path, input_filename, output_document_stub
+                )
+        elif (
+            issue is not None
+            and element.tag == UKP_ARTICLE
+            and is_child(element, UKP_PAGE)
+            and is_ukp_issue(element.getparent().getparent())
+        ):
+            issue.pending.append(ukp_article_record(element))
+            clear_element(element)
+            if issue.is_complete():
+                yield from issue.flush(
+                    input_sub_path, input_filename, output_document_stub
+                )
+
+
+def bln_article(article, words, input_sub_path, input_filename, output_document_stub):
+    """
+    Creates BLN article, as extract_text_bln.xslt does.
+
+    :param article: BL_article element, with its words removed
+    :type article: lxml.etree._Element
+    :param words: Words
+    :type words: list(str)
+    :param input_sub_path: Input sub-path e.g. 0002647/1824/0217
+    :type input_sub_path: str
+    :param input_filename: Input filename
+    :type input_filename: str
+    :param output_document_stub: Output file stub
+    :type output_document_stub: str
+    :return: article
+    :rtype: alto2txt.articles.Article
+    """
+    item_id = str(BLN_ITEM_ID(article))
+    lwm = etree.Element("lwm")
+    articles.lwm_process(
+        lwm, "bln", str(BLN_SOFTWARE(article)), input_sub_path, input_filename
+    )
+    publication = articles.sub_element(
+        lwm, "publication", id=str(BLN_PUBLICATION_ID(article))
+    )
+    articles.sub_element(publication, "title", str(BLN_TITLE(article)))
+    articles.sub_element(publication, "location", str(BLN_LOCATION(article)))
+    issue = articles.sub_element(publication, "issue", id=str(BLN_ISSUE_ID(article)))
+    articles.sub_element(issue, "date", str(BLN_DATE(article)).replace(".", "-"))
+    item = articles.sub_element(issue, "item", id=item_id)
+    articles.sub_element(
+        item, "plain_text_file", output_document_stub + articles.TEXT_SUFFIX
+    )
+    articles.sub_element(item, "title", str(BLN_ITEM_TITLE(article)))
+    articles.sub_element(item, "word_count", str(len(words)))
+    articles.sub_element(item, "ocr_quality_summary", str(BLN_QUALITY(article)))
+    return articles.Article(
+        item_id, output_document_stub, words_to_text(words) + "\n", lwm
+    )
+
+
+def is_bln_article_word(element):
+    """
+    Checks if element is an articleWord giving article text, that is,
+    a BL_article/image_metadata/articleImage/articleText/articleWord
+    element, where BL_article is a child of the root element.
+
+    :param element: Element
+    :type element: lxml.etree._Element
+    :return: True if so
+    :rtype: bool
+    """
+    if element.tag != BLN_ARTICLE_WORD:
+        return False
+    for tag in BLN_WORD_PATH:
+        element = element.getparent()
+        if element is None or element.tag != tag:
+            return False
+    root = element.getparent()
+    return root is not None and root.getparent() is None
+
+
+def bln_to_articles(
+    xml_file_path, input_sub_path, input_filename, output_document_stub
+):
+    """
+    Converts a BLN file to a plaintext article and generates minimal
+    metadata, streaming the file.
+
+    Every BL_article is written by the XSLT to the same files, so only
+    the last BL_article's output is kept, and it is yielded once the
+    whole file has been parsed.
+
+    :param xml_file_path: BLN file, which may be within an archive (see
+    alto2txt.inputs)
+    :type xml_file_path: str
+    :param input_sub_path: Input sub-path e.g. 0002647/1824/0217
+    :type input_sub_path: str
+    :param input_filename: Input filename
+    :type input_filename: str
+    :param output_document_stub: Output file stub
+    :type output_document_stub: str
+    :return: articles
+    :rtype: generator(alto2txt.articles.Article)
+    :raises BLPageError: if the root element has a BL_page child
+    :raises lxml.etree.XMLSyntaxError: if the XML is malformed
+    """
+    last_article = None
+    has_bl_page = False
+    words = []
+    for _, element in inputs.iterparse(xml_file_path, events=("end",)):
+        if is_bln_article_word(element):
+            words.append(str(STRING_VALUE(element)))
+            clear_element(element)
+            continue
+        parent = element.getparent()
+        if parent is None or parent.getparent() is not None:
+            # Only children of the root element are of interest.
+            continue
+        if element.tag == xml.BLN_PAGE:
+            has_bl_page = True
+        elif element.tag == BLN_ARTICLE:
+            last_article = bln_article(
+                element, words, input_sub_path, input_filename, output_document_stub
+            )
+            words = []
+        clear_element(element)
+    if has_bl_page:
+        raise BLPageError("{} has BL_page elements".format(xml_file_path))
+    if last_article is not None:
+        yield last_article
@@ -0,0 +1,729 @@
+"""
+Generator of synthetic corpora of XML publications, in METS 1.8/ALTO
+1.4, METS 1.3/ALTO 1.4, BLN and UKP format, for benchmarking.
+
+A corpus has the structure expected by xml_to_text.publications_to_text:
+
+corpus_dir
+|-- publication
+|   |-- year
+|   |   |-- issue
+|   |   |   |-- xml_content
+|   |-- year
+|-- publication
+
+Its size is set by the number of publications per flavour, years per
+publication, issues per year, pages per issue, articles per page and
+words per article. Content is pseudo-random, from a seed, so a corpus
+is reproducible.
+"""
+
+import datetime
+import logging
+import os
+import os.path
+import random
+
+from lxml import etree
+
+from alto2txt import mets_to_text, xml
+
+logger = logging.getLogger(__name__)
+""" Module-level logger. """
+
+FLAVOURS = [xml.FLAVOUR_METS_18, xml.FLAVOUR_METS_13, xml.FLAVOUR_BLN, xml.FLAVOUR_UKP]
+""" Flavours of XML that can be generated. """
+FLAVOUR_PREFIXES = {
+    xml.FLAVOUR_METS_18: "1",
+    xml.FLAVOUR_METS_13: "2",
+    xml.FLAVOUR_BLN: "SBLN",
+    xml.FLAVOUR_UKP: "SUKP",
+}
+"""
+Publication ID prefixes for each flavour, so publications of all
+flavours can be generated into one corpus. IDs are padded to 7
+characters e.g. 1000000, SBLN000.
+"""
+FIRST_YEAR = 1850
+""" Year of first issues. """
+WORDS_PER_LINE = 8
+""" Words per ALTO TextLine or UKP/BLN paragraph. """
+WORDS = (
+    "the of and to a in that is was he for it with as his on be at by had "
+    "not are but from or have an they which one you were her all she there "
+    "would their we him been has when who will more no if out so said what "
+    "up its about into than them can only other new some could time these "
+    "two may then do first any my now such like our over man me even most "
+    "made after also did many before must through back years where much "
+    "your way well down should because each just those people Mr how too "
+    "little state good very make world still own see men work long get here "
+    "between both life being under never day same another know while last "
+    "London Parliament ship cargo market harbour letter"
+).split()
+""" Vocabulary of generated text. """
+
+ALTO_SCHEMA_LOCATION = "http://schema.ccs-gmbh.com/docworks/alto-1-4.xsd"
+""" ALTO noNamespaceSchemaLocation """
+MODS_SCHEMA_LOCATION = "http://www.loc.gov/standards/mods/v3/mods-3-2.xsd"
+""" MODS schemaLocation """
+SOFTWARE = "alto2txt synthetic corpus"
+""" METS software agent name. """
+
+
+def qname(namespace, tag):
+    """
+    Gets qualified name of an element or attribute.
+
+    :param namespace: Namespace URI
+    :type namespace: str
+    :param tag: Local name
+    :type tag: str
+    :return: qualified name
+    :rtype: str
+    """
+    return etree.QName(namespace, tag).text
+
+
+def sub_element(parent, tag, text="", attributes=None):
+    """
+    Creates sub-element, whose attributes can have qualified names.
+
+    :param parent: Parent element
+    :type parent: lxml.etree._Element
+    :param tag: Tag
+    :type tag: str
+    :param text: Text
+    :type text: str
+    :param attributes: Attributes
+    :type attributes: dict(str: str)
+    :return: Element
+    :rtype: lxml.etree._Element
+    """
+    element = etree.SubElement(parent, tag, attributes or {})
+    if text:
+        element.text = text
+    return element
+
+
+def write_xml(root, path):
+    """
+    Writes XML document.
+
+    :param root: Root element
+    :type root: lxml.etree._Element
+    :param path: File path
+    :type path: str
+    """
+    etree.ElementTree(root).write(
+        path, xml_declaration=True, encoding="UTF-8", pretty_print=True
+    )
+
+
+def get_words(rng, num_words):
+    """
+    Gets pseudo-random words, with a number near num_words.
+
+    :param rng: Random number generator
+    :type rng: random.Random
+    :param num_words: Mean number of words
+    :type num_words: int
+    :return: words
+    :rtype: list(str)
+    """
+    num_words = max(1, int(rng.gauss(num_words, num_words / 4)))
+    return [rng.choice(WORDS) for _ in range(num_words)]
+
+
+def get_lines(words):
+    """
+    Splits words into lines of WORDS_PER_LINE words.
+
+    :param words: Words
+    :type words: list(str)
+    :return: lines
+    :rtype: list(list(str))
+    """
+    return [
+        words[start : start + WORDS_PER_LINE]
+        for start in range(0, len(words), WORDS_PER_LINE)
+    ]
+
+
+def issue_dates(year, num_issues):
+    """
+    Gets dates of issues spread over a year.
+
+    :param year: Year
+    :type year: int
+    :param num_issues: Number of issues, at most 365
+    :type num_issues: int
+    :return: dates
+    :rtype: list(datetime.date)
+    """
+    interval = max(1, 365 // max(num_issues, 1))
+    first = datetime.date(year, 1, 1)
+    return [first + datetime.timedelta(days=i * interval) for i in range(num_issues)]
+
+
+def alto_page(path, page, blocks, rng):
+    """
+    Writes an ALTO 1.4 page.
+
+    :param path: File path
+    :type path: str
+    :param page: Page number, from 1
+    :type page: int
+    :param blocks: (TextBlock ID, words) tuples
+    :type blocks: list(tuple(str, list(str)))
+    :param rng: Random number generator
+    :type rng: random.Random
+    """
+    alto = etree.Element(
+        xml.ALTO_ROOT,
+        {xml.NO_NS_SCHEMA_LOCATION.text: ALTO_SCHEMA_LOCATION},
+        nsmap={"xsi": xml.XSI_NS},
+    )
+    layout = sub_element(alto, mets_to_text.ALTO_LAYOUT)
+    page_element = sub_element(
+        layout,
+        "Page",
+        attributes={"ID": "P{}".format(page), "PHYSICAL_IMG_NR": str(page)},
+    )
+    print_space = sub_element(page_element, "PrintSpace")
+    for block_id, words in blocks:
+        block = sub_element(
+            print_space, mets_to_text.ALTO_TEXT_BLOCK, attributes={"ID": block_id}
+        )
+        for line_words in get_lines(words):
+            line = sub_element(block, mets_to_text.ALTO_TEXT_LINE)
+            for position, word in enumerate(line_words):
+                if position > 0:
+                    sub_element(line, mets_to_text.ALTO_SP)
+                sub_element(
+                    line,
+                    mets_to_text.ALTO_STRING,
+                    attributes={
+                        "CONTENT": word,
+                        "WC": "{:.2f}".format(rng.uniform(0.3, 1.0)),
+                    },
+                )
+    write_xml(alto, path)
+
+
+def mets_root(schema_uri, xlink_ns):
+    """
+    Creates METS root element.
+
+    :param schema_uri: METS schemaLocation
+    :type schema_uri: str
+    :param xlink_ns: XLink namespace URI
+    :type xlink_ns: str
+    :return: mets element
+    :rtype: lxml.etree._Element
+    """
+    mets = etree.Element(
+        xml.METS_ROOT.text,
+        {
+            xml.SCHEMA_LOCATION.text: "{} {} {} {}".format(
+                xml.METS_NS, schema_uri, mets_to_text.MODS_NS, MODS_SCHEMA_LOCATION
+            ),
+            "TYPE": "Newspaper",
+        },
+        nsmap={
+            "mets": xml.METS_NS,
+            "mods": mets_to_text.MODS_NS,
+            "xlink": xlink_ns,
+            "xsi": xml.XSI_NS,
+        },
+    )
+    header = sub_element(mets, qname(xml.METS_NS, "metsHdr"))
+    agent = sub_element(
+        header,
+        qname(xml.METS_NS, "agent"),
+        attributes={"ROLE": "CREATOR", "TYPE": "OTHER", "OTHERTYPE": "SOFTWARE"},
+    )
+    sub_element(agent, qname(xml.METS_NS, "name"), SOFTWARE)
+    return mets
+
+
+def mods_section(mets, dmd_id):
+    """
+    Creates METS dmdSec holding a MODS element, after any other
+    dmdSec elements.
+
+    :param mets: mets element
+    :type mets: lxml.etree._Element
+    :param dmd_id: dmdSec ID
+    :type dmd_id: str
+    :return: mods element
+    :rtype: lxml.etree._Element
+    """
+    dmd_secs = mets.findall(mets_to_text.METS_DMD_SEC)
+    dmd_sec = etree.Element(mets_to_text.METS_DMD_SEC, {"ID": dmd_id})
+    if dmd_secs:
+        dmd_secs[-1].addnext(dmd_sec)
+    else:
+        mets.append(dmd_sec)
+    md_wrap = sub_element(
+        dmd_sec, qname(xml.METS_NS, "mdWrap"), attributes={"MDTYPE": "MODS"}
+    )
+    xml_data = sub_element(md_wrap, qname(xml.METS_NS, "xmlData"))
+    return sub_element(xml_data, qname(mets_to_text.MODS_NS, "mods"))
+
+
+def mets18_issue(issue_dir, publication, date, number, pages, rng):
+    """
+    Writes a METS 1.8 file and its ALTO 1.4 pages.
+
+    Each article is held in one TextBlock, whose ID is that of a
+    pagearea div linked to the article by structLink.
+
+    :param issue_dir: Issue directory
+    :type issue_dir: str
+    :param publication: Publication ID
+    :type publication: str
+    :param date: Issue date
+    :type date: datetime.date
+    :param number: Issue number
+    :type number: int
+    :param pages: Words of each article on each page
+    :type pages: list(list(list(str)))
+    :param rng: Random number generator
+    :type rng: random.Random
+    """
+    stub = "{}_{}".format(publication, date.strftime("%Y%m%d"))
+    mets = mets_root(xml.METS_18_URI, mets_to_text.XLINK_18_NS)
+    mods_ns = mets_to_text.MODS_NS
+    issue_dmd_id = "MODS_ISSUE_{}-00000".format(publication)
+    mods = mods_section(mets, issue_dmd_id)
+    host = sub_element(mods, qname(mods_ns, "relatedItem"), attributes={"type": "host"})
+    sub_element(host, qname(mods_ns, "identifier"), publication, {"type": "NLP"})
+    original = sub_element(
+        mods, qname(mods_ns, "relatedItem"), attributes={"type": "original"}
+    )
+    sub_element(original, qname(mods_ns, "note"), SOFTWARE, {"type": "source note"})
+    title_info = sub_element(mods, qname(mods_ns, "titleInfo"))
+    sub_element(title_info, qname(mods_ns, "title"), "The {}".format(publication))
+    origin_info = sub_element(mods, qname(mods_ns, "originInfo"))
+    sub_element(
+        origin_info,
+        qname(mods_ns, "dateIssued"),
+        date.isoformat(),
+        {"encoding": "w3cdtf"},
+    )
+    place = sub_element(origin_info, qname(mods_ns, "place"))
+    sub_element(place, qname(mods_ns, "placeTerm"), "London, England", {"type": "text"})
+    part = sub_element(mods, qname(mods_ns, "part"))
+    detail = sub_element(part, qname(mods_ns, "detail"), attributes={"type": "issue"})
+    sub_element(detail, qname(mods_ns, "number"), str(number))
+    file_sec = sub_element(mets, qname(xml.METS_NS, "fileSec"))
+    file_grp = sub_element(
+        file_sec, qname(xml.METS_NS, "fileGrp"), attributes={"USE": "Fulltext"}
+    )
+    logical = sub_element(
+        mets, qname(xml.METS_NS, "structMap"), attributes={"TYPE": "LOGICAL"}
+    )
+    issue_div = sub_element(
+        logical,
+        qname(xml.METS_NS, "div"),
+        attributes={"ID": "log1", "TYPE": "ISSUE", "DMDID": issue_dmd_id},
+    )
+    physical = sub_element(
+        mets, qname(xml.METS_NS, "structMap"), attributes={"TYPE": "PHYSICAL"}
+    )
+    sequence = sub_element(
+        physical,
+        qname(xml.METS_NS, "div"),
+        attributes={"ID": "phys0", "TYPE": "physSequence"},
+    )
+    struct_link = sub_element(mets, qname(xml.METS_NS, "structLink"))
+    href = qname(mets_to_text.XLINK_18_NS, "href")
+    label = qname(mets_to_text.XLINK_18_NS, "label")
+    xlink_type = qname(mets_to_text.XLINK_18_NS, "type")
+    item = 0
+    for page, page_articles in enumerate(pages, 1):
+        file_id = "img{:04d}-alto".format(page)
+        alto_file = "{}_{:04d}.xml".format(stub, page)
+        file_element = sub_element(
+            file_grp, qname(xml.METS_NS, "file"), attributes={"ID": file_id}
+        )
+        sub_element(
+            file_element,
+            qname(xml.METS_NS, "FLocat"),
+            attributes={"LOCTYPE": "URL", href: alto_file},
+        )
+        page_div = sub_element(
+            sequence,
+            qname(xml.METS_NS, "div"),
+            attributes={
+                "ID": "phys{}".format(page),
+                "ORDER": str(page),
+                "TYPE": "page",
+            },
+        )
+        sub_element(
+            page_div, qname(xml.METS_NS, "fptr"), attributes={"FILEID": file_id}
+        )
+        blocks = []
+        for area, words in enumerate(page_articles, 1):
+            item += 1
+            item_id = "art{:04d}".format(item)
+            item_dmd_id = "modsarticle{}".format(item)
+            area_id = "pa{:04d}{:03d}".format(page, area)
+            item_mods = mods_section(mets, item_dmd_id)
+            item_title_info = sub_element(item_mods, qname(mods_ns, "titleInfo"))
+            sub_element(
+                item_title_info, qname(mods_ns, "title"), " ".join(words[:3]).title()
+            )
+            sub_element(
+                issue_div,
+                qname(xml.METS_NS, "div"),
+                attributes={"ID": item_id, "TYPE": "ARTICLE", "DMDID": item_dmd_id},
+            )
+            area_div = sub_element(
+                page_div,
+                qname(xml.METS_NS, "div"),
+                attributes={"ID": area_id, "TYPE": "pagearea"},
+            )
+            fptr = sub_element(area_div, qname(xml.METS_NS, "fptr"))
+            sub_element(
+                fptr,
+                qname(xml.METS_NS, "area"),
+                attributes={"FILEID": file_id, "BETYPE": "IDREF", "BEGIN": area_id},
+            )
+            group = sub_element(struct_link, qname(xml.METS_NS, "smLinkGrp"))
+            area_label = "page{} area{}".format(page, area)
+            sub_element(
+                group,
+                qname(xml.METS_NS, "smLocatorLink"),
+                attributes={
+                    href: "#" + item_id,
+                    label: "article",
+                    xlink_type: "locator",
+                },
+            )
+            sub_element(
+                group,
+                qname(xml.METS_NS, "smLocatorLink"),
+                attributes={
+                    href: "#" + area_id,
+                    label: area_label,
+                    xlink_type: "locator",
+                },
+            )
+            sub_element(
+                group,
+                qname(xml.METS_NS, "smArcLink"),
+                attributes={
+                    xlink_type: "arc",
+                    qname(mets_to_text.XLINK_18_NS, "from"): "article",
+                    qname(mets_to_text.XLINK_18_NS, "to"): area_label,
+                    "ARCTYPE": "logicalphysical",
+                },
+            )
+            blocks.append((area_id, words))
+        alto_page(os.path.join(issue_dir, alto_file), page, blocks, rng)
+    write_xml(mets, os.path.join(issue_dir, stub + "_mets.xml"))
+
+
+def mets13_issue(issue_dir, publication, date, number, pages, rng):
+    """
+    Writes a METS 1.3 file and its ALTO 1.4 pages.
+
+    Each article is held in one TextBlock, referenced by an area of
+    the article's div.
+
+    :param issue_dir: Issue directory
+    :type issue_dir: str
+    :param publication: Publication ID
+    :type publication: str
+    :param date: Issue date
+    :type date: datetime.date
+    :param number: Issue number
+    :type number: int
+    :param pages: Words of each article on each page
+    :type pages: list(list(list(str)))
+    :param rng: Random number generator
+    :type rng: random.Random
+    """
+    stub = "{}_{}".format(publication, date.strftime("%Y%m%d"))
+    mets = mets_root(xml.METS_13_URI, mets_to_text.XLINK_13_NS)
+    mods_ns = mets_to_text.MODS_NS
+    issue_dmd_id = "MODSMD_ISSUE1"
+    mods = mods_section(mets, issue_dmd_id)
+    title_info = sub_element(mods, qname(mods_ns, "titleInfo"))
+    sub_element(title_info, qname(mods_ns, "title"), "The {}".format(publication))
+    sub_element(title_info, qname(mods_ns, "partNumber"), str(number))
+    origin_info = sub_element(mods, qname(mods_ns, "originInfo"))
+    sub_element(origin_info, qname(mods_ns, "dateIssued"), date.strftime("%d.%m.%Y"))
+    host = sub_element(mods, qname(mods_ns, "relatedItem"), attributes={"type": "host"})
+    sub_element(host, qname(mods_ns, "identifier"), publication, {"type": "local"})
+    file_sec = sub_element(mets, qname(xml.METS_NS, "fileSec"))
+    file_grp = sub_element(
+        file_sec, qname(xml.METS_NS, "fileGrp"), attributes={"USE": "Text"}
+    )
+    logical = sub_element(
+        mets, qname(xml.METS_NS, "structMap"), attributes={"TYPE": "LOGICAL"}
+    )
+    newspaper = sub_element(
+        logical, qname(xml.METS_NS, "div"), attributes={"TYPE": "Newspaper"}
+    )
+    volume = sub_element(
+        newspaper, qname(xml.METS_NS, "div"), attributes={"TYPE": "VOLUME"}
+    )
+    issue_div = sub_element(
+        volume,
+        qname(xml.METS_NS, "div"),
+        attributes={"ID": "DIVL1", "TYPE": "ISSUE", "DMDID": issue_dmd_id},
+    )
+    content = sub_element(
+        issue_div, qname(xml.METS_NS, "div"), attributes={"TYPE": "CONTENT"}
+    )
+    href = qname(mets_to_text.XLINK_13_NS, "href")
+    item = 0
+    for page, page_articles in enumerate(pages, 1):
+        file_id = "ALTO{:04d}".format(page)
+        alto_file = "{}_{:04d}.xml".format(stub, page)
+        file_element = sub_element(
+            file_grp, qname(xml.METS_NS, "file"), attributes={"ID": file_id}
+        )
+        sub_element(
+            file_element,
+            qname(xml.METS_NS, "FLocat"),
+            attributes={
+                "LOCTYPE": "URL",
+                href: mets_to_text.METS_13_FILE_PREFIX + alto_file,
+            },
+        )
+        blocks = []
+        for area, words in enumerate(page_articles, 1):
+            item += 1
+            item_dmd_id = "MODSMD_ARTICLE{}".format(item)
+            block_id = "P{}_TB{:05d}".format(page, area)
+            item_mods = mods_section(mets, item_dmd_id)
+            item_title_info = sub_element(item_mods, qname(mods_ns, "titleInfo"))
+            sub_element(
+                item_title_info, qname(mods_ns, "title"), " ".join(words[:3]).title()
+            )
+            div = sub_element(
+                content,
+                qname(xml.METS_NS, "div"),
+                attributes={
+                    "ID": "art{:04d}".format(item),
+                    "TYPE": "ARTICLE",
+                    "DMDID": item_dmd_id,
+                },
+            )
+            for div_type in ["BODY", "TEXT", "BODY", "BODY_CONTENT"]:
+                div = sub_element(
+                    div, qname(xml.METS_NS, "div"), attributes={"TYPE": div_type}
+                )
+            fptr = sub_element(div, qname(xml.METS_NS, "fptr"))
+            sub_element(
+                fptr,
+                qname(xml.METS_NS, "area"),
+                attributes={"FILEID": file_id, "BEGIN": block_id, "BETYPE": "IDREF"},
+            )
+            blocks.append((block_id, words))
+        alto_page(os.path.join(issue_dir, alto_file), page, blocks, rng)
+    write_xml(mets, os.path.join(issue_dir, stub + "_mets.xml"))
+
+
+def bln_issue(issue_dir, publication, date, number, pages, rng):
+    """
+    Writes a BLN file per article.
+
+    :param issue_dir: Issue directory
+    :type issue_dir: str
+    :param publication: Publication ID
+    :type publication: str
+    :param date: Issue date
+    :type date: datetime.date
+    :param number: Issue number
+    :type number: int
+    :param pages: Words of each article on each page
+    :type pages: list(list(list(str)))
+    :param rng: Random number generator
+    :type rng: random.Random
+    """
+    stub = "{}_{}".format(publication, date.strftime("%Y%m%d"))
+    dc_ns = "http://purl.org/dc/elements/1.1/"
+    item = 0
+    for page_articles in pages:
+        for words in page_articles:
+            item += 1
+            root = etree.Element(xml.BLN_ROOT, nsmap={"dc": dc_ns})
+            article = sub_element(root, "BL_article")
+            title_metadata = sub_element(article, "title_metadata")
+            sub_element(title_metadata, "titleAbbreviation", publication)
+            sub_element(title_metadata, "title", "The {}".format(publication))
+            sub_element(title_metadata, "placeOfPublication", "London, England")
+            issue_metadata = sub_element(article, "issue_metadata")
+            sub_element(issue_metadata, "issueNumber", str(number))
+            sub_element(issue_metadata, "normalisedDate", date.strftime("%Y.%m.%d"))
+            sub_element(issue_metadata, "qualityRating", str(rng.randint(1, 4)))
+            article_metadata = sub_element(article, "article_metadata")
+            dc_metadata = sub_element(article_metadata, "dc_metadata")
+            sub_element(dc_metadata, qname(dc_ns, "Title"), " ".join(words[:3]).title())
+            image_metadata = sub_element(article, "image_metadata")
+            article_image = sub_element(image_metadata, "articleImage")
+            sub_element(article_image, "articleSequence", "{:04d}".format(item))
+            article_text = sub_element(article_image, "articleText")
+            for position, word in enumerate(words):
+                sub_element(
+                    article_text,
+                    "articleWord",
+                    word,
+                    {"pos": "{},0,0,0".format(position)},
+                )
+            write_xml(root, os.path.join(issue_dir, "{}_{:04d}.xml".format(stub, item)))
+
+
+def ukp_issue(issue_dir, publication, date, number, pages, rng):
+    """
+    Writes a UKP file for an issue.
+
+    :param issue_dir: Issue directory
+    :type issue_dir: str
+    :param publication: Publication ID
+    :type publication: str
+    :param date: Issue date
+    :type date: datetime.date
+    :param number: Issue number
+    :type number: int
+    :param pages: Words of each article on each page
+    :type pages: list(list(list(str)))
+    :param rng: Random number generator
+    :type rng: random.Random
+    """
+    stub = "{}_{}".format(publication, date.strftime("%Y%m%d"))
+    root = etree.Element(xml.UKP_ROOT.text, nsmap={None: xml.UKP_NS})
+
+    def ukp_element(parent, tag, text=""):
+        return sub_element(parent, qname(xml.UKP_NS, tag), text)
+
+    periodical = ukp_element(root, "Periodical")
+    issue = ukp_element(periodical, "issue")
+    issue_id = "{}-{}".format(publication, date.strftime("%Y-%m%d"))
+    ukp_element(issue, "id", issue_id)
+    ukp_element(issue, "is", str(number))
+    ukp_element(issue, "pf", date.strftime("%Y%m%d"))
+    metadata_info = ukp_element(issue, "metadatainfo")
+    ukp_element(metadata_info, "newspaperID", publication)
+    for page, page_articles in enumerate(pages, 1):
+        page_element = ukp_element(issue, "page")
+        ukp_element(page_element, "pa", str(page))
+        for area, words in enumerate(page_articles, 1):
+            article = ukp_element(page_element, "article")
+            ukp_element(article, "id", "{}-{:04d}-{:03d}".format(issue_id, page, area))
+            ukp_element(article, "ti", " ".join(words[:3]).title())
+            ukp_element(article, "ct", "News")
+            ukp_element(article, "ocr", "{:.1f}".format(rng.uniform(30, 100)))
+            text = ukp_element(article, "text")
+            text_cr = ukp_element(text, "text.cr")
+            for line_words in get_lines(words):
+                paragraph = ukp_element(text_cr, "p")
+                for position, word in enumerate(line_words):
+                    wd = ukp_element(paragraph, "wd", word)
+                    wd.set("pos", "{},0,0,0".format(position))
+    write_xml(root, os.path.join(issue_dir, stub + ".xml"))
+
+
+def publication_id(flavour, index):
+    """
+    Gets ID of a generated publication.
+
+    :param flavour: Flavour, from FLAVOURS
+    :type flavour: str
+    :param index: Index of publication of the flavour, from 0
+    :type index: int
+    :return: publication ID e.g. 1000000, SBLN000
+    :rtype: str
+    """
+    prefix = FLAVOUR_PREFIXES[flavour]
+    return prefix + str(index).zfill(7 - len(prefix))
+
+
+ISSUE_GENERATORS = {
+    xml.FLAVOUR_METS_18: mets18_issue,
+    xml.FLAVOUR_METS_13: mets13_issue,
+    xml.FLAVOUR_BLN: bln_issue,
+    xml.FLAVOUR_UKP: ukp_issue,
+}
+""" Map from flavour to issue generator. """
+
+
+def generate_corpus(
+    corpus_dir,
+    flavours=FLAVOURS,
+    publications=1,
+    years=1,
+    issues=1,
+    pages=4,
+    articles_per_page=8,
+    words=200,
+    seed=0,
+):
+    """
+    Generates a synthetic corpus.
+
+    :param corpus_dir: Output directory for XML publications
+    :type corpus_dir: str
+    :param flavours: Flavours, from FLAVOURS
+    :type flavours: list(str)
+    :param publications: Publications per flavour
+    :type publications: int
+    :param years: Years per publication
+    :type years: int
+    :param issues: Issues per year
+    :type issues: int
+    :param pages: Pages per issue
+    :type pages: int
+    :param articles_per_page: Articles per page
+    :type articles_per_page: int
+    :param words: Mean words per article
+    :type words: int
+    :param seed: Random number generator seed
+    :type seed: int
+    :return: counts of publications, issues, articles, files and bytes
+    :rtype: dict(str: int)
+    :raise AssertionError: if a flavour is not in FLAVOURS
+    """
+    for flavour in flavours:
+        assert flavour in ISSUE_GENERATORS, "Unknown flavour: {}".format(flavour)
+    rng = random.Random(seed)
+    counts = {
+        "num_publications": 0,
+        "num_issues": 0,
+        "num_articles": 0,
+        "num_files": 0,
+        "num_bytes": 0,
+    }
+    for flavour in flavours:
+        for publication_index in range(publications):
+            publication = publication_id(flavour, publication_index)
+            counts["num_publications"] += 1
+            number = 0
+            for year in range(FIRST_YEAR, FIRST_YEAR + years):
+                for date in issue_dates(year, issues):
+                    number += 1
+                    issue_dir = os.path.join(
+                        corpus_dir, publication, str(year), date.strftime("%m%d")
+                    )
+                    os.makedirs(issue_dir, exist_ok=True)
+                    issue_pages = [
+                        [get_words(rng, words) for _ in range(articles_per_page)]
+                        for _ in range(pages)
+                    ]
+                    ISSUE_GENERATORS[flavour](
+                        issue_dir, publication, date, number, issue_pages, rng
+                    )
+                    counts["num_issues"] += 1
+                    counts["num_articles"] += pages * articles_per_page
+                    for name in os.listdir(issue_dir):
+                        counts["num_files"] += 1
+                        counts["num_bytes"] += os.path.getsize(
+                            os.path.join(issue_dir, name)
+                        )
+    logger.info("Corpus %s: %s", corpus_dir, str(counts))
+    return counts
@@ -0,0 +1,229 @@
+"""
+Functions to convert XML (in METS 1.8/ALTO 1.4, METS 1.3/ALTO 1.4, BLN
+or UKP format) publications to plaintext articles and generate minimal
+metadata using a pool of threads in a single process.
+
+lxml releases the GIL while parsing XML and running XSLTs, so threads
+convert issues concurrently without the cost of a process per core:
+one interpreter and one set of log handlers. The XSLT files are read
+once, by the main thread. XSLTs are not shared between threads, and
+lxml parsers, and the names they intern, are specific to a thread, so
+each thread parses and compiles its own XSLTs, once, from the contents
+read.
+"""
+
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from alto2txt import profiling, sampling, sinks, stats, xml, xml_to_text
+from alto2txt.multiprocess_xml_to_text import batch_issues, issues_to_text, list_issues
+
+logger = logging.getLogger(__name__)
+""" Module-level logger. """
+
+BATCHES_PER_THREAD = 4
+"""
+Number of issue batches to create per thread. More batches give
+better load balancing at the cost of more task dispatches.
+"""
+
+_thread_xslts = threading.local()
+""" XSLTs compiled for each thread, by get_thread_xslts. """
+
+
+def get_thread_xslts(xslt_sources):
+    """
+    Gets the XSLTs of the current thread, parsing and compiling them
+    on first use.
+
+    :param xslt_sources: XSLT contents and paths, from
+    alto2txt.xml.read_xslts
+    :type xslt_sources: dict(str: tuple(bytes, str))
+    :return: XSLTs
+    :rtype: dict(str: lxml.etree.XSLT)
+    """
+    xslts = getattr(_thread_xslts, "xslts", None)
+    if xslts is None or _thread_xslts.xslt_sources is not xslt_sources:
+        xslts = xml.load_xslts(xslt_sources)
+        _thread_xslts.xslts = xslts
+        _thread_xslts.xslt_sources = xslt_sources
+    return xslts
+
+
+def thread_issues_to_text(issues, xslt_sources, **kwargs):
+    """
+    Converts a batch of issues on a thread of the pool, with the XSLTs
+    of the thread (see multiprocess_xml_to_text.issues_to_text).
+
+    :param issues: (publication, year, issue, issue_dir,
+    issue_inventory, issue_record) tuples, from
+    multiprocess_xml_to_text.list_issues
+    :type issues: list(tuple(str, str, str, str, dict, dict))
+    :param xslt_sources: XSLT contents and paths, from
+    alto2txt.xml.read_xslts
+    :type xslt_sources: dict(str: tuple(bytes, str))
+    :param kwargs: Keyword arguments of
+    multiprocess_xml_to_text.issues_to_text
+    :type kwargs: dict
+    :return: publication to summary of its issues in the batch (see
+    alto2txt.stats)
+    :rtype: dict(str: dict(str: int or float))
+    """
+    return issues_to_text(issues, xslts=get_thread_xslts(xslt_sources), **kwargs)
+
+
+def publications_to_text(
+    publications_dir,
+    txt_out_dir,
+    downsample=1,
+    engine=xml_to_text.ENGINE_XSLT,
+    resume=False,
+    incremental=False,
+    output_format=sinks.OUTPUT_FILES,
+    index=False,
+    search=False,
+    profile=False,
+    writer_threads=0,
+    fsync=sinks.FSYNC_NONE,
+    count_words=False,
+    inventory_file=None,
+    sample_size=None,
+    sample_bytes=None,
+    stratify=sampling.STRATIFY_PUBLICATION,
+    sample_seed=0,
+    issues_file=None,
+    shard_index=0,
+    shard_count=1,
+    num_threads=None,
+):
+    """
+    Converts XML publications to plaintext articles and generates
+    minimal metadata.
+
+    Issues are listed, and batched, as for
+    multiprocess_xml_to_text.publications_to_text, and the batches are
+    handed out to a pool of threads as threads become free. Each batch
+    is converted by multiprocess_xml_to_text.issues_to_text, with its
+    own manifest, index part files, profiler and output writer, so
+    these are not shared between threads.
+
+    publications_dir is expected to have the structure described in
+    multiprocess_xml_to_text.publications_to_text.
+
+    :param publications dir: Input directory with XML publications
+    :type publications_dir: str
+    :param txt_out_dir: Output directory for plaintext articles
+    :type txt_out_dir: str
+    :param downsample: Downsample, converting 1 in N issues only (see
+    alto2txt.sampling)
+    :type downsample: int
+    :param engine: Engine, one of xml_to_text.ENGINES
+    :type engine: str
+    :param resume: Resume, skipping issues already converted
+    :type resume: bool
+    :param incremental: Convert only issues whose content changed
+    :type incremental: bool
+    :param output_format: Output format, one of
+    alto2txt.sinks.OUTPUT_FORMATS
+    :type output_format: str
+    :param index: Write metadata index
+    :type index: bool
+    :param search: Write full-text search index
+    :type search: bool
+    :param profile: Profile conversion
+    :type profile: bool
+    :param writer_threads: Number of writer threads per batch
+    :type writer_threads: int
+    :param fsync: fsync policy, one of alto2txt.sinks.FSYNC_POLICIES
+    :type fsync: str
+    :param count_words: Count words of articles written by the XSLTs
+    :type count_words: bool
+    :param inventory_file: Inventory file to reuse, see
+    alto2txt.inventory.get_inventory
+    :type inventory_file: str
+    :param sample_size: Number of issues to convert, or None for all
+    :type sample_size: int
+    :param sample_bytes: Total size, in bytes, of the input files of the
+    issues to convert, or None for all
+    :type sample_bytes: int
+    :param stratify: Stratification, one of
+    alto2txt.sampling.STRATIFICATIONS
+    :type stratify: str
+    :param sample_seed: Sampling seed
+    :type sample_seed: int
+    :param issues_file: File listing issues to convert, or "-" to read
+    them from stdin, or None for all issues (see
+    alto2txt.inventory.read_issue_paths)
+    :type issues_file: str
+    :param shard_index: Shard of issues to convert, from 0 (see
+    alto2txt.inventory.take_shard)
+    :type shard_index: int
+    :param shard_count: Number of shards
+    :type shard_count: int
+    :param num_threads: Number of threads, or None for one per CPU
+    :type num_threads: int
+    :return: publication to summary (see alto2txt.stats)
+    :rtype: dict(str: dict(str: int or float))
+    """
+    logger.info("Processing: %s", publications_dir)
+    issues, summaries = list_issues(
+        publications_dir,
+        txt_out_dir,
+        downsample,
+        resume,
+        incremental,
+        inventory_file,
+        sample_size,
+        sample_bytes,
+        stratify,
+        sample_seed,
+        issues_file,
+        shard_index,
+        shard_count,
+    )
+    if not issues:
+        return summaries
+    if num_threads is None:
+        num_threads = multiprocessing.cpu_count()
+    batches = batch_issues(issues, num_threads * BATCHES_PER_THREAD)
+    pool_size = min(num_threads, len(batches))
+    logger.info(
+        "Issues: %d Batches: %d Thread pool size: %d",
+        len(issues),
+        len(batches),
+        pool_size,
+    )
+    xslt_sources = xml.read_xslts()
+    with ThreadPoolExecutor(pool_size, thread_name_prefix="alto2txt") as executor:
+        for batch_summaries in executor.map(
+            partial(
+                thread_issues_to_text,
+                xslt_sources=xslt_sources,
+                txt_out_dir=txt_out_dir,
+                engine=engine,
+                incremental=incremental,
+                output_format=output_format,
+                index=index,
+                search=search,
+                profile=profile,
+                writer_threads=writer_threads,
+                fsync=fsync,
+                count_words=count_words,
+            ),
+            batches,
+        ):
+            stats.add_summaries(summaries, batch_summaries)
+    if index:
+        from alto2txt import metadata_index
+
+        metadata_index.merge_index(txt_out_dir)
+    if search:
+        from alto2txt import search_index
+
+        search_index.merge_search_index(txt_out_dir)
+    if profile:
+        profiling.merge_profiles(txt_out_dir)
+    return summaries
@@ -0,0 +1,488 @@
+"""
+Work queue of issues, in a SQLite database on a filesystem shared by
+any number of worker processes, on any number of nodes.
+
+The first worker to open the queue lists the issues to convert and
+adds them to the queue (see WorkQueue.populate). Every worker then
+claims issues, one at a time, taking a lease which expires unless it
+is renewed (see WorkQueue.claim). A thread in each worker renews the
+leases it holds (see WorkQueue.start_renewing), so issues of a worker
+that crashed, or lost its node, are claimed again by another worker
+once their leases expire. An issue whose lease has expired
+QUEUE_MAX_ATTEMPTS times is recorded as failed rather than claimed
+again.
+
+The summary of each issue converted is stored in the queue, so the
+summaries of all issues, whichever worker converted them, can be
+aggregated (see WorkQueue.get_summaries), and the last worker to
+finish can be identified (see WorkQueue.finalise).
+
+Lease expiry times are compared across nodes, so their clocks must be
+synchronised to well within the lease duration. SQLite's locking must
+be supported by the shared filesystem.
+"""
+
+import json
+import logging
+import os
+import os.path
+import socket
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from alto2txt import stats
+
+logger = logging.getLogger(__name__)
+""" Module-level logger. """
+
+QUEUE_FILE = "alto2txt_queue.sqlite"
+""" Work queue file name, in output directory. """
+QUEUE_LEASE_SECONDS = 600
+""" Default duration, in seconds, of a lease on an issue. """
+QUEUE_MAX_ATTEMPTS = 3
+""" Number of leases on an issue that may expire before it is failed. """
+QUEUE_TIMEOUT = 60
+""" Time, in seconds, to wait for a lock on the queue. """
+
+QUEUE_PENDING = "pending"
+""" State of an issue waiting to be claimed. """
+QUEUE_LEASED = "leased"
+""" State of an issue claimed by a worker. """
+QUEUE_DONE = "done"
+""" State of an issue converted. """
+QUEUE_FAILED = "failed"
+""" State of an issue that failed to convert. """
+QUEUE_STATES = [QUEUE_PENDING, QUEUE_LEASED, QUEUE_DONE, QUEUE_FAILED]
+""" Issue states. """
+
+QUEUE_LISTED = "listed"
+""" Listing owner recorded once the queue is populated. """
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS issues (
+    id INTEGER PRIMARY KEY,
+    publication TEXT NOT NULL,
+    year TEXT NOT NULL,
+    issue TEXT NOT NULL,
+    issue_dir TEXT NOT NULL,
+    inventory TEXT,
+    record TEXT,
+    cost INTEGER NOT NULL,
+    state TEXT NOT NULL,
+    worker TEXT,
+    lease_expiry REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    summary TEXT,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS issues_state ON issues (state, cost);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+""" Queue database schema. """
+
+
+def get_worker_id():
+    """
+    Gets an identifier of this process, unique across nodes.
+
+    :return: host name and process ID e.g. node01:1234
+    :rtype: str
+    """
+    return "{}:{}".format(socket.gethostname(), os.getpid())
+
+
+def connect(queue_file):
+    """
+    Connects to a queue database, creating it if needed. The connection
+    does not open transactions implicitly (see transaction).
+
+    :param queue_file: Queue file
+    :type queue_file: str
+    :return: connection
+    :rtype: sqlite3.Connection
+    """
+    queue_dir = os.path.dirname(queue_file)
+    if queue_dir:
+        os.makedirs(queue_dir, exist_ok=True)
+    connection = sqlite3.connect(
+        queue_file, timeout=QUEUE_TIMEOUT, isolation_level=None
+    )
+    connection.executescript(SCHEMA)
+    return connection
+
+
+@contextmanager
+def transaction(connection):
+    """
+    Context manager running statements in a transaction which holds
+    the write lock on the queue from the start, so a row read cannot
+    be claimed by another worker before it is updated.
+
+    :param connection: Connection, from connect
+    :type connection: sqlite3.Connection
+    """
+    connection.execute("BEGIN IMMEDIATE")
+    try:
+        yield connection
+    except BaseException:
+        connection.execute("ROLLBACK")
+        raise
+    connection.execute("COMMIT")
+
+
+class WorkQueue:
+    """
+    Work queue of issues shared by worker processes.
+
+    :param queue_file: Queue file
+    :type queue_file: str
+    :param lease_seconds: Duration, in seconds, of a lease on an issue
+    :type lease_seconds: float
+    :param worker_id: Identifier of this worker, or None for
+    get_worker_id
+    :type worker_id: str
+    """
+
+    def __init__(self, queue_file, lease_seconds=QUEUE_LEASE_SECONDS, worker_id=None):
+        self.queue_file = queue_file
+        self.lease_seconds = lease_seconds
+        self.worker_id = worker_id or get_worker_id()
+        self.connection = connect(queue_file)
+        self.renewer = None
+        self.stop_renewing = threading.Event()
+
+    def get_meta(self, key):
+        """
+        Gets a value recorded in the queue.
+
+        :param key: Key
+        :type key: str
+        :return: value, or None if not recorded
+        :rtype: object
+        """
+        row = self.connection.execute(
+            "SELECT value FROM meta WHERE key = ?", (key,)
+        ).fetchone()
+        return None if row is None else json.loads(row[0])
+
+    def set_meta(self, key, value):
+        """
+        Records a value in the queue, within a transaction.
+
+        :param key: Key
+        :type key: str
+        :param value: Value, which must be JSON-serialisable
+        :type value: object
+        """
+        self.connection.execute(
+            "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+            (key, json.dumps(value)),
+        )
+
+    def try_listing(self):
+        """
+        Checks if the queue is populated and, if not, and no other
+        worker holds an unexpired lease on listing the issues, takes
+        that lease.
+
+        :return: True if the queue is populated, False if this worker
+        is to list the issues, or None if another worker is listing them
+        :rtype: bool
+        """
+        with transaction(self.connection):
+            lister = self.get_meta("lister")
+            if lister is not None:
+                if lister["worker"] == QUEUE_LISTED:
+                    return True
+                if lister["expiry"] > time.time():
+                    return None
+                logger.warning("Listing by %s expired", lister["worker"])
+            self.set_meta(
+                "lister",
+                {"worker": self.worker_id, "expiry": time.time() + self.lease_seconds},
+            )
+        return False
+
+    def populate(self, list_issues, poll_seconds=1):
+        """
+        Populates the queue, unless it has already been populated.
+
+        Only one worker lists the issues, holding a lease on listing
+        them, renewed while listing, while other workers wait.
+
+        :param list_issues: Function returning (cost, (publication,
+        year, issue, issue_dir, issue_inventory, issue_record)) tuples
+        and publication to summary of skipped issues, as
+        alto2txt.multiprocess_xml_to_text.list_issues
+        :type list_issues: callable
+        :param poll_seconds: Time, in seconds, between checks for the
+        queue being populated by another worker
+        :type poll_seconds: float
+        :return: True if the queue was populated by this worker
+        :rtype: bool
+        """
+        while True:
+            listed = self.try_listing()
+            if listed:
+                return False
+            if listed is False:
+                break
+            time.sleep(poll_seconds)
+        issues, summaries = list_issues()
+        with transaction(self.connection):
+            self.connection.executemany(
+                "INSERT INTO issues "
+                "(publication, year, issue, issue_dir, inventory, record, "
+                "cost, state) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (
+                        publication,
+                        year,
+                        issue,
+                        issue_dir,
+                        json.dumps(issue_inventory),
+                        json.dumps(issue_record),
+                        cost,
+                        QUEUE_PENDING,
+                    )
+                    for cost, (
+                        publication,
+                        year,
+                        issue,
+                        issue_dir,
+                        issue_inventory,
+                        issue_record,
+                    ) in issues
+                ],
+            )
+            self.set_meta("skipped", summaries)
+            self.set_meta("lister", {"worker": QUEUE_LISTED, "expiry": None})
+        logger.info("Queued issues: %d", len(issues))
+        return True
+
+    def claim(self):
+        """
+        Claims the costliest issue that is pending, or whose lease has
+        expired, taking a lease on it.
+
+        :return: issue ID and (publication, year, issue, issue_dir,
+        issue_inventory, issue_record), or None if no issue can be
+        claimed
+        :rtype: tuple(int, tuple(str, str, str, str, dict, dict))
+        """
+        with transaction(self.connection):
+            while True:
+                now = time.time()
+                row = self.connection.execute(
+                    "SELECT id, publication, year, issue, issue_dir, inventory, "
+                    "record, state, worker, attempts FROM issues "
+                    "WHERE state = ? OR (state = ? AND lease_expiry < ?) "
+                    "ORDER BY cost DESC, id LIMIT 1",
+                    (QUEUE_PENDING, QUEUE_LEASED, now),
+                ).fetchone()
+                if row is None:
+                    return None
+                issue_id, publication, year, issue, issue_dir = row[:5]
+                inventory, record, state, worker, attempts = row[5:]
+                if state == QUEUE_LEASED:
+                    logger.warning(
+                        "Lease on %s by %s expired (attempt %d)",
+                        issue_dir,
+                        worker,
+                        attempts,
+                    )
+                    if attempts >= QUEUE_MAX_ATTEMPTS:
+                        self.connection.execute(
+                            "UPDATE issues SET state = ?, error = ? WHERE id = ?",
+                            (
+                                QUEUE_FAILED,
+                                "Lease expired {} times".format(attempts),
+                                issue_id,
+                            ),
+                        )
+                        continue
+                self.connection.execute(
+                    "UPDATE issues SET state = ?, worker = ?, lease_expiry = ?, "
+                    "attempts = attempts + 1 WHERE id = ?",
+                    (QUEUE_LEASED, self.worker_id, now + self.lease_seconds, issue_id),
+                )
+                return issue_id, (
+                    publication,
+                    year,
+                    issue,
+                    issue_dir,
+                    json.loads(inventory),
+                    json.loads(record),
+                )
+
+    def complete(self, issue_ids, summaries):
+        """
+        Records issues as converted, unless their leases have since
+        been taken by another worker.
+
+        :param issue_ids: Issue IDs
+        :type issue_ids: list(int)
+        :param summaries: Issue summaries (see alto2txt.stats)
+        :type summaries: list(dict(str: int or float))
+        """
+        with transaction(self.connection):
+            self.connection.executemany(
+                "UPDATE issues SET state = ?, summary = ?, lease_expiry = NULL "
+                "WHERE id = ? AND state = ? AND worker = ?",
+                [
+                    (
+                        QUEUE_DONE,
+                        json.dumps(summary),
+                        issue_id,
+                        QUEUE_LEASED,
+                        self.worker_id,
+                    )
+                    for issue_id, summary in zip(issue_ids, summaries)
+                ],
+            )
+
+    def fail(self, issue_id, error):
+        """
+        Records an issue as failed.
+
+        :param issue_id: Issue ID
+        :type issue_id: int
+        :param error: Error message
+        :type error: str
+        """
+        with transaction(self.connection):
+            self.connection.execute(
+                "UPDATE issues SET state = ?, error = ?, lease_expiry = NULL "
+                "WHERE id = ? AND worker = ?",
+                (QUEUE_FAILED, error, issue_id, self.worker_id),
+            )
+
+    def renew(self, connection=None):
+        """
+        Renews the leases held by this worker, on issues and on
+        listing them.
+
+        :param connection: Connection, or None for that of the queue
+        :type connection: sqlite3.Connection
+        """
+        connection = connection or self.connection
+        expiry = time.time() + self.lease_seconds
+        with transaction(connection):
+            connection.execute(
+                "UPDATE issues SET lease_expiry = ? WHERE state = ? AND worker = ?",
+                (expiry, QUEUE_LEASED, self.worker_id),
+            )
+            connection.execute(
+                "UPDATE meta SET value = ? "
+                "WHERE key = ? AND json_extract(value, '$.worker') = ?",
+                (
+                    json.dumps({"worker": self.worker_id, "expiry": expiry}),
+                    "lister",
+                    self.worker_id,
+                ),
+            )
+
+    def start_renewing(self):
+        """
+        Starts a thread renewing the leases held by this worker, every
+        third of the lease duration, until stop is called.
+        """
+
+        def run():
+            connection = connect(self.queue_file)
+            try:
+                while not self.stop_renewing.wait(self.lease_seconds / 3):
+                    try:
+                        self.renew(connection)
+                    except sqlite3.Error as e:
+                        logger.error("Failed to renew leases: %s", str(e))
+            finally:
+                connection.close()
+
+        self.stop_renewing.clear()
+        self.renewer = threading.Thread(target=run, name="alto2txt-lease", daemon=True)
+        self.renewer.start()
+
+    def count_states(self):
+        """
+        Counts issues in each state.
+
+        :return: state to number of issues
+        :rtype: dict(str: int)
+        """
+        counts = {state: 0 for state in QUEUE_STATES}
+        for state, count in self.connection.execute(
+            "SELECT state, COUNT(*) FROM issues GROUP BY state"
+        ):
+            counts[state] = count
+        return counts
+
+    def is_finished(self):
+        """
+        Checks if every issue is converted or failed.
+
+        :return: True if so
+        :rtype: bool
+        """
+        counts = self.count_states()
+        return (
+            self.get_meta("lister") is not None
+            and counts[QUEUE_PENDING] + counts[QUEUE_LEASED] == 0
+        )
+
+    def finalise(self):
+        """
+        Checks if every issue is converted or failed and, if so, and
+        no other worker has already done so, records this worker as the
+        one to finalise the run, for example by merging part files.
+
+        :return: True if this worker is to finalise the run
+        :rtype: bool
+        """
+        with transaction(self.connection):
+            if not self.is_finished() or self.get_meta("finaliser") is not None:
+                return False
+            self.set_meta("finaliser", self.worker_id)
+        return True
+
+    def get_summaries(self):
+        """
+        Aggregates the summaries of all issues converted, and of
+        issues skipped when listing, by publication. Failed issues are
+        logged.
+
+        :return: publication to summary (see alto2txt.stats)
+        :rtype: dict(str: dict(str: int or float))
+        """
+        summaries = {}
+        stats.add_summaries(summaries, self.get_meta("skipped") or {})
+        for publication, summary in self.connection.execute(
+            "SELECT publication, summary FROM issues WHERE state = ?", (QUEUE_DONE,)
+        ):
+            stats.add_summaries(summaries, {publication: json.loads(summary)})
+        for issue_dir, error in self.connection.execute(
+            "SELECT issue_dir, error FROM issues WHERE state = ?", (QUEUE_FAILED,)
+        ):
+            logger.error("%s failed to convert: %s", issue_dir, error)
+        return summaries
+
+    def stop(self):
+        """
+        Stops renewing leases.
+        """
+        if self.renewer is not None:
+            self.stop_renewing.set()
+            self.renewer.join()
+            self.renewer = None
+
+    def close(self):
+        """
+        Stops renewing leases and closes the connection.
+        """
+        self.stop()
+        self.connection.close()
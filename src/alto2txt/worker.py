@@ -0,0 +1,93 @@
+"""
+Worker process lifecycle.
+
+Loading the XSLTs parses and compiles all four stylesheets, and
+configuring logging opens the log file, or connects to the queue of
+the parent's log listener (see alto2txt.logging_utils). Worker
+processes, whether in a multiprocessing pool or Spark Python workers,
+do this once, via init_worker, and keep the XSLTs for their lifetime,
+rather than once per task.
+"""
+
+import logging
+import os
+
+from alto2txt import logging_utils, xml
+
+logger = logging.getLogger(__name__)
+""" Module-level logger. """
+
+_log_config = None
+""" Logging configured for this process by init_worker. """
+_xslts = None
+""" XSLTs loaded for this process by get_xslts. """
+_pid = None
+""" Process ID for which _log_config and _xslts were set. """
+
+
+def _check_process():
+    """
+    Clears the worker state if it was inherited from a parent process,
+    for example by forking, so a process can tell if it has been
+    initialised itself.
+    """
+    global _log_config, _xslts, _pid
+    if _pid != os.getpid():
+        _log_config = None
+        _xslts = None
+        _pid = os.getpid()
+
+
+def init_worker(
+    log_file,
+    log_queue=None,
+    log_detail=logging_utils.LOG_DETAIL_FILE,
+    log_rate=None,
+):
+    """
+    Initialises a worker process, configuring logging and loading
+    XSLTs. Only the first call in a process, for a given logging
+    configuration, has any effect, so this can be called at the start
+    of every task.
+
+    :param log_file: log file
+    :type log_file: str
+    :param log_queue: queue to which to send records, from
+    alto2txt.logging_utils.start_log_listener, or None to log to
+    log_file directly
+    :type log_queue: multiprocessing.Queue
+    :param log_detail: Log detail, one of
+    alto2txt.logging_utils.LOG_DETAILS
+    :type log_detail: str
+    :param log_rate: Maximum number of per-file messages per second,
+    or None for no limit
+    :type log_rate: float
+    """
+    global _log_config
+    _check_process()
+    log_config = (log_file, log_queue, log_detail, log_rate)
+    if _log_config != log_config:
+        # This function will run in a separate process so reconfigure
+        # logging.
+        if log_queue is None:
+            logging_utils.configure_logging(log_file)
+        else:
+            logging_utils.configure_queue_logging(log_queue)
+        logging_utils.configure_file_messages(log_detail, log_rate)
+        _log_config = log_config
+        logger.debug("Initialised worker: %d", _pid)
+    get_xslts()
+
+
+def get_xslts():
+    """
+    Gets the XSLTs of this process, loading them on first use.
+
+    :return: XSLTs
+    :rtype: dict(str: lxml.etree.XSLT)
+    """
+    global _xslts
+    _check_process()
+    if _xslts is None:
+        _xslts = xml.load_xslts()
+    return _xslts
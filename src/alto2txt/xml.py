@@ -6,7 +6,7 @@ import os
 
 from lxml import etree
 
-from alto2txt import xslts
+from alto2txt import inputs, xslts
 
 METS_18_XSLT = "extract_text_mets18.xslt"
 """ METS 1.8 XSLT """
@@ -36,6 +36,8 @@ ALTO_ROOT = "alto"
 """ ALTO root element """
 BLN_ROOT = "BL_newspaper"
 """ BLN root element """
+BLN_PAGE = "BL_page"
+""" BLN BL_page element """
 BLN_PAGE_XPATH = "/BL_newspaper/BL_page"
 """ XPath for BLN BL_page element """
 UKP_NS = "http://tempuri.org/ncbpissue"
@@ -56,6 +58,32 @@ XML_NO_NS_SCHEMA_LOCATION = "no_ns_schema_location"
 """ XML metadata key. """
 XML_SCHEMA_LOCATIONS = "schema_locations"
 """ XML metadata key. """
+XML_FIRST_CHILD = "first_child"
+""" XML metadata key. """
+
+FLAVOUR_ALTO = "alto"
+""" ALTO page, accessed via a METS file. """
+FLAVOUR_METS_18 = "mets18"
+""" METS 1.8 """
+FLAVOUR_METS_13 = "mets13"
+""" METS 1.3 """
+FLAVOUR_METS_UNKNOWN = "mets_unknown"
+""" METS with an unknown schemaLocation. """
+FLAVOUR_BLN = "bln"
+""" BLN """
+FLAVOUR_BL_PAGE = "bl_page"
+""" BLN BL_page, which contains layout not text. """
+FLAVOUR_UKP = "ukp"
+""" UKP """
+FLAVOUR_UNKNOWN = "unknown"
+""" Unknown root element. """
+FLAVOUR_XSLTS = {
+    FLAVOUR_METS_18: METS_18_XSLT,
+    FLAVOUR_METS_13: METS_13_XSLT,
+    FLAVOUR_BLN: BLN_XSLT,
+    FLAVOUR_UKP: UKP_XSLT,
+}
+""" XSLTs to convert each flavour of XML to plaintext. """
 
 RE_METS = "(.*)[-|_](mets|METS).xml$"
 """ Regular expression for METS file """
@@ -75,7 +103,24 @@ def get_path(module, *name):
     return os.path.join(os.path.dirname(module.__file__), *name)
 
 
-def load_xslts():
+def read_xslts():
+    """
+    Reads XSLT files, without parsing them, and returns their contents
+    and paths in a dictionary, from which XSLTs can be loaded by
+    load_xslts, for example once per thread.
+
+    :return: XSLT contents and paths
+    :rtype: dict(str: tuple(bytes, str))
+    """
+    xslt_sources = {}
+    for xslt_name in [METS_18_XSLT, METS_13_XSLT, BLN_XSLT, UKP_XSLT]:
+        xslt_file = get_path(xslts, xslt_name)
+        with open(xslt_file, "rb") as f:
+            xslt_sources[xslt_name] = (f.read(), xslt_file)
+    return xslt_sources
+
+
+def load_xslts(xslt_sources=None):
     """
     Loads XSLTs and returns in a dictionary.
 
@@ -87,30 +132,37 @@ def load_xslts():
     * extract_text_bln.xslt: BLN XSL file.
     * extract_text_ukp.xslt: BLN UKP file.
 
+    The XSLTs are parsed with an alto2txt.inputs.ArchiveResolver so
+    they can load ALTO files that are compressed or within archives.
+
+    :param xslt_sources: XSLT contents and paths, from read_xslts, to
+    parse rather than reading the XSLT files
+    :type xslt_sources: dict(str: tuple(bytes, str))
     :return: XSLTs
     :rtype: dict(str: lxml.etree.XSLT)
     """
-    xsl_transforms = {}
-    for xslt_name in [METS_18_XSLT, METS_13_XSLT, BLN_XSLT, UKP_XSLT]:
-        xslt_file = get_path(xslts, xslt_name)
-        xsl_transforms[xslt_name] = etree.XSLT(etree.parse(xslt_file))
-    return xsl_transforms
+    if xslt_sources is None:
+        xslt_sources = read_xslts()
+    parser = etree.XMLParser()
+    parser.resolvers.add(inputs.ArchiveResolver())
+    return {
+        xslt_name: etree.XSLT(etree.fromstring(source, parser, base_url=xslt_file))
+        for xslt_name, (source, xslt_file) in xslt_sources.items()
+    }
 
 
 def get_xml(filename):
     """
-    Gets XML document tree from file.
+    Gets XML document tree from file, which may be compressed or
+    within an archive (see alto2txt.inputs).
 
     :param filename: XML filename
     :type filename: str
     :return: Document tree
     :rtype: lxml.etree._ElementTree
     """
-    with open(filename, "r") as f:
-        document_tree = None
-        parser = etree.XMLParser()
-        document_tree = etree.parse(f, parser)
-    return document_tree
+    parser = etree.XMLParser()
+    return inputs.parse(filename, parser)
 
 
 def get_xml_metadata(document_tree):
@@ -132,9 +184,71 @@ def get_xml_metadata(document_tree):
     :return: metadata
     :rtype: dict
     """
-    root_element = document_tree.getroot()
+    metadata = get_root_metadata(document_tree.getroot())
+    metadata[XML_DOCTYPE] = str(document_tree.docinfo.doctype)
+    return metadata
+
+
+def sniff_xml_metadata(filename):
+    """
+    Extracts information (root element, namespaces, schema locations,
+    default schema location, first child element) from XML file
+    without building its document tree. The file is parsed only as far
+    as the start of the first child of the root element. Returns dict
+    of form:
+
+        {
+            first_child: <FIRST_CHILD_ELEMENT> | None,
+            namespaces: {<TAG>: <URL>, <TAG>: <URL>, ...},
+            no_ns_schema_location: <URL> | None,
+            root: <ROOT_ELEMENT>,
+            schema_locations: {<URL>: <URL>, ...}
+        }
+
+    As the file is not parsed in full, malformed XML after the start
+    of the first child element is not detected. The file may be
+    compressed or within an archive (see alto2txt.inputs).
+
+    :param filename: XML filename
+    :type filename: str
+    :return: metadata
+    :rtype: dict
+    :raises lxml.etree.XMLSyntaxError: if the XML is malformed before
+    the start of the first child element or has no root element
+    """
+    metadata = None
+    with inputs.open_file(filename) as f:
+        for _, element in etree.iterparse(f, events=("start",)):
+            if metadata is None:
+                metadata = get_root_metadata(element)
+                metadata[XML_FIRST_CHILD] = None
+            else:
+                # The start event after the root element's is that of
+                # its first child.
+                metadata[XML_FIRST_CHILD] = str(element.tag)
+                break
+    return metadata
+
+
+def get_root_metadata(root_element):
+    """
+    Extracts information (root element, namespaces, schema locations,
+    default schema location) from XML root element. Returns dict of
+    form:
+
+        {
+            namespaces: {<TAG>: <URL>, <TAG>: <URL>, ...},
+            no_ns_schema_location: <URL> | None,
+            root: <ROOT_ELEMENT>,
+            schema_locations: {<URL>: <URL>, ...}
+        }
+
+    :param root_element: Root element
+    :type root_element: lxml.etree._Element
+    :return: metadata
+    :rtype: dict
+    """
     root_element_tag = str(root_element.tag)
-    doctype = str(document_tree.docinfo.doctype)
     namespaces = root_element.nsmap
     no_ns_schema_location = root_element.get(NO_NS_SCHEMA_LOCATION.text)
     schema_locations = root_element.get(SCHEMA_LOCATION.text)
@@ -148,13 +262,43 @@ def get_xml_metadata(document_tree):
         schema_locations = {}
     metadata = {}
     metadata[XML_ROOT] = root_element_tag
-    metadata[XML_DOCTYPE] = doctype
     metadata[XML_NS] = namespaces
     metadata[XML_NO_NS_SCHEMA_LOCATION] = no_ns_schema_location
     metadata[XML_SCHEMA_LOCATIONS] = schema_locations
     return metadata
 
 
+def get_xml_flavour(metadata):
+    """
+    Gets flavour of XML from metadata returned by sniff_xml_metadata.
+
+    BLN files are classified as FLAVOUR_BL_PAGE if the first child of
+    their root element is a BL_page element.
+
+    :param metadata: metadata
+    :type metadata: dict
+    :return: flavour, one of the FLAVOUR_ constants
+    :rtype: str
+    """
+    root = metadata[XML_ROOT]
+    if root == ALTO_ROOT:
+        return FLAVOUR_ALTO
+    if root == BLN_ROOT:
+        if metadata.get(XML_FIRST_CHILD) == BLN_PAGE:
+            return FLAVOUR_BL_PAGE
+        return FLAVOUR_BLN
+    if root == UKP_ROOT:
+        return FLAVOUR_UKP
+    if root == METS_ROOT:
+        mets_uri = metadata[XML_SCHEMA_LOCATIONS].get(METS_NS)
+        if mets_uri == METS_18_URI:
+            return FLAVOUR_METS_18
+        if mets_uri == METS_13_URI:
+            return FLAVOUR_METS_13
+        return FLAVOUR_METS_UNKNOWN
+    return FLAVOUR_UNKNOWN
+
+
 def query_xml(document_tree, query):
     """
     Runs XPath query and returns results.
@@ -4,20 +4,82 @@ or UKP format) publications to plaintext articles and generate minimal
 metadata.
 """
 
+import functools
 import logging
 import os
 import os.path
 import re
+import time
 
 from lxml import etree
 
-from alto2txt import xml
+from alto2txt import (
+    inputs,
+    inventory,
+    logging_utils,
+    manifest,
+    mets_to_text,
+    output_writer,
+    profiling,
+    sampling,
+    sinks,
+    stats,
+    stream_to_text,
+    xml,
+)
 
 logger = logging.getLogger(__name__)
 """ Module-level logger. """
+files_logger = logging.getLogger(logging_utils.FILES_LOGGER)
+""" Logger for per-file messages (see alto2txt.logging_utils). """
+
+ENGINE_XSLT = "xslt"
+""" Engine converting XML using the XSLTs. """
+ENGINE_NATIVE = "native"
+""" Engine converting XML natively, using lxml only. """
+ENGINES = [ENGINE_XSLT, ENGINE_NATIVE]
+""" Engines. """
+NATIVE_ENGINES = {
+    xml.FLAVOUR_METS_18: mets_to_text.mets18_to_articles,
+    xml.FLAVOUR_METS_13: mets_to_text.mets13_to_articles,
+}
+"""
+Native engines for each XML flavour, which convert a document tree.
+Flavours without a native engine are converted using the XSLTs.
+"""
+STREAMING_ENGINES = {
+    xml.FLAVOUR_UKP: stream_to_text.ukp_to_articles,
+    xml.FLAVOUR_BLN: stream_to_text.bln_to_articles,
+}
+"""
+Native engines for each XML flavour, which stream a file rather than
+converting a document tree, so large files are never fully loaded.
+"""
+INVENTORY_SKIPPED_FLAVOURS = [xml.FLAVOUR_ALTO, xml.FLAVOUR_BL_PAGE]
+"""
+XML flavours of files which are skipped without being read if an
+inventory classifies them (see alto2txt.inventory).
+"""
 
 
-def issue_to_text(publication, year, issue, issue_dir, txt_out_dir, xslts):
+def issue_to_text(
+    publication,
+    year,
+    issue,
+    issue_dir,
+    txt_out_dir,
+    xslts,
+    engine=ENGINE_XSLT,
+    issue_manifest=None,
+    output_format=sinks.OUTPUT_FILES,
+    issue_index=None,
+    profiler=None,
+    writer=None,
+    issue_inventory=None,
+    sink=None,
+    issue_record=None,
+    count_words=False,
+):
     """
     Converts a single issue of an XML publication to plaintext
     articles and generates minimal metadata.
@@ -28,99 +90,266 @@ def issue_to_text(publication, year, issue, issue_dir, txt_out_dir, xslts):
     :type year: str
     :param issue: Issue directory local name e.g. 0121
     :type issue: str
-    :param issue_dir: Issue directory e.g. .../0000151/1835/0121
+    :param issue_dir: Issue directory e.g. .../0000151/1835/0121, which
+    may be within an archive and may hold compressed XML files, e.g.
+    .xml.gz (see alto2txt.inputs)
     :type issue_dir: str
     :param txt_out_dir: Output directory for plaintext articles
     :type txt_out_dir: str
     :param xslts: XSLTs to convert XML to plaintext
     :type xslts: dict(str: lxml.etree.XSLT)
+    :param engine: Engine, one of ENGINES
+    :type engine: str
+    :param issue_manifest: Manifest in which to record the issue once
+    converted. If the manifest was loaded to resume a run and records
+    the issue as converted, with unchanged input files, then the issue
+    is skipped. If the manifest is in incremental mode then articles
+    previously output for the issue are removed before it is
+    converted, so no stale articles remain.
+    :type issue_manifest: alto2txt.manifest.Manifest
+    :param output_format: Output format, one of
+    alto2txt.sinks.OUTPUT_FORMATS
+    :type output_format: str
+    :param issue_index: Metadata index writer to which to add a row
+    for each article
+    :type issue_index: alto2txt.metadata_index.IndexWriter
+    :param profiler: Profiler to which to add the template times of
+    each XSLT run
+    :type profiler: alto2txt.profiling.Profiler
+    :param writer: Output writer setting the fsync policy of the sink
+    and, if it has writer threads, writing it asynchronously, in which
+    case the issue is recorded in the manifest once its articles are
+    written
+    :type writer: alto2txt.output_writer.OutputWriter
+    :param issue_inventory: Inventory record of the issue (see
+    alto2txt.inventory). If provided, the issue's files are read from
+    it rather than by listing issue_dir, and files it classifies as
+    ALTO or BL_page are skipped without being read.
+    :type issue_inventory: dict
+    :param sink: Sink to which to write the articles, such as an
+    alto2txt.sinks.ArticleSink, rather than one opened for
+    output_format in txt_out_dir, in which case txt_out_dir,
+    output_format, issue_index and writer are not used
+    :type sink: alto2txt.sinks.Sink
+    :param issue_record: Manifest record of the issue, if loaded when
+    listing issues (see
+    alto2txt.multiprocess_xml_to_text.list_issues), to check against
+    and reuse the hashes of rather than any loaded by issue_manifest
+    :type issue_record: dict
+    :param count_words: Count the words of articles written as files
+    by the XSLTs, which requires reading them once written (see
+    alto2txt.sinks.open_sink), otherwise num_words does not include
+    them
+    :type count_words: bool
+    :return: summary (see alto2txt.stats)
+    :rtype: dict(str: int or float)
     """
+    start = time.perf_counter()
+    summary = stats.new_summary()
+    input_sub_path = os.path.join(publication, year, issue)
+    if issue_manifest is not None:
+        # Snapshot input files before conversion so any changes during
+        # conversion are detected when resuming.
+        if issue_inventory is None:
+            issue_files = manifest.issue_files(issue_dir)
+        else:
+            issue_files = issue_inventory[inventory.INVENTORY_FILES]
+        issue_fingerprint = issue_manifest.get_fingerprint(
+            input_sub_path, issue_dir, issue_record
+        )
+        if issue_manifest.is_complete(
+            input_sub_path, issue_files, issue_fingerprint, issue_record
+        ):
+            logger.info("Skipping converted issue: %s", input_sub_path)
+            summary["skipped_issues"] = 1
+            summary["time_total"] = time.perf_counter() - start
+            return summary
     # TODO Fix these error messages, they're too vague
     logger.info("Processing issue: %s", os.path.join(year, issue))
-    summary = {}
-    summary["num_files"] = 0
-    summary["bad_xml"] = 0
-    summary["converted_ok"] = 0
-    summary["converted_bad"] = 0
-    summary["skipped_alto"] = 0
-    summary["skipped_bl_page"] = 0
-    summary["skipped_mets_unknown"] = 0
-    summary["skipped_root_unknown"] = 0
-    summary["non_xml"] = 0
-    issue_out_dir = os.path.join(txt_out_dir, year, issue)
-    assert not os.path.exists(issue_out_dir) or not os.path.isfile(
-        issue_out_dir
-    ), "{} exists and is not a file".format(issue_out_dir)
-    if not os.path.exists(issue_out_dir):
-        os.makedirs(issue_out_dir)
-    assert os.path.exists(issue_out_dir), "Create {} failed".format(issue_out_dir)
-    for xml_file in os.listdir(issue_dir):
-        xml_file_path = os.path.join(issue_dir, xml_file)
-        if os.path.isdir(xml_file_path):
-            logger.warning("Unexpected directory: %s", xml_file)
-            continue
-        summary["num_files"] += 1
-        if os.path.splitext(xml_file)[1].lower() != ".xml":
-            summary["non_xml"] += 1
-            logger.warning("File with no .xml suffix: %s", xml_file)
-            continue
-        try:
-            document_tree = xml.get_xml(xml_file_path)
-        except Exception as e:
-            summary["bad_xml"] += 1
-            logger.warning("Problematic file %s: %s", xml_file, str(e))
-            continue
-        metadata = xml.get_xml_metadata(document_tree)
-
-        if metadata[xml.XML_ROOT] == xml.ALTO_ROOT:
-            # alto files are accessed via mets file.
-            summary["skipped_alto"] += 1
-            continue
-        if xml.query_xml(document_tree, xml.BLN_PAGE_XPATH):
-            # BL_page files contain layout not text.
-            summary["skipped_bl_page"] += 1
-            continue
-        if metadata[xml.XML_ROOT] == xml.BLN_ROOT:
-            xslt = xslts[xml.BLN_XSLT]
-        elif metadata[xml.XML_ROOT] == xml.UKP_ROOT:
-            xslt = xslts[xml.UKP_XSLT]
-        elif metadata[xml.XML_ROOT] == xml.METS_ROOT:
-            mets_uri = metadata[xml.XML_SCHEMA_LOCATIONS][xml.METS_NS]
-            if mets_uri == xml.METS_18_URI:
-                xslt = xslts[xml.METS_18_XSLT]
-            elif mets_uri == xml.METS_13_URI:
-                xslt = xslts[xml.METS_13_XSLT]
+    summary["num_issues"] = 1
+    if sink is None:
+        sink = sinks.open_sink(
+            output_format,
+            os.path.join(txt_out_dir, year, issue),
+            issue_index,
+            os.path.join(publication, year, issue),
+            writer,
+            count_words,
+        )
+    with sink:
+        if issue_manifest is not None and issue_manifest.incremental:
+            num_removed = sink.remove_articles()
+            if num_removed:
+                logger.info("Removed previous output files: %d", num_removed)
+        flavours = {}
+        if issue_inventory is None:
+            xml_files = inputs.listdir(issue_dir)
+        else:
+            xml_files = list(issue_inventory[inventory.INVENTORY_FILES])
+            flavours = issue_inventory[inventory.INVENTORY_FLAVOURS]
+        for xml_file in xml_files:
+            xml_file_path = os.path.join(issue_dir, xml_file)
+            if issue_inventory is None:
+                if inputs.isdir(xml_file_path):
+                    files_logger.warning("Unexpected directory: %s", xml_file)
+                    continue
+                file_size = inputs.getsize(xml_file_path)
             else:
+                file_size = issue_inventory[inventory.INVENTORY_FILES][xml_file][0]
+            summary["num_files"] += 1
+            summary["bytes_read"] += file_size
+            # Compressed files are named as if they were not, so their
+            # output is the same.
+            input_filename = inputs.strip_compression_suffix(xml_file)
+            if os.path.splitext(input_filename)[1].lower() != ".xml":
+                summary["non_xml"] += 1
+                files_logger.warning("File with no .xml suffix: %s", xml_file)
+                continue
+            # Classify the file from its root element so only files that
+            # will be converted are parsed in full. Files the inventory
+            # classifies as skipped are not read at all.
+            flavour = flavours.get(xml_file)
+            if flavour not in INVENTORY_SKIPPED_FLAVOURS:
+                try:
+                    with stats.timed(summary, "time_classify"):
+                        metadata = xml.sniff_xml_metadata(xml_file_path)
+                except Exception as e:
+                    summary["bad_xml"] += 1
+                    files_logger.warning("Problematic file %s: %s", xml_file, str(e))
+                    continue
+                flavour = xml.get_xml_flavour(metadata)
+            if flavour == xml.FLAVOUR_ALTO:
+                # alto files are accessed via mets file.
+                summary["skipped_alto"] += 1
+                continue
+            if flavour == xml.FLAVOUR_BL_PAGE:
+                # BL_page files contain layout not text.
+                summary["skipped_bl_page"] += 1
+                continue
+            if flavour == xml.FLAVOUR_METS_UNKNOWN:
                 # Unknown METS.
-                logger.warning("Unknown METS schema %s: %s", xml_file, mets_uri)
+                files_logger.warning(
+                    "Unknown METS schema %s: %s",
+                    xml_file,
+                    metadata[xml.XML_SCHEMA_LOCATIONS].get(xml.METS_NS),
+                )
                 summary["skipped_mets_unknown"] += 1
                 continue
-        else:
-            summary["skipped_root_unknown"] += 1
-            continue
-        input_filename = os.path.basename(xml_file)
-        input_sub_path = os.path.join(publication, year, issue)
-        if metadata[xml.XML_ROOT] == xml.METS_ROOT:
-            mets_match = re.findall(xml.RE_METS, input_filename)
-            issue_out_stub = mets_match[0][0]
-        else:
-            issue_out_stub = os.path.splitext(input_filename)[0]
-        issue_out_path = os.path.join(issue_out_dir, issue_out_stub)
-        try:
-            xslt(
-                document_tree,
-                input_path=etree.XSLT.strparam(os.path.abspath(issue_dir)),
-                input_sub_path=etree.XSLT.strparam(input_sub_path),
-                input_filename=etree.XSLT.strparam(input_filename),
-                output_document_stub=etree.XSLT.strparam(issue_out_stub),
-                output_path=etree.XSLT.strparam(issue_out_path),
-            )
-            summary["converted_ok"] += 1
-            logger.info("%s gave XSLT output", xml_file_path)
-        except Exception as e:
-            summary["converted_bad"] += 1
-            logger.error("%s failed to give XSLT output: %s", xml_file, str(e))
-            continue
+            if flavour == xml.FLAVOUR_UNKNOWN:
+                summary["skipped_root_unknown"] += 1
+                continue
+            if metadata[xml.XML_ROOT] == xml.METS_ROOT:
+                mets_match = re.findall(xml.RE_METS, input_filename)
+                issue_out_stub = mets_match[0][0]
+            else:
+                issue_out_stub = os.path.splitext(input_filename)[0]
+            # Time spent writing is counted by the sink, so is
+            # subtracted from the time spent transforming.
+            time_write = sink.time_write
+            if engine == ENGINE_NATIVE and flavour in STREAMING_ENGINES:
+                num_articles = sink.num_articles
+                try:
+                    with stats.timed(summary, "time_transform"):
+                        for article in STREAMING_ENGINES[flavour](
+                            xml_file_path,
+                            input_sub_path,
+                            input_filename,
+                            issue_out_stub,
+                        ):
+                            sink.write_article(article)
+                    summary["converted_ok"] += 1
+                    files_logger.info("%s gave native output", xml_file_path)
+                except stream_to_text.BLPageError:
+                    # BL_page files contain layout not text.
+                    summary["skipped_bl_page"] += 1
+                except etree.XMLSyntaxError as e:
+                    if sink.num_articles == num_articles:
+                        summary["bad_xml"] += 1
+                        files_logger.warning(
+                            "Problematic file %s: %s", xml_file, str(e)
+                        )
+                    else:
+                        # The articles preceding the error have been
+                        # written, whereas the XSLTs write nothing.
+                        summary["converted_bad"] += 1
+                        files_logger.error(
+                            "%s gave partial native output: %s", xml_file, str(e)
+                        )
+                except Exception as e:
+                    summary["converted_bad"] += 1
+                    files_logger.error(
+                        "%s failed to give native output: %s", xml_file, str(e)
+                    )
+                summary["time_transform"] -= sink.time_write - time_write
+                continue
+            try:
+                with stats.timed(summary, "time_parse"):
+                    document_tree = xml.get_xml(xml_file_path)
+            except Exception as e:
+                summary["bad_xml"] += 1
+                files_logger.warning("Problematic file %s: %s", xml_file, str(e))
+                continue
+            if flavour == xml.FLAVOUR_BLN and xml.query_xml(
+                document_tree, xml.BLN_PAGE_XPATH
+            ):
+                # BL_page files contain layout not text.
+                summary["skipped_bl_page"] += 1
+                continue
+            native_engine = None
+            if engine == ENGINE_NATIVE:
+                native_engine = NATIVE_ENGINES.get(flavour)
+            if native_engine is not None:
+                try:
+                    with stats.timed(summary, "time_transform"):
+                        for article in native_engine(
+                            document_tree,
+                            os.path.abspath(issue_dir),
+                            input_sub_path,
+                            input_filename,
+                            issue_out_stub,
+                        ):
+                            sink.write_article(article)
+                    summary["converted_ok"] += 1
+                    files_logger.info("%s gave native output", xml_file_path)
+                except Exception as e:
+                    summary["converted_bad"] += 1
+                    files_logger.error(
+                        "%s failed to give native output: %s", xml_file, str(e)
+                    )
+                summary["time_transform"] -= sink.time_write - time_write
+                continue
+            xslt = xslts[xml.FLAVOUR_XSLTS[flavour]]
+            try:
+                with stats.timed(summary, "time_transform"):
+                    with sinks.files_output_dir(sink, issue_out_stub) as xslt_out_dir:
+                        result = xslt(
+                            document_tree,
+                            profile_run=profiler is not None,
+                            input_path=etree.XSLT.strparam(os.path.abspath(issue_dir)),
+                            input_sub_path=etree.XSLT.strparam(input_sub_path),
+                            input_filename=etree.XSLT.strparam(input_filename),
+                            output_document_stub=etree.XSLT.strparam(issue_out_stub),
+                            output_path=etree.XSLT.strparam(
+                                os.path.join(xslt_out_dir, issue_out_stub)
+                            ),
+                        )
+                if profiler is not None:
+                    profiler.add_xslt_profile(
+                        xml.FLAVOUR_XSLTS[flavour], result.xslt_profile
+                    )
+                summary["converted_ok"] += 1
+                files_logger.info("%s gave XSLT output", xml_file_path)
+            except Exception as e:
+                summary["converted_bad"] += 1
+                files_logger.error(
+                    "%s failed to give XSLT output: %s", xml_file, str(e)
+                )
+            summary["time_transform"] -= sink.time_write - time_write
+    summary["num_articles"] = sink.num_articles
+    summary["num_words"] = sink.num_words
+    summary["bytes_written"] = sink.bytes_written
+    summary["time_write"] = sink.time_write
+    summary["time_total"] = time.perf_counter() - start
     if (summary["converted_ok"] > 0) and (
         summary["converted_ok"]
         == (
@@ -131,12 +360,36 @@ def issue_to_text(publication, year, issue, issue_dir, txt_out_dir, xslts):
             - summary["skipped_bl_page"]
         )
     ):
-        logger.info("%s %s", issue_dir, str(summary))
+        logger.info("%s %s", issue_dir, str(stats.get_counts(summary)))
     else:
-        logger.warning("%s %s", issue_dir, str(summary))
+        logger.warning("%s %s", issue_dir, str(stats.get_counts(summary)))
+    if issue_manifest is not None:
+        sink.on_written(
+            functools.partial(
+                issue_manifest.record,
+                input_sub_path,
+                issue_files,
+                dict(summary),
+                issue_fingerprint,
+            )
+        )
+    return summary
 
 
-def publication_to_text(publication_dir, txt_out_dir, xslts, downsample=1):
+def publication_to_text(
+    publication_dir,
+    txt_out_dir,
+    xslts,
+    downsample=1,
+    engine=ENGINE_XSLT,
+    issue_manifest=None,
+    output_format=sinks.OUTPUT_FILES,
+    issue_index=None,
+    profiler=None,
+    writer=None,
+    issues=None,
+    count_words=False,
+):
     """
     Converts issues of an XML publication to plaintext articles and
     generates minimal metadata.
@@ -150,7 +403,12 @@ def publication_to_text(publication_dir, txt_out_dir, xslts, downsample=1):
     |   |   |-- xml_content
     |-- year
 
-    txt_out_dir is created with an analogous structure.
+    txt_out_dir is created with an analogous structure. If
+    output_format is not alto2txt.sinks.OUTPUT_FILES then the articles
+    of each issue are packed into a single file, see alto2txt.sinks.
+
+    publication_dir, or any year directory, can be a zip or tar
+    archive (see alto2txt.inputs).
 
     :param publication_dir: Input directory with XML publications
     :type publication_dir: str
@@ -158,33 +416,219 @@ def publication_to_text(publication_dir, txt_out_dir, xslts, downsample=1):
     :type txt_out_dir: str
     :param xslts: XSLTs to convert XML to plaintext
     :type xslts: dict(str: lxml.etree.XSLT)
-    :param downsample: Downsample, converting every Nth issue only
+    :param downsample: Downsample, converting 1 in N issues only (see
+    publication_issues)
     :type downsample: int
+    :param engine: Engine, one of ENGINES
+    :type engine: str
+    :param issue_manifest: Manifest of converted issues, see
+    issue_to_text
+    :type issue_manifest: alto2txt.manifest.Manifest
+    :param output_format: Output format, one of
+    alto2txt.sinks.OUTPUT_FORMATS
+    :type output_format: str
+    :param issue_index: Metadata index writer, see issue_to_text
+    :type issue_index: alto2txt.metadata_index.IndexWriter
+    :param profiler: Profiler, see issue_to_text
+    :type profiler: alto2txt.profiling.Profiler
+    :param writer: Output writer, see issue_to_text
+    :type writer: alto2txt.output_writer.OutputWriter
+    :param issues: (year, issue, issue_dir, issue_inventory) tuples
+    of the issues to convert, already downsampled, with their
+    inventory records (see alto2txt.inventory). If provided, these
+    are converted rather than the issues listed in publication_dir.
+    :type issues: list(tuple(str, str, str, dict))
+    :param count_words: Count words of articles written by the XSLTs,
+    see issue_to_text
+    :type count_words: bool
+    :return: summary of all issues (see alto2txt.stats)
+    :rtype: dict(str: int or float)
     """
-    issue_counter = 0
-
     # TODO The publication name, year, and edition is copied from the directory path and not the METS file.
 
-    publication = os.path.basename(publication_dir)
+    publication = inputs.get_name(os.path.basename(os.path.normpath(publication_dir)))
     logger.info("Processing publication: %s", publication)
-    for year in os.listdir(publication_dir):
-        year_dir = os.path.join(publication_dir, year)
-        if not os.path.isdir(year_dir):
-            logger.warning("Unexpected file: %s", year)
-            continue
-        for issue in os.listdir(year_dir):
-            issue_dir = os.path.join(year_dir, issue)
-            if not os.path.isdir(issue_dir):
-                logger.warning("Unexpected file: %s", os.path.join(year, issue))
-                continue
-            # Only process every Nth issue (when using downsample).
-            issue_counter += 1
-            if (issue_counter % downsample) != 0:
-                continue
-            issue_to_text(publication, year, issue, issue_dir, txt_out_dir, xslts)
+    summary = stats.new_summary()
+    if issues is None:
+        issues = (
+            (year, issue, issue_dir, None)
+            for year, issue, issue_dir in publication_issues(
+                publication_dir, downsample
+            )
+        )
+    for year, issue, issue_dir, issue_inventory in issues:
+        issue_summary = issue_to_text(
+            publication,
+            year,
+            issue,
+            issue_dir,
+            txt_out_dir,
+            xslts,
+            engine,
+            issue_manifest,
+            output_format,
+            issue_index,
+            profiler,
+            writer,
+            issue_inventory,
+            count_words=count_words,
+        )
+        stats.add_summary(summary, issue_summary)
+    return summary
+
+
+def publication_issues(
+    publication_dir,
+    downsample=1,
+    sample_size=None,
+    sample_bytes=None,
+    stratify=sampling.STRATIFY_PUBLICATION,
+    seed=0,
+):
+    """
+    Lists issues of an XML publication, yielding a (year, issue,
+    issue_dir) tuple for each issue.
+
+    publication_dir is expected to have the structure described in
+    publication_to_text. Year directories can be zip or tar archives,
+    in which case the year is the archive name without its suffix and
+    issue_dir is a path within the archive (see alto2txt.inputs).
 
+    If downsample is greater than 1, or sample_size or sample_bytes
+    are provided, then the issues are sampled (see
+    alto2txt.sampling.sample_issues).
 
-def publications_to_text(publications_dir, txt_out_dir, downsample=1):
+    :param publication_dir: Input directory with XML publications
+    :type publication_dir: str
+    :param downsample: Downsample, yielding 1 in N issues only
+    :type downsample: int
+    :param sample_size: Number of issues to yield, or None for all
+    :type sample_size: int
+    :param sample_bytes: Total size, in bytes, of the input files of the
+    issues to yield, or None for all
+    :type sample_bytes: int
+    :param stratify: Stratification, one of
+    alto2txt.sampling.STRATIFICATIONS
+    :type stratify: str
+    :param seed: Sampling seed
+    :type seed: int
+    :return: (year, issue, issue_dir) tuples
+    :rtype: generator(tuple(str, str, str))
+    """
+    issue_dirs = inventory.issue_dirs(publication_dir)
+    if downsample == 1 and sample_size is None and sample_bytes is None:
+        yield from issue_dirs
+        return
+    publication = inputs.get_name(os.path.basename(os.path.normpath(publication_dir)))
+    issues = []
+    for year, issue, issue_dir in issue_dirs:
+        num_bytes = 0
+        if sample_bytes is not None:
+            num_bytes = sum(
+                size for size, _ in manifest.issue_files(issue_dir).values()
+            )
+        issues.append((publication, year, issue, num_bytes, issue_dir))
+    for _, year, issue, _, issue_dir in sampling.sample_issues(
+        issues, downsample, sample_size, sample_bytes, stratify, seed
+    ):
+        yield year, issue, issue_dir
+
+
+def iter_articles(issue_dir, engine=ENGINE_NATIVE, xslts=None):
+    """
+    Converts a single issue of an XML publication to articles held in
+    memory, yielding a record of the plaintext and metadata fields of
+    each article (see alto2txt.articles.ArticleRecord), without writing
+    any files.
+
+    Files are classified and converted as by issue_to_text. With the
+    native engine, the default, no files are written at all. With the
+    XSLT engine, the XSLTs write articles to a temporary directory
+    from which they are read. Articles are yielded once the issue is
+    converted, so at most an issue's articles are held in memory.
+
+    :param issue_dir: Issue directory e.g. .../0000151/1835/0121, which
+    may be within an archive (see alto2txt.inputs)
+    :type issue_dir: str
+    :param engine: Engine, one of ENGINES
+    :type engine: str
+    :param xslts: XSLTs to convert XML to plaintext, loaded if None and
+    engine is ENGINE_XSLT
+    :type xslts: dict(str: lxml.etree.XSLT)
+    :return: article records
+    :rtype: generator(alto2txt.articles.ArticleRecord)
+    """
+    if xslts is None and engine == ENGINE_XSLT:
+        xslts = xml.load_xslts()
+    year_dir, issue = os.path.split(os.path.normpath(issue_dir))
+    publication_dir, year = os.path.split(year_dir)
+    sink = sinks.ArticleSink(issue_dir)
+    issue_to_text(
+        inputs.get_name(os.path.basename(publication_dir)),
+        inputs.get_name(year),
+        issue,
+        issue_dir,
+        None,
+        xslts,
+        engine,
+        sink=sink,
+    )
+    yield from sink.records
+
+
+def iter_publication_articles(
+    publication_dir, engine=ENGINE_NATIVE, xslts=None, downsample=1
+):
+    """
+    Converts issues of an XML publication to articles held in memory,
+    yielding a record of each article, issue by issue (see
+    iter_articles).
+
+    publication_dir is expected to have the structure described in
+    publication_to_text.
+
+    :param publication_dir: Input directory with XML publications
+    :type publication_dir: str
+    :param engine: Engine, one of ENGINES
+    :type engine: str
+    :param xslts: XSLTs to convert XML to plaintext, loaded if None and
+    engine is ENGINE_XSLT
+    :type xslts: dict(str: lxml.etree.XSLT)
+    :param downsample: Downsample, converting 1 in N issues only (see
+    publication_issues)
+    :type downsample: int
+    :return: article records
+    :rtype: generator(alto2txt.articles.ArticleRecord)
+    """
+    if xslts is None and engine == ENGINE_XSLT:
+        xslts = xml.load_xslts()
+    for _, _, issue_dir in publication_issues(publication_dir, downsample):
+        yield from iter_articles(issue_dir, engine, xslts)
+
+
+def publications_to_text(
+    publications_dir,
+    txt_out_dir,
+    downsample=1,
+    engine=ENGINE_XSLT,
+    resume=False,
+    incremental=False,
+    output_format=sinks.OUTPUT_FILES,
+    index=False,
+    search=False,
+    profile=False,
+    writer_threads=0,
+    fsync=sinks.FSYNC_NONE,
+    count_words=False,
+    inventory_file=None,
+    sample_size=None,
+    sample_bytes=None,
+    stratify=sampling.STRATIFY_PUBLICATION,
+    sample_seed=0,
+    issues_file=None,
+    shard_index=0,
+    shard_count=1,
+):
     """
     Converts XML publications to plaintext articles and generates
     minimal metadata.
@@ -200,7 +644,12 @@ def publications_to_text(publications_dir, txt_out_dir, downsample=1):
     |   |-- year
     |-- publication
 
-    txt_out_dir is created with an analogous structure.
+    txt_out_dir is created with an analogous structure. If
+    output_format is not alto2txt.sinks.OUTPUT_FILES then the articles
+    of each issue are packed into a single file, see alto2txt.sinks.
+
+    Any publication or year directory can be a zip or tar archive,
+    which is read in place (see alto2txt.inputs).
 
     Quality assurance is also performed to check for:
 
@@ -218,21 +667,156 @@ def publications_to_text(publications_dir, txt_out_dir, downsample=1):
     * extract_text_bln.xslt: BLN XSL file.
     * extract_text_ukp.xslt: UKP XSL file.
 
+    If engine is ENGINE_NATIVE then METS 1.8 and METS 1.3 XML is
+    converted natively and UKP and BLN XML is streamed, giving the same
+    output as the XSLTs.
+
+    Converted issues are recorded in a manifest in txt_out_dir (see
+    alto2txt.manifest). If resume is True then issues recorded as
+    converted, whose input files are unchanged, are skipped. If
+    incremental is True then issues recorded as converted, whose input
+    files and referenced ALTO files have unchanged content, are
+    skipped, and the previous output of other issues is removed
+    before they are converted again.
+
+    If index is True then a metadata index of the articles converted
+    is written to txt_out_dir (see alto2txt.metadata_index). If search
+    is True then a full-text search index of the articles converted is
+    written to txt_out_dir as they are converted (see
+    alto2txt.search_index).
+
+    If profile is True then conversion is profiled and profile tables
+    are written to txt_out_dir (see alto2txt.profiling).
+
+    If writer_threads is not 0 then articles are written by that many
+    writer threads while issues are converted (see
+    alto2txt.output_writer). Files written are synced to disk as
+    specified by fsync (see alto2txt.sinks.FSYNC_POLICIES). Words of
+    articles written as files by the XSLTs are counted only if
+    count_words is True, as the files must be read (see
+    issue_to_text).
+
+    Issues are listed from an inventory of publications_dir (see
+    alto2txt.inventory). If inventory_file is an inventory of
+    publications_dir then it is reused, otherwise publications_dir is
+    scanned and the inventory written to inventory_file or, if not
+    provided, to txt_out_dir. Issues are sampled from the inventory
+    if downsample is greater than 1 or sample_size or sample_bytes are
+    provided (see alto2txt.sampling).
+
     :param publications dir: Input directory with XML publications
     :type publications_dir: str
     :param txt_out_dir: Output directory for plaintext articles
     :type txt_out_dir: str
-    :param downsample: Downsample, converting every Nth issue only
+    :param downsample: Downsample, converting 1 in N issues only (see
+    publication_issues)
     :type downsample: int
+    :param engine: Engine, one of ENGINES
+    :type engine: str
+    :param resume: Resume, skipping issues already converted
+    :type resume: bool
+    :param incremental: Convert only issues whose content changed
+    :type incremental: bool
+    :param output_format: Output format, one of
+    alto2txt.sinks.OUTPUT_FORMATS
+    :type output_format: str
+    :param index: Write metadata index
+    :type index: bool
+    :param search: Write full-text search index
+    :type search: bool
+    :param profile: Profile conversion
+    :type profile: bool
+    :param writer_threads: Number of writer threads
+    :type writer_threads: int
+    :param fsync: fsync policy, one of alto2txt.sinks.FSYNC_POLICIES
+    :type fsync: str
+    :param count_words: Count words of articles written by the XSLTs
+    :type count_words: bool
+    :param inventory_file: Inventory file to reuse
+    :type inventory_file: str
+    :param sample_size: Number of issues to convert, or None for all
+    :type sample_size: int
+    :param sample_bytes: Total size, in bytes, of the input files of the
+    issues to convert, or None for all
+    :type sample_bytes: int
+    :param stratify: Stratification, one of
+    alto2txt.sampling.STRATIFICATIONS
+    :type stratify: str
+    :param sample_seed: Sampling seed
+    :type sample_seed: int
+    :param issues_file: File listing issues to convert, or "-" to read
+    them from stdin, or None for all issues (see
+    alto2txt.inventory.read_issue_paths)
+    :type issues_file: str
+    :param shard_index: Shard of issues to convert, from 0 (see
+    alto2txt.inventory.take_shard)
+    :type shard_index: int
+    :param shard_count: Number of shards
+    :type shard_count: int
+    :return: publication to summary (see alto2txt.stats)
+    :rtype: dict(str: dict(str: int or float))
     """
     logger.info("Processing: %s", publications_dir)
+    records = inventory.get_inventory(
+        publications_dir,
+        txt_out_dir,
+        inventory_file,
+        issues_file=issues_file,
+        shard_index=shard_index,
+        shard_count=shard_count,
+    )
+    publications = inventory.group_issues(
+        publications_dir,
+        sampling.sample_records(
+            records, downsample, sample_size, sample_bytes, stratify, sample_seed
+        ),
+    )
     xslts = xml.load_xslts()
-    publications = os.listdir(publications_dir)
+    issue_manifest = manifest.Manifest(txt_out_dir, resume or incremental, incremental)
+    issue_index = None
+    if index:
+        from alto2txt import metadata_index
+
+        issue_index = metadata_index.IndexWriter(txt_out_dir)
+    if search:
+        from alto2txt import search_index
+
+        issue_index = search_index.add_search_index(issue_index, txt_out_dir)
+    profiler = None
+    if profile:
+        profiler = profiling.Profiler(txt_out_dir)
+        profiler.enable()
+    writer = output_writer.open_writer(writer_threads, fsync)
     logger.info("Publications: %d", len(publications))
-    for publication in publications:
-        publication_dir = os.path.join(publications_dir, publication)
-        if not os.path.isdir(publication_dir):
-            logger.warning("Unexpected file: %s", publication_dir)
-            continue
-        publication_txt_out_dir = os.path.join(txt_out_dir, publication)
-        publication_to_text(publication_dir, publication_txt_out_dir, xslts, downsample)
+    summaries = {}
+    try:
+        for publication, (publication_dir, issues) in publications.items():
+            publication_txt_out_dir = os.path.join(txt_out_dir, publication)
+            summaries[publication] = publication_to_text(
+                publication_dir,
+                publication_txt_out_dir,
+                xslts,
+                downsample,
+                engine,
+                issue_manifest,
+                output_format,
+                issue_index,
+                profiler,
+                writer,
+                issues,
+                count_words,
+            )
+    finally:
+        if writer is not None:
+            writer.close()
+        if issue_index is not None:
+            issue_index.close()
+        if profiler is not None:
+            profiler.close()
+    if index:
+        metadata_index.merge_index(txt_out_dir)
+    if search:
+        search_index.merge_search_index(txt_out_dir)
+    if profile:
+        profiling.merge_profiles(txt_out_dir)
+    return summaries
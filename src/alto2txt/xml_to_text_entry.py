@@ -8,9 +8,22 @@ metadata.
 import logging
 import os
 import os.path
+import time
 
-from alto2txt import xml, xml_to_text
-from alto2txt.logging_utils import configure_logging
+from alto2txt import (
+    inputs,
+    inventory,
+    logging_utils,
+    manifest,
+    output_writer,
+    profiling,
+    sampling,
+    sinks,
+    stats,
+    work_queue,
+    xml,
+    xml_to_text,
+)
 
 logger = logging.getLogger(__name__)
 """ Module-level logger. """
@@ -21,21 +34,66 @@ PROCESS_SERIAL = "serial"
 """ Process publications serially. """
 PROCESS_MULTI = "multi"
 """ Process publications using multiprocessing. """
+PROCESS_THREADS = "threads"
+""" Process publications using a pool of threads in one process. """
 PROCESS_SPARK = "spark"
 """ Process publications using Spark. """
-PROCESS_TYPES = [PROCESS_SINGLE, PROCESS_SERIAL, PROCESS_MULTI, PROCESS_SPARK]
+PROCESS_QUEUE = "queue"
+""" Process publications using a work queue shared by processes. """
+PROCESS_TYPES = [
+    PROCESS_SINGLE,
+    PROCESS_SERIAL,
+    PROCESS_MULTI,
+    PROCESS_THREADS,
+    PROCESS_SPARK,
+    PROCESS_QUEUE,
+]
 
 
-def check_parameters(xml_in_dir, txt_out_dir, process_type, num_cores, downsample):
+def check_parameters(
+    xml_in_dir,
+    txt_out_dir,
+    process_type,
+    num_cores,
+    downsample,
+    engine=xml_to_text.ENGINE_XSLT,
+    output_format=sinks.OUTPUT_FILES,
+    writer_threads=0,
+    fsync=sinks.FSYNC_NONE,
+    sample_size=None,
+    sample_bytes=None,
+    stratify=sampling.STRATIFY_PUBLICATION,
+    log_detail=logging_utils.LOG_DETAIL_FILE,
+    log_rate=None,
+    lease_seconds=work_queue.QUEUE_LEASE_SECONDS,
+    issues_file=None,
+    shard_index=0,
+    shard_count=1,
+):
     """
     Check parameters. The following checks are done:
 
     * xml_in_dir exists and is a directory.
     * txt_out_dir either does not exists or exists and is a directory.
     * xml_in_dir and txt_out_dir are not the same directory.
-    * process_type is one of single, serial, multi, spark.
+    * process_type is one of single, serial, multi, threads, spark,
+      queue.
     * downsample is a positive integer.
     * num_cores is a positive integer.
+    * engine is one of xslt, native.
+    * output_format is one of files, zip, tar, jsonl.
+    * writer_threads is a non-negative integer.
+    * fsync is one of none, issue, article.
+    * sample_size and sample_bytes, if provided, are positive integers.
+    * stratify is one of publication, year, none.
+    * log_detail is one of file, issue.
+    * log_rate, if provided, is positive.
+    * lease_seconds is positive.
+    * issues_file, if provided, is "-" or exists.
+    * shard_count is a positive integer and shard_index is from 0 to
+      shard_count - 1.
+    * issues_file and shards are not provided if process_type is
+      single.
 
     :param xml_in_dir: Input directory with XML publications
     :type xml_in_dir: str
@@ -47,13 +105,39 @@ def check_parameters(xml_in_dir, txt_out_dir, process_type, num_cores, downsampl
     :type num_cores: int
     :param downsample: Downsample
     :type downsample: int
+    :param engine: Engine
+    :type engine: str
+    :param output_format: Output format
+    :type output_format: str
+    :param writer_threads: Number of writer threads
+    :type writer_threads: int
+    :param fsync: fsync policy
+    :type fsync: str
+    :param sample_size: Number of issues to sample
+    :type sample_size: int
+    :param sample_bytes: Size of issues to sample, in bytes
+    :type sample_bytes: int
+    :param stratify: Stratification
+    :type stratify: str
+    :param log_detail: Log detail
+    :type log_detail: str
+    :param log_rate: Maximum number of per-file messages per second
+    :type log_rate: float
+    :param lease_seconds: Duration, in seconds, of a lease on an issue
+    :type lease_seconds: float
+    :param issues_file: File listing issues
+    :type issues_file: str
+    :param shard_index: Shard index
+    :type shard_index: int
+    :param shard_count: Number of shards
+    :type shard_count: int
     :raise AssertionError: if any check fails
     """
     assert downsample > 0, "downsample, {}, must be a positive integer".format(
         downsample
     )
     assert os.path.exists(xml_in_dir), "xml_in_dir, {}, not found".format(xml_in_dir)
-    assert os.path.isdir(xml_in_dir), "xml_in_dir, {}, is not a directory".format(
+    assert inputs.isdir(xml_in_dir), "xml_in_dir, {}, is not a directory".format(
         xml_in_dir
     )
     assert not os.path.isfile(
@@ -67,6 +151,58 @@ def check_parameters(xml_in_dir, txt_out_dir, process_type, num_cores, downsampl
     assert process_type in PROCESS_TYPES, "process-type, {}, must be one of {}.".format(
         process_type, ",".join(PROCESS_TYPES)
     )
+    assert engine in xml_to_text.ENGINES, "engine, {}, must be one of {}.".format(
+        engine, ",".join(xml_to_text.ENGINES)
+    )
+    assert (
+        output_format in sinks.OUTPUT_FORMATS
+    ), "output-format, {}, must be one of {}.".format(
+        output_format, ",".join(sinks.OUTPUT_FORMATS)
+    )
+    assert (
+        writer_threads >= 0
+    ), "writer_threads, {}, must be a non-negative integer".format(writer_threads)
+    assert fsync in sinks.FSYNC_POLICIES, "fsync, {}, must be one of {}.".format(
+        fsync, ",".join(sinks.FSYNC_POLICIES)
+    )
+    assert (
+        sample_size is None or sample_size > 0
+    ), "sample_size, {}, must be a positive integer".format(sample_size)
+    assert (
+        sample_bytes is None or sample_bytes > 0
+    ), "sample_bytes, {}, must be a positive integer".format(sample_bytes)
+    assert (
+        stratify in sampling.STRATIFICATIONS
+    ), "stratify, {}, must be one of {}.".format(
+        stratify, ",".join(sampling.STRATIFICATIONS)
+    )
+    assert (
+        log_detail in logging_utils.LOG_DETAILS
+    ), "log_detail, {}, must be one of {}.".format(
+        log_detail, ",".join(logging_utils.LOG_DETAILS)
+    )
+    assert log_rate is None or log_rate > 0, "log_rate, {}, must be positive".format(
+        log_rate
+    )
+    assert lease_seconds > 0, "lease_seconds, {}, must be positive".format(
+        lease_seconds
+    )
+    assert (
+        issues_file is None
+        or issues_file == inventory.ISSUES_STDIN
+        or os.path.isfile(issues_file)
+    ), "issues_file, {}, not found".format(issues_file)
+    assert shard_count > 0, "shard_count, {}, must be a positive integer".format(
+        shard_count
+    )
+    assert (
+        0 <= shard_index < shard_count
+    ), "shard_index, {}, must be from 0 to {}".format(shard_index, shard_count - 1)
+    assert process_type != PROCESS_SINGLE or (
+        issues_file is None and shard_count == 1
+    ), "issues_file and shards cannot be used with process-type {}".format(
+        PROCESS_SINGLE
+    )
     if process_type == PROCESS_SPARK:
         assert num_cores > 0, "num_cores, {}, must be a positive integer".format(
             num_cores
@@ -77,7 +213,33 @@ def check_parameters(xml_in_dir, txt_out_dir, process_type, num_cores, downsampl
 
 
 def xml_publications_to_text(
-    xml_in_dir, txt_out_dir, process_type, log_file="out.log", num_cores=1, downsample=1
+    xml_in_dir,
+    txt_out_dir,
+    process_type,
+    log_file="out.log",
+    num_cores=1,
+    downsample=1,
+    engine=xml_to_text.ENGINE_XSLT,
+    resume=False,
+    incremental=False,
+    output_format=sinks.OUTPUT_FILES,
+    index=False,
+    search=False,
+    profile=False,
+    writer_threads=0,
+    fsync=sinks.FSYNC_NONE,
+    count_words=False,
+    inventory_file=None,
+    sample_size=None,
+    sample_bytes=None,
+    stratify=sampling.STRATIFY_PUBLICATION,
+    sample_seed=0,
+    issues_file=None,
+    shard_index=0,
+    shard_count=1,
+    log_detail=logging_utils.LOG_DETAIL_FILE,
+    log_rate=None,
+    lease_seconds=work_queue.QUEUE_LEASE_SECONDS,
 ):
     """
     Converts XML publications to plaintext articles and generates
@@ -85,6 +247,19 @@ def xml_publications_to_text(
 
     Each publication is processed concurrently.
 
+    If process_type is threads then issues are converted by a pool of
+    threads in this process, each with its own XSLTs, rather than by a
+    pool of processes (see
+    alto2txt.thread_xml_to_text).
+
+    If process_type is queue then issues are claimed from a work queue
+    in txt_out_dir, shared by any number of processes running with the
+    same xml_in_dir and txt_out_dir, for example on several nodes with
+    a shared filesystem. Each claim is a lease, of lease_seconds,
+    renewed while the process runs, so issues claimed by a process that
+    stops are claimed again by another. The run report covers every
+    issue in the queue (see alto2txt.queue_xml_to_text).
+
     One text file is output per article, each complemented by one XML
     metadata file.
 
@@ -94,6 +269,79 @@ def xml_publications_to_text(
     publications_to_text is called.
 
     txt_out_dir is created with an analogous structure to xml_in_dir.
+    If output_format is not files then the articles of each issue are
+    packed into a single zip, tar or JSON Lines file.
+
+    Converted issues are recorded in a manifest in txt_out_dir. If
+    resume is True then issues recorded as converted, whose input files
+    are unchanged and none of whose files failed to convert, are
+    skipped, so an interrupted run can be resumed.
+    If incremental is True then only issues whose input files, or the
+    ALTO files their METS files reference, have changed content are
+    converted, and their previous output is removed first.
+
+    If index is True then a Parquet metadata index, with a row per
+    article converted, is written to txt_out_dir. This requires
+    pyarrow.
+
+    If search is True then an SQLite database,
+    txt_out_dir/alto2txt_search.sqlite, is written with the metadata of
+    each article converted and an FTS5 full-text index of its title and
+    plaintext, built as articles are written rather than by reading
+    the output again (see alto2txt.search_index).
+
+    If profile is True then conversion is profiled with cProfile and,
+    for the XSLTs, libxslt profiling, and tables of the time spent in
+    Python functions and in each XSLT template, aggregated across
+    workers, are written to txt_out_dir/alto2txt_profile.txt (see
+    alto2txt.profiling).
+
+    If writer_threads is not 0 then articles are written by that many
+    writer threads, per process, while issues are converted, with a
+    bounded amount of output held in memory (see
+    alto2txt.output_writer). Files written are synced to disk as
+    specified by fsync: not at all (none), once each issue is written
+    (issue) or as each article is written (article).
+
+    The words of articles written as files by the XSLTs, with engine
+    xslt and output_format files, are counted in the run report only
+    if count_words is True, as this requires reading the files once
+    written. The words of other articles are counted as they are
+    written.
+
+    Unless process_type is single, issues are listed from an inventory
+    of xml_in_dir, recording each issue's files and the flavour of its
+    XML files, which is scanned by concurrent threads and written to
+    txt_out_dir/alto2txt_inventory.jsonl. If inventory_file is an
+    inventory of xml_in_dir then it is reused rather than scanning
+    xml_in_dir again (see alto2txt.inventory).
+
+    If issues_file is provided then only the issues it lists, one issue
+    directory per line, are converted, and only those issues are
+    scanned, or taken from inventory_file. If issues_file is "-" then
+    issues are read from stdin. If shard_count is greater than 1 then
+    issues are sorted by path and only every shard_count-th issue, from
+    shard_index, is converted, so each task of an array job can convert
+    one shard without scanning xml_in_dir if issues_file or
+    inventory_file are provided.
+
+    Issues are sampled deterministically, by a hash of their path and
+    sample_seed, within strata given by stratify: 1 in downsample
+    issues, sample_size issues or sample_bytes bytes of input files
+    (see alto2txt.sampling). The same issues are sampled by every
+    process type.
+
+    A message is logged for each file converted unless log_detail is
+    issue, in which case only a summary is logged for each issue,
+    with warnings and errors for files. If log_rate is provided then
+    at most that many per-file messages are logged per second, per
+    process. If process_type is multi then worker processes send log
+    records to this process, which alone writes to the console and
+    log_file (see alto2txt.logging_utils).
+
+    Once all publications are converted, a run report, with counts and
+    per-stage timings for each publication and in total, is written as
+    JSON to txt_out_dir/alto2txt_report.json (see alto2txt.stats).
 
     :param xml_in_dir: Input directory with XML publications
     :type xml_in_dir: str
@@ -105,27 +353,310 @@ def xml_publications_to_text(
     :type log_file: str
     :param num_cores: Number of cores (used for Spark only)
     :type num_cores: int
-    :param downsample: Downsample, converting every Nth issue only
+    :param downsample: Downsample, converting 1 in N issues only (see
+    alto2txt.sampling)
     :type downsample: int
+    :param engine: Engine, xslt to use the XSLTs or native to convert
+    METS 1.8, METS 1.3, UKP and BLN without XSLT
+    :type engine: str
+    :param resume: Resume, skipping issues already converted
+    :type resume: bool
+    :param incremental: Convert only issues whose content changed
+    :type incremental: bool
+    :param output_format: Output format, one of
+    alto2txt.sinks.OUTPUT_FORMATS
+    :type output_format: str
+    :param index: Write metadata index
+    :type index: bool
+    :param search: Write full-text search index
+    :type search: bool
+    :param profile: Profile conversion
+    :type profile: bool
+    :param writer_threads: Number of writer threads
+    :type writer_threads: int
+    :param fsync: fsync policy, one of alto2txt.sinks.FSYNC_POLICIES
+    :type fsync: str
+    :param count_words: Count words of articles written by the XSLTs
+    :type count_words: bool
+    :param inventory_file: Inventory file to reuse
+    :type inventory_file: str
+    :param sample_size: Number of issues to convert, or None for all
+    :type sample_size: int
+    :param sample_bytes: Total size, in bytes, of the input files of the
+    issues to convert, or None for all
+    :type sample_bytes: int
+    :param stratify: Stratification, one of
+    alto2txt.sampling.STRATIFICATIONS
+    :type stratify: str
+    :param sample_seed: Sampling seed
+    :type sample_seed: int
+    :param issues_file: File listing issues to convert, or "-" to read
+    them from stdin, or None for all issues (see
+    alto2txt.inventory.read_issue_paths)
+    :type issues_file: str
+    :param shard_index: Shard of issues to convert, from 0 (see
+    alto2txt.inventory.take_shard)
+    :type shard_index: int
+    :param shard_count: Number of shards
+    :type shard_count: int
+    :param log_detail: Log detail, one of
+    alto2txt.logging_utils.LOG_DETAILS
+    :type log_detail: str
+    :param log_rate: Maximum number of per-file messages per second,
+    per process, or None for no limit
+    :type log_rate: float
+    :param lease_seconds: Duration, in seconds, of a lease on an issue
+    if process_type is queue
+    :type lease_seconds: float
+    :return: run report
+    :rtype: dict
     :raise AssertionError: if any parameter check fails (see
     check_parameters)
     """
-    check_parameters(xml_in_dir, txt_out_dir, process_type, num_cores, downsample)
-    configure_logging(log_file)
+    check_parameters(
+        xml_in_dir,
+        txt_out_dir,
+        process_type,
+        num_cores,
+        downsample,
+        engine,
+        output_format,
+        writer_threads,
+        fsync,
+        sample_size,
+        sample_bytes,
+        stratify,
+        log_detail,
+        log_rate,
+        lease_seconds,
+        issues_file,
+        shard_index,
+        shard_count,
+    )
+    logging_utils.configure_logging(log_file)
+    logging_utils.configure_file_messages(log_detail, log_rate)
+    start = time.time()
+    start_counter = time.perf_counter()
     if process_type == PROCESS_SINGLE:
         xslts = xml.load_xslts()
-        xml_to_text.publication_to_text(xml_in_dir, txt_out_dir, xslts, downsample)
+        issue_index = None
+        if index:
+            from alto2txt import metadata_index
+
+            issue_index = metadata_index.IndexWriter(txt_out_dir)
+        if search:
+            from alto2txt import search_index
+
+            issue_index = search_index.add_search_index(issue_index, txt_out_dir)
+        profiler = None
+        if profile:
+            profiler = profiling.Profiler(txt_out_dir)
+            profiler.enable()
+        writer = output_writer.open_writer(writer_threads, fsync)
+        issues = [
+            (year, issue, issue_dir, None)
+            for year, issue, issue_dir in xml_to_text.publication_issues(
+                xml_in_dir, downsample, sample_size, sample_bytes, stratify, sample_seed
+            )
+        ]
+        try:
+            summary = xml_to_text.publication_to_text(
+                xml_in_dir,
+                txt_out_dir,
+                xslts,
+                downsample,
+                engine,
+                manifest.Manifest(txt_out_dir, resume or incremental, incremental),
+                output_format,
+                issue_index,
+                profiler,
+                writer,
+                issues,
+                count_words,
+            )
+        finally:
+            if writer is not None:
+                writer.close()
+            if issue_index is not None:
+                issue_index.close()
+            if profiler is not None:
+                profiler.close()
+        if index:
+            metadata_index.merge_index(txt_out_dir)
+        if search:
+            search_index.merge_search_index(txt_out_dir)
+        if profile:
+            profiling.merge_profiles(txt_out_dir)
+        summaries = {
+            inputs.get_name(os.path.basename(os.path.normpath(xml_in_dir))): summary
+        }
     elif process_type == PROCESS_SERIAL:
-        xml_to_text.publications_to_text(xml_in_dir, txt_out_dir, downsample)
+        summaries = xml_to_text.publications_to_text(
+            xml_in_dir,
+            txt_out_dir,
+            downsample,
+            engine,
+            resume,
+            incremental,
+            output_format,
+            index,
+            search,
+            profile,
+            writer_threads,
+            fsync,
+            count_words,
+            inventory_file,
+            sample_size,
+            sample_bytes,
+            stratify,
+            sample_seed,
+            issues_file,
+            shard_index,
+            shard_count,
+        )
     elif process_type == PROCESS_SPARK:
         from alto2txt import spark_xml_to_text
 
-        spark_xml_to_text.publications_to_text(
-            xml_in_dir, txt_out_dir, log_file, num_cores, downsample
+        summaries = spark_xml_to_text.publications_to_text(
+            xml_in_dir,
+            txt_out_dir,
+            log_file,
+            num_cores,
+            downsample,
+            engine,
+            resume,
+            incremental,
+            output_format,
+            index,
+            search,
+            profile,
+            writer_threads,
+            fsync,
+            count_words,
+            inventory_file,
+            sample_size,
+            sample_bytes,
+            stratify,
+            sample_seed,
+            issues_file,
+            shard_index,
+            shard_count,
+            log_detail,
+            log_rate,
+        )
+    elif process_type == PROCESS_QUEUE:
+        from alto2txt import queue_xml_to_text
+
+        summaries = queue_xml_to_text.publications_to_text(
+            xml_in_dir,
+            txt_out_dir,
+            downsample,
+            engine,
+            resume,
+            incremental,
+            output_format,
+            index,
+            search,
+            profile,
+            writer_threads,
+            fsync,
+            count_words,
+            inventory_file,
+            sample_size,
+            sample_bytes,
+            stratify,
+            sample_seed,
+            issues_file,
+            shard_index,
+            shard_count,
+            lease_seconds,
+        )
+    elif process_type == PROCESS_THREADS:
+        from alto2txt import thread_xml_to_text
+
+        summaries = thread_xml_to_text.publications_to_text(
+            xml_in_dir,
+            txt_out_dir,
+            downsample,
+            engine,
+            resume,
+            incremental,
+            output_format,
+            index,
+            search,
+            profile,
+            writer_threads,
+            fsync,
+            count_words,
+            inventory_file,
+            sample_size,
+            sample_bytes,
+            stratify,
+            sample_seed,
+            issues_file,
+            shard_index,
+            shard_count,
         )
     else:
         from alto2txt import multiprocess_xml_to_text
 
-        multiprocess_xml_to_text.publications_to_text(
-            xml_in_dir, txt_out_dir, log_file, downsample
+        summaries = multiprocess_xml_to_text.publications_to_text(
+            xml_in_dir,
+            txt_out_dir,
+            log_file,
+            downsample,
+            engine,
+            resume,
+            incremental,
+            output_format,
+            index,
+            search,
+            profile,
+            writer_threads,
+            fsync,
+            count_words,
+            inventory_file,
+            sample_size,
+            sample_bytes,
+            stratify,
+            sample_seed,
+            issues_file,
+            shard_index,
+            shard_count,
+            log_detail,
+            log_rate,
         )
+    parameters = {
+        "xml_in_dir": xml_in_dir,
+        "txt_out_dir": txt_out_dir,
+        "process_type": process_type,
+        "num_cores": num_cores,
+        "downsample": downsample,
+        "engine": engine,
+        "resume": resume,
+        "incremental": incremental,
+        "output_format": output_format,
+        "index": index,
+        "search": search,
+        "profile": profile,
+        "writer_threads": writer_threads,
+        "fsync": fsync,
+        "count_words": count_words,
+        "inventory_file": inventory_file,
+        "sample_size": sample_size,
+        "sample_bytes": sample_bytes,
+        "stratify": stratify,
+        "sample_seed": sample_seed,
+        "issues_file": issues_file,
+        "shard_index": shard_index,
+        "shard_count": shard_count,
+        "log_detail": log_detail,
+        "log_rate": log_rate,
+        "lease_seconds": lease_seconds,
+    }
+    report = stats.run_report(
+        summaries, parameters, start, time.perf_counter() - start_counter
+    )
+    stats.write_report(report, txt_out_dir)
+    logger.info("Total: %s", str(report["total"]))
+    return report
@@ -0,0 +1,30 @@
+import os
+
+import pytest
+
+from alto2txt import xml, xml_to_text
+
+TEST_FILES = os.path.join("tests", "tests", "test_files")
+
+
+@pytest.fixture
+def convert_issue():
+    """
+    Converts an issue with an engine, returning the output file names
+    and contents.
+    """
+
+    def convert(publication_dir, year, issue, output_dir, engine):
+        xml_to_text.issue_to_text(
+            os.path.basename(publication_dir),
+            year,
+            issue,
+            os.path.join(publication_dir, year, issue),
+            str(output_dir),
+            xml.load_xslts(),
+            engine,
+        )
+        issue_out_dir = output_dir / year / issue
+        return {path.name: path.read_bytes() for path in issue_out_dir.iterdir()}
+
+    return convert
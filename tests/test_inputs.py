@@ -0,0 +1,145 @@
+import gzip
+import os
+import shutil
+import tarfile
+import zipfile
+
+import pytest
+
+from alto2txt import inputs, manifest, synthetic, xml_to_text
+
+
+def read_output(output_dir):
+    return {
+        path.relative_to(output_dir): path.read_bytes()
+        for path in output_dir.rglob("*")
+        if path.is_file() and path.suffix in (".txt", ".xml")
+    }
+
+
+def write_archive(archive_path, source_dir, arcname):
+    if archive_path.endswith(".zip"):
+        with zipfile.ZipFile(archive_path, "w") as archive:
+            for root, _, names in os.walk(source_dir):
+                for name in names:
+                    path = os.path.join(root, name)
+                    archive.write(
+                        path,
+                        os.path.join(arcname, os.path.relpath(path, source_dir)),
+                    )
+    else:
+        with tarfile.open(archive_path, "w:gz") as archive:
+            archive.add(source_dir, arcname=arcname)
+
+
+@pytest.fixture(scope="module")
+def corpus_dir(tmp_path_factory):
+    corpus_dir = tmp_path_factory.mktemp("corpus")
+    synthetic.generate_corpus(
+        str(corpus_dir), issues=2, pages=2, articles_per_page=2, words=10
+    )
+    return corpus_dir
+
+
+@pytest.mark.parametrize("suffix", [".zip", ".tar.gz"])
+@pytest.mark.parametrize("level", ["publication", "year"])
+@pytest.mark.parametrize("engine", xml_to_text.ENGINES)
+def test_archives(tmp_path, corpus_dir, suffix, level, engine):
+    archive_dir = tmp_path / "archives"
+    shutil.copytree(corpus_dir, archive_dir)
+    for publication_dir in archive_dir.iterdir():
+        if level == "publication":
+            # Members are within a directory named after the archive.
+            write_archive(
+                str(publication_dir) + suffix,
+                str(publication_dir),
+                publication_dir.name,
+            )
+            shutil.rmtree(publication_dir)
+            continue
+        for year_dir in publication_dir.iterdir():
+            write_archive(str(year_dir) + suffix, str(year_dir), "")
+            shutil.rmtree(year_dir)
+    expected = xml_to_text.publications_to_text(
+        str(corpus_dir), str(tmp_path / "expected"), engine=engine
+    )
+    summaries = xml_to_text.publications_to_text(
+        str(archive_dir), str(tmp_path / "output"), engine=engine
+    )
+    assert sorted(summaries) == sorted(expected)
+    for publication, summary in summaries.items():
+        assert summary["converted_bad"] == 0
+        assert summary["num_articles"] == expected[publication]["num_articles"]
+    assert read_output(tmp_path / "output") == read_output(tmp_path / "expected")
+    # Issues within archives are recorded in the manifest.
+    manifest_file = str(tmp_path / "output" / manifest.MANIFEST_FILE)
+    assert len(manifest.load_manifest(manifest_file)) == sum(
+        summary["num_issues"] for summary in summaries.values()
+    )
+
+
+def test_virtual_paths(tmp_path):
+    archive_path = str(tmp_path / "1824.zip")
+    with zipfile.ZipFile(archive_path, "w") as archive:
+        archive.writestr("1824/0217/a.xml", b"<a/>")
+        archive.writestr("1824/0217/b.txt", b"b")
+    assert inputs.split_path(os.path.join(archive_path, "0217", "a.xml")) == (
+        archive_path,
+        "0217/a.xml",
+    )
+    assert inputs.isdir(archive_path)
+    assert inputs.listdir(archive_path) == ["0217"]
+    issue_dir = os.path.join(archive_path, "0217")
+    assert inputs.isdir(issue_dir)
+    assert inputs.listdir(issue_dir) == ["a.xml", "b.txt"]
+    assert inputs.isfile(os.path.join(issue_dir, "a.xml"))
+    assert not inputs.isfile(os.path.join(issue_dir, "c.xml"))
+    assert inputs.getsize(os.path.join(issue_dir, "b.txt")) == 1
+    assert inputs.read_file(os.path.join(issue_dir, "a.xml")) == b"<a/>"
+    assert sorted(inputs.list_files(issue_dir)) == ["a.xml", "b.txt"]
+    assert inputs.get_name("1824.zip") == "1824"
+    assert inputs.get_name("1824.tar.gz") == "1824"
+    assert inputs.get_name("1824") == "1824"
+
+
+def compress_file(path, suffix):
+    with open(path, "rb") as f:
+        content = f.read()
+    if suffix == inputs.GZIP_SUFFIX:
+        content = gzip.compress(content)
+    else:
+        content = pytest.importorskip("zstandard").ZstdCompressor().compress(content)
+    with open(path + suffix, "wb") as f:
+        f.write(content)
+    os.remove(path)
+
+
+@pytest.mark.parametrize("suffix", inputs.COMPRESSION_SUFFIXES)
+@pytest.mark.parametrize("engine", xml_to_text.ENGINES)
+def test_compressed_files(tmp_path, corpus_dir, suffix, engine):
+    compressed_dir = tmp_path / "compressed"
+    shutil.copytree(corpus_dir, compressed_dir)
+    for path in compressed_dir.rglob("*.xml"):
+        compress_file(str(path), suffix)
+    expected = xml_to_text.publications_to_text(
+        str(corpus_dir), str(tmp_path / "expected"), engine=engine
+    )
+    summaries = xml_to_text.publications_to_text(
+        str(compressed_dir), str(tmp_path / "output"), engine=engine
+    )
+    for publication, summary in summaries.items():
+        assert summary["converted_bad"] == 0
+        assert summary["non_xml"] == 0
+        assert summary["num_articles"] == expected[publication]["num_articles"]
+        assert summary["bytes_read"] < expected[publication]["bytes_read"]
+    assert read_output(tmp_path / "output") == read_output(tmp_path / "expected")
+
+
+def test_compressed_fingerprint(tmp_path):
+    issue_dir = tmp_path / "0002647" / "1824" / "0217"
+    shutil.copytree(os.path.join("demo-files", "0002647"), tmp_path / "0002647")
+    for path in issue_dir.iterdir():
+        compress_file(str(path), inputs.GZIP_SUFFIX)
+    fingerprint = manifest.issue_fingerprint(str(issue_dir))
+    assert sorted(fingerprint) == sorted(path.name for path in issue_dir.iterdir())
+    assert all(state is not None for state in fingerprint.values())
@@ -0,0 +1,124 @@
+import io
+import os
+import shutil
+
+import pytest
+
+from alto2txt import inventory, xml, xml_to_text
+
+DEMO_ISSUE = os.path.join("demo-files", "0002647", "1824", "0217")
+
+
+def copy_publications(tmp_path, issues):
+    publications_dir = tmp_path / "input"
+    for publication, year, issue in issues:
+        shutil.copytree(DEMO_ISSUE, publications_dir / publication / year / issue)
+    return publications_dir
+
+
+def test_scan(tmp_path):
+    records = inventory.scan("demo-files")
+    assert len(records) == 1
+    record = records[0]
+    assert record[inventory.INVENTORY_PATH] == os.path.join("0002647", "1824", "0217")
+    files = record[inventory.INVENTORY_FILES]
+    assert files["0002647_18240217_mets.xml"][0] == os.path.getsize(
+        os.path.join(DEMO_ISSUE, "0002647_18240217_mets.xml")
+    )
+    flavours = record[inventory.INVENTORY_FLAVOURS]
+    assert flavours["0002647_18240217_mets.xml"] == xml.FLAVOUR_METS_18
+    assert flavours["0002647_18240217_0001.xml"] == xml.FLAVOUR_ALTO
+
+
+def test_get_inventory_reuses_file(tmp_path):
+    publications_dir = copy_publications(tmp_path, [("0002647", "1824", "0217")])
+    output_dir = str(tmp_path / "output")
+    records = inventory.get_inventory(str(publications_dir), output_dir)
+    inventory_file = os.path.join(output_dir, inventory.INVENTORY_FILE)
+    assert inventory.load_inventory(inventory_file, str(publications_dir)) == records
+    # The inventory is reused, so new issues are not seen.
+    shutil.copytree(DEMO_ISSUE, publications_dir / "0002647" / "1824" / "0218")
+    assert (
+        inventory.get_inventory(str(publications_dir), output_dir, inventory_file)
+        == records
+    )
+    # Nor is it reused for another directory.
+    assert inventory.load_inventory(inventory_file, "demo-files") is None
+    assert len(inventory.get_inventory(str(publications_dir), output_dir)) == 2
+
+
+def test_inventory_output_matches(tmp_path):
+    publications_dir = copy_publications(tmp_path, [("0002647", "1824", "0217")])
+    expected = tmp_path / "expected"
+    xml_to_text.publication_to_text(
+        str(publications_dir / "0002647"), str(expected), xml.load_xslts()
+    )
+    output_dir = tmp_path / "output"
+    summaries = xml_to_text.publications_to_text(str(publications_dir), str(output_dir))
+    assert summaries["0002647"]["skipped_alto"] == 4
+    issue_out_dir = output_dir / "0002647" / "1824" / "0217"
+    assert {path.name: path.read_bytes() for path in issue_out_dir.iterdir()} == {
+        path.name: path.read_bytes() for path in (expected / "1824" / "0217").iterdir()
+    }
+
+
+def test_get_inventory_issues_file(tmp_path, monkeypatch):
+    issues = [("0002647", "1824", issue) for issue in ["0217", "0218", "0219"]]
+    publications_dir = copy_publications(tmp_path, issues)
+    issues_file = tmp_path / "issues.txt"
+    issues_file.write_text(
+        "# Failed issues\n"
+        "0002647/1824/0219\n"
+        "\n"
+        "{}\n"
+        "{}\n"
+        "0002647/1824/0220\n"
+        "0002647/1824\n".format(
+            publications_dir / "0002647" / "1824" / "0217",
+            os.path.relpath(publications_dir / "0002647" / "1824" / "0219"),
+        )
+    )
+    output_dir = str(tmp_path / "output")
+    records = inventory.get_inventory(
+        str(publications_dir), output_dir, issues_file=str(issues_file)
+    )
+    # Listed issues are scanned, in order, without duplicates or the
+    # issue not found.
+    assert [record[inventory.INVENTORY_ISSUE] for record in records] == [
+        "0219",
+        "0217",
+    ]
+    assert records[0][inventory.INVENTORY_FILES]
+    assert not os.path.exists(os.path.join(output_dir, inventory.INVENTORY_FILE))
+    # Listed issues are taken from an inventory, which is not scanned
+    # again for new issues, and read from stdin.
+    inventory_file = str(tmp_path / inventory.INVENTORY_FILE)
+    inventory.write_inventory(inventory_file, str(publications_dir), records[:1])
+    monkeypatch.setattr("sys.stdin", io.StringIO("0002647/1824/0219\n"))
+    assert (
+        inventory.get_inventory(
+            str(publications_dir),
+            output_dir,
+            inventory_file,
+            issues_file=inventory.ISSUES_STDIN,
+        )
+        == records[:1]
+    )
+
+
+def test_get_inventory_shards(tmp_path):
+    issues = [("0002647", "1824", "{:04d}".format(issue)) for issue in range(5)]
+    publications_dir = copy_publications(tmp_path, issues)
+    output_dir = str(tmp_path / "output")
+    shards = [
+        inventory.get_inventory(
+            str(publications_dir), output_dir, shard_index=index, shard_count=2
+        )
+        for index in range(2)
+    ]
+    assert [
+        [record[inventory.INVENTORY_ISSUE] for record in shard] for shard in shards
+    ] == [["0000", "0002", "0004"], ["0001", "0003"]]
+    assert inventory.parse_shard("1/2") == (1, 2)
+    with pytest.raises(ValueError):
+        inventory.parse_shard("1")
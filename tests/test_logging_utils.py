@@ -0,0 +1,78 @@
+import logging
+import multiprocessing
+
+import pytest
+
+from alto2txt import logging_utils
+
+
+@pytest.fixture
+def root_handlers():
+    root_logger = logging.getLogger()
+    handlers = list(root_logger.handlers)
+    level = root_logger.level
+    yield
+    for handler in list(root_logger.handlers):
+        root_logger.removeHandler(handler)
+        if handler not in handlers:
+            handler.close()
+    for handler in handlers:
+        root_logger.addHandler(handler)
+    root_logger.setLevel(level)
+    logging_utils.configure_file_messages()
+
+
+def make_record(level=logging.INFO):
+    return logging.LogRecord(
+        logging_utils.FILES_LOGGER, level, __file__, 0, "%s gave output", ("a",), None
+    )
+
+
+def test_rate_limit_filter(monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr(logging_utils.time, "monotonic", lambda: now[0])
+    log_filter = logging_utils.RateLimitFilter(2)
+    assert [log_filter.filter(make_record()) for _ in range(4)] == [
+        True,
+        True,
+        False,
+        False,
+    ]
+    assert log_filter.filter(make_record(logging.WARNING))
+    now[0] = 0.5
+    record = make_record()
+    assert log_filter.filter(record)
+    assert record.getMessage() == "a gave output (2 messages dropped)"
+
+
+def test_configure_file_messages(root_handlers, caplog):
+    files_logger = logging.getLogger(logging_utils.FILES_LOGGER)
+    logging_utils.configure_file_messages(logging_utils.LOG_DETAIL_ISSUE)
+    with caplog.at_level(logging.INFO):
+        files_logger.info("a gave output")
+        files_logger.warning("Problematic file b")
+    assert [record.getMessage() for record in caplog.records] == ["Problematic file b"]
+    logging_utils.configure_file_messages(logging_utils.LOG_DETAIL_FILE, 1)
+    logging_utils.configure_file_messages(logging_utils.LOG_DETAIL_FILE, 1)
+    assert len(files_logger.filters) == 1
+    assert files_logger.level == logging.NOTSET
+
+
+def log_to_queue(log_queue):
+    logging_utils.configure_queue_logging(log_queue)
+    logging.getLogger("alto2txt.test").info("From worker")
+
+
+def test_log_listener(root_handlers, tmp_path):
+    log_file = tmp_path / "out.log"
+    log_queue, listener = logging_utils.start_log_listener(str(log_file))
+    try:
+        process = multiprocessing.Process(target=log_to_queue, args=(log_queue,))
+        process.start()
+        process.join()
+    finally:
+        listener.stop()
+    assert process.exitcode == 0
+    lines = log_file.read_text().splitlines()
+    assert len(lines) == 1
+    assert lines[0].endswith(":alto2txt.test:{}:INFO:From worker".format(process.pid))
@@ -0,0 +1,131 @@
+import errno
+import json
+import os
+import shutil
+
+from alto2txt import manifest, sinks, xml_to_text
+
+DEMO_ISSUE = os.path.join("0002647", "1824", "0217")
+
+
+def read_manifest(output_dir):
+    with open(os.path.join(output_dir, manifest.MANIFEST_FILE)) as f:
+        return [json.loads(line) for line in f]
+
+
+def test_manifest_records_issue(tmp_path):
+    output_dir = tmp_path / "output"
+    xml_to_text.publications_to_text("demo-files", str(output_dir))
+    (record,) = read_manifest(output_dir)
+    assert record[manifest.MANIFEST_ISSUE] == DEMO_ISSUE
+    assert record[manifest.MANIFEST_SUMMARY]["converted_ok"] == 1
+    assert record[manifest.MANIFEST_VERSION] == manifest.get_version()
+    assert record[manifest.MANIFEST_FILES] == manifest.issue_files(
+        os.path.join("demo-files", DEMO_ISSUE)
+    )
+
+
+def test_resume_skips_unchanged_issues(tmp_path):
+    input_dir = tmp_path / "input"
+    shutil.copytree("demo-files", input_dir)
+    output_dir = tmp_path / "output"
+    xml_to_text.publications_to_text(str(input_dir), str(output_dir))
+    issue_out_dir = output_dir / DEMO_ISSUE
+    text_file = next(issue_out_dir.glob("*.txt"))
+    text_file.unlink()
+
+    # Unchanged issue is skipped so the deleted output is not rewritten.
+    xml_to_text.publications_to_text(str(input_dir), str(output_dir), resume=True)
+    assert not text_file.exists()
+    assert len(read_manifest(output_dir)) == 1
+
+    # Changed issue is converted again.
+    mets_file = next((input_dir / DEMO_ISSUE).glob("*_mets.xml"))
+    os.utime(mets_file, ns=(0, 0))
+    xml_to_text.publications_to_text(str(input_dir), str(output_dir), resume=True)
+    assert text_file.exists()
+    assert len(read_manifest(output_dir)) == 2
+
+
+def test_load_manifest_ignores_partial_record(tmp_path):
+    issue_manifest = manifest.Manifest(str(tmp_path))
+    issue_manifest.record("a/1824/0217", {"a.xml": [1, 2]}, {"converted_ok": 1})
+    with open(issue_manifest.manifest_file, "a") as f:
+        f.write('{"issue": "b/1824/02')
+    resumed = manifest.Manifest(str(tmp_path), resume=True)
+    assert list(resumed.records) == ["a/1824/0217"]
+    assert resumed.is_complete("a/1824/0217", {"a.xml": [1, 2]})
+    assert not resumed.is_complete("a/1824/0217", {"a.xml": [1, 3]})
+    assert not resumed.is_complete("b/1824/0217", {})
+
+
+def test_issue_fingerprint_includes_referenced_alto():
+    issue_dir = os.path.join("tests", "tests", "test_files", "mets13", "1830", "0105")
+    fingerprint = manifest.issue_fingerprint(issue_dir)
+    assert fingerprint["0000123_18300105_0001.xml"][3] == manifest.file_digest(
+        os.path.join(issue_dir, "0000123_18300105_0001.xml")
+    )
+    # Page 0003 is referenced but missing.
+    assert fingerprint["0000123_18300105_0003.xml"] is None
+    # Hashes are reused for unchanged files.
+    previous = {fileloc: state for fileloc, state in fingerprint.items()}
+    previous["0000123_18300105_0001.xml"] = previous["0000123_18300105_0001.xml"][
+        :3
+    ] + ["reused"]
+    assert manifest.issue_fingerprint(issue_dir, previous) == previous
+
+
+def test_incremental_converts_changed_issues(tmp_path):
+    input_dir = tmp_path / "input"
+    shutil.copytree("demo-files", input_dir)
+    output_dir = tmp_path / "output"
+    xml_to_text.publications_to_text(str(input_dir), str(output_dir), incremental=True)
+    (record,) = read_manifest(output_dir)
+    assert len(record[manifest.MANIFEST_FINGERPRINT]) == 5
+    issue_out_dir = output_dir / DEMO_ISSUE
+    text_file = next(issue_out_dir.glob("*.txt"))
+    text_file.unlink()
+
+    # Issue with unchanged content is skipped.
+    mets_file = next((input_dir / DEMO_ISSUE).glob("*_mets.xml"))
+    os.utime(mets_file, ns=(0, 0))
+    xml_to_text.publications_to_text(str(input_dir), str(output_dir), incremental=True)
+    assert not text_file.exists()
+    assert len(read_manifest(output_dir)) == 1
+
+    # Issue with changed ALTO is converted again and stale output removed.
+    stale_file = issue_out_dir / "0002647_18240217_art9999.txt"
+    stale_file.write_text("stale")
+    alto_file = input_dir / DEMO_ISSUE / "0002647_18240217_0004.xml"
+    with open(alto_file, "a") as f:
+        f.write("\n")
+    xml_to_text.publications_to_text(str(input_dir), str(output_dir), incremental=True)
+    assert text_file.exists()
+    assert not stale_file.exists()
+    assert len(read_manifest(output_dir)) == 2
+
+
+def test_resume_converts_failed_issues(tmp_path, monkeypatch):
+    output_dir = tmp_path / "output"
+
+    def write_article(sink, article):
+        raise OSError(errno.ENOSPC, os.strerror(errno.ENOSPC))
+
+    with monkeypatch.context() as m:
+        m.setattr(sinks.Sink, "write_article", write_article)
+        summaries = xml_to_text.publications_to_text(
+            "demo-files", str(output_dir), engine=xml_to_text.ENGINE_NATIVE
+        )
+    assert summaries["0002647"]["converted_bad"] == 1
+    assert summaries["0002647"]["num_articles"] == 0
+    resumed = manifest.Manifest(str(output_dir), resume=True)
+    assert not resumed.is_complete(
+        DEMO_ISSUE, manifest.issue_files(os.path.join("demo-files", DEMO_ISSUE))
+    )
+
+    # Issue that failed is converted again.
+    summaries = xml_to_text.publications_to_text(
+        "demo-files", str(output_dir), engine=xml_to_text.ENGINE_NATIVE, resume=True
+    )
+    assert summaries["0002647"]["converted_bad"] == 0
+    assert len(list((output_dir / DEMO_ISSUE).glob("*.txt"))) == 27
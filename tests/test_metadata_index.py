@@ -0,0 +1,80 @@
+import os
+import shutil
+
+import pytest
+
+pq = pytest.importorskip("pyarrow.parquet")
+
+from lxml import etree  # noqa: E402
+
+from alto2txt import metadata_index, sinks, xml_to_text  # noqa: E402
+
+DEMO_ISSUE = os.path.join("0002647", "1824", "0217")
+
+
+@pytest.mark.parametrize("engine", xml_to_text.ENGINES)
+@pytest.mark.parametrize("output_format", [sinks.OUTPUT_FILES, sinks.OUTPUT_ZIP])
+def test_index_has_row_per_article(tmp_path, engine, output_format):
+    output_dir = tmp_path / "output"
+    xml_to_text.publications_to_text(
+        "demo-files",
+        str(output_dir),
+        engine=engine,
+        output_format=output_format,
+        index=True,
+    )
+    assert not (output_dir / metadata_index.INDEX_PARTS_DIR).exists()
+    table = pq.read_table(output_dir / metadata_index.INDEX_FILE)
+    assert table.schema == metadata_index.INDEX_SCHEMA
+    assert table.num_rows == 27
+    rows = sorted(table.to_pylist(), key=lambda row: row["item_id"])
+    assert rows[0]["publication_id"] == "0002647"
+    assert rows[0]["issue_date"] == "1824-02-17"
+    assert rows[0]["item_id"] == "art0001"
+    assert rows[0]["word_count"] == 789
+    assert rows[0]["ocr_quality_mean"] == 0.8086
+    assert rows[0]["plain_text_file"] == "0002647_18240217_art0001.txt"
+    suffix = "" if output_format == sinks.OUTPUT_FILES else ".zip"
+    assert rows[0]["output"] == DEMO_ISSUE + suffix
+
+
+def test_merge_index_replaces_converted_issues(tmp_path):
+    input_dir = tmp_path / "input"
+    shutil.copytree("demo-files", input_dir / "a")
+    output_dir = tmp_path / "output"
+    xml_to_text.publications_to_text(str(input_dir / "a"), str(output_dir), index=True)
+    shutil.copytree("demo-files", input_dir / "b")
+    # Issue converted again replaces its rows, others are kept.
+    os.utime(next((input_dir / "b" / DEMO_ISSUE).glob("*_mets.xml")), ns=(0, 0))
+    xml_to_text.publications_to_text(
+        str(input_dir / "b"), str(output_dir), resume=True, index=True
+    )
+    table = pq.read_table(output_dir / metadata_index.INDEX_FILE)
+    assert table.num_rows == 27
+
+
+def test_merge_index_keeps_newest_part(tmp_path, caplog):
+    output_dir = tmp_path / "output"
+    xml_to_text.publications_to_text("demo-files", str(output_dir))
+    metadata_files = sorted((output_dir / DEMO_ISSUE).glob("*_metadata.xml"))
+    # The issue is in two part files, e.g. after an interrupted run,
+    # the newest having fewer articles.
+    for mtime, output, files in [
+        (1, "old", metadata_files),
+        (2, "new", metadata_files[:2]),
+    ]:
+        writer = metadata_index.IndexWriter(str(output_dir))
+        for metadata_file in files:
+            writer.add(etree.parse(str(metadata_file)).getroot(), output)
+        writer.close()
+        os.utime(writer.part_file, (mtime, mtime))
+    parts_dir = output_dir / metadata_index.INDEX_PARTS_DIR
+    truncated = parts_dir / "part-truncated.parquet"
+    with open(writer.part_file, "rb") as f:
+        truncated.write_bytes(f.read(100))
+    assert metadata_index.merge_index(str(output_dir)) == 2
+    table = pq.read_table(output_dir / metadata_index.INDEX_FILE)
+    assert set(table.column("output").to_pylist()) == {"new"}
+    # The unreadable part file is skipped and left in place.
+    assert [path.name for path in parts_dir.iterdir()] == [truncated.name]
+    assert "Skipping unreadable index part" in caplog.text
@@ -0,0 +1,95 @@
+import os
+
+import pytest
+from lxml import etree
+
+from alto2txt import articles, mets_to_text, xml_to_text
+
+DEMO_ISSUE = ("0002647", "1824", "0217")
+TEST_FILES = os.path.join("tests", "tests", "test_files")
+
+
+@pytest.mark.parametrize(
+    "publication_dir, year, issue",
+    [
+        (os.path.join("demo-files", DEMO_ISSUE[0]),) + DEMO_ISSUE[1:],
+        (os.path.join(TEST_FILES, "missing_page"),) + DEMO_ISSUE[1:],
+        (os.path.join(TEST_FILES, "mets13"), "1830", "0105"),
+    ],
+)
+def test_native_engine_matches_xslt(
+    tmp_path, convert_issue, publication_dir, year, issue
+):
+    expected = convert_issue(
+        publication_dir, year, issue, tmp_path / "xslt", xml_to_text.ENGINE_XSLT
+    )
+    actual = convert_issue(
+        publication_dir, year, issue, tmp_path / "native", xml_to_text.ENGINE_NATIVE
+    )
+    assert expected
+    assert sorted(actual) == sorted(expected)
+    for name, content in expected.items():
+        assert actual[name] == content, name
+
+
+def test_alto_pages():
+    issue_dir = os.path.join(TEST_FILES, "mets13", "1830", "0105")
+    pages = mets_to_text.AltoPages(
+        issue_dir,
+        [
+            "0000123_18300105_0001.xml",
+            "0000123_18300105_0002.xml",
+            "0000123_18300105_0001.xml",
+            "0000123_18300105_0003.xml",
+        ],
+    )
+    # Blocks are indexed once per page reference, but each page is
+    # parsed once.
+    assert len(pages.blocks["P1_TB00001"]) == 2
+    assert pages.blocks["P1_TB00001"][0] is pages.blocks["P1_TB00001"][1]
+    assert [block.get("ID") for block in pages.blocks["P2_CB00001"]] == ["P2_CB00001"]
+    assert pages.get_alto_namespace().endswith("alto-1-4.xsd")
+    assert pages.missing == [os.path.join(issue_dir, "0000123_18300105_0003.xml")]
+    with pytest.raises(OSError):
+        pages.check_missing()
+
+
+def test_mets13_date():
+    assert mets_to_text.mets13_date("05.01.1830") == "1830-01-05"
+    assert mets_to_text.mets13_date("") == "--"
+
+
+def test_blocks_to_text():
+    page = etree.XML(
+        b"<alto><Layout><TextBlock ID='b1'>"
+        b"<TextLine><String CONTENT='A' WC='0.5'/><SP/><HYP CONTENT='-'/><SP/></TextLine>"
+        b"<TextLine><String CONTENT='B'/></TextLine>"
+        b"</TextBlock><TextBlock ID='b2'>"
+        b"<TextLine><String CONTENT='C' WC='1'/></TextLine>"
+        b"</TextBlock></Layout></alto>"
+    )
+    text, word_confidences = mets_to_text.blocks_to_text(page[0])
+    assert text == "A -\nB\n\nC\n"
+    assert word_confidences == ["0.5", "1"]
+
+
+def test_blocks_to_text_no_words():
+    page = etree.XML(
+        b"<alto><Layout><TextBlock><TextLine/></TextBlock></Layout></alto>"
+    )
+    assert mets_to_text.blocks_to_text(page[0]) == ("\n", [])
+
+
+def test_word_confidence_stats():
+    assert articles.word_confidence_stats(["0.5", "1"]) == (2, 0.75, 0.25)
+    word_count, mean, standard_deviation = articles.word_confidence_stats([])
+    assert word_count == 0
+    assert mean != mean and standard_deviation != standard_deviation
+
+
+@pytest.mark.parametrize(
+    "number, pattern, expected",
+    [(0.75, "0.0000", "0.7500"), (0.123456, "0.0000", "0.1235"), (12, "0", "12")],
+)
+def test_format_number(number, pattern, expected):
+    assert articles.format_number(number, pattern) == expected
@@ -0,0 +1,83 @@
+from alto2txt import manifest
+from alto2txt import multiprocess_xml_to_text as mxt
+from alto2txt import xml
+
+
+def test_batch_issues_largest_first():
+    issues = [(1, "a"), (50, "b"), (2, "c"), (40, "d"), (3, "e"), (4, "f")]
+    batches = mxt.batch_issues(issues, 4)
+    # Issues costlier than total / num_batches are batched alone, first.
+    assert batches[0] == ["b"]
+    assert batches[1] == ["d"]
+    # Every issue is batched exactly once.
+    assert sorted(i for batch in batches for i in batch) == list("abcdef")
+
+
+def test_batch_issues_groups_cheap_issues():
+    issues = [(1, i) for i in range(100)]
+    batches = mxt.batch_issues(issues, 10)
+    assert len(batches) == 10
+    assert all(len(batch) == 10 for batch in batches)
+
+
+def test_batch_issues_empty():
+    assert mxt.batch_issues([], 4) == []
+
+
+def test_publications_to_text(tmp_path):
+    output_dir = tmp_path / "output"
+    mxt.publications_to_text("demo-files", str(output_dir), str(tmp_path / "out.log"))
+    issue_dir = output_dir / "0002647" / "1824" / "0217"
+    assert len(list(issue_dir.glob("*.txt"))) == 27
+    assert len(list(issue_dir.glob("*_metadata.xml"))) == 27
+
+
+def test_list_issues(tmp_path):
+    output_dir = str(tmp_path / "output")
+    issues, summaries = mxt.list_issues("demo-files", output_dir)
+    assert [issue[:4] for _, issue in issues] == [
+        ("0002647", "1824", "0217", "demo-files/0002647/1824/0217")
+    ]
+    assert issues[0][0] > 0
+    # Issues carry their inventory records.
+    assert issues[0][1][4]["path"] == "0002647/1824/0217"
+    assert summaries == {}
+    mxt.publications_to_text("demo-files", output_dir, str(tmp_path / "out.log"))
+    issues, summaries = mxt.list_issues("demo-files", output_dir, resume=True)
+    assert issues == []
+    assert summaries["0002647"]["skipped_issues"] == 1
+
+
+def test_incremental_hashes_files_in_workers(tmp_path, monkeypatch):
+    output_dir = str(tmp_path / "output")
+    digests = []
+    file_digest = manifest.file_digest
+    monkeypatch.setattr(
+        manifest, "file_digest", lambda path: digests.append(path) or file_digest(path)
+    )
+    issues, _ = mxt.list_issues("demo-files", output_dir, incremental=True)
+    assert digests == []
+    assert issues[0][1][5] is None
+    summaries = mxt.issues_to_text(
+        [issue for _, issue in issues],
+        output_dir,
+        incremental=True,
+        xslts=xml.load_xslts(),
+    )
+    assert summaries["0002647"]["num_issues"] == 1
+    assert len(digests) == len(set(digests)) > 0
+    # Issues are listed with their records, and skipped by the workers
+    # if unchanged, without hashing files again.
+    issues, _ = mxt.list_issues("demo-files", output_dir, incremental=True)
+    record = issues[0][1][5]
+    assert record[manifest.MANIFEST_ISSUE] == "0002647/1824/0217"
+    num_digests = len(digests)
+    summaries = mxt.issues_to_text(
+        [issue for _, issue in issues],
+        output_dir,
+        incremental=True,
+        xslts=xml.load_xslts(),
+    )
+    assert summaries["0002647"]["skipped_issues"] == 1
+    assert summaries["0002647"]["num_issues"] == 0
+    assert len(digests) == num_digests
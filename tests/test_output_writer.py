@@ -0,0 +1,96 @@
+import os
+import threading
+
+import pytest
+
+from alto2txt import manifest, output_writer, sinks, xml, xml_to_text
+from tests.test_sinks import DEMO_PUBLICATION, read_container
+
+
+@pytest.mark.parametrize("engine", xml_to_text.ENGINES)
+@pytest.mark.parametrize("output_format", [sinks.OUTPUT_FILES, sinks.OUTPUT_ZIP])
+def test_async_matches_sync(convert_issue, tmp_path, engine, output_format):
+    expected = convert_issue(
+        DEMO_PUBLICATION, "1824", "0217", tmp_path / "sync", engine
+    )
+    output_dir = tmp_path / "async"
+    issue_manifest = manifest.Manifest(str(output_dir), resume=True)
+    # A small budget and batch exercise backpressure.
+    writer = output_writer.OutputWriter(
+        2, sinks.FSYNC_ISSUE, max_bytes=1024, batch_articles=2
+    )
+    try:
+        summary = xml_to_text.issue_to_text(
+            "0002647",
+            "1824",
+            "0217",
+            os.path.join(DEMO_PUBLICATION, "1824", "0217"),
+            str(output_dir),
+            xml.load_xslts(),
+            engine,
+            issue_manifest,
+            output_format,
+            writer=writer,
+        )
+    finally:
+        writer.close()
+    assert summary["num_articles"] == 27
+    assert "0002647/1824/0217" in issue_manifest.records
+    issue_out_dir = output_dir / "1824" / "0217"
+    if output_format == sinks.OUTPUT_FILES:
+        actual = {path.name: path.read_bytes() for path in issue_out_dir.iterdir()}
+    else:
+        actual = read_container(str(issue_out_dir) + ".zip")
+    assert actual == expected
+
+
+def test_write_failure_skips_on_written(tmp_path):
+    writer = output_writer.OutputWriter(1)
+    written = []
+    try:
+        sink = sinks.open_sink(
+            sinks.OUTPUT_FILES, str(tmp_path / "0217"), writer=writer
+        )
+        # Remove the output directory so writing fails.
+        os.rmdir(tmp_path / "0217")
+        with sink:
+            sink.write("a", b"text", b"metadata")
+        sink.on_written(lambda: written.append(True))
+    finally:
+        writer.close()
+    assert sink.error is not None
+    assert written == []
+
+
+def test_submit_blocks_until_written():
+    writer = output_writer.OutputWriter(1, max_bytes=10)
+    task_queue = writer.assign_queue()
+    release = threading.Event()
+    try:
+        writer.submit(task_queue, release.wait, [], 10)
+        blocked = threading.Thread(
+            target=writer.submit, args=(task_queue, lambda: None, [], 1)
+        )
+        blocked.start()
+        blocked.join(0.1)
+        assert blocked.is_alive()
+        release.set()
+        blocked.join()
+    finally:
+        writer.close()
+    assert writer.queued_bytes == 0
+
+
+def test_open_writer(tmp_path):
+    assert output_writer.open_writer() is None
+    writer = output_writer.open_writer(0, sinks.FSYNC_ARTICLE)
+    try:
+        with sinks.open_sink(
+            sinks.OUTPUT_FILES, str(tmp_path / "0217"), writer=writer
+        ) as sink:
+            sink.write("a", b"text", b"metadata")
+    finally:
+        writer.close()
+    assert isinstance(sink, sinks.FilesSink)
+    assert sink.fsync == sinks.FSYNC_ARTICLE
+    assert (tmp_path / "0217" / "a.txt").read_bytes() == b"text"
@@ -0,0 +1,15 @@
+from alto2txt import profiling, xml_to_text
+
+
+def test_profile(tmp_path):
+    xml_to_text.publications_to_text("demo-files", str(tmp_path), profile=True)
+    profile = (tmp_path / profiling.PROFILE_FILE).read_text()
+    assert "issue_to_text" in profile
+    assert "XSLT templates: extract_text_mets18.xslt" in profile
+    assert 'match="/mets:mets"' in profile
+    assert (tmp_path / profiling.PROFILE_STATS_FILE).exists()
+    assert not (tmp_path / profiling.PROFILE_PARTS_DIR).exists()
+
+
+def test_merge_profiles_without_parts(tmp_path):
+    assert profiling.merge_profiles(str(tmp_path)) is None
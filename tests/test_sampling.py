@@ -0,0 +1,106 @@
+import os
+import shutil
+
+import pytest
+
+from alto2txt import inventory, sampling, xml_to_text
+
+DEMO_ISSUE = os.path.join("demo-files", "0002647", "1824", "0217")
+
+
+def make_issues():
+    return [
+        (publication, year, "{:04d}".format(issue), 100 * (issue + 1))
+        for publication in ["0002647", "0002648"]
+        for year in ["1824", "1825"]
+        for issue in range(25)
+    ]
+
+
+def test_sample_is_deterministic():
+    issues = make_issues()
+    sample = sampling.sample_issues(issues, 4)
+    assert sampling.sample_issues(list(reversed(issues)), 4) == list(reversed(sample))
+    assert sampling.sample_issues(issues, 4, seed=1) != sample
+    # Issues are kept in order.
+    assert sample == [issue for issue in issues if issue in sample]
+
+
+@pytest.mark.parametrize(
+    "stratify,strata",
+    [
+        (sampling.STRATIFY_PUBLICATION, {("0002647",): 12, ("0002648",): 12}),
+        (
+            sampling.STRATIFY_YEAR,
+            {
+                ("0002647", "1824"): 6,
+                ("0002647", "1825"): 6,
+                ("0002648", "1824"): 6,
+                ("0002648", "1825"): 6,
+            },
+        ),
+    ],
+)
+def test_downsample_stratified(stratify, strata):
+    sample = sampling.sample_issues(make_issues(), 4, stratify=stratify)
+    counts = {}
+    for publication, year, _, _ in sample:
+        stratum = sampling.get_stratum(publication, year, stratify)
+        counts[stratum] = counts.get(stratum, 0) + 1
+    assert counts == strata
+
+
+def test_sample_size():
+    issues = make_issues()
+    sample = sampling.sample_issues(issues, sample_size=10)
+    assert len(sample) == 10
+    assert {issue[0] for issue in sample} == {"0002647", "0002648"}
+    assert len(sampling.sample_issues(issues, sample_size=1000)) == len(issues)
+    assert len(sampling.sample_issues(issues, 2, sample_size=1000)) == 50
+
+
+def test_sample_bytes():
+    issues = make_issues()
+    sample = sampling.sample_issues(
+        issues, sample_bytes=10000, stratify=sampling.STRATIFY_NONE
+    )
+    total = sum(issue[3] for issue in sample)
+    assert 0 < total <= 10000
+
+
+def test_allocate():
+    assert sampling.allocate({("a",): 5, ("b",): 3, ("c",): 2}, 5) == {
+        ("a",): 3,
+        ("b",): 1,
+        ("c",): 1,
+    }
+    assert sampling.allocate({("a",): 1}, 5) == {("a",): 1}
+
+
+def test_parse_bytes():
+    assert sampling.parse_bytes("1024") == 1024
+    assert sampling.parse_bytes("500M") == 500 * 1024 * 1024
+    assert sampling.parse_bytes("2GiB") == 2 * 1024**3
+    with pytest.raises(ValueError):
+        sampling.parse_bytes("lots")
+
+
+def test_inventory_sample_matches_publication_issues(tmp_path):
+    publications_dir = tmp_path / "input"
+    for publication, year, issue in [
+        ("0002647", "1824", issue) for issue in ["0217", "0218", "0219", "0220"]
+    ] + [("0002648", "1825", issue) for issue in ["0101", "0102", "0103"]]:
+        shutil.copytree(DEMO_ISSUE, publications_dir / publication / year / issue)
+    records = inventory.scan(str(publications_dir))
+    selected = inventory.group_issues(
+        str(publications_dir), sampling.sample_records(records, 2, seed=3)
+    )
+    for publication, num_issues in [("0002647", 2), ("0002648", 1)]:
+        publication_dir, issues = selected[publication]
+        assert len(issues) == num_issues
+        assert {issue_dir for _, _, issue_dir, _ in issues} == {
+            issue_dir
+            for _, _, issue_dir in xml_to_text.publication_issues(
+                publication_dir, 2, seed=3
+            )
+        }
@@ -0,0 +1,92 @@
+import os
+import shutil
+import sqlite3
+
+import pytest
+from lxml import etree
+
+from alto2txt import search_index, sinks, thread_xml_to_text, xml_to_text
+
+DEMO_ISSUE = os.path.join("0002647", "1824", "0217")
+
+QUERY = """
+SELECT articles.* FROM articles_text
+JOIN articles ON articles.id = articles_text.rowid
+WHERE articles_text MATCH ?
+"""
+
+
+def read_search_index(output_dir, query=None):
+    connection = sqlite3.connect(str(output_dir / search_index.SEARCH_FILE))
+    connection.row_factory = sqlite3.Row
+    try:
+        if query is None:
+            return connection.execute("SELECT * FROM articles").fetchall()
+        return connection.execute(QUERY, (query,)).fetchall()
+    finally:
+        connection.close()
+
+
+@pytest.mark.parametrize("engine", xml_to_text.ENGINES)
+@pytest.mark.parametrize("output_format", [sinks.OUTPUT_FILES, sinks.OUTPUT_ZIP])
+def test_search_index_has_row_per_article(tmp_path, engine, output_format):
+    output_dir = tmp_path / "output"
+    xml_to_text.publications_to_text(
+        "demo-files",
+        str(output_dir),
+        engine=engine,
+        output_format=output_format,
+        search=True,
+    )
+    assert not (output_dir / search_index.SEARCH_PARTS_DIR).exists()
+    assert len(read_search_index(output_dir)) == 27
+    rows = read_search_index(output_dir, "algebra")
+    assert [row["item_id"] for row in rows] == ["art0001"]
+    assert rows[0]["issue_date"] == "1824-02-17"
+    assert rows[0]["word_count"] == 789
+    assert rows[0]["plain_text_file"] == "0002647_18240217_art0001.txt"
+    suffix = "" if output_format == sinks.OUTPUT_FILES else ".zip"
+    assert rows[0]["output"] == DEMO_ISSUE + suffix
+
+
+def test_merge_search_index_replaces_converted_issues(tmp_path):
+    input_dir = tmp_path / "input"
+    shutil.copytree("demo-files", input_dir / "a")
+    output_dir = tmp_path / "output"
+    xml_to_text.publications_to_text(str(input_dir / "a"), str(output_dir), search=True)
+    shutil.copytree("demo-files", input_dir / "b")
+    # Issue converted again replaces its rows, in threads alongside a
+    # metadata index.
+    pytest.importorskip("pyarrow")
+    os.utime(next((input_dir / "b" / DEMO_ISSUE).glob("*_mets.xml")), ns=(0, 0))
+    thread_xml_to_text.publications_to_text(
+        str(input_dir / "b"), str(output_dir), resume=True, index=True, search=True
+    )
+    assert len(read_search_index(output_dir)) == 27
+    assert len(read_search_index(output_dir, "algebra")) == 1
+
+
+def test_merge_search_index_keeps_newest_part(tmp_path, caplog):
+    output_dir = tmp_path / "output"
+    xml_to_text.publications_to_text("demo-files", str(output_dir))
+    metadata_files = sorted((output_dir / DEMO_ISSUE).glob("*_metadata.xml"))
+    # The issue is in two part files, e.g. after an interrupted run,
+    # the newest having fewer articles.
+    for mtime, output, files in [
+        (2, "new", metadata_files[:2]),
+        (1, "old", metadata_files),
+    ]:
+        writer = search_index.SearchIndexWriter(str(output_dir))
+        for metadata_file in files:
+            writer.add(etree.parse(str(metadata_file)).getroot(), output, "text")
+        writer.close()
+        os.utime(writer.part_file, (mtime, mtime))
+    parts_dir = output_dir / search_index.SEARCH_PARTS_DIR
+    truncated = parts_dir / "part-truncated.sqlite"
+    with open(writer.part_file, "rb") as f:
+        truncated.write_bytes(f.read(100))
+    assert search_index.merge_search_index(str(output_dir)) == 2
+    assert {row["output"] for row in read_search_index(output_dir)} == {"new"}
+    # The unreadable part file is skipped and left in place.
+    assert [path.name for path in parts_dir.iterdir()] == [truncated.name]
+    assert "Skipping unreadable search index part" in caplog.text
@@ -0,0 +1,91 @@
+import json
+import os
+import tarfile
+import zipfile
+
+import pytest
+from lxml import etree
+
+from alto2txt import articles, sinks, xml, xml_to_text
+
+DEMO_PUBLICATION = os.path.join("demo-files", "0002647")
+
+
+def read_container(path):
+    if path.endswith(".zip"):
+        with zipfile.ZipFile(path) as container:
+            return {name: container.read(name) for name in container.namelist()}
+    if path.endswith(".tar"):
+        with tarfile.open(path) as container:
+            return {
+                member.name: container.extractfile(member).read()
+                for member in container.getmembers()
+            }
+    files = {}
+    with open(path, "rb") as f:
+        for line in f:
+            record = json.loads(line)
+            stub = record[sinks.JSONL_STUB]
+            files[stub + articles.TEXT_SUFFIX] = record[sinks.JSONL_TEXT].encode()
+            files[stub + articles.METADATA_SUFFIX] = record[
+                sinks.JSONL_METADATA
+            ].encode()
+    return files
+
+
+@pytest.mark.parametrize("engine", xml_to_text.ENGINES)
+@pytest.mark.parametrize(
+    "output_format", [sinks.OUTPUT_ZIP, sinks.OUTPUT_TAR, sinks.OUTPUT_JSONL]
+)
+def test_container_matches_files(convert_issue, tmp_path, engine, output_format):
+    expected = convert_issue(
+        DEMO_PUBLICATION, "1824", "0217", tmp_path / "files", engine
+    )
+    output_dir = tmp_path / output_format
+    xml_to_text.issue_to_text(
+        "0002647",
+        "1824",
+        "0217",
+        os.path.join(DEMO_PUBLICATION, "1824", "0217"),
+        str(output_dir),
+        xml.load_xslts(),
+        engine,
+        output_format=output_format,
+    )
+    assert os.listdir(output_dir / "1824") == ["0217." + output_format]
+    assert read_container(str(output_dir / "1824" / "0217") + "." + output_format) == (
+        expected
+    )
+
+
+def test_container_removed_on_abort(tmp_path):
+    issue_out_dir = str(tmp_path / "1824" / "0217")
+    with pytest.raises(ValueError):
+        with sinks.open_sink(sinks.OUTPUT_ZIP, issue_out_dir) as sink:
+            sink.write("a", b"text", b"metadata")
+            raise ValueError()
+    assert os.listdir(tmp_path / "1824") == []
+
+
+@pytest.mark.parametrize("engine", xml_to_text.ENGINES)
+def test_iter_articles_matches_files(convert_issue, tmp_path, engine):
+    expected = convert_issue(DEMO_PUBLICATION, "1824", "0217", tmp_path, engine)
+    records = list(
+        xml_to_text.iter_articles(
+            os.path.join(DEMO_PUBLICATION, "1824", "0217"), engine
+        )
+    )
+    assert len(records) == 27
+    for record in records:
+        assert record.text.encode("utf-8") == expected[record.stub + ".txt"]
+        lwm = etree.fromstring(expected[record.stub + articles.METADATA_SUFFIX])
+        assert record == articles.article_record(record.stub, record.text, lwm)
+    assert records[0].input_sub_path == "0002647/1824/0217"
+    assert records[0].word_count > 0
+    assert records[0].ocr_quality_mean is not None
+
+
+def test_iter_publication_articles():
+    records = list(xml_to_text.iter_publication_articles(DEMO_PUBLICATION))
+    assert len(records) == 27
+    assert {record.publication_id for record in records} == {"0002647"}
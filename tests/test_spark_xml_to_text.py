@@ -0,0 +1,84 @@
+import importlib
+import importlib.util
+import logging
+import sys
+from unittest import mock
+
+import pytest
+
+import alto2txt
+from alto2txt import multiprocess_xml_to_text as mxt
+from alto2txt import search_index, stats, xml_to_text
+from tests.test_worker import get_file_handlers
+
+PYSPARK_MODULES = ["pyspark", "pyspark.sql", "pyspark.sql.types"]
+
+
+@pytest.fixture(scope="module")
+def sxt():
+    # Only the driver needs Spark, so mock pyspark if not installed to
+    # test the functions run on Spark workers.
+    mock_pyspark = importlib.util.find_spec("pyspark") is None
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        if mock_pyspark:
+            for name in PYSPARK_MODULES:
+                monkeypatch.setitem(sys.modules, name, mock.MagicMock())
+        yield importlib.import_module("alto2txt.spark_xml_to_text")
+        if mock_pyspark:
+            # Do not leave the module importable without pyspark.
+            del sys.modules["alto2txt.spark_xml_to_text"]
+            delattr(alto2txt, "spark_xml_to_text")
+
+
+@pytest.fixture
+def log_file(tmp_path):
+    log_file = str(tmp_path / "out.log")
+    yield log_file
+    for handler in get_file_handlers(log_file):
+        logging.getLogger().removeHandler(handler)
+        handler.close()
+
+
+def get_counts(summary):
+    return {key: summary[key] for key in stats.SUMMARY_COUNTS + stats.STATS_COUNTS}
+
+
+@pytest.mark.parametrize("engine", xml_to_text.ENGINES)
+def test_partition_to_text(sxt, tmp_path, log_file, engine):
+    output_dir = tmp_path / "output"
+    issues, _ = mxt.list_issues("demo-files", str(output_dir))
+    rows = list(
+        sxt.partition_to_text(
+            [issue for _, issue in issues], str(output_dir), log_file, engine=engine
+        )
+    )
+    assert [row[: len(sxt.ISSUE_COLUMNS)] for row in rows] == [
+        ("0002647", "1824", "0217")
+    ]
+    columns = sxt.ISSUE_COLUMNS + stats.SUMMARY_COUNTS + stats.STATS_COUNTS
+    summary = dict(zip(columns + stats.STATS_TIMES, rows[0]))
+    expected = xml_to_text.publications_to_text(
+        "demo-files", str(tmp_path / "serial"), engine=engine
+    )
+    assert get_counts(summary) == get_counts(expected["0002647"])
+    issue_dir = output_dir / "0002647" / "1824" / "0217"
+    assert len(list(issue_dir.glob("*.txt"))) == 27
+
+
+def test_partition_to_text_skips_failed_issues(sxt, tmp_path, log_file):
+    output_dir = tmp_path / "output"
+    issues, _ = mxt.list_issues("demo-files", str(output_dir))
+    missing = ("0002647", "1824", "0218", str(tmp_path / "missing"), None, None)
+    rows = list(
+        sxt.partition_to_text(
+            [missing] + [issue for _, issue in issues],
+            str(output_dir),
+            log_file,
+            search=True,
+        )
+    )
+    assert [row[: len(sxt.ISSUE_COLUMNS)] for row in rows] == [
+        ("0002647", "1824", "0217")
+    ]
+    # The search index part file is complete once the partition is done.
+    assert search_index.merge_search_index(str(output_dir)) == 27
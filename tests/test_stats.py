@@ -0,0 +1,91 @@
+import json
+import os
+
+import pytest
+
+from alto2txt import sinks, stats, xml_to_text, xml_to_text_entry
+
+DEMO_ISSUE_DIR = os.path.join("demo-files", "0002647", "1824", "0217")
+
+
+@pytest.mark.parametrize("engine", xml_to_text.ENGINES)
+@pytest.mark.parametrize("output_format", [sinks.OUTPUT_FILES, sinks.OUTPUT_ZIP])
+def test_summary_counts_output(tmp_path, engine, output_format):
+    summaries = xml_to_text.publications_to_text(
+        "demo-files",
+        str(tmp_path),
+        engine=engine,
+        output_format=output_format,
+        count_words=True,
+    )
+    summary = summaries["0002647"]
+    assert summary["num_issues"] == 1
+    assert summary["converted_ok"] == 1
+    assert summary["num_articles"] == 27
+    assert summary["num_words"] > 0
+    assert summary["bytes_read"] == sum(
+        os.path.getsize(os.path.join(DEMO_ISSUE_DIR, name))
+        for name in os.listdir(DEMO_ISSUE_DIR)
+    )
+    if output_format == sinks.OUTPUT_FILES:
+        issue_out_dir = tmp_path / "0002647" / "1824" / "0217"
+        assert summary["bytes_written"] == sum(
+            path.stat().st_size for path in issue_out_dir.iterdir()
+        )
+    for key in stats.STATS_TIMES:
+        assert summary[key] >= 0
+    assert summary["time_total"] >= summary["time_transform"]
+
+
+def test_summary_counts_words_if_requested(tmp_path):
+    native = xml_to_text.publications_to_text(
+        "demo-files", str(tmp_path / "native"), engine=xml_to_text.ENGINE_NATIVE
+    )["0002647"]
+    xslt = xml_to_text.publications_to_text("demo-files", str(tmp_path / "xslt"))[
+        "0002647"
+    ]
+    # Articles written by the XSLTs are not read again to count words.
+    assert xslt["num_words"] == 0
+    assert xslt["bytes_written"] == native["bytes_written"]
+    xslt = xml_to_text.publications_to_text(
+        "demo-files", str(tmp_path / "counted"), count_words=True
+    )["0002647"]
+    assert xslt["num_words"] == native["num_words"]
+
+
+def test_add_summaries():
+    total = {}
+    summary = stats.new_summary()
+    summary["num_articles"] = 2
+    summary["time_parse"] = 0.5
+    stats.add_summaries(total, {"a": summary, "b": summary})
+    stats.add_summaries(total, {"a": summary})
+    assert total["a"]["num_articles"] == 4
+    assert total["a"]["time_parse"] == 1.0
+    assert total["b"]["num_articles"] == 2
+
+
+def test_run_report(tmp_path):
+    output_dir = tmp_path / "output"
+    report = xml_to_text_entry.xml_publications_to_text(
+        "demo-files",
+        str(output_dir),
+        xml_to_text_entry.PROCESS_SERIAL,
+        log_file=str(tmp_path / "out.log"),
+    )
+    with open(output_dir / stats.REPORT_FILE) as f:
+        assert json.load(f) == report
+    assert report["parameters"]["process_type"] == xml_to_text_entry.PROCESS_SERIAL
+    assert report["total"] == report["publications"]["0002647"]
+    assert report["total"]["num_articles"] == 27
+
+    # Issues skipped on resume are counted.
+    report = xml_to_text_entry.xml_publications_to_text(
+        "demo-files",
+        str(output_dir),
+        xml_to_text_entry.PROCESS_SERIAL,
+        log_file=str(tmp_path / "out.log"),
+        resume=True,
+    )
+    assert report["total"]["skipped_issues"] == 1
+    assert report["total"]["num_issues"] == 0
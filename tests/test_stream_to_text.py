@@ -0,0 +1,103 @@
+import os
+import shutil
+
+import pytest
+
+from alto2txt import stream_to_text, xml, xml_to_text
+
+TEST_FILES = os.path.join("tests", "tests", "test_files")
+
+
+@pytest.mark.parametrize("publication", ["ukp", "bln"])
+def test_streaming_engine_matches_xslt(tmp_path, convert_issue, publication):
+    publication_dir = os.path.join(TEST_FILES, publication)
+    expected = convert_issue(
+        publication_dir, "1850", "0102", tmp_path / "xslt", xml_to_text.ENGINE_XSLT
+    )
+    actual = convert_issue(
+        publication_dir, "1850", "0102", tmp_path / "native", xml_to_text.ENGINE_NATIVE
+    )
+    assert expected
+    assert sorted(actual) == sorted(expected)
+    for name, content in expected.items():
+        assert actual[name] == content, name
+
+
+def test_ukp_to_articles():
+    issue_dir = os.path.join(TEST_FILES, "ukp", "1850", "0102")
+    articles = list(
+        stream_to_text.ukp_to_articles(
+            os.path.join(issue_dir, "NCBP_18500102.xml"),
+            "ukp/1850/0102",
+            "NCBP_18500102.xml",
+            "NCBP_18500102",
+        )
+    )
+    assert [article.item_id for article in articles] == [
+        "-0001-001",
+        "-0001-002",
+        "-0002-001",
+    ]
+    assert articles[2].text == "\n\n\n"
+
+
+def test_bln_to_articles_bl_page(tmp_path):
+    bln_file = tmp_path / "bln.xml"
+    bln_file.write_bytes(b"<BL_newspaper><BL_article/><BL_page/></BL_newspaper>")
+    with pytest.raises(stream_to_text.BLPageError):
+        list(stream_to_text.bln_to_articles(str(bln_file), "", "bln.xml", "bln"))
+
+
+def test_bln_bl_page_skipped(tmp_path, convert_issue):
+    issue_dir = tmp_path / "input" / "bln" / "1850" / "0102"
+    shutil.copytree(os.path.join(TEST_FILES, "bln", "1850", "0102"), issue_dir)
+    bln_file = issue_dir / "EXGZ_18500102_0007.xml"
+    bln_file.write_text(
+        bln_file.read_text().replace("</BL_newspaper>", "<BL_page/></BL_newspaper>")
+    )
+    for engine in xml_to_text.ENGINES:
+        output = convert_issue(
+            str(tmp_path / "input" / "bln"), "1850", "0102", tmp_path / engine, engine
+        )
+        assert output == {}
+
+
+def test_words_to_text():
+    words = [str(i) for i in range(1, 22)]
+    assert stream_to_text.words_to_text(words) == (
+        "1 2 3 4 5 6 7 8 9 10\n11 12 13 14 15 16 17 18 19 20\n21"
+    )
+    assert stream_to_text.words_to_text([]) == ""
+
+
+@pytest.mark.parametrize("cut", ["<page>", "</page>"])
+def test_streaming_engine_partial_output(tmp_path, cut):
+    issue_dir = tmp_path / "input" / "ukp" / "1850" / "0102"
+    shutil.copytree(os.path.join(TEST_FILES, "ukp", "1850", "0102"), issue_dir)
+    ukp_file = issue_dir / "NCBP_18500102.xml"
+    content = ukp_file.read_text()
+    # Truncate the file before, or after, the first page's articles.
+    ukp_file.write_text(content[: content.index(cut) + len(cut)])
+    summaries = {}
+    for engine in xml_to_text.ENGINES:
+        summaries[engine] = xml_to_text.issue_to_text(
+            "ukp",
+            "1850",
+            "0102",
+            str(issue_dir),
+            str(tmp_path / engine),
+            xml.load_xslts(),
+            engine,
+        )
+    assert summaries[xml_to_text.ENGINE_XSLT]["bad_xml"] == 1
+    assert summaries[xml_to_text.ENGINE_XSLT]["num_articles"] == 0
+    native = summaries[xml_to_text.ENGINE_NATIVE]
+    if cut == "<page>":
+        assert native["bad_xml"] == 1
+        assert native["num_articles"] == 0
+    else:
+        # Articles preceding the error are output, so the file is
+        # counted as failing to convert rather than as bad XML.
+        assert native["bad_xml"] == 0
+        assert native["converted_bad"] == 1
+        assert native["num_articles"] == 2
@@ -0,0 +1,71 @@
+import pytest
+
+from alto2txt import benchmark, synthetic, xml_to_text, xml_to_text_entry
+
+
+def read_output(output_dir):
+    return {
+        path.relative_to(output_dir): path.read_bytes()
+        for path in output_dir.rglob("*")
+        if path.is_file() and path.suffix in (".txt", ".xml")
+    }
+
+
+@pytest.mark.parametrize("flavour", synthetic.FLAVOURS)
+def test_synthetic_corpus_converts(tmp_path, flavour):
+    corpus_dir = tmp_path / "corpus"
+    counts = synthetic.generate_corpus(
+        str(corpus_dir), [flavour], issues=2, pages=2, articles_per_page=3, words=20
+    )
+    assert counts["num_issues"] == 2
+    assert counts["num_articles"] == 12
+    outputs = {}
+    for engine in xml_to_text.ENGINES:
+        output_dir = tmp_path / engine
+        summaries = xml_to_text.publications_to_text(
+            str(corpus_dir), str(output_dir), engine=engine
+        )
+        summary = summaries[synthetic.publication_id(flavour, 0)]
+        assert summary["converted_bad"] == 0
+        assert summary["num_articles"] == 12
+        outputs[engine] = read_output(output_dir)
+    assert outputs[xml_to_text.ENGINE_XSLT] == outputs[xml_to_text.ENGINE_NATIVE]
+
+
+def test_synthetic_corpus_is_reproducible(tmp_path):
+    for name in ["a", "b"]:
+        synthetic.generate_corpus(str(tmp_path / name), pages=1, words=10, seed=1)
+    assert read_output(tmp_path / "a") == read_output(tmp_path / "b")
+
+
+def test_run_benchmarks(tmp_path):
+    corpus = {
+        "flavours": [synthetic.FLAVOURS[0]],
+        "publications": 1,
+        "years": 1,
+        "issues": 1,
+        "pages": 1,
+        "articles_per_page": 2,
+        "words": 10,
+        "seed": 0,
+    }
+    record = benchmark.run_benchmarks(
+        str(tmp_path),
+        corpus,
+        [xml_to_text.ENGINE_NATIVE],
+        [xml_to_text_entry.PROCESS_SERIAL],
+    )
+    assert list(record["results"]) == [
+        "issue_to_text[mets18,native]",
+        "publication_to_text[mets18,native]",
+        "serial[native]",
+    ]
+    for metrics in record["results"].values():
+        assert metrics["num_articles"] == 2
+        assert metrics["files_per_second"] > 0
+    results_file = str(tmp_path / benchmark.RESULTS_FILE)
+    benchmark.save_results(record, results_file)
+    (previous,) = benchmark.load_results(results_file)
+    assert benchmark.same_corpus(previous, record)
+    comparison = benchmark.compare_results(previous, record)
+    assert [change for _, _, _, change in comparison] == [0.0, 0.0, 0.0]
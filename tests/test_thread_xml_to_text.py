@@ -0,0 +1,74 @@
+import shutil
+import tarfile
+import threading
+
+from alto2txt import multiprocess_xml_to_text as mxt
+from alto2txt import synthetic
+from alto2txt import thread_xml_to_text as txt
+from alto2txt import xml, xml_to_text
+
+
+def read_output(output_dir):
+    return {
+        path.relative_to(output_dir): path.read_bytes()
+        for path in output_dir.rglob("*")
+        if path.is_file() and not path.name.startswith("alto2txt_")
+    }
+
+
+def test_publications_to_text_matches_multi(tmp_path):
+    multi_dir = tmp_path / "multi"
+    mxt.publications_to_text("demo-files", str(multi_dir), str(tmp_path / "out.log"))
+    threads_dir = tmp_path / "threads"
+    summaries = txt.publications_to_text("demo-files", str(threads_dir), num_threads=2)
+    assert summaries["0002647"]["num_articles"] == 27, summaries
+    assert read_output(threads_dir) == read_output(multi_dir)
+
+
+def test_get_thread_xslts():
+    xslt_sources = xml.read_xslts()
+    xslts = txt.get_thread_xslts(xslt_sources)
+    assert txt.get_thread_xslts(xslt_sources) is xslts
+    assert set(xslts) == set(xslt_sources)
+    other = []
+    thread = threading.Thread(
+        target=lambda: other.append(txt.get_thread_xslts(xslt_sources))
+    )
+    thread.start()
+    thread.join()
+    assert other[0] is not xslts
+
+
+def test_publications_to_text_tar_archives(tmp_path):
+    corpus_dir = tmp_path / "corpus"
+    synthetic.generate_corpus(
+        str(corpus_dir),
+        flavours=[xml.FLAVOUR_METS_18],
+        issues=40,
+        pages=4,
+        articles_per_page=4,
+        words=50,
+    )
+    archive_dir = tmp_path / "archives"
+    shutil.copytree(corpus_dir, archive_dir)
+    # Issues of each year archive are converted by concurrent threads.
+    for year_dir in archive_dir.glob("*/*"):
+        with tarfile.open(str(year_dir) + ".tar", "w") as archive:
+            for issue_dir in year_dir.iterdir():
+                archive.add(str(issue_dir), arcname=issue_dir.name)
+        shutil.rmtree(year_dir)
+    expected = xml_to_text.publications_to_text(
+        str(corpus_dir), str(tmp_path / "expected"), engine=xml_to_text.ENGINE_NATIVE
+    )
+    summaries = txt.publications_to_text(
+        str(archive_dir),
+        str(tmp_path / "output"),
+        engine=xml_to_text.ENGINE_NATIVE,
+        num_threads=8,
+    )
+    for publication, summary in summaries.items():
+        assert summary["bad_xml"] == 0
+        assert summary["converted_bad"] == 0
+        assert summary["num_issues"] == expected[publication]["num_issues"]
+        assert summary["num_articles"] == expected[publication]["num_articles"]
+    assert read_output(tmp_path / "output") == read_output(tmp_path / "expected")
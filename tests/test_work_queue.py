@@ -0,0 +1,160 @@
+import multiprocessing
+from functools import partial
+
+from alto2txt import (
+    multiprocess_xml_to_text,
+    profiling,
+    queue_xml_to_text,
+    stats,
+    synthetic,
+    work_queue,
+    xml,
+    xml_to_text,
+)
+
+
+def list_issues():
+    issues = [
+        (cost, ("p", "1850", issue, "in/p/1850/" + issue, {"path": issue}, None))
+        for cost, issue in [(10, "0101"), (30, "0102"), (20, "0103")]
+    ]
+    summary = stats.new_summary()
+    summary["skipped_issues"] = 1
+    return issues, {"p": summary}
+
+
+def issue_summary(num_articles):
+    summary = stats.new_summary()
+    summary["num_issues"] = 1
+    summary["num_articles"] = num_articles
+    return summary
+
+
+def test_work_queue(tmp_path):
+    queue_file = str(tmp_path / work_queue.QUEUE_FILE)
+    queue = work_queue.WorkQueue(queue_file, worker_id="a")
+    assert queue.populate(list_issues)
+    # Another worker joins the populated queue.
+    other = work_queue.WorkQueue(queue_file, worker_id="b")
+    assert not other.populate(list_issues)
+    claims = [queue.claim() for _ in range(3)]
+    # Costliest issues are claimed first.
+    assert [issue[2] for _, issue in claims] == ["0102", "0103", "0101"]
+    assert claims[0][1][4] == {"path": "0102"}
+    assert other.claim() is None
+    assert not queue.is_finished()
+    queue.complete([issue_id for issue_id, _ in claims[:2]], [issue_summary(2)] * 2)
+    queue.fail(claims[2][0], "Bad issue")
+    assert queue.count_states()[work_queue.QUEUE_DONE] == 2
+    assert queue.finalise()
+    assert not other.finalise()
+    summaries = other.get_summaries()
+    assert summaries["p"]["num_issues"] == 2
+    assert summaries["p"]["num_articles"] == 4
+    assert summaries["p"]["skipped_issues"] == 1
+    queue.close()
+    other.close()
+
+
+def test_work_queue_expired_lease(tmp_path):
+    queue_file = str(tmp_path / work_queue.QUEUE_FILE)
+    crashed = work_queue.WorkQueue(queue_file, lease_seconds=-1, worker_id="a")
+    crashed.populate(list_issues)
+    issue_id, _ = crashed.claim()
+    queue = work_queue.WorkQueue(queue_file, worker_id="b")
+    # The expired lease is claimed again before pending issues.
+    assert queue.claim()[0] == issue_id
+    # The first worker no longer holds the lease.
+    crashed.complete([issue_id], [issue_summary(1)])
+    assert queue.count_states()[work_queue.QUEUE_DONE] == 0
+    queue.complete([issue_id], [issue_summary(1)])
+    assert queue.count_states()[work_queue.QUEUE_DONE] == 1
+    crashed.close()
+    queue.close()
+
+
+def test_work_queue_max_attempts(tmp_path):
+    queue_file = str(tmp_path / work_queue.QUEUE_FILE)
+    queue = work_queue.WorkQueue(queue_file, lease_seconds=-1)
+    queue.populate(lambda: (list_issues()[0][:1], {}))
+    for _ in range(work_queue.QUEUE_MAX_ATTEMPTS):
+        assert queue.claim() is not None
+    assert queue.claim() is None
+    assert queue.count_states()[work_queue.QUEUE_FAILED] == 1
+    assert queue.is_finished()
+    queue.close()
+
+
+def test_work_queue_renew(tmp_path):
+    queue_file = str(tmp_path / work_queue.QUEUE_FILE)
+    queue = work_queue.WorkQueue(queue_file, lease_seconds=-1)
+    queue.populate(list_issues)
+    issue_id, _ = queue.claim()
+    queue.lease_seconds = 60
+    queue.renew()
+    other = work_queue.WorkQueue(queue_file)
+    assert other.claim()[0] != issue_id
+    queue.close()
+    other.close()
+
+
+def convert_from_queue(corpus_dir, output_dir):
+    queue_xml_to_text.publications_to_text(corpus_dir, output_dir, poll_seconds=0.1)
+
+
+def read_output(output_dir):
+    return {
+        path.relative_to(output_dir): path.read_bytes()
+        for path in output_dir.rglob("*")
+        if path.is_file() and not path.name.startswith("alto2txt_")
+    }
+
+
+def test_publications_to_text_processes(tmp_path):
+    corpus_dir = str(tmp_path / "corpus")
+    synthetic.generate_corpus(
+        corpus_dir, issues=3, pages=1, articles_per_page=2, words=10
+    )
+    output_dir = tmp_path / "queue"
+    processes = [
+        multiprocessing.Process(
+            target=convert_from_queue, args=(corpus_dir, str(output_dir))
+        )
+        for _ in range(3)
+    ]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+    assert [process.exitcode for process in processes] == [0, 0, 0]
+    queue = work_queue.WorkQueue(str(output_dir / work_queue.QUEUE_FILE))
+    assert queue.count_states()[work_queue.QUEUE_DONE] == 12
+    queue.close()
+    # A further worker converts nothing but reports every issue.
+    summaries = queue_xml_to_text.publications_to_text(corpus_dir, str(output_dir))
+    assert sum(summary["num_issues"] for summary in summaries.values()) == 12
+    serial_dir = tmp_path / "serial"
+    xml_to_text.publications_to_text(corpus_dir, str(serial_dir))
+    assert read_output(output_dir) == read_output(serial_dir)
+
+
+def test_queue_worker_waits_without_writing_parts(tmp_path):
+    output_dir = tmp_path / "output"
+    queue_file = str(output_dir / work_queue.QUEUE_FILE)
+    output_dir.mkdir()
+    other = work_queue.WorkQueue(queue_file, lease_seconds=0.5, worker_id="a")
+    other.populate(
+        partial(multiprocess_xml_to_text.list_issues, "demo-files", str(output_dir))
+    )
+    # The other worker stops while holding the lease on the only issue.
+    assert other.claim() is not None
+    queue = work_queue.WorkQueue(queue_file, worker_id="b")
+    worker = queue_xml_to_text.QueueWorker(
+        queue, str(output_dir), xml.load_xslts(), profile=True
+    )
+    # The worker waits for the lease to expire, then converts the issue.
+    assert worker.run(poll_seconds=0.05) == 1
+    parts_dir = output_dir / profiling.PROFILE_PARTS_DIR
+    assert len(list(parts_dir.iterdir())) == 2
+    other.close()
+    queue.close()
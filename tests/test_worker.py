@@ -0,0 +1,27 @@
+import logging
+import os
+
+from alto2txt import worker
+
+
+def get_file_handlers(log_file):
+    return [
+        handler
+        for handler in logging.getLogger().handlers
+        if isinstance(handler, logging.FileHandler)
+        and handler.baseFilename == os.path.abspath(log_file)
+    ]
+
+
+def test_init_worker_once(tmp_path):
+    log_file = str(tmp_path / "out.log")
+    try:
+        worker.init_worker(log_file)
+        xslts = worker.get_xslts()
+        worker.init_worker(log_file)
+        assert worker.get_xslts() is xslts
+        assert len(get_file_handlers(log_file)) == 1
+    finally:
+        for handler in get_file_handlers(log_file):
+            logging.getLogger().removeHandler(handler)
+            handler.close()
@@ -0,0 +1,65 @@
+import pytest
+from lxml import etree
+
+from alto2txt import xml
+
+DEMO_ISSUE = "demo-files/0002647/1824/0217/"
+
+
+@pytest.mark.parametrize(
+    "content, flavour",
+    [
+        ("<BL_newspaper><BL_article/><BL_page/></BL_newspaper>", xml.FLAVOUR_BLN),
+        ("<BL_newspaper><BL_page/></BL_newspaper>", xml.FLAVOUR_BL_PAGE),
+        (
+            '<UKP xmlns="http://tempuri.org/ncbpissue"><Periodical/></UKP>',
+            xml.FLAVOUR_UKP,
+        ),
+        (
+            '<mets:mets xmlns:mets="http://www.loc.gov/METS/" '
+            'xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" '
+            'xsi:schemaLocation="http://www.loc.gov/METS/ '
+            'http://schema.ccs-gmbh.com/docworks/mets-metae.xsd"/>',
+            xml.FLAVOUR_METS_13,
+        ),
+        (
+            '<mets:mets xmlns:mets="http://www.loc.gov/METS/"/>',
+            xml.FLAVOUR_METS_UNKNOWN,
+        ),
+        ("<html><body/></html>", xml.FLAVOUR_UNKNOWN),
+    ],
+)
+def test_get_xml_flavour(tmp_path, content, flavour):
+    xml_file = tmp_path / "file.xml"
+    xml_file.write_text(content)
+    assert xml.get_xml_flavour(xml.sniff_xml_metadata(str(xml_file))) == flavour
+
+
+def test_sniff_xml_metadata_demo_files():
+    alto = xml.sniff_xml_metadata(DEMO_ISSUE + "0002647_18240217_0001.xml")
+    assert xml.get_xml_flavour(alto) == xml.FLAVOUR_ALTO
+    assert alto[xml.XML_FIRST_CHILD] == "Description"
+    mets_file = DEMO_ISSUE + "0002647_18240217_mets.xml"
+    mets = xml.sniff_xml_metadata(mets_file)
+    assert xml.get_xml_flavour(mets) == xml.FLAVOUR_METS_18
+    # Sniffed metadata agrees with that from the full document tree.
+    full = xml.get_xml_metadata(xml.get_xml(mets_file))
+    for key in [xml.XML_ROOT, xml.XML_NS, xml.XML_SCHEMA_LOCATIONS]:
+        assert mets[key] == full[key]
+
+
+def test_sniff_xml_metadata_only_reads_root(tmp_path):
+    xml_file = tmp_path / "file.xml"
+    xml_file.write_text("<alto><Description/><Layout><unclosed></Layout></alto>")
+    assert (
+        xml.get_xml_flavour(xml.sniff_xml_metadata(str(xml_file))) == xml.FLAVOUR_ALTO
+    )
+    with pytest.raises(etree.XMLSyntaxError):
+        xml.get_xml(str(xml_file))
+
+
+def test_sniff_xml_metadata_bad_xml(tmp_path):
+    xml_file = tmp_path / "file.xml"
+    xml_file.write_text("")
+    with pytest.raises(etree.XMLSyntaxError):
+        xml.sniff_xml_metadata(str(xml_file))